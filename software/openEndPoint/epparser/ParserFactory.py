@@ -6,6 +6,8 @@ log = logging.getLogger('ParserFactory')
 log.setLevel(logging.ERROR)
 log.addHandler(NullHandler())
 
+import threading
+
 from epparser.specificparsers import *
 from ParserException import IncorrectParserException
 from ParserException import UnexistingParserException
@@ -13,15 +15,56 @@ from ParserException import NoSubclassException
 
 # creates an instance of an specific parser
 class ParserFactory(object):
+    '''
+    Returns the specific parser of an application name.
+    
+    The parser classes are indexed by the names in their ``apps`` when this
+    module is imported, and one instance is kept per name: the specific
+    parsers hold no state, so an instance is shared by all the messages of
+    an application. A name which is not indexed is looked up among the
+    subclasses of SpecificParser, as parsers may be defined after import.
+    '''
+    
+    registry  = {}  # application name -> parser class
+    instances = {}  # application name -> parser instance
+    dataLock  = threading.Lock()
     
     #======================== public ==========================================
-    #by reflection get all subclasses of SpecificParser
+    
     def getParser(self,name):
-        #p=ScheduleParser.ScheduleParser();
         strname="".join(chr(b) for b in name)
+        try:
+            return self.instances[strname]
+        except KeyError:
+            pass
+        
+        cl = self.registry.get(strname)
+        if cl is None:
+            instance = self._discover(strname)
+        else:
+            instance = cl()
+        
+        with self.dataLock:
+            return self.instances.setdefault(strname,instance)
+    
+    @classmethod
+    def register(self,cl):
+        '''
+        Index a parser class by the application names in its ``apps``.
+        Can be used as a class decorator.
+        '''
+        with self.dataLock:
+            for app in cl.apps:
+                self.registry[app] = cl
+                self.instances.pop(app,None)
+        return cl
+    
+    #======================== private =========================================
+    
+    #by reflection get all subclasses of SpecificParser
+    def _discover(self,strname):
         try:
             sub=SpecificParser.SpecificParser.__subclasses__()
-            #sub=Parser.Parser.__subclasses__()
         except NoSubclassException:  
             log.error("there are no parsers defined.")
             raise NoSubclassException()
@@ -29,10 +72,14 @@ class ParserFactory(object):
              try:
                instance = cl() #instantiate the subclass
                instance.create(strname) #check if this is the right one.
+               self.register(cl)
                return instance #if this is the desired class return its instance.
              except IncorrectParserException:
                log.debug("not this class..")
                
                #do nothing.. look for next one.
         raise UnexistingParserException() #in case the subclass does no exist throw an error. TODO check how to create an exception
-    #======================== private =========================================
+
+#index the parsers defined at import
+for cl in SpecificParser.SpecificParser.__subclasses__():
+    ParserFactory.register(cl)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+'''
+Benchmark of the lookup of specific parsers by ParserFactory.
+
+A mix of CoAP messages carrying schedule ('d_s'), neighbors ('d_n') and
+uRes test ('res') payloads, as sent by the motes, is parsed by
+ParserPayload. The lookup of the parsers is timed on its own, through the
+registry and through the discovery among the subclasses of SpecificParser
+which was run for every message before.
+
+Usage: python bench_parserFactory.py [numMessages]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..'))                             # openEndPoint/
+
+import time
+import random
+
+from   epparser import ParserPayload
+from   epparser import ParserFactory
+
+#============================ defines =========================================
+
+NUM_MESSAGES   = 20000
+URI_PATH       = 9
+
+#============================ helpers =========================================
+
+def coapMessage(app,payload):
+    message  = [1<<6 | 0<<4 | 2, 2, 0x12, 0x34]         # POST, two options
+    message += [URI_PATH<<4 | 1, ord('d')]
+    message += [0<<4 | len(app)] + [ord(c) for c in app]
+    return message + payload
+
+def recordedMix(numMessages):
+    rand     = random.Random(0)
+    messages = []
+    for i in range(numMessages):
+        kind = rand.choice(['d_s','d_s','d_n','res'])
+        if kind=='d_s':
+            numCells = rand.randint(1,10)
+            payload  = [numCells]+[rand.randint(0,255) for _ in range(3*numCells)]
+        elif kind=='d_n':
+            numNeighbors = rand.randint(1,5)
+            payload  = [numNeighbors]+[rand.randint(0,255) for _ in range(6*numNeighbors)]
+        else:
+            payload  = [rand.randint(0,255) for _ in range(6)]
+        messages.append(coapMessage(kind,payload))
+    return messages
+
+def timeIt(function,messages):
+    start = time.time()
+    for m in messages:
+        function(m)
+    return time.time()-start
+
+#============================ main ============================================
+
+def bench(numMessages=NUM_MESSAGES):
+    
+    messages  = recordedMix(numMessages)
+    names     = [m[7:7+(m[6]&0x0f)] for m in messages]
+    factory   = ParserFactory.ParserFactory()
+    parser    = ParserPayload.ParserPayload()
+    
+    discover  = timeIt(lambda n: factory._discover(''.join([chr(b) for b in n])),names)
+    lookup    = timeIt(factory.getParser,names)
+    parse     = timeIt(parser.parse,messages)
+    
+    output    = []
+    output   += ['{0} messages'.format(numMessages)]
+    output   += ['parser lookup, discovery: {0:.2f}us/msg'.format(1e6*discover/numMessages)]
+    output   += ['parser lookup, registry:  {0:.2f}us/msg'.format(1e6*lookup/numMessages)]
+    output   += ['ParserPayload.parse:      {0:.2f}us/msg'.format(1e6*parse/numMessages)]
+    print '\n'.join(output)
+
+if __name__=='__main__':
+    bench(*[int(a) for a in sys.argv[1:]])
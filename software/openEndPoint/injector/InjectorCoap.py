@@ -7,13 +7,23 @@ log.setLevel(logging.ERROR)
 log.addHandler(NullHandler())
 
 import random
+import select
+import socket
+import struct
+import threading
+import time
 
 import InjectorUdp
 from InjectorException import NoSuitableInjectorException
 
 class InjectorCoap(InjectorUdp.InjectorUdp):
     
-    CONFIRMABLE   = 0
+    CONFIRMABLE     = 0
+    NON_CONFIRMABLE = 1
+    ACKNOWLEDGEMENT = 2
+    RESET           = 3
+    
+    EMPTY         = 0   # code of an empty message
     
     VERSION       = 1
     
@@ -22,21 +32,96 @@ class InjectorCoap(InjectorUdp.InjectorUdp):
     POST          = 2
     PUT           = 3
     
+    ACK_TIMEOUT   = 2.0 # seconds before the first retransmission
+    MAX_RETRANSMIT = 4
+    CONCURRENCY   = 16  # confirmable requests in flight in inject_many
+    MAX_MESSAGE   = 1280
+    
+    MESSAGE_ID    = struct.Struct('>H')
+    
     resources = []
     
+    _messageId     = random.randint(0,0xffff)
+    _messageIdLock = threading.Lock()
+    
     #======================== public ==========================================
     
     @classmethod
     def inject(self,destination=None,coapResource=None,fields=None):
-        print self.__subclasses__()
+        self._findInjector(coapResource).inject_internal(destination,coapResource,fields)
+    
+    @classmethod
+    def inject_many(self,requests,concurrency=None,retransmissions=None,ackTimeout=None):
+        '''
+        Send confirmable requests to many motes from a single socket.
+        
+        Up to ``concurrency`` requests are in flight at once. Each response
+        is matched to its request by message ID and by the mote it comes
+        from; a request without answer is retransmitted after ``ackTimeout``
+        seconds, the timeout doubling at each of the ``retransmissions``
+        attempts. A request acknowledged by an empty ACK is not
+        retransmitted; its response, which the mote sends separately, is
+        matched by the mote it comes from, and acknowledged if confirmable.
+        
+        :param requests: [in] A list of ``(destination,coapResource,fields)``
+            tuples, as the parameters of :meth:`inject`.
+        :returns: A list with, for each request, the response as a string,
+            or ``None`` if the mote did not answer.
+        '''
+        if concurrency is None:
+            concurrency     = self.CONCURRENCY
+        if retransmissions is None:
+            retransmissions = self.MAX_RETRANSMIT
+        if ackTimeout is None:
+            ackTimeout      = self.ACK_TIMEOUT
+        assert concurrency>0
+        
+        messages = []
+        for (destination,coapResource,fields) in requests:
+            self._checkDestination(destination)
+            (method,payload) = self._findInjector(coapResource).getRequest(coapResource,fields)
+            messages.append((destination,coapResource,method,payload))
+        
+        sock = self._getSocket()
+        try:
+            return self._exchange(sock,messages,concurrency,retransmissions,ackTimeout)
+        finally:
+            self._releaseSocket(sock)
+    
+    @classmethod
+    def getRequest(self,coapResource=None,fields=None):
+        '''
+        :returns: The ``(method,payload)`` of the request which sets a
+            resource to the given fields.
+        '''
+        raise NotImplementedError()
+    
+    @classmethod
+    def inject_internal(self,destination=None,coapResource=None,method=None,payload=None):
+        
+        # hand over to UDP injector
+        InjectorUdp.InjectorUdp.inject(
+            destination,
+            self._buildMessage(coapResource,method,payload,self._newMessageId()),
+        )
+    
+    #======================== private =========================================
+    
+    @classmethod
+    def _findInjector(self,coapResource):
         for injector in self.__subclasses__():
             if coapResource in injector.resources:
-                injector.inject_internal(destination,coapResource,fields)
-                return
+                return injector
         raise NoSuitableInjectorException()
     
     @classmethod
-    def inject_internal(self,destination=None,coapResource=None,method=None,payload=None):
+    def _newMessageId(self):
+        with self._messageIdLock:
+            InjectorCoap._messageId = (InjectorCoap._messageId+1) & 0xffff
+            return InjectorCoap._messageId
+    
+    @classmethod
+    def _buildMessage(self,coapResource,method,payload,messageId):
         
         assert(method in [self.POST,self.PUT])
         
@@ -56,12 +141,134 @@ class InjectorCoap(InjectorUdp.InjectorUdp):
                         len(coapOptions)<<0
                       ]
         coapHeader += [method]
-        coapHeader += [random.randint(0,255),random.randint(0,255)]
+        coapHeader += [(messageId>>8)&0xff,messageId&0xff]
         
         # build final payload
-        payload     = coapHeader + sum(coapOptions,[]) + payload
+        return coapHeader + sum(coapOptions,[]) + payload
         
-        # hand over to UDP injector
-        InjectorUdp.InjectorUdp.inject(destination,payload)
+    @classmethod
+    def _exchange(self,sock,messages,concurrency,retransmissions,ackTimeout):
+    
+        responses = [None]*len(messages)
+        pending   = {} # messageId -> state of the request in flight
+        nextIdx   = 0
+        
+        # drop answers left over from previous users of the socket
+        self._receive(sock,{},responses)
+        
+        while nextIdx<len(messages) or pending:
+            now    = time.time()
+            toSend = []
+            
+            # open the window
+            while nextIdx<len(messages) and len(pending)<concurrency:
+                (destination,coapResource,method,payload) = messages[nextIdx]
+                messageId = self._newMessageId()
+                data      = self._toString(
+                    self._buildMessage(coapResource,method,payload,messageId)
+                )
+                pending[messageId] = {
+                    'index':       nextIdx,
+                    'messageId':   messageId,
+                    'destination': destination,
+                    'data':        data,
+                    'attempts':    0,
+                    'timeout':     ackTimeout,
+                    'deadline':    now+ackTimeout,
+                    # how long to wait for a separate response, once acknowledged
+                    'lifetime':    ackTimeout*(2**(retransmissions+1)-1),
+                    'acknowledged':False,
+                }
+                toSend.append((destination,data))
+                nextIdx += 1
+            
+            # retransmit, or give up on, the requests without answer
+            for (messageId,request) in pending.items():
+                if request['deadline']>now:
+                    continue
+                if request['attempts']>=retransmissions or request['acknowledged']:
+                    log.warning("no answer from {0}".format(request['destination']))
+                    del pending[messageId]
+                    continue
+                request['attempts'] += 1
+                request['timeout']  *= 2
+                request['deadline']  = now+request['timeout']
+                toSend.append((request['destination'],request['data']))
+            
+            if toSend:
+                self._sendMany(sock,toSend)
+            if not pending:
+                continue
+            
+            # wait for answers until the next deadline
+            wait = min([r['deadline'] for r in pending.values()])-time.time()
+            if select.select([sock],[],[],max(wait,0))[0]:
+                self._receive(sock,pending,responses)
+        
+        return responses
     
-    #======================== private =========================================
\ No newline at end of file
+    @classmethod
+    def _receive(self,sock,pending,responses):
+        '''
+        Read the datagrams waiting on the socket, and match them to the
+        requests in flight by message ID and source, as in section 4.4 of
+        RFC 7252.
+        '''
+        while select.select([sock],[],[],0)[0]:
+            (data,source) = sock.recvfrom(self.MAX_MESSAGE)
+            if len(data)<4:
+                continue
+            msgType      = (ord(data[0])>>4)&0x03
+            code         = ord(data[1])
+            (messageId,) = self.MESSAGE_ID.unpack_from(data,2)
+            request      = pending.get(messageId)
+            if request is not None and not self._sameEndpoint(source,request['destination']):
+                # the message ID of one of our requests, from another host
+                request  = None
+            
+            if request is None:
+                # a separate response comes with a message ID of the mote
+                if code!=self.EMPTY and msgType in [self.CONFIRMABLE,self.NON_CONFIRMABLE]:
+                    request = self._findAcknowledged(pending,source)
+                if request is None:
+                    # duplicate, or not ours
+                    continue
+                if msgType==self.CONFIRMABLE:
+                    sock.sendto(self._emptyAck(messageId),source[:2])
+            elif msgType==self.RESET:
+                del pending[messageId]
+                log.warning("{0} reset the request".format(request['destination']))
+                continue
+            elif code==self.EMPTY:
+                # the response will come separately
+                if not request['acknowledged']:
+                    request['acknowledged'] = True
+                    request['deadline']     = time.time()+request['lifetime']
+                continue
+            
+            del pending[request['messageId']]
+            responses[request['index']] = data
+    
+    @classmethod
+    def _findAcknowledged(self,pending,source):
+        '''
+        :returns: The oldest acknowledged request to the mote a separate
+            response comes from, or None.
+        '''
+        candidates = [r for r in pending.values() if r['acknowledged'] and self._sameEndpoint(source,r['destination'])]
+        if not candidates:
+            return None
+        return min(candidates,key=lambda r: r['index'])
+    
+    @classmethod
+    def _sameEndpoint(self,source,destination):
+        if source[1]!=destination[1]:
+            return False
+        try:
+            return socket.inet_pton(socket.AF_INET6,source[0].split('%')[0])==socket.inet_pton(socket.AF_INET6,destination[0].split('%')[0])
+        except socket.error:
+            return source[0]==destination[0]
+    
+    @classmethod
+    def _emptyAck(self,messageId):
+        return chr(self.VERSION<<6 | self.ACKNOWLEDGEMENT<<4)+chr(self.EMPTY)+self.MESSAGE_ID.pack(messageId)
@@ -17,10 +17,17 @@ class InjectorCoapLed(InjectorCoap.InjectorCoap):
     @classmethod
     def inject_internal(self,destination=None,coapResource=None,fields=None):
         
+        (method,payload) = self.getRequest(coapResource,fields)
+        
+        # hand over to CoAP injector
+        InjectorCoap.InjectorCoap.inject_internal(destination,coapResource,method,payload)
+    
+    @classmethod
+    def getRequest(self,coapResource=None,fields=None):
+        
         # turn fields into payload
         payload = [0x01,0x02] # poipoi
         
-        # hand over to CoAP injector
-        InjectorCoap.InjectorCoap.inject_internal(destination,coapResource,self.PUT,payload)
+        return (self.PUT,payload)
     
     #======================== private =========================================
\ No newline at end of file
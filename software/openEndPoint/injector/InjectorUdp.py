@@ -7,27 +7,91 @@ log.setLevel(logging.ERROR)
 log.addHandler(NullHandler())
 
 import socket
+import threading
 
 import Injector
 
 class InjectorUdp(Injector.Injector):
     
+    POOL_SIZE     = 4    # idle sockets kept for reuse
+    
+    _pool         = []
+    _poolLock     = threading.Lock()
+    
     #======================== public ==========================================
     
     @classmethod
     def inject(self,destination=None,payload=None):
         
         # check that destination is well formatted
+        self._checkDestination(destination)
+        
+        # send payload over a pooled UDP socket
+        sock = self._getSocket()
+        try:
+            sock.sendto(self._toString(payload),destination)
+        finally:
+            self._releaseSocket(sock)
+    
+    @classmethod
+    def inject_many(self,packets):
+        '''
+        Send a batch of payloads from a single pooled socket.
+        
+        :param packets: [in] A list of ``(destination,payload)`` tuples,
+            where destination is a ``(ip,port)`` tuple and payload a list
+            of bytes or a string.
+        '''
+        for (destination,payload) in packets:
+            self._checkDestination(destination)
+        
+        sock = self._getSocket()
+        try:
+            self._sendMany(sock,[(d,self._toString(p)) for (d,p) in packets])
+        finally:
+            self._releaseSocket(sock)
+    
+    #======================== private =========================================
+    
+    @classmethod
+    def _checkDestination(self,destination):
         assert len(destination)==2
         destIp   = destination[0]
         assert type(destIp)==str
         destPort = destination[1]
         assert type(destPort)==int
         
-        # send payload over UDP socket
-        sock = socket.socket(socket.AF_INET6,    # IPv6
+    @classmethod
+    def _toString(self,payload):
+        if type(payload)==str:
+            return payload
+        return ''.join([chr(b) for b in payload])
+    
+    #=== socket pool
+    
+    @classmethod
+    def _getSocket(self):
+        with self._poolLock:
+            if self._pool:
+                return self._pool.pop()
+        return socket.socket(socket.AF_INET6,    # IPv6
                              socket.SOCK_DGRAM ) # UDP
-        sock.sendto(''.join([chr(b) for b in payload]),
-                    (destIp, destPort) )
     
-    #======================== private =========================================
\ No newline at end of file
+    @classmethod
+    def _releaseSocket(self,sock):
+        with self._poolLock:
+            if len(self._pool)<self.POOL_SIZE:
+                self._pool.append(sock)
+                return
+        sock.close()
+    
+    #=== sending
+    
+    @classmethod
+    def _sendMany(self,sock,packets):
+        '''
+        :param packets: [in] A list of ``(destination,string)`` tuples.
+        '''
+        sendto = sock.sendto
+        for (destination,data) in packets:
+            sendto(data,destination)
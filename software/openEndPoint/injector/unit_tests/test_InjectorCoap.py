@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..'))                                   # injector/
+
+import logging
+import logging.handlers
+import socket
+import threading
+import time
+
+import pytest
+
+import InjectorCoap
+import InjectorUdp
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_InjectorCoap.log'
+
+import logging
+log = logging.getLogger('test_InjectorCoap')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_InjectorCoap',
+                   'InjectorCoap',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+RESOURCE    = 't'
+ACK_TIMEOUT = 0.05
+
+CHANGED     = 0x44 # 2.04
+
+#============================ helpers =========================================
+
+class InjectorCoapTest(InjectorCoap.InjectorCoap):
+    
+    resources = [RESOURCE]
+    
+    @classmethod
+    def getRequest(self,coapResource=None,fields=None):
+        return (self.PUT,[fields])
+
+class responder(threading.Thread):
+    '''
+    A mote, answering the requests it receives with the datagrams returned
+    by ``answer(request,numReceived)``, as ``(socket,data)`` tuples.
+    '''
+    def __init__(self,answer):
+        self.answer   = answer
+        self.sock     = socket.socket(socket.AF_INET6,socket.SOCK_DGRAM)
+        self.sock.bind(('::1',0))
+        self.address  = self.sock.getsockname()[:2]
+        self.received = []
+        threading.Thread.__init__(self)
+        self.daemon   = True
+        self.start()
+    def run(self):
+        while True:
+            try:
+                (data,source) = self.sock.recvfrom(1500)
+            except socket.error:
+                return
+            self.received.append(data)
+            for (sock,data) in self.answer(data,len(self.received)):
+                sock.sendto(data,source[:2])
+    def close(self):
+        self.sock.close()
+
+def response(request,msgType=InjectorCoap.InjectorCoap.ACKNOWLEDGEMENT,code=CHANGED,messageId=None,payload=''):
+    if messageId is None:
+        messageId = request[2:4]
+    else:
+        messageId = InjectorCoap.InjectorCoap.MESSAGE_ID.pack(messageId)
+    return chr(1<<6 | msgType<<4)+chr(code)+messageId+payload
+
+@pytest.fixture
+def motes(request):
+    created = []
+    def create(answer):
+        mote = responder(answer)
+        created.append(mote)
+        return mote
+    def close():
+        for mote in created:
+            mote.close()
+    request.addfinalizer(close)
+    return create
+
+def waitFor(condition,timeout=2):
+    end = time.time()+timeout
+    while not condition() and time.time()<end:
+        time.sleep(0.001)
+    return condition()
+
+def injectMany(requests,**kwargs):
+    kwargs.setdefault('ackTimeout',ACK_TIMEOUT)
+    return InjectorCoap.InjectorCoap.inject_many(requests,**kwargs)
+
+#============================ tests ===========================================
+
+def test_correlation(motes):
+    stray = socket.socket(socket.AF_INET6,socket.SOCK_DGRAM)
+    # a host which is not the mote answers first, with the same message ID
+    moteA = motes(lambda r,n: [(stray,response(r,payload='stray')),(moteA.sock,response(r,payload='A'+r[-1]))])
+    moteB = motes(lambda r,n: [(moteB.sock,response(r,payload='B'+r[-1]))])
+    
+    responses = injectMany([
+        (moteA.address,RESOURCE,1),
+        (moteB.address,RESOURCE,2),
+        (moteA.address,RESOURCE,3),
+    ])
+    stray.close()
+    
+    assert [r[4:] for r in responses]==['A\x01','B\x02','A\x03']
+    assert len(moteA.received)==2
+    assert len(moteB.received)==1
+
+def test_retransmission(motes):
+    # the first copy of the request is lost
+    mote      = motes(lambda r,n: [(mote.sock,response(r))] if n>1 else [])
+    
+    responses = injectMany([(mote.address,RESOURCE,1)])
+    
+    assert responses[0] is not None
+    assert len(mote.received)==2
+    assert mote.received[0]==mote.received[1]
+
+def test_giveUp(motes):
+    mote      = motes(lambda r,n: [])
+    
+    responses = injectMany([(mote.address,RESOURCE,1)],retransmissions=2)
+    
+    assert responses==[None]
+    assert len(mote.received)==3
+
+def test_separateResponse(motes):
+    # an empty ACK, then the response with a message ID of the mote
+    def answer(request,n):
+        if n>1:
+            # the injector acknowledges the separate response
+            return []
+        return [
+            (mote.sock,response(request,code=InjectorCoap.InjectorCoap.EMPTY)),
+            (mote.sock,response(request,msgType=InjectorCoap.InjectorCoap.CONFIRMABLE,messageId=0x1234,payload='late')),
+        ]
+    mote      = motes(answer)
+    
+    responses = injectMany([(mote.address,RESOURCE,1)])
+    
+    assert responses[0][4:]=='late'
+    assert waitFor(lambda: len(mote.received)==2)
+    assert mote.received[1]==response('',code=InjectorCoap.InjectorCoap.EMPTY,messageId=0x1234)
+
+def test_socketPool(motes):
+    mote      = motes(lambda r,n: [(mote.sock,response(r))])
+    
+    # the socket of a batch goes back to the pool, for the next batch
+    injectMany([(mote.address,RESOURCE,1)])
+    numIdle   = len(InjectorUdp.InjectorUdp._pool)
+    sock      = InjectorUdp.InjectorUdp._pool[-1]
+    injectMany([(mote.address,RESOURCE,1)])
+    assert len(InjectorUdp.InjectorUdp._pool)==numIdle
+    assert InjectorUdp.InjectorUdp._pool[-1] is sock
+    
+    # at most POOL_SIZE idle sockets are kept
+    socks     = [InjectorUdp.InjectorUdp._getSocket() for _ in range(InjectorUdp.InjectorUdp.POOL_SIZE+2)]
+    for s in socks:
+        InjectorUdp.InjectorUdp._releaseSocket(s)
+    assert len(InjectorUdp.InjectorUdp._pool)==InjectorUdp.InjectorUdp.POOL_SIZE
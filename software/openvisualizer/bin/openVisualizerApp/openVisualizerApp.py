@@ -12,10 +12,13 @@ import sys
 import os
 import logging
 import json
+import re
 log = logging.getLogger('openVisualizerApp')
 
 from openvisualizer.eventBus      import eventBusMonitor
 from openvisualizer.moteProbe     import moteProbe
+from openvisualizer.moteProbe     import ioReactor
+from openvisualizer.moteProbe     import trafficGenerator
 from openvisualizer.moteConnector import moteConnector
 from openvisualizer.moteState     import moteState
 from openvisualizer.RPL           import RPL
@@ -34,7 +37,8 @@ class OpenVisualizerApp(object):
     top-level functionality for several UI clients.
     '''
     
-    def __init__(self,confdir,datadir,logdir,simulatorMode,numMotes,trace,debug,simTopology,iotlabmotes, pathTopo):
+    def __init__(self,confdir,datadir,logdir,simulatorMode,numMotes,trace,debug,simTopology,iotlabmotes, pathTopo,
+            captureDir='',replayFiles='',replaySpeed=1.0,syntheticMotes=0,syntheticRates=None):
         
         # store params
         self.confdir              = confdir
@@ -46,6 +50,11 @@ class OpenVisualizerApp(object):
         self.debug                = debug
         self.iotlabmotes          = iotlabmotes
         self.pathTopo             = pathTopo
+        self.captureDir           = captureDir
+        self.replayFiles          = replayFiles
+        self.replaySpeed          = replaySpeed
+        self.syntheticMotes       = syntheticMotes
+        self.syntheticRates       = syntheticRates
         
         # local variables
         self.eventBusMonitor      = eventBusMonitor.eventBusMonitor()
@@ -55,8 +64,15 @@ class OpenVisualizerApp(object):
         self.topology             = topology.topology()
         self.udpLatency           = UDPLatency.UDPLatency()
         self.DAGrootList          = []
+        self.trafficGenerator     = None
+        # a single thread reads the serial ports, IoT-LAB sockets and TUN
+        # interface; emulated motes are not file descriptors
+        if os.name=='posix' and not self.simulatorMode:
+            self.reactor          = ioReactor.ioReactor()
+        else:
+            self.reactor          = None
         # create openTun call last since indicates prefix
-        self.openTun              = openTun.create() 
+        self.openTun              = openTun.create(reactor=self.reactor)
         if self.simulatorMode:
             from openvisualizer.SimEngine import SimEngine, MoteHandler
             
@@ -87,18 +103,43 @@ class OpenVisualizerApp(object):
                 moteHandler       = MoteHandler.MoteHandler(oos_openwsn.OpenMote())
                 self.simengine.indicateNewMote(moteHandler)
                 self.moteProbes  += [moteProbe.moteProbe(emulatedMote=moteHandler)]
+        elif self.syntheticMotes:
+            # in "synthetic" mode, virtual motes generate traffic
+            
+            self.trafficGenerator = trafficGenerator.TrafficGenerator(
+                self.syntheticMotes,
+                rates             = self.syntheticRates,
+            )
+            self.moteProbes       = [
+                moteProbe.moteProbe(emulatedMote=m) for m in self.trafficGenerator.getMotes()
+            ]
+        elif self.replayFiles:
+            # in "replay" mode, the bytes captured from motes are read back
+            
+            self.moteProbes       = [
+                moteProbe.moteProbe(replayfile=f,replaySpeed=self.replaySpeed) for f in self.replayFiles.split(',')
+            ]
+        
         elif self.iotlabmotes:
             # in "IoT-LAB" mode, motes are connected to TCP ports
             
             self.moteProbes       = [
-                moteProbe.moteProbe(iotlabmote=p) for p in self.iotlabmotes.split(',')
+                moteProbe.moteProbe(
+                    iotlabmote    = p,
+                    reactor       = self.reactor,
+                    capturefile   = self._captureFile('IoT-LAB'+p),
+                ) for p in self.iotlabmotes.split(',')
             ]
             
         else:
             # in "hardware" mode, motes are connected to the serial port
             
             self.moteProbes       = [
-                moteProbe.moteProbe(serialport=p) for p in moteProbe.findSerialPorts()
+                moteProbe.moteProbe(
+                    serialport    = p,
+                    reactor       = self.reactor,
+                    capturefile   = self._captureFile(p[0]),
+                ) for p in moteProbe.findSerialPorts()
             ]
         
         # create a moteConnector for each moteProbe
@@ -111,6 +152,16 @@ class OpenVisualizerApp(object):
             moteState.moteState(mc) for mc in self.moteConnectors
         ]
         
+        # start replaying once the replayed ports are listened to
+        for mp in self.moteProbes:
+            if mp.mode==mp.MODE_REPLAY:
+                mp.start()
+        if self.trafficGenerator:
+            self.trafficGenerator.start()
+        
+        # index the moteStates by serial port and addresses
+        self.moteStateIndex       = moteState.moteStateIndex(self.moteStates)
+        
         # boot all emulated motes, if applicable
         if self.simulatorMode:
             self.simengine.pause()
@@ -181,6 +232,28 @@ class OpenVisualizerApp(object):
         self.rpl.close()
         for probe in self.moteProbes:
             probe.close()
+        if self.trafficGenerator:
+            self.trafficGenerator.close()
+        if self.reactor:
+            self.reactor.close()
+        if self.simulatorMode:
+            from openvisualizer.BspEmulator import VcdLogger
+            VcdLogger.VcdLogger().close()
+    
+    def getMetrics(self):
+        '''
+        Returns a snapshot of the ingestion counters of each port.
+        
+        :returns: A dictionary with, for each port name, the counters of the
+            input and output of its moteProbe, see :meth:`moteProbe.getStats`,
+            and, under 'parser', those of its moteConnector.
+        '''
+        metrics = {}
+        for (probe,connector) in zip(self.moteProbes,self.moteConnectors):
+            stats           = probe.getStats()
+            stats['parser'] = connector.getStats()
+            metrics[stats.pop('portname')] = stats
+        return metrics
                 
     def getMoteState(self, moteid):
         '''
@@ -189,15 +262,42 @@ class OpenVisualizerApp(object):
         :param moteid: 16-bit ID of mote
         :rtype:        moteState or None if not found
         '''
-        for ms in self.moteStates:
-            idManager = ms.getStateElem(ms.ST_IDMANAGER)
-            if idManager and idManager.get16bAddr():
-                addr = ''.join(['%02x'%b for b in idManager.get16bAddr()])
-                if addr == moteid:
-                    return ms
-        else:
-            return None
+        return self.moteStateIndex.getBy16bAddr(moteid)
+    
+    def getMoteStateByEui64(self, eui64):
+        '''
+        Returns the moteState object for the provided connected mote.
+        
+        :param eui64:  EUI64 of mote, as a list of integers
+        :rtype:        moteState or None if not found
+        '''
+        return self.moteStateIndex.getByEui64(eui64)
+    
+    def getMoteConnector(self, serialport):
+        '''
+        Returns the moteConnector object attached to the provided serial port.
         
+        :param serialport: name of the serial port
+        :rtype:            moteConnector or None if not found
+        '''
+        ms = self.moteStateIndex.getBySerialPort(serialport)
+        return ms.moteConnector if ms else None
+        
+    #======================== private =========================================
+    
+    def _captureFile(self,portname):
+        '''
+        Returns the file to capture a port in, or None when not capturing.
+        '''
+        if not self.captureDir:
+            return None
+        if not os.path.isdir(self.captureDir):
+            os.makedirs(self.captureDir)
+        return os.path.join(
+            self.captureDir,
+            '{0}.ovcap.gz'.format(re.sub('[^A-Za-z0-9_.-]','_',portname).strip('_')),
+        )
+
 
 #============================ main ============================================
 import logging.config
@@ -264,6 +364,11 @@ def main(parser=None):
         simTopology     = argspace.simTopology,
         iotlabmotes     = argspace.iotlabmotes,
         pathTopo        = argspace.pathTopo,
+        captureDir      = argspace.captureDir,
+        replayFiles     = argspace.replayFiles,
+        replaySpeed     = argspace.replaySpeed,
+        syntheticMotes  = argspace.syntheticMotes,
+        syntheticRates  = argspace.syntheticRates,
     )
 
 def _addParserArgs(parser):
@@ -315,6 +420,36 @@ def _addParserArgs(parser):
         action     = 'store',
         help       = 'a topology can be loaded from a json file'
     )
+    parser.add_argument('-cap', '--capture',
+        dest       = 'captureDir',
+        default    = '',
+        action     = 'store',
+        help       = 'directory to record the bytes received from each mote in'
+    )
+    parser.add_argument('-rep', '--replay',
+        dest       = 'replayFiles',
+        default    = '',
+        action     = 'store',
+        help       = 'comma-separated list of recorded files to replay instead of motes'
+    )
+    parser.add_argument('-rs', '--replaySpeed',
+        dest       = 'replaySpeed',
+        type       = float,
+        default    = 1.0,
+        help       = 'replay pace relative to the recording, 0 for as fast as possible'
+    )
+    parser.add_argument('-syn', '--synthetic',
+        dest       = 'syntheticMotes',
+        type       = int,
+        default    = 0,
+        help       = 'number of virtual motes generating synthetic traffic instead of motes'
+    )
+    parser.add_argument('-sr', '--syntheticRates',
+        dest       = 'syntheticRates',
+        type       = trafficGenerator.parseRates,
+        default    = '',
+        help       = 'frames per second of each virtual mote (e.g. "status=1,notif=0.1,data=0.5,dao=0.05")'
+    )
     
 def _forceSlashSep(ospath, debug):
     '''
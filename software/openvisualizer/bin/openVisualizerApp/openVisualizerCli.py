@@ -120,6 +120,24 @@ class OpenVisualizerCli(Cmd):
             except ValueError as err:
                 print "{0}:{1}".format(type(err),err)
 
+    def do_traffic(self, arg):
+        """
+        Prints the ingest rate and drops of the synthetic motes (--synthetic)
+        Usage: traffic
+        """
+        if not self.app.trafficGenerator:
+            self.stdout.write('No synthetic motes\n')
+            return
+        stats   = self.app.trafficGenerator.getStats()
+        output  = []
+        output += ['{0} motes, {1:.1f}s'.format(stats['numMotes'],stats['duration'])]
+        output += ['- generated: {0} frames ({1:.1f}/s)'.format(stats['numGenerated'],stats['offeredRate'])]
+        output += ['- received:  {0} frames ({1:.1f}/s, {2:.0f}B/s)'.format(stats['numReceived'],stats['ingestRate'],stats['bytesPerSec'])]
+        output += ['- dropped:   {0} frames'.format(stats['numDropped'])]
+        output += ['- lost:      {0} frames'.format(stats['numLost'])]
+        self.stdout.write('\n'.join(output))
+        self.stdout.write('\n')
+    
     def help_all(self):
         """Lists first line of help for all documented commands"""
         names = self.get_names()
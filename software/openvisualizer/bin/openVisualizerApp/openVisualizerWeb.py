@@ -107,6 +107,7 @@ class OpenVisualizerWeb(eventBusClient.eventBusClient):
         self.websrv.route(path='/routing',                                callback=self._showRouting)
         self.websrv.route(path='/routing/dag',                            callback=self._showDAG)
         self.websrv.route(path='/eventdata',                              callback=self._getEventData)
+        self.websrv.route(path='/metrics',                                callback=self._getMetrics)
         self.websrv.route(path='/wiresharkDebug/:enabled',                callback=self._setWiresharkDebug)
         self.websrv.route(path='/gologicDebug/:enabled',                  callback=self._setGologicDebug)
         self.websrv.route(path='/topology',                               callback=self._topologyPage)
@@ -117,6 +118,7 @@ class OpenVisualizerWeb(eventBusClient.eventBusClient):
         self.websrv.route(path='/topology/connections',   method='POST',  callback=self._topologyConnectionsUpdate)
         self.websrv.route(path='/topology/connections',   method='DELETE',callback=self._topologyConnectionsDelete)
         self.websrv.route(path='/topology/route',         method='GET',   callback=self._topologyRouteRetrieve)
+        self.websrv.route(path='/topology/routes',        method='GET',   callback=self._topologyRoutesRetrieve)
         self.websrv.route(path='/static/<filepath:path>',                 callback=self._serverStatic)
 
     @view('moteview.tmpl')
@@ -167,25 +169,24 @@ class OpenVisualizerWeb(eventBusClient.eventBusClient):
         '''
         Collects data for the provided mote.
 
+        The data is served from the mote's cached snapshot. A request whose
+        If-None-Match header matches the ETag of the snapshot gets an empty
+        304 response.
+
         :param moteid: 16-bit ID of mote
         '''
         log.debug('Get JSON data for moteid {0}'.format(moteid))
         ms = self.app.getMoteState(moteid)
         if ms:
             log.debug('Found mote {0} in moteStates'.format(moteid))
-            states = {
-                ms.ST_IDMANAGER   : ms.getStateElem(ms.ST_IDMANAGER).toJson('data'),
-                ms.ST_ASN         : ms.getStateElem(ms.ST_ASN).toJson('data'),
-                ms.ST_ISSYNC      : ms.getStateElem(ms.ST_ISSYNC).toJson('data'),
-                ms.ST_MYDAGRANK   : ms.getStateElem(ms.ST_MYDAGRANK).toJson('data'),
-                ms.ST_KAPERIOD    : ms.getStateElem(ms.ST_KAPERIOD).toJson('data'),
-                ms.ST_OUPUTBUFFER : ms.getStateElem(ms.ST_OUPUTBUFFER).toJson('data'),
-                ms.ST_BACKOFF     : ms.getStateElem(ms.ST_BACKOFF).toJson('data'),
-                ms.ST_MACSTATS    : ms.getStateElem(ms.ST_MACSTATS).toJson('data'),
-                ms.ST_SCHEDULE    : ms.getStateElem(ms.ST_SCHEDULE).toJson('data'),
-                ms.ST_QUEUE       : ms.getStateElem(ms.ST_QUEUE).toJson('data'),
-                ms.ST_NEIGHBORS   : ms.getStateElem(ms.ST_NEIGHBORS).toJson('data'),
-            }
+            (etag,body) = ms.getSnapshot()
+            response.set_header('ETag', etag)
+            response.set_header('Cache-Control', 'no-cache')
+            response.content_type = 'application/json'
+            if bottle.request.get_header('If-None-Match')==etag:
+                response.status = 304
+                return ''
+            return body
         else:
             log.debug('Mote {0} not found in moteStates'.format(moteid))
             states = {}
@@ -215,8 +216,8 @@ class OpenVisualizerWeb(eventBusClient.eventBusClient):
         return self._getEventData()
 
     def _showDAG(self):
-        states,edges = self.app.topology.getDAG()
-        return { 'states': states, 'edges': edges }
+        response.content_type = 'application/json'
+        return self.app.topology.getDAGJson()
 
     @view('routing.tmpl')
     def _showRouting(self):
@@ -339,6 +340,26 @@ class OpenVisualizerWeb(eventBusClient.eventBusClient):
 
         return data
 
+    def _topologyRoutesRetrieve(self):
+        '''
+        Retrieve the routes to all the motes, and the depth histogram of the
+        routing tree, in a single call.
+        '''
+
+        routes = self.app.topology.getRoutes()
+
+        data = {
+            'routes'         : [
+                {
+                    'destination': dest[-1],
+                    'route':       [r[-1] for r in route],
+                } for (dest,route) in routes.items()
+            ],
+            'depths'         : self.app.topology.getDepthHistogram(),
+        }
+
+        return data
+
     def _topologyDownload(self):
         '''
         Retrieve the topology data, in JSON format, and download it.
@@ -366,6 +387,63 @@ class OpenVisualizerWeb(eventBusClient.eventBusClient):
         }
         return response
 
+    def _getMetrics(self):
+        '''
+        Returns the ingestion counters of each port, in the Prometheus text
+        format.
+        '''
+        output  = []
+        def add(name,kind,description,samples):
+            output.append('# HELP openvisualizer_{0} {1}'.format(name,description))
+            output.append('# TYPE openvisualizer_{0} {1}'.format(name,kind))
+            for (suffix,labels,value) in samples:
+                output.append('openvisualizer_{0}{1}{{{2}}} {3}'.format(
+                    name,
+                    suffix,
+                    ','.join(['{0}="{1}"'.format(k,str(v).replace('\\','\\\\').replace('"','\\"')) for (k,v) in labels]),
+                    value,
+                ))
+        def histogram(port,bounds,counts,total):
+            samples = []
+            count   = 0
+            for (bound,n) in zip(bounds+['+Inf'],counts):
+                count   += n
+                samples += [('_bucket',[('port',port),('le',bound)],count)]
+            samples += [('_sum',[('port',port)],total)]
+            samples += [('_count',[('port',port)],count)]
+            return samples
+
+        metrics = sorted(self.app.getMetrics().items())
+        add('serial_bytes_total','counter','Bytes read from and written to the serial port.',
+            [('',[('port',p),('direction','in')], m['input']['numBytes']) for (p,m) in metrics]+
+            [('',[('port',p),('direction','out')],m['output']['numBytes']) for (p,m) in metrics])
+        add('frames_decoded_total','counter','Valid HDLC frames received.',
+            [('',[('port',p)],m['input']['numFrames']) for (p,m) in metrics])
+        add('frame_errors_total','counter','Invalid HDLC frames received, by error.',
+            [('',[('port',p),('error',e)],n) for (p,m) in metrics for (e,n) in sorted(m['input']['errors'].items())])
+        add('frame_size_bytes','histogram','Size of the valid HDLC frames received, CRC removed.',
+            [s for (p,m) in metrics for s in histogram(p,m['input']['frameSizeBuckets'],m['input']['frameSizes'],m['input']['numFrameBytes'])])
+        add('port_reconnects_total','counter','Times the serial port was reopened after failing.',
+            [('',[('port',p)],m['input']['numReconnects']) for (p,m) in metrics])
+        add('frames_parsed_total','counter','Frames parsed.',
+            [('',[('port',p)],m['parser']['numParsed']) for (p,m) in metrics])
+        add('parse_errors_total','counter','Frames which could not be parsed, by frame type and error.',
+            [('',[('port',p),('type',t),('error',e)],n)
+                for (p,m) in metrics
+                for (t,errors) in sorted(m['parser']['parseErrors'].items())
+                for (e,n) in sorted(errors.items())])
+        add('output_frames_total','counter','Frames written to the serial port.',
+            [('',[('port',p)],m['output']['numWritten']) for (p,m) in metrics])
+        add('output_queue_depth','gauge','Frames waiting to be written to the serial port.',
+            [('',[('port',p)],m['output']['depth']) for (p,m) in metrics])
+        add('output_queue_max_depth','gauge','Most frames waiting to be written to the serial port.',
+            [('',[('port',p)],m['output']['maxDepth']) for (p,m) in metrics])
+        add('output_wait_seconds','histogram','Time from queuing a frame to writing it to the serial port.',
+            [s for (p,m) in metrics for s in histogram(p,m['output']['waitBuckets'],m['output']['waitHistogram'],m['output']['waitTotal'])])
+
+        response.content_type = 'text/plain; version=0.0.4'
+        return '\n'.join(output)+'\n'
+
 #============================ main ============================================
 from argparse       import ArgumentParser
 
@@ -43,6 +43,13 @@ class serialTesterCli(OpenCli):
             ['timeout'],
             self._handle_timeout
         )
+        self.registerCommand(
+            'window',
+            'win',
+            'test packets in flight, 0 to wait for each echo',
+            ['window'],
+            self._handle_window
+        )
         self.registerCommand(
             'trace',
             'trace',
@@ -69,6 +76,7 @@ class serialTesterCli(OpenCli):
         self._handle_pklen([10])
         self._handle_numpk([1])
         self._handle_timeout([1])
+        self._handle_window([0])
         self._handle_trace([1])
         
     #======================== public ==========================================
@@ -86,6 +94,9 @@ class serialTesterCli(OpenCli):
     def _handle_timeout(self,params):
         self.moteConnector_handler.setTimeout(int(params[0]))
     
+    def _handle_window(self,params):
+        self.moteConnector_handler.setWindow(int(params[0]))
+    
     def _handle_trace(self,params):
         if params[0] in [1,'on','yes']:
             self.moteConnector_handler.setTrace(self._indicate_trace)
@@ -100,6 +111,24 @@ class serialTesterCli(OpenCli):
         output  = []
         for k in ['numSent','numOk','numCorrupted','numTimeout']:
             output += ['- {0:<15} : {1}'.format(k,stats[k])]
+        if stats['duration']:
+            # windowed test
+            for k in ['numLate','numReordered']:
+                output += ['- {0:<15} : {1}'.format(k,stats[k])]
+            output += ['- {0:<15} : {1:.1f}'.format('framesPerSec',stats['framesPerSec'])]
+            output += ['- {0:<15} : {1:.1f}'.format('bytesPerSec',stats['bytesPerSec'])]
+            output += ['- {0:<15} : {1:.2f}/{2:.2f}/{3:.2f}'.format(
+                'p50/p95/p99 ms',
+                stats['latencyP50'],
+                stats['latencyP95'],
+                stats['latencyP99'],
+            )]
+            bounds  = SerialTester.LATENCY_BUCKETS_MS
+            for (i,count) in enumerate(stats['latencyHistogram']):
+                if i<len(bounds):
+                    output += ['  {0:>6} {1:<8} : {2}'.format('<=',bounds[i],count)]
+                else:
+                    output += ['  {0:>6} {1:<8} : {2}'.format('>',bounds[-1],count)]
         output  = '\n'.join(output)
         print output
     
@@ -1,12 +1,30 @@
 import os
+import gzip
+import shutil
 import traceback
 import threading
 
 class VcdLogger(object):
+    '''
+    Logs the debug pins of the emulated motes into a VCD file.
+    
+    Transitions are formatted into an in-memory buffer, which is written to
+    a body file in large batches. The variables of a mote are declared the
+    first time it toggles a pin, but the header is only written when the
+    logger is closed: :meth:`close` writes the header into :attr:`FILENAME`
+    and appends the body file to it, so adding a mote never rewrites the
+    trace.
+    
+    When compressed, both the header and the body are gzip members; their
+    concatenation is a valid gzip file.
+    '''
     
     ACTIVITY_DUR   = 1000 # 1000ns=1us
     FILENAME       = 'debugpins.vcd'
-    FILENAME_SWAP  = 'debugpins.vcd.swap'
+    BODY_SUFFIX    = '.body'
+    GZIP_SUFFIX    = '.gz'
+    BATCH_SIZE     = 4096 # number of buffered lines per write
+    GZIP_LEVEL     = 1    # fast, traces compress well anyway
     ENDVAR_LINE    = '$upscope $end\n'
     ENDDEF_LINE    = '$enddefinitions $end\n'
     
@@ -19,37 +37,35 @@ class VcdLogger(object):
     
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
-            cls._instance = super(VcdLogger, cls).__new__(cls, *args, **kwargs)
+            cls._instance = super(VcdLogger, cls).__new__(cls)
         return cls._instance
     
     #======================== main ============================================
     
-    def __init__(self):
+    def __init__(self,filename=FILENAME,compress=False):
         
         # don't re-initialize an instance (singleton pattern)
         if self._init:
             return
         self._init = True
         
+        # store params
+        self.compress   = compress
+        self.filename   = filename
+        if self.compress:
+            self.filename += self.GZIP_SUFFIX
+        
         # local variables
-        self.f          = open(self.FILENAME,'w')
+        self.f          = None
         self.signame    = {}
+        self.sigLines   = {}
         self.lastTs     = {}
-        self.dataLock   = threading.RLock()
+        self.lastTsOut  = None
+        self.buf        = []
+        self.dataLock   = threading.Lock()
         self.enabled    = False
-        self.sigChar    = ord('!')
-        
-        # create header
-        header          = []
-        header         += ['$timescale 1ns $end\n']
-        header         += ['$scope module logic $end\n']
-        # variables will be declared here by self._addMote()
-        header         += [self.ENDVAR_LINE]
-        header         += [self.ENDDEF_LINE]
-        header          = ''.join(header)
-        
-        # write header
-        self.f.write(header)
+        self.closed     = False
+        self.sigNum     = 0
     
     #======================== public ==========================================
     
@@ -58,6 +74,8 @@ class VcdLogger(object):
         
         with self.dataLock:
             self.enabled = enabled
+            if not enabled:
+                self._flush()
     
     def log(self,ts,mote,signal,state):
         
@@ -65,76 +83,137 @@ class VcdLogger(object):
         assert state in [True,False]
         
         # stop here if not enables
-        with self.dataLock:
-            if not self.enabled:
-                return
-        
-        # translate state to val
-        if state:
-            val = 1
-        else:
-            val = 0
+        if not self.enabled:
+            return
         
         with self.dataLock:
             
+            if self.closed:
+                return
+            
             # add mote if needed
-            if mote not in self.signame:
+            if mote not in self.sigLines:
                 self._addMote(mote)
             
             # format
-            output  = []
             tsTemp = int(ts*1000000)*1000
-            if ((mote,signal) in self.lastTs) and self.lastTs[(mote,signal)]==ts:
+            if self.lastTs.get((mote,signal))==ts:
                 tsTemp += self.ACTIVITY_DUR
-            output += ['#{0}\n'.format(tsTemp)]
-            output += ['{0}{1}\n'.format(val,self.signame[mote][signal])]
-            output  = ''.join(output)
-            
-            # write
-            self.f.write(output)
+            if tsTemp!=self.lastTsOut:
+                self.buf.append('#%d\n' % tsTemp)
+                self.lastTsOut = tsTemp
+            self.buf.append(self.sigLines[mote][signal][state])
             
             # remember ts
             self.lastTs[(mote,signal)] = ts
+            
+            # write
+            if len(self.buf)>=self.BATCH_SIZE:
+                self._flush()
+    
+    def flush(self):
+        '''
+        Writes the buffered transitions to the body file.
+        '''
+        with self.dataLock:
+            self._flush()
+    
+    def close(self):
+        '''
+        Writes the complete VCD file, header then transitions.
+        '''
+        with self.dataLock:
+            
+            if self.closed:
+                return
+            self.closed = True
+            self._flush()
+            
+            if self.f:
+                self.f.close()
+            
+            with open(self.filename,'wb') as f:
+                self._write(f,self._header())
+                if self.f:
+                    with open(self._bodyFilename(),'rb') as body:
+                        shutil.copyfileobj(body,f)
+            
+            if self.f:
+                os.remove(self._bodyFilename())
+                self.f = None
     
     #======================== private =========================================
     
     def _addMote(self,mote):
         assert mote not in self.signame
         
-        #=== populate signame
-        self.signame[mote] = {}
+        self.signame[mote]  = {}
+        self.sigLines[mote] = {}
         for signal in self.SIGNAMES:
-            self.signame[mote][signal] = chr(self.sigChar)
-            self.sigChar += 1
+            identifier = self._identifier(self.sigNum)
+            self.sigNum += 1
+            self.signame[mote][signal]  = identifier
+            self.sigLines[mote][signal] = {
+                False: '0{0}\n'.format(identifier),
+                True:  '1{0}\n'.format(identifier),
+            }
         
-        #=== close FILENAME
-        self.f.close()
+    def _identifier(self,num):
+        '''
+        Returns the VCD identifier of the num-th variable.
         
-        #=== FILENAME -> FILENAME_SWAP
-        fswap = open(self.FILENAME_SWAP,'w')
-        for line in open(self.FILENAME,'r'):
-            # declare variables
-            if line==self.ENDVAR_LINE:
-                for signal in self.SIGNAMES:
-                    fswap.write(
-                        '$var wire 1 {0} {1}_{2} $end\n'.format(
-                            self.signame[mote][signal],
-                            mote,
-                            signal,
-                        )
+        Identifiers are made of the printable characters '!' to '~', so any
+        number of motes can be declared.
+        '''
+        identifier = []
+        while True:
+            identifier += [chr(ord('!')+num%94)]
+            num         = num//94
+            if not num:
+                break
+        return ''.join(identifier)
+    
+    def _header(self):
+        header          = []
+        header         += ['$timescale 1ns $end\n']
+        header         += ['$scope module logic $end\n']
+        for mote in sorted(self.signame):
+            for signal in self.SIGNAMES:
+                header += [
+                    '$var wire 1 {0} {1}_{2} $end\n'.format(
+                        self.signame[mote][signal],
+                        mote,
+                        signal,
                     )
-            # print line
-            fswap.write(line)
-            # initialize variables
-            if line==self.ENDDEF_LINE:
+                ]
+        header         += [self.ENDVAR_LINE]
+        header         += [self.ENDDEF_LINE]
+        # initialize variables
+        if self.signame:
+            header     += ['#0\n']
+            for mote in sorted(self.signame):
                 for signal in self.SIGNAMES:
-                    fswap.write('#0\n')
-                    fswap.write('0{0}\n'.format(self.signame[mote][signal]))
-        fswap.close()
+                    header += [self.sigLines[mote][signal][False]]
+        return ''.join(header)
         
-        #=== FILENAME_SWAP -> FILENAME
-        os.remove(self.FILENAME)
-        os.rename(self.FILENAME_SWAP, self.FILENAME)
+    def _flush(self):
+        if not self.buf:
+            return
+        if not self.f:
+            if self.compress:
+                self.f = gzip.open(self._bodyFilename(),'wb',self.GZIP_LEVEL)
+            else:
+                self.f = open(self._bodyFilename(),'wb')
+        self.f.write(''.join(self.buf))
+        self.buf = []
         
-        #=== re-open FILENAME
-        self.f = open(self.FILENAME,'a')
+    def _write(self,f,data):
+        if self.compress:
+            gz = gzip.GzipFile(fileobj=f,mode='wb',compresslevel=self.GZIP_LEVEL)
+            gz.write(data)
+            gz.close()
+        else:
+            f.write(data)
+
+    def _bodyFilename(self):
+        return self.filename+self.BODY_SUFFIX
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+'''
+Benchmark of the VCD logger of the debug pins.
+
+Logs the pin transitions of emulated motes the way BspDebugpins does, with
+motes appearing one after the other during the simulation, then closes the
+logger to write the VCD file.
+
+Usage: python bench_VcdLogger.py [numTransitions] [numMotes] [compress]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # BspEmulator/
+
+import time
+import random
+import tempfile
+import shutil
+
+import VcdLogger
+
+#============================ defines =========================================
+
+NUM_TRANSITIONS = 1000000
+NUM_MOTES       = 100
+
+#============================ helpers =========================================
+
+def bench(numTransitions,numMotes,compress):
+    
+    tmpdir    = tempfile.mkdtemp()
+    vcd       = VcdLogger.VcdLogger(
+        filename  = os.path.join(tmpdir,VcdLogger.VcdLogger.FILENAME),
+        compress  = compress,
+    )
+    vcd.setEnabled(True)
+    
+    # pre-compute the transitions so the benchmark measures the logger only;
+    # new motes keep appearing until the end of the simulation
+    rand      = random.Random(0)
+    signals   = VcdLogger.VcdLogger.SIGNAMES
+    logs      = [
+        (
+            i*0.000010,
+            rand.randint(1,1+(numMotes-1)*i//numTransitions),
+            signals[rand.randint(0,len(signals)-1)],
+            rand.random()<0.5,
+        ) for i in range(numTransitions)
+    ]
+    
+    start     = time.time()
+    for (ts,mote,signal,state) in logs:
+        vcd.log(ts,mote,signal,state)
+    tLog      = time.time()-start
+    
+    start     = time.time()
+    vcd.close()
+    tClose    = time.time()-start
+    size      = os.path.getsize(vcd.filename)
+    shutil.rmtree(tmpdir)
+    
+    output    = []
+    output   += ['{0} transitions, {1} motes, {2}'.format(numTransitions,numMotes,'gzip' if compress else 'plain')]
+    output   += ['- log:   {0:.3f}s ({1:.2f}us/transition, {2:.0f} transitions/s)'.format(tLog,1e6*tLog/numTransitions,numTransitions/tLog)]
+    output   += ['- close: {0:.3f}s ({1:.1f}MB)'.format(tClose,size/1e6)]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numTransitions = int(sys.argv[1]) if len(sys.argv)>1 else NUM_TRANSITIONS
+    numMotes       = int(sys.argv[2]) if len(sys.argv)>2 else NUM_MOTES
+    compress       = (sys.argv[3]=='compress') if len(sys.argv)>3 else False
+    bench(numTransitions,numMotes,compress)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # BspEmulator/
+
+import logging
+import logging.handlers
+import gzip
+
+import pytest
+
+import VcdLogger
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_VcdLogger.log'
+
+import logging
+log = logging.getLogger('test_VcdLogger')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_VcdLogger',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+EXPECTED_MOTE_1 = [
+    '$var wire 1 {0} 1_{1} $end'.format(chr(ord('!')+i),s)
+    for (i,s) in enumerate(VcdLogger.VcdLogger.SIGNAMES)
+]
+
+#============================ helpers =========================================
+
+@pytest.fixture
+def newLogger(tmpdir,monkeypatch):
+    # the logger is a singleton, start each test with a new instance
+    monkeypatch.setattr(VcdLogger.VcdLogger,'_instance',None)
+    monkeypatch.setattr(VcdLogger.VcdLogger,'_init',False)
+    def create(**kwargs):
+        return VcdLogger.VcdLogger(filename=str(tmpdir.join('debugpins.vcd')),**kwargs)
+    return create
+
+def logTransitions(vcd):
+    vcd.setEnabled(True)
+    vcd.log(ts=0.5,   mote=1, signal='frame', state=True)
+    vcd.log(ts=0.5,   mote=1, signal='slot',  state=True)
+    vcd.log(ts=0.5,   mote=2, signal='frame', state=True)
+    vcd.log(ts=0.5,   mote=1, signal='frame', state=False)
+    vcd.log(ts=0.75,  mote=2, signal='frame', state=False)
+    vcd.close()
+
+#============================ tests ===========================================
+
+def test_header(newLogger):
+    vcd = newLogger()
+    vcd.BATCH_SIZE = 2
+    logTransitions(vcd)
+    
+    lines = open(vcd.filename).read().splitlines()
+    
+    # all the motes are declared, even though transitions were already written
+    assert lines[2:12]==EXPECTED_MOTE_1
+    assert lines[12]=='$var wire 1 + 2_frame $end'
+    assert lines[22:24]==['$upscope $end','$enddefinitions $end']
+    assert lines[24]=='#0'
+    assert lines[25:45]==['0{0}'.format(chr(ord('!')+i)) for i in range(20)]
+    assert lines[45:]==[
+        '#500000000','1!','1"','1+',
+        '#500001000','0!',
+        '#750000000','0+',
+    ]
+    assert not os.path.exists(vcd.filename+vcd.BODY_SUFFIX)
+
+def test_compressed(newLogger):
+    plain = newLogger()
+    logTransitions(plain)
+    expected = open(plain.filename).read()
+    
+    VcdLogger.VcdLogger._instance = None
+    VcdLogger.VcdLogger._init     = False
+    vcd = newLogger(compress=True)
+    vcd.BATCH_SIZE = 2
+    logTransitions(vcd)
+    
+    assert vcd.filename.endswith('.vcd.gz')
+    assert gzip.open(vcd.filename).read()==expected
+
+def test_disabled(newLogger):
+    vcd = newLogger()
+    vcd.log(ts=0.5, mote=1, signal='frame', state=True)
+    vcd.close()
+    
+    assert open(vcd.filename).read().splitlines()[2:]==['$upscope $end','$enddefinitions $end']
+
+def test_identifiers(newLogger):
+    vcd = newLogger()
+    
+    assert vcd._identifier(0)=='!'
+    assert vcd._identifier(93)=='~'
+    assert vcd._identifier(94)=='!"'
+    assert len(set(vcd._identifier(i) for i in range(10000)))==10000
@@ -232,9 +232,9 @@ class RPL(eventBusClient.eventBusClient):
                     dao_transit_information['Transit_information_path_control']     = dao[3]
                     dao_transit_information['Transit_information_path_sequence']    = dao[4]
                     dao_transit_information['Transit_information_path_lifetime']    = dao[5]
-                    # address of the parent
+                    # address of the parent, kept by the topology as a list
                     prefix        =  dao[6:14]
-                    parents      += [dao[14:22]]
+                    parents      += [list(dao[14:22])]
                     dao           = dao[22:]
                 elif dao[0]==self._TARGET_INFORMATION_TYPE:
                     dao_target_information['Target_information_type']               = dao[0]
@@ -243,7 +243,7 @@ class RPL(eventBusClient.eventBusClient):
                     dao_target_information['Target_information_prefix_length']      = dao[3]
                     # address of the child
                     prefix        =  dao[4:12]
-                    children     += [dao[12:20]]
+                    children     += [list(dao[12:20])]
                     dao           = dao[20:]
                 else:
                     log.warning("DAO with wrong Option {0}. Neither Transit nor Target.".format(dao[0]))
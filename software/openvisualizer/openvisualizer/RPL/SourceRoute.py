@@ -23,18 +23,38 @@ from openvisualizer.eventBus import eventBusClient
 
 
 class SourceRoute(eventBusClient.eventBusClient):
+    '''
+    Computes source routes from the parents collected by the topology.
+    
+    Routes are cached, keyed by the EUI64 address of their destination. When
+    the parents of a node change, only the cached routes going through that
+    node, i.e. the routes to the node and to its descendants, are dropped.
+    '''
        
     def __init__(self):
         
         # local variables
         self.dataLock        = threading.Lock()
         self.parents         = {}
+        self.routes          = {}   # tuple(destAddr) -> source route
+        self.routesVia       = {}   # tuple(addr) -> tuple(destAddr) routed via addr
+        self.stats           = {
+            'hits':          0,
+            'misses':        0,
+            'invalidations': 0,
+        }
         
         # initialize parent class
         eventBusClient.eventBusClient.__init__(
             self,
             name             = 'SourceRoute',
-            registrations =  []
+            registrations =  [
+                {
+                    'sender'      : self.WILDCARD,
+                    'signal'      : 'parentsChanged',
+                    'callback'    : self._parentsChanged_notif,
+                },
+            ]
         )
     
     #======================== public ==========================================
@@ -49,45 +69,94 @@ class SourceRoute(eventBusClient.eventBusClient):
             destination to source.
         '''
         
-        sourceRoute = []
+        key = tuple(destAddr)
         with self.dataLock:
+            sourceRoute = self.routes.get(key)
+            if sourceRoute is not None:
+                self.stats['hits']   += 1
+                return sourceRoute[:]
+            
+            self.stats['misses']     += 1
             try:
                 parents=self._dispatchAndGetResult(signal='getParents',data=None)
-                self._getSourceRoute_internal(destAddr,sourceRoute,parents)
+                (sourceRoute,via) = self._getSourceRoute_internal(destAddr,parents)
             except Exception as err:
                 log.error(err)
                 raise
         
-        return sourceRoute
+            # cache
+            self.routes[key] = sourceRoute
+            for addr in via:
+                self.routesVia.setdefault(addr,set()).add(key)
+        
+        return sourceRoute[:]
+    
+    def getStats(self):
+        '''
+        Returns the counters of the route cache.
+        
+        :returns: A dictionary with the number of cache hits, misses and
+            invalidated routes, and the number of cached routes.
+        '''
+        with self.dataLock:
+            returnVal = dict(self.stats)
+            returnVal['routes'] = len(self.routes)
+        return returnVal
     
     #======================== private =========================================
     
-    def _getSourceRoute_internal(self,destAddr,sourceRoute,parents):
+    def _parentsChanged_notif(self,sender,signal,data):
+        '''
+        Drops the cached routes going through a node whose parents changed.
         
-        if not destAddr:
-            # no more parents
-            return
+        :param data: [in] The EUI64 address of the node, as a tuple.
+        '''
+        with self.dataLock:
+            for key in self.routesVia.pop(data,()):
+                sourceRoute = self.routes.pop(key,None)
+                if sourceRoute is None:
+                    continue
+                self.stats['invalidations'] += 1
+                for addr in [key]+[tuple(a) for a in sourceRoute]:
+                    dests = self.routesVia.get(addr)
+                    if dests:
+                        dests.discard(key)
+                        if not dests:
+                            del self.routesVia[addr]
         
-        if not parents.get(tuple(destAddr)):
+    def _getSourceRoute_internal(self,destAddr,parents):
+        '''
+        Walks the first parent of each node, from the destination up.
+        
+        :returns: A tuple ``(sourceRoute,via)``, with ``via`` the addresses
+            of the nodes whose parents determine the source route.
+        '''
+        
+        sourceRoute          = []
+        node                 = tuple(destAddr)
+        via                  = set([node])
+        
+        nodeParents          = parents.get(node)
+        if not destAddr or not nodeParents:
             # this node does not have a list of parents
-            return
+            return (sourceRoute,via)
         
-        # first time add destination address
-        if destAddr not in sourceRoute:
-            sourceRoute     += [destAddr]
+        sourceRoute         += [destAddr]
+        while nodeParents:
         
-        # pick a parent
-        parent               = parents.get(tuple(destAddr))[0]
+            # pick a parent
+            parent           = nodeParents[0]
+            node             = tuple(parent)
         
-        # avoid loops
-        if parent not in sourceRoute:
-            sourceRoute     += [parent]
+            # avoid loops
+            if node in via:
+                break
             
-            # add non empty parents recursively
-            nextparent       = self._getSourceRoute_internal(parent,sourceRoute,parents)
+            sourceRoute     += [parent]
+            via.add(node)
+            nodeParents      = parents.get(node)
             
-            if nextparent:
-                sourceRoute += [nextparent]
+        return (sourceRoute,via)
     
     #======================== helpers =========================================
     
\ No newline at end of file
@@ -17,17 +17,35 @@ log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
 import threading
+import json
 
 import openvisualizer.openvisualizer_utils as u
 from openvisualizer.eventBus import eventBusClient
 
 class topology(eventBusClient.eventBusClient):
+    '''
+    Collects the parents announced in DAOs, and maintains the routing tree.
+    
+    The tree links each node to its preferred (first) parent. It is updated
+    incrementally when a DAO changes the parents of a node, together with an
+    index of the children and of the depth of each node. Nodes without a
+    parent are at depth 0.
+    
+    Each change increments :attr:`version`; the DAG served to the web
+    interface is only regenerated when the version changes.
+    '''
     
     def __init__(self):
         
         # local variables
         self.dataLock        = threading.Lock()
         self.parents         = {}
+        self.preferredParent = {}   # tuple(node) -> tuple(preferred parent)
+        self.children        = {}   # tuple(node) -> set of tuple(child)
+        self.depth           = {}   # tuple(node) -> depth
+        self.depthCount      = {}   # depth -> number of nodes
+        self.version         = 0
+        self.dag             = None # (version,(states,edges),json)
         
         eventBusClient.eventBusClient.__init__(
             self,
@@ -52,11 +70,161 @@ class topology(eventBusClient.eventBusClient):
         return self.parents
     
     def getDAG(self):
-        states = []
-        edges = []
-        motes = []
+        return self._getDAG()[0]
+    
+    def getDAGJson(self):
+        '''
+        Returns the DAG as served to the web interface, serialized in JSON.
+        '''
+        return self._getDAG()[1]
+    
+    def getRoutes(self):
+        '''
+        Returns the route to each node which has a parent.
         
+        :returns: A dictionary indexed by the EUI64 address of the node, as
+            a tuple, to its route: a list of EUI64 addresses (as tuples),
+            ordered from the node to the root, as
+            :meth:`SourceRoute.getSourceRoute` computes it.
+        '''
+        routes               = {}
         with self.dataLock:
+            
+            # top down from the roots, extending the route of the parent
+            todo             = [
+                (child,[root])
+                for root in self.children if root not in self.preferredParent
+                for child in self.children[root]
+            ]
+            while todo:
+                (node,parentRoute) = todo.pop()
+                route        = [node]+parentRoute
+                routes[node] = route
+                for child in self.children.get(node,()):
+                    todo    += [(child,route)]
+            
+            # nodes which are not below a root are in a loop
+            for node in self.preferredParent:
+                if node not in routes:
+                    routes[node] = self._walkToRoot(node)
+        
+        return routes
+    
+    def getSubtree(self,node):
+        '''
+        Returns the descendants of a node in the routing tree.
+        
+        :param node: [in] The EUI64 address of the node.
+        
+        :returns: A list of EUI64 addresses, as tuples, parents before their
+            children.
+        '''
+        with self.dataLock:
+            return self._subtree(tuple(node))[1:]
+    
+    def getDepth(self,node):
+        with self.dataLock:
+            return self.depth.get(tuple(node))
+    
+    def getDepthHistogram(self):
+        '''
+        Returns the number of nodes at each depth of the routing tree.
+        '''
+        with self.dataLock:
+            return dict(self.depthCount)
+    
+    def updateParents(self,sender,signal,data):
+        ''' inserts parent information into the parents dictionary '''
+        with self.dataLock:
+            #data[0] == source address, data[1] == list of parents
+            changed = (self.parents.get(data[0])!=data[1])
+            self.parents.update({data[0]:data[1]})
+            if changed:
+                self._updateTree(tuple(data[0]),[tuple(p) for p in data[1]])
+        
+        # routes through this node need to be recomputed
+        if changed:
+            self.dispatch(
+                signal          = 'parentsChanged',
+                data            = data[0],
+            )
+    
+    #======================== private =========================================
+    
+    def _updateTree(self,node,parents):
+        
+        self.version        += 1
+        
+        # all the nodes appear in the tree, even the ones without parents
+        for n in [node]+parents:
+            if n not in self.depth:
+                self._setDepth(n,0)
+        
+        # move the node below its new preferred parent
+        oldParent            = self.preferredParent.pop(node,None)
+        if oldParent is not None:
+            self.children[oldParent].discard(node)
+            if not self.children[oldParent]:
+                del self.children[oldParent]
+        if parents:
+            self.preferredParent[node] = parents[0]
+            self.children.setdefault(parents[0],set()).add(node)
+        
+        # update the depth of the node and its descendants
+        subtree              = self._subtree(node)
+        for n in subtree:
+            parent           = self.preferredParent.get(n)
+            if parent is None or (n==node and parent in subtree):
+                # root, or moved below its own descendant (loop)
+                self._setDepth(n,0)
+            else:
+                self._setDepth(n,self.depth[parent]+1)
+    
+    def _setDepth(self,node,depth):
+        oldDepth             = self.depth.get(node)
+        if oldDepth==depth:
+            return
+        if oldDepth is not None:
+            self.depthCount[oldDepth] -= 1
+            if not self.depthCount[oldDepth]:
+                del self.depthCount[oldDepth]
+        self.depth[node]     = depth
+        self.depthCount[depth] = self.depthCount.get(depth,0)+1
+    
+    def _subtree(self,node):
+        # breadth-first, so each node comes after its parent
+        subtree              = [node]
+        visited              = set(subtree)
+        i                    = 0
+        while i<len(subtree):
+            for child in self.children.get(subtree[i],()):
+                if child not in visited:
+                    visited.add(child)
+                    subtree += [child]
+            i               += 1
+        return subtree
+    
+    def _walkToRoot(self,node):
+        route                = [node]
+        visited              = set(route)
+        parent               = self.preferredParent.get(node)
+        while parent is not None and parent not in visited:
+            route           += [parent]
+            visited.add(parent)
+            parent           = self.preferredParent.get(parent)
+        return route
+    
+    def _getDAG(self):
+        
+        with self.dataLock:
+            
+            if self.dag and self.dag[0]==self.version:
+                return self.dag[1:]
+            
+            states = []
+            edges = []
+            motes = []
+            
             for src, dsts in self.parents.iteritems():
                 src_s = ''.join(['%02X' % x for x in src[-2:] ])
                 motes.append(src_s)
@@ -69,14 +237,9 @@ class topology(eventBusClient.eventBusClient):
                 d = { 'id': mote, 'value': { 'label': mote } } 
                 states.append(d)
         
-        return (states,edges)
+            dagJson  = json.dumps({ 'states': states, 'edges': edges })
+            self.dag = (self.version,(states,edges),dagJson)
         
-    def updateParents(self,sender,signal,data):
-        ''' inserts parent information into the parents dictionary '''
-        with self.dataLock:
-            #data[0] == source address, data[1] == list of parents
-            self.parents.update({data[0]:data[1]})
-    
-    #======================== private =========================================
+            return self.dag[1:]
     
     #======================== helpers =========================================
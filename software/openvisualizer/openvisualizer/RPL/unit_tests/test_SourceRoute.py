@@ -43,6 +43,11 @@ MOTE_B = [0xbb]*8
 MOTE_C = [0xcc]*8
 MOTE_D = [0xdd]*8
 
+ROOT   = [0x10]*8
+MOTE_X = [0x11]*8
+MOTE_Y = [0x12]*8
+MOTE_Z = [0x13]*8
+
 #============================ fixtures ========================================
 
 EXPECTEDSOURCEROUTE = [
@@ -57,6 +62,12 @@ def expectedSourceRoute(request):
 
 #============================ helpers =========================================
 
+def updateParents(client,node,parents):
+    client.dispatch(
+        signal          = 'updateParents',
+        data            =  (tuple(node),parents),
+    )
+
 #============================ tests ===========================================
 
 def test_sourceRoute(expectedSourceRoute):
@@ -101,3 +112,49 @@ def test_sourceRoute(expectedSourceRoute):
         log.debug(output)
     
     assert calculatedRoute==expectedRoute
+
+def test_sourceRouteCache():
+    '''
+    This tests the following topology, before and after MOTE_X changes
+    parent to MOTE_Y
+    
+    ROOT <- MOTE_X <- MOTE_Z
+    ROOT <- MOTE_Y
+    '''
+    
+    sourceRoute = SourceRoute.SourceRoute()
+    topo        = topology.topology()
+    
+    updateParents(sourceRoute,MOTE_X,[ROOT])
+    updateParents(sourceRoute,MOTE_Y,[ROOT])
+    updateParents(sourceRoute,MOTE_Z,[MOTE_X])
+    
+    assert sourceRoute.getSourceRoute(MOTE_Z)==[MOTE_Z,MOTE_X,ROOT]
+    assert sourceRoute.getSourceRoute(MOTE_Y)==[MOTE_Y,ROOT]
+    
+    # the caller can modify the route it gets
+    sourceRoute.getSourceRoute(MOTE_Z).pop()
+    assert sourceRoute.getSourceRoute(MOTE_Z)==[MOTE_Z,MOTE_X,ROOT]
+    
+    # a DAO with the same parents keeps the cached routes
+    updateParents(sourceRoute,MOTE_X,[ROOT])
+    
+    assert sourceRoute.getStats()=={'hits':2,'misses':2,'invalidations':0,'routes':2}
+    
+    # only the routes through MOTE_X are recomputed
+    updateParents(sourceRoute,MOTE_X,[MOTE_Y])
+    
+    assert sourceRoute.getSourceRoute(MOTE_Y)==[MOTE_Y,ROOT]
+    assert sourceRoute.getSourceRoute(MOTE_Z)==[MOTE_Z,MOTE_X,MOTE_Y,ROOT]
+    assert sourceRoute.getStats()=={'hits':3,'misses':3,'invalidations':1,'routes':2}
+
+def test_sourceRouteUnknownDestination():
+    
+    sourceRoute = SourceRoute.SourceRoute()
+    topo        = topology.topology()
+    
+    assert sourceRoute.getSourceRoute([0x20]*8)==[]
+    
+    updateParents(sourceRoute,[0x20]*8,[ROOT])
+    
+    assert sourceRoute.getSourceRoute([0x20]*8)==[[0x20]*8,ROOT]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # RPL/
+
+import logging
+import logging.handlers
+import json
+import gc
+
+import pytest
+
+import SourceRoute
+import topology
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_topology.log'
+
+import logging
+log = logging.getLogger('test_topology')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_topology',
+                   'topology',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+ROOT   = tuple([0x30]*8)
+MOTE_A = tuple([0x31]*8)
+MOTE_B = tuple([0x32]*8)
+MOTE_C = tuple([0x33]*8)
+MOTE_D = tuple([0x34]*8)
+
+#============================ helpers =========================================
+
+def updateParents(topo,node,parents):
+    topo.dispatch(
+        signal          = 'updateParents',
+        data            =  (node,[list(p) for p in parents]),
+    )
+
+def buildTopology():
+    '''
+    ROOT <- MOTE_A <- MOTE_B <- MOTE_C
+    ROOT <- MOTE_D
+    '''
+    topo = topology.topology()
+    updateParents(topo,MOTE_A,[ROOT])
+    updateParents(topo,MOTE_B,[MOTE_A,ROOT])
+    updateParents(topo,MOTE_C,[MOTE_B])
+    updateParents(topo,MOTE_D,[ROOT])
+    return topo
+
+#============================ tests ===========================================
+
+def test_tree():
+    topo = buildTopology()
+    
+    assert [topo.getDepth(n) for n in [ROOT,MOTE_A,MOTE_B,MOTE_C,MOTE_D]]==[0,1,2,3,1]
+    assert topo.getDepthHistogram()=={0:1,1:2,2:1,3:1}
+    assert topo.getSubtree(ROOT)[:1]==[MOTE_A] or topo.getSubtree(ROOT)[:1]==[MOTE_D]
+    assert sorted(topo.getSubtree(ROOT))==sorted([MOTE_A,MOTE_B,MOTE_C,MOTE_D])
+    assert topo.getSubtree(MOTE_A)==[MOTE_B,MOTE_C]
+    assert topo.getSubtree(MOTE_C)==[]
+    assert topo.getRoutes()=={
+        MOTE_A: [MOTE_A,ROOT],
+        MOTE_B: [MOTE_B,MOTE_A,ROOT],
+        MOTE_C: [MOTE_C,MOTE_B,MOTE_A,ROOT],
+        MOTE_D: [MOTE_D,ROOT],
+    }
+
+def test_reparent():
+    topo = buildTopology()
+    
+    # MOTE_B moves below MOTE_D, with its subtree
+    updateParents(topo,MOTE_B,[MOTE_D])
+    
+    assert [topo.getDepth(n) for n in [ROOT,MOTE_A,MOTE_B,MOTE_C,MOTE_D]]==[0,1,2,3,1]
+    assert topo.getSubtree(MOTE_A)==[]
+    assert topo.getSubtree(MOTE_D)==[MOTE_B,MOTE_C]
+    assert topo.getRoutes()[MOTE_C]==[MOTE_C,MOTE_B,MOTE_D,ROOT]
+    
+    # MOTE_D moves below MOTE_C: loop
+    updateParents(topo,MOTE_D,[MOTE_C])
+    
+    assert topo.getRoutes()[MOTE_C]==[MOTE_C,MOTE_B,MOTE_D]
+    assert topo.getRoutes()[MOTE_A]==[MOTE_A,ROOT]
+    assert sum(topo.getDepthHistogram().values())==5
+
+def test_routesMatchSourceRoute():
+    # the topologies of the other tests would also answer getParents
+    gc.collect()
+    
+    sourceRoute = SourceRoute.SourceRoute()
+    topo        = buildTopology()
+    
+    for (node,route) in topo.getRoutes().items():
+        assert [tuple(r) for r in sourceRoute.getSourceRoute(list(node))]==route
+
+def test_dagCache():
+    topo = buildTopology()
+    
+    dag  = topo.getDAGJson()
+    assert topo.getDAGJson() is dag
+    assert len(json.loads(dag)['edges'])==5
+    
+    # same parents: the DAG is not regenerated
+    updateParents(topo,MOTE_D,[ROOT])
+    assert topo.getDAGJson() is dag
+    
+    updateParents(topo,MOTE_D,[MOTE_A])
+    assert topo.getDAGJson() is not dag
+    assert {'u':'3434','v':'3131'} in json.loads(topo.getDAGJson())['edges']
@@ -11,10 +11,227 @@ import copy
 import random
 from math import radians, cos, sin, asin, sqrt, log10
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from openvisualizer.eventBus      import eventBusClient
 
 import SimEngine
 
+#============================ defines =========================================
+
+FREQUENCY_GHz        =    2.4
+TX_POWER_dBm         =    0.0
+PISTER_HACK_LOSS     =   40.0
+SENSITIVITY_dBm      = -101.0
+GREY_AREA_dB         =   15.0
+EARTH_RADIUS_km      = 6367
+
+#============================ helpers =========================================
+
+def pisterHackPdr(latFrom,lonFrom,latTo,lonTo):
+    '''
+    Computes the PDR of the link between two locations.
+    
+    Applies the Friis propagation model to the distance between both
+    locations, then removes a random loss of up to ``PISTER_HACK_LOSS`` dB.
+    '''
+    
+    # compute distance
+    lonFrom, latFrom, lonTo, latTo = map(radians, [lonFrom, latFrom, lonTo, latTo])
+    dlon             = lonTo - lonFrom
+    dlat             = latTo - latFrom
+    a                = sin(dlat/2)**2 + cos(latFrom) * cos(latTo) * sin(dlon/2)**2
+    c                = 2 * asin(sqrt(a))
+    d_km             = EARTH_RADIUS_km * c
+    
+    # compute reception power (first Friis, then apply Pister-hack)
+    Prx              = TX_POWER_dBm - (20*log10(d_km) + 20*log10(FREQUENCY_GHz) + 92.45)
+    Prx             -= PISTER_HACK_LOSS*random.random()
+    
+    #turn into PDR
+    if   Prx<SENSITIVITY_dBm:
+        pdr          = 0.0
+    elif Prx>SENSITIVITY_dBm+GREY_AREA_dB:
+        pdr          = 1.0
+    else:
+        pdr          = (Prx-SENSITIVITY_dBm)/GREY_AREA_dB
+    
+    return pdr
+
+def pisterHackPdrs(latFrom,lonFrom,latsTo,lonsTo):
+    '''
+    Vectorized :func:`pisterHackPdr`, from one location to many.
+    
+    :param latsTo: [in] numpy array of latitudes, in degrees.
+    :param lonsTo: [in] numpy array of longitudes, in degrees.
+    
+    :returns: A numpy array of PDRs, one per destination.
+    
+    .. note:: The random loss is drawn from ``numpy.random``, not ``random``;
+        seed both for a reproducible simulation.
+    '''
+    
+    # compute distance
+    latFrom          = radians(latFrom)
+    lonFrom          = radians(lonFrom)
+    latsTo           = numpy.radians(latsTo)
+    lonsTo           = numpy.radians(lonsTo)
+    a                = numpy.sin((latsTo-latFrom)/2)**2 + cos(latFrom) * numpy.cos(latsTo) * numpy.sin((lonsTo-lonFrom)/2)**2
+    d_km             = EARTH_RADIUS_km * 2 * numpy.arcsin(numpy.sqrt(a))
+    
+    # compute reception power (first Friis, then apply Pister-hack)
+    with numpy.errstate(divide='ignore'):
+        Prx          = TX_POWER_dBm - (20*numpy.log10(d_km) + 20*log10(FREQUENCY_GHz) + 92.45)
+    Prx             -= PISTER_HACK_LOSS*numpy.random.random_sample(len(Prx))
+    
+    #turn into PDR
+    return numpy.clip((Prx-SENSITIVITY_dBm)/GREY_AREA_dB,0.0,1.0)
+
+class PdrMatrix(object):
+    '''
+    Symmetric PDR matrix between motes, backed by a numpy array.
+    
+    Each mote is given a row/column the first time it appears in a
+    connection; the array doubles in size when it runs out of rows. A PDR of
+    0 means there is no connection.
+    
+    .. note:: :meth:`drawReceivers` draws from ``numpy.random``, not
+        ``random``; seed both for a reproducible simulation.
+    '''
+    
+    INITIAL_SIZE              = 16
+    
+    def __init__(self):
+        
+        # local variables
+        self.moteIds              = []  # row -> mote id
+        self.rows                 = {}  # mote id -> row
+        self.pdr                  = numpy.zeros((self.INITIAL_SIZE,self.INITIAL_SIZE))
+    
+    #======================== public ==========================================
+    
+    def set(self,fromMote,toMote,pdr):
+        i = self._getRow(fromMote)
+        j = self._getRow(toMote)
+        self.pdr[i,j]             = pdr
+        self.pdr[j,i]             = pdr
+    
+    def setMany(self,fromMote,toMotes,pdrs):
+        '''
+        Sets the PDR from one mote to many.
+        
+        :param toMotes: [in] list of mote ids.
+        :param pdrs:    [in] list or numpy array of PDRs, one per mote id.
+        '''
+        i = self._getRow(fromMote)
+        j = [self._getRow(m) for m in toMotes]
+        self.pdr[i,j]             = pdrs
+        self.pdr[j,i]             = pdrs
+    
+    def delete(self,fromMote,toMote):
+        i = self.rows.get(fromMote)
+        j = self.rows.get(toMote)
+        if i is None or j is None:
+            return # did not exist
+        self.pdr[i,j]             = 0.0
+        self.pdr[j,i]             = 0.0
+    
+    def links(self):
+        '''
+        Returns each connection once, as a ``(fromMote,toMote,pdr)`` tuple,
+        with ``fromMote<toMote`` whatever the order the motes were added in.
+        '''
+        n    = len(self.moteIds)
+        pdr  = self.pdr[:n,:n]
+        (I,J) = numpy.nonzero(numpy.triu(pdr))
+        return [
+            (min(self.moteIds[i],self.moteIds[j]),max(self.moteIds[i],self.moteIds[j]),float(pdr[i,j]))
+            for (i,j) in zip(I,J)
+        ]
+    
+    def drawReceivers(self,fromMote):
+        '''
+        Picks the motes which receive a frame sent by a mote.
+        
+        One random number is drawn per mote in a single vectorized call; a
+        mote receives the frame when its number is below the PDR of its link.
+        '''
+        i = self.rows.get(fromMote)
+        if i is None:
+            return []
+        n    = len(self.moteIds)
+        rx   = numpy.flatnonzero(numpy.random.random_sample(n)<self.pdr[i,:n])
+        return [self.moteIds[j] for j in rx]
+    
+    #======================== private =========================================
+    
+    def _getRow(self,moteId):
+        row = self.rows.get(moteId)
+        if row is None:
+            row = len(self.moteIds)
+            if row==len(self.pdr):
+                size = 2*len(self.pdr)
+                pdr  = numpy.zeros((size,size))
+                pdr[:row,:row] = self.pdr
+                self.pdr = pdr
+            self.moteIds         += [moteId]
+            self.rows[moteId]     = row
+        return row
+
+class PdrDict(object):
+    '''
+    Same interface as :class:`PdrMatrix`, for when numpy is not installed.
+    
+    Only existing connections are stored, as nested dictionaries.
+    '''
+    
+    def __init__(self):
+        
+        # local variables
+        self.connections          = {}
+    
+    #======================== public ==========================================
+    
+    def set(self,fromMote,toMote,pdr):
+        if not pdr:
+            self.delete(fromMote,toMote)
+            return
+        self.connections.setdefault(fromMote,{})[toMote] = pdr
+        self.connections.setdefault(toMote,{})[fromMote] = pdr
+    
+    def setMany(self,fromMote,toMotes,pdrs):
+        for (toMote,pdr) in zip(toMotes,pdrs):
+            self.set(fromMote,toMote,pdr)
+    
+    def delete(self,fromMote,toMote):
+        try:
+            del self.connections[fromMote][toMote]
+            if not self.connections[fromMote]:
+                del self.connections[fromMote]
+            
+            del self.connections[toMote][fromMote]
+            if not self.connections[toMote]:
+                del self.connections[toMote]
+        except KeyError:
+            pass # did not exist
+    
+    def links(self):
+        returnVal = []
+        for (fromMote,neighbors) in self.connections.items():
+            for (toMote,pdr) in neighbors.items():
+                if fromMote<toMote:
+                    returnVal += [(fromMote,toMote,pdr)]
+        return returnVal
+    
+    def drawReceivers(self,fromMote):
+        return [
+            toMote for (toMote,pdr) in self.connections.get(fromMote,{}).items()
+            if random.random()<=pdr
+        ]
+
 class Propagation(eventBusClient.eventBusClient):
     '''
     The propagation model of the engine.
@@ -31,8 +248,11 @@ class Propagation(eventBusClient.eventBusClient):
         
         # local variables
         self.dataLock             = threading.Lock()
-        self.connections          = {}
-        self.pendingTxEnd         = []
+        if numpy:
+            self.connections      = PdrMatrix()
+        else:
+            self.connections      = PdrDict()
+        self.pendingTxEnd         = {}
         
         # logging
         self.log                  = logging.getLogger('Propagation')
@@ -60,13 +280,21 @@ class Propagation(eventBusClient.eventBusClient):
     #======================== public ==========================================
     
     def createConnection(self,fromMote,toMote):
+        self.createConnections(fromMote,[toMote])
   
+    def createConnections(self,fromMote,toMotes):
+        '''
+        Creates, updates or deletes the connections from one mote to many.
+        
+        With numpy installed, the PDRs of all the connections are computed
+        in a single vectorized call.
         
-        FREQUENCY_GHz        =    2.4
-        TX_POWER_dBm         =    0.0
-        PISTER_HACK_LOSS     =   40.0
-        SENSITIVITY_dBm      = -101.0
-        GREY_AREA_dB         =   15.0
+        :param fromMote: [in] id of the mote.
+        :param toMotes:  [in] list of ids of the other motes.
+        '''
+        
+        if not toMotes:
+            return
         
         with self.dataLock:
             
@@ -75,100 +303,57 @@ class Propagation(eventBusClient.eventBusClient):
                 #===== Pister-hack model
                 
                 # retrieve position
-                mhFrom            = self.engine.getMoteHandlerById(fromMote)
-                (latFrom,lonFrom) = mhFrom.getLocation()
-                mhTo              = self.engine.getMoteHandlerById(toMote)
-                (latTo,lonTo)     = mhTo.getLocation()
-    
-                # compute distance
-                lonFrom, latFrom, lonTo, latTo = map(radians, [lonFrom, latFrom, lonTo, latTo])
-                dlon             = lonTo - lonFrom 
-                dlat             = latTo - latFrom 
-                a                = sin(dlat/2)**2 + cos(latFrom) * cos(latTo) * sin(dlon/2)**2
-                c                = 2 * asin(sqrt(a)) 
-                d_km                = 6367 * c
-                
-                # compute reception power (first Friis, then apply Pister-hack)
-                Prx              = TX_POWER_dBm - (20*log10(d_km) + 20*log10(FREQUENCY_GHz) + 92.45)
-                Prx             -= PISTER_HACK_LOSS*random.random()
-               
-                #turn into PDR
-                if   Prx<SENSITIVITY_dBm:
-                    pdr          = 0.0
-                elif Prx>SENSITIVITY_dBm+GREY_AREA_dB:
-                    pdr          = 1.0
+                (latFrom,lonFrom) = self.engine.getMoteHandlerById(fromMote).getLocation()
+                locations         = [self.engine.getMoteHandlerById(m).getLocation() for m in toMotes]
+    
+                if numpy:
+                    locations     = numpy.array(locations,dtype=float)
+                    pdrs          = pisterHackPdrs(latFrom,lonFrom,locations[:,0],locations[:,1])
                 else:
-                    pdr          = (Prx-SENSITIVITY_dBm)/GREY_AREA_dB
+                    pdrs          = [
+                        pisterHackPdr(latFrom,lonFrom,latTo,lonTo)
+                        for (latTo,lonTo) in locations
+                    ]
 
             elif self.simTopology=='linear':
                 
                 # linear network
-                if fromMote==toMote+1:
-                    pdr          = 1.0
-                else:
-                    pdr          = 0.0
+                pdrs              = [1.0 if fromMote==toMote+1 else 0.0 for toMote in toMotes]
             
             elif self.simTopology=='fully-meshed':
                 
-                pdr          = 1.0
+                pdrs              = [1.0]*len(toMotes)
             
             else:
                 
                 raise NotImplementedError('unsupported simTopology={0}'.format(self.simTopology))
             
-            #==== create, update or delete connection
+            #==== create, update or delete connections
             
-            if pdr:
-                if fromMote not in self.connections:
-                    self.connections[fromMote] = {}
-                self.connections[fromMote][toMote] = pdr
-                
-                if toMote not in self.connections:
-                    self.connections[toMote] = {}
-                self.connections[toMote][fromMote] = pdr
-            else:
-                self.deleteConnection(toMote,fromMote)
+            self.connections.setMany(fromMote,toMotes,pdrs)
     
     def retrieveConnections(self):
         
-        retrievedConnections = []
-        returnVal            = []
         with self.dataLock:
+            links = self.connections.links()
             
-            for fromMote in self.connections:
-                for toMote in self.connections[fromMote]:
-                    if (toMote,fromMote) not in retrievedConnections:
-                        returnVal += [
-                            {
-                                'fromMote': fromMote,
-                                'toMote':   toMote,
-                                'pdr':      self.connections[fromMote][toMote],
-                            }
-                        ]
-                        retrievedConnections += [(fromMote,toMote)]
-        
-        return returnVal
+        return [
+            {
+                'fromMote': fromMote,
+                'toMote':   toMote,
+                'pdr':      pdr,
+            } for (fromMote,toMote,pdr) in links
+        ]
     
     def updateConnection(self,fromMote,toMote,pdr):
         
         with self.dataLock:
-            self.connections[fromMote][toMote] = pdr
-            self.connections[toMote][fromMote] = pdr
+            self.connections.set(fromMote,toMote,pdr)
     
     def deleteConnection(self,fromMote,toMote):
         
         with self.dataLock:
-            
-            try:
-                del self.connections[fromMote][toMote]
-                if not self.connections[fromMote]:
-                    del self.connections[fromMote]
-                
-                del self.connections[toMote][fromMote]
-                if not self.connections[toMote]:
-                    del self.connections[toMote]
-            except KeyError:
-                pass # did not exist
+            self.connections.delete(fromMote,toMote)
     
     #======================== indication from eventBus ========================
     
@@ -176,30 +361,23 @@ class Propagation(eventBusClient.eventBusClient):
         
         (fromMote,packet,channel) = data
         
-        if fromMote in self.connections:
-            for (toMote,pdr) in self.connections[fromMote].items():
-                if random.random()<=pdr:
+        receivers = self.connections.drawReceivers(fromMote)
+        for toMote in receivers:
                     
-                    # indicate start of transmission
-                    mh = self.engine.getMoteHandlerById(toMote)
-                    mh.bspRadio.indicateTxStart(fromMote,packet,channel)
+            # indicate start of transmission
+            mh = self.engine.getMoteHandlerById(toMote)
+            mh.bspRadio.indicateTxStart(fromMote,packet,channel)
                     
-                    # remember to signal end of transmission
-                    self.pendingTxEnd += [(fromMote,toMote)]
+        # remember to signal end of transmission
+        self.pendingTxEnd[fromMote] = receivers
     
     def _indicateTxEnd(self,sender,signal,data):
         
         fromMote = data
         
-        if fromMote in self.connections:
-            for (toMote,pdr) in self.connections[fromMote].items():
-                try:
-                    self.pendingTxEnd.remove((fromMote,toMote))
-                except ValueError:
-                    pass
-                else:
-                    mh = self.engine.getMoteHandlerById(toMote)
-                    mh.bspRadio.indicateTxEnd(fromMote)
+        for toMote in self.pendingTxEnd.pop(fromMote,[]):
+            mh = self.engine.getMoteHandlerById(toMote)
+            mh.bspRadio.indicateTxEnd(fromMote)
     
     #======================== private =========================================
     
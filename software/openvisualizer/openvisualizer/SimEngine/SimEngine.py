@@ -64,6 +64,7 @@ class SimEngine(object):
         
         # local variables
         self.moteHandlers         = []
+        self.moteHandlersById     = {}
         self.timeline             = TimeLine.TimeLine()
         self.propagation          = Propagation.Propagation(simTopology)
         self.idmanager            = IdManager.IdManager()
@@ -158,13 +159,13 @@ class SimEngine(object):
         
         # add this mote to my list of motes
         self.moteHandlers.append(newMoteHandler)
+        self.moteHandlersById[newMoteHandler.getId()] = newMoteHandler
         
         # create connections to already existing motes
-        for mh in self.moteHandlers[:-1]:
-            self.propagation.createConnection(
-                fromMote     = newMoteHandler.getId(),
-                toMote       = mh.getId(),
-            )
+        self.propagation.createConnections(
+            fromMote         = newMoteHandler.getId(),
+            toMotes          = [mh.getId() for mh in self.moteHandlers[:-1]],
+        )
     
     #=== called from timeline
     
@@ -180,11 +181,7 @@ class SimEngine(object):
         return self.moteHandlers[rank]
     
     def getMoteHandlerById(self,moteId):
-        returnVal = None
-        for h in self.moteHandlers:
-            if h.getId()==moteId:
-                returnVal = h
-                break
+        returnVal = self.moteHandlersById.get(moteId)
         assert returnVal
         return returnVal
     
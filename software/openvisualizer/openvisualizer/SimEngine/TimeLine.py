@@ -7,6 +7,8 @@
 
 import logging
 import threading
+import heapq
+import itertools
 
 import SimEngine
 
@@ -28,6 +30,7 @@ class TimeLineEvent(object):
         self.moteId     = moteId
         self.desc       = desc
         self.cb         = cb
+        self.cancelled  = False
     
     def __str__(self):
         return '{0} {1}: {2}'.format(self.atTime,self.moteId,self.desc)
@@ -35,8 +38,18 @@ class TimeLineEvent(object):
 class TimeLine(threading.Thread):
     '''
     The timeline of the engine.
+    
+    Upcoming events are kept in a binary heap of ``(atTime,-seq,event)``
+    entries; an event scheduled at the same time as already pending events
+    runs before them. A ``(moteId,desc)``
+    index gives direct access to the pending event of each description;
+    rescheduled and canceled events are only flagged and discarded when
+    they reach the head of the heap.
     '''
     
+    # compact the heap when more than this fraction of it is canceled entries
+    MAX_CANCELED_RATIO        = 0.5
+    
     def __init__(self):
         
         # store params
@@ -44,7 +57,11 @@ class TimeLine(threading.Thread):
         
         # local variables
         self.currentTime          = 0   # current time
-        self.timeline             = []  # list of upcoming events
+        self.timeline             = []  # heap of upcoming events
+        self.pendingEvents        = {}  # (moteId,desc) -> pending event
+        self.numCanceled          = 0   # canceled entries still in the heap
+        self.eventSeq             = itertools.count()
+        self.dataLock             = threading.RLock()
         self.firstEventPassed     = False
         self.firstEvent           = threading.Lock()
         self.firstEvent.acquire()
@@ -87,17 +104,17 @@ class TimeLine(threading.Thread):
         
         while True:
             
+            # pop the event at the head of the timeline
+            event = self._popEvent()
+            
             # detect the end of the simulation
-            if len(self.timeline)==0:
+            if event is None:
                 output  = ''
                 output += 'end of simulation reached\n'
                 output += ' - currentTime='+str(self.getCurrentTime())+'\n'
                 self.log.warning(output)
                 raise StopIteration(output)
             
-            # pop the event at the head of the timeline
-            event = self.timeline.pop(0)
-            
             # make sure that this event is later in time than the previous
             assert(self.currentTime<=event.atTime)
             
@@ -151,23 +168,14 @@ class TimeLine(threading.Thread):
         # create a new event
         newEvent = TimeLineEvent(moteId,atTime,cb,desc)
         
-        # remove any event already in the queue with same description
-        for i in range(len(self.timeline)):
-            if (self.timeline[i].moteId==moteId and
-                self.timeline[i].desc==desc):
-                self.timeline.pop(i)
-                break
-        
-        # look for where to put this event
-        i = 0
-        while i<len(self.timeline):
-            if newEvent.atTime>self.timeline[i].atTime:
-               i += 1
-            else:
-               break
-        
-        # insert the new event
-        self.timeline.insert(i,newEvent)
+        with self.dataLock:
+            
+            # remove any event already in the queue with same description
+            self._cancel((moteId,desc))
+            
+            # insert the new event
+            self.pendingEvents[(moteId,desc)] = newEvent
+            heapq.heappush(self.timeline,(atTime,-self.eventSeq.next(),newEvent))
         
         # start the timeline, if applicable
         with self.firstEventLock:
@@ -188,26 +196,17 @@ class TimeLine(threading.Thread):
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('cancelEvent {0}@{1}'.format(desc,moteId))
         
-        # initialize return variable
-        numEventsCanceled = 0
-        
         # remove any event already the queue with same description
-        i = 0
-        while i<len(self.timeline):
-            if (
-                  self.timeline[i].moteId==moteId and
-                  self.timeline[i].desc==desc
-               ):
-                self.timeline.pop(i)
-                numEventsCanceled += 1
-            else:
-                i += 1
+        with self.dataLock:
+            numEventsCanceled = self._cancel((moteId,desc))
         
         # return the number of events canceled
         return numEventsCanceled
         
     def getEvents(self):
-        return [[ev.atTime,ev.moteId,ev.desc] for ev in self.timeline]
+        with self.dataLock:
+            entries = sorted(self.timeline)
+        return [[ev.atTime,ev.moteId,ev.desc] for (_,_,ev) in entries if not ev.cancelled]
     
     def getStats(self):
         return self.stats
@@ -216,9 +215,45 @@ class TimeLine(threading.Thread):
     
     def _printTimeline(self):
         output  = ''
-        for event in self.timeline:
-            output += '\n'+str(event)
+        for (atTime,moteId,desc) in self.getEvents():
+            output += '\n{0} {1}: {2}'.format(atTime,moteId,desc)
         return output
     
+    def _popEvent(self):
+        '''
+        Pops the earliest pending event, skipping canceled entries.
+        
+        :returns: The event, or None if the timeline is empty.
+        '''
+        with self.dataLock:
+            while self.timeline:
+                (_,_,event) = heapq.heappop(self.timeline)
+                if event.cancelled:
+                    self.numCanceled -= 1
+                    continue
+                del self.pendingEvents[(event.moteId,event.desc)]
+                return event
+            return None
+    
+    def _cancel(self,key):
+        '''
+        Flags the pending event with this key as canceled.
+        
+        :returns: The number of events canceled (0 or 1).
+        '''
+        event = self.pendingEvents.pop(key,None)
+        if event is None:
+            return 0
+        event.cancelled   = True
+        self.numCanceled += 1
+        
+        # drop canceled entries once they make up most of the heap
+        if self.numCanceled>len(self.timeline)*self.MAX_CANCELED_RATIO:
+            self.timeline    = [e for e in self.timeline if not e[2].cancelled]
+            heapq.heapify(self.timeline)
+            self.numCanceled = 0
+        
+        return 1
+    
     #======================== helpers =========================================
     
\ No newline at end of file
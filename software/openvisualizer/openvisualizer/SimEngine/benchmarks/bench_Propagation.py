@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+'''
+Benchmark of the propagation model.
+
+Builds a Pister-hack topology the way the engine does when motes are
+created, then draws the receivers of frames sent by random motes. Uses the
+numpy backend when numpy is installed.
+
+Usage: python bench_Propagation.py [numMotes] [numTx]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # SimEngine/
+
+import time
+import random
+
+import SimEngine
+import Propagation
+
+#============================ defines =========================================
+
+NUM_MOTES  = 500
+NUM_TX     = 10000
+
+#============================ helpers =========================================
+
+class benchMote(object):
+    '''
+    The part of a MoteHandler the propagation model uses, without an
+    emulated mote.
+    '''
+    def __init__(self,engine):
+        self.id       = engine.idmanager.getId()
+        self.location = engine.locationmanager.getLocation()
+    
+    def getId(self):
+        return self.id
+    
+    def getLocation(self):
+        return self.location
+
+def bench(numMotes,numTx):
+    
+    engine    = SimEngine.SimEngine()
+    motes     = [benchMote(engine) for _ in range(numMotes)]
+    
+    start     = time.time()
+    for mh in motes:
+        engine.indicateNewMote(mh)
+    tCreate   = time.time()-start
+    numLinks  = len(engine.propagation.retrieveConnections())
+    
+    rand      = random.Random(0)
+    ids       = [rand.choice(motes).getId() for _ in range(numTx)]
+    pdrs      = engine.propagation.connections
+    numRx     = 0
+    start     = time.time()
+    for moteId in ids:
+        numRx += len(pdrs.drawReceivers(moteId))
+    tDraw     = time.time()-start
+    
+    output    = []
+    output   += ['{0} motes, {1} links, {2} backend'.format(numMotes,numLinks,pdrs.__class__.__name__)]
+    output   += ['- create topology: {0:.3f}s'.format(tCreate)]
+    output   += ['- draw receivers:  {0:.3f}s ({1:.2f}us/frame, {2:.1f} receivers/frame)'.format(tDraw,1e6*tDraw/numTx,float(numRx)/numTx)]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numMotes  = int(sys.argv[1]) if len(sys.argv)>1 else NUM_MOTES
+    numTx     = int(sys.argv[2]) if len(sys.argv)>2 else NUM_TX
+    bench(numMotes,numTx)
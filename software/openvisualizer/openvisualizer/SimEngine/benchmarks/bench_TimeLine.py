@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+'''
+Benchmark of the SimEngine timeline.
+
+Schedules and cancels events the way emulated motes do: each mote keeps a
+handful of pending timer/uart events which are continuously rescheduled
+or canceled, so most calls hit a description already in the timeline.
+
+Usage: python bench_TimeLine.py [numEvents] [numMotes] [numDescs]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # SimEngine/
+
+import time
+import random
+
+import SimEngine
+
+#============================ defines =========================================
+
+NUM_EVENTS = 1000000
+NUM_MOTES  = 100
+NUM_DESCS  = 30
+
+#============================ helpers =========================================
+
+def _cb():
+    pass
+
+def bench(numEvents,numMotes,numDescs):
+    
+    # the engine sets the timeline's log level, as in a real simulation
+    timeline  = SimEngine.SimEngine().timeline
+    rand      = random.Random(0)
+    descs     = ['event{0}'.format(i) for i in range(numDescs)]
+    
+    # pre-compute the keys so the benchmark measures the timeline only
+    keys      = [(rand.randint(1,numMotes),descs[rand.randint(0,numDescs-1)]) for _ in range(numEvents)]
+    times     = [i*0.000001+rand.random() for i in range(numEvents)]
+    
+    # schedule (most calls replace a pending event with the same description)
+    start     = time.time()
+    for i in xrange(numEvents):
+        timeline.scheduleEvent(times[i],keys[i][0],_cb,keys[i][1])
+    tSchedule = time.time()-start
+    numPending = len(timeline.getEvents())
+    
+    # cancel, rescheduling every other canceled event to keep the timeline full
+    start     = time.time()
+    numCanceled = 0
+    for i in xrange(numEvents):
+        numCanceled += timeline.cancelEvent(keys[-i][0],keys[-i][1])
+        if i%2:
+            timeline.scheduleEvent(times[i],keys[i][0],_cb,keys[i][1])
+    tCancel   = time.time()-start
+    
+    # drain
+    start     = time.time()
+    numPopped = 0
+    while timeline._popEvent():
+        numPopped += 1
+    tDrain    = time.time()-start
+    
+    output    = []
+    output   += ['{0} events, {1} motes, {2} pending events'.format(numEvents,numMotes,numPending)]
+    output   += ['- scheduleEvent:          {0:.3f}s ({1:.2f}us/event)'.format(tSchedule,1e6*tSchedule/numEvents)]
+    output   += ['- cancelEvent+reschedule: {0:.3f}s ({1:.2f}us/event, {2} canceled)'.format(tCancel,1e6*tCancel/numEvents,numCanceled)]
+    output   += ['- drain:                  {0:.3f}s ({1} events)'.format(tDrain,numPopped)]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numEvents = int(sys.argv[1]) if len(sys.argv)>1 else NUM_EVENTS
+    numMotes  = int(sys.argv[2]) if len(sys.argv)>2 else NUM_MOTES
+    numDescs  = int(sys.argv[3]) if len(sys.argv)>3 else NUM_DESCS
+    bench(numEvents,numMotes,numDescs)
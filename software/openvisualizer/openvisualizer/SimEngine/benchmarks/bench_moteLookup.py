@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+'''
+Benchmark of the lookup of emulated motes by id.
+
+Looks motes up the way Propagation does when a mote transmits: the
+transmitter, then every other mote as a potential receiver. Compares
+SimEngine.getMoteHandlerById to a linear scan of the motes.
+
+Usage: python bench_moteLookup.py [numMotes] [numTx]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # SimEngine/
+
+import time
+import random
+
+import SimEngine
+
+#============================ defines =========================================
+
+NUM_MOTES  = 200
+NUM_TX     = 200
+
+#============================ helpers =========================================
+
+class benchMote(object):
+    '''
+    The part of a MoteHandler the engine indexes, without an emulated mote.
+    '''
+    def __init__(self,engine):
+        self.id = engine.idmanager.getId()
+    
+    def getId(self):
+        return self.id
+
+def linearLookup(engine,moteId):
+    # lookup before motes were indexed by id
+    for h in engine.moteHandlers:
+        if h.getId()==moteId:
+            return h
+
+def bench(numMotes,numTx):
+    
+    # linear topology: connections do not need the location of motes
+    engine    = SimEngine.SimEngine(simTopology='linear')
+    for _ in range(numMotes):
+        engine.indicateNewMote(benchMote(engine))
+    
+    rand      = random.Random(0)
+    ids       = [mh.getId() for mh in engine.moteHandlers]
+    txIds     = [rand.choice(ids) for _ in range(numTx)]
+    numLookup = numTx*numMotes
+    
+    start     = time.time()
+    for txId in txIds:
+        engine.getMoteHandlerById(txId)
+        for rxId in ids:
+            if rxId!=txId:
+                engine.getMoteHandlerById(rxId)
+    tIndex    = time.time()-start
+    
+    start     = time.time()
+    for txId in txIds:
+        linearLookup(engine,txId)
+        for rxId in ids:
+            if rxId!=txId:
+                linearLookup(engine,rxId)
+    tLinear   = time.time()-start
+    
+    output    = []
+    output   += ['{0} motes, {1} transmissions, {2} lookups'.format(numMotes,numTx,numLookup)]
+    output   += ['- getMoteHandlerById: {0:.3f}s ({1:.2f}us/lookup)'.format(tIndex,1e6*tIndex/numLookup)]
+    output   += ['- linear scan:        {0:.3f}s ({1:.2f}us/lookup)'.format(tLinear,1e6*tLinear/numLookup)]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numMotes  = int(sys.argv[1]) if len(sys.argv)>1 else NUM_MOTES
+    numTx     = int(sys.argv[2]) if len(sys.argv)>2 else NUM_TX
+    bench(numMotes,numTx)
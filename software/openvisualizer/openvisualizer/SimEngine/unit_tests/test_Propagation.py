@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # SimEngine/
+
+import logging
+import logging.handlers
+
+import pytest
+
+import SimEngine
+import Propagation
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_Propagation.log'
+
+import logging
+log = logging.getLogger('test_Propagation')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_Propagation',
+                   'Propagation',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+BACKENDS = [Propagation.PdrDict]
+if Propagation.numpy:
+    BACKENDS += [Propagation.PdrMatrix]
+
+#============================ helpers =========================================
+
+class radio(object):
+    def __init__(self):
+        self.received = []
+    
+    def indicateTxStart(self,moteId,packet,channel):
+        self.received += [('start',moteId,packet)]
+    
+    def indicateTxEnd(self,moteId):
+        self.received += [('end',moteId)]
+
+class mote(object):
+    '''
+    The part of a MoteHandler the propagation model uses.
+    '''
+    def __init__(self,engine):
+        self.id       = engine.idmanager.getId()
+        self.bspRadio = radio()
+    
+    def getId(self):
+        return self.id
+
+#============================ tests ===========================================
+
+@pytest.fixture(params=BACKENDS)
+def pdrs(request):
+    return request.param()
+
+def test_pdrSymmetric(pdrs):
+    pdrs.setMany(1,[2,3,4],[0.5,0.0,1.0])
+    pdrs.set(3,2,0.25)
+    
+    assert sorted(pdrs.links())==[(1,2,0.5),(1,4,1.0),(2,3,0.25)]
+    
+    pdrs.delete(2,1)
+    pdrs.delete(1,5)
+    pdrs.set(4,1,0.0)
+    
+    assert pdrs.links()==[(2,3,0.25)]
+
+    # a link is listed from the lowest mote id, whatever the order the
+    # motes were added in
+    pdrs.set(6,5,0.5)
+    
+    assert sorted(pdrs.links())==[(2,3,0.25),(5,6,0.5)]
+
+def test_pdrDrawReceivers(pdrs):
+    pdrs.setMany(1,[2,3,4],[1.0,0.0,1.0])
+    
+    assert sorted(pdrs.drawReceivers(1))==[2,4]
+    assert pdrs.drawReceivers(3)==[]
+    assert pdrs.drawReceivers(5)==[]
+
+def test_pisterHackPdr():
+    # motes a meter apart always hear each other, 10km apart never, whatever
+    # the random loss
+    assert Propagation.pisterHackPdr(37.875,-122.257,37.87501,-122.257)==1.0
+    assert Propagation.pisterHackPdr(37.875,-122.257,37.965,-122.257)==0.0
+    if Propagation.numpy:
+        pdrs = Propagation.pisterHackPdrs(
+            37.875,-122.257,
+            Propagation.numpy.array([37.87501,37.965]),
+            Propagation.numpy.array([-122.257,-122.257]),
+        )
+        assert list(pdrs)==[1.0,0.0]
+
+def test_linearTopology():
+    engine    = SimEngine.SimEngine(simTopology='linear')
+    motes     = [mote(engine) for _ in range(4)]
+    for m in motes:
+        engine.indicateNewMote(m)
+    ids       = [m.getId() for m in motes]
+    
+    connections = engine.propagation.retrieveConnections()
+    assert sorted((c['fromMote'],c['toMote']) for c in connections)==[
+        (min(ids[i],ids[i+1]),max(ids[i],ids[i+1])) for i in range(3)
+    ]
+    
+    # the end of a transmission is indicated to the motes which heard its start
+    engine.propagation._indicateTxStart(None,None,(ids[1],'p',11))
+    engine.propagation.deleteConnection(ids[1],ids[2])
+    engine.propagation._indicateTxEnd(None,None,ids[1])
+    
+    assert motes[0].bspRadio.received==[('start',ids[1],'p'),('end',ids[1])]
+    assert motes[2].bspRadio.received==[('start',ids[1],'p'),('end',ids[1])]
+    assert motes[3].bspRadio.received==[]
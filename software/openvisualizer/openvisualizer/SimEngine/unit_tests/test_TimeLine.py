@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # SimEngine/
+
+import logging
+import logging.handlers
+import random
+
+import pytest
+
+import TimeLine
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_TimeLine.log'
+
+import logging
+log = logging.getLogger('test_TimeLine')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_TimeLine',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ helpers =========================================
+
+def _cb():
+    pass
+
+class listTimeLine(object):
+    '''
+    The timeline as a sorted list, as it was before the heap: the reference
+    the heap must behave like.
+    '''
+    def __init__(self):
+        self.timeline = []
+    
+    def scheduleEvent(self,atTime,moteId,cb,desc):
+        self.cancelEvent(moteId,desc)
+        i = 0
+        while i<len(self.timeline) and atTime>self.timeline[i][0]:
+            i += 1
+        self.timeline.insert(i,[atTime,moteId,desc])
+    
+    def cancelEvent(self,moteId,desc):
+        numEventsCanceled = len(self.timeline)
+        self.timeline     = [e for e in self.timeline if e[1:]!=[moteId,desc]]
+        return numEventsCanceled-len(self.timeline)
+    
+    def getEvents(self):
+        return [list(e) for e in self.timeline]
+    
+    def popEvent(self):
+        return self.timeline.pop(0)
+
+@pytest.fixture
+def timeline():
+    return TimeLine.TimeLine()
+
+def popAll(timeline):
+    returnVal = []
+    while True:
+        event = timeline._popEvent()
+        if event is None:
+            return returnVal
+        returnVal += [[event.atTime,event.moteId,event.desc]]
+
+#============================ tests ===========================================
+
+def test_sameTimeNewestFirst(timeline):
+    timeline.scheduleEvent(2,1,_cb,'a')
+    timeline.scheduleEvent(1,1,_cb,'b')
+    timeline.scheduleEvent(2,2,_cb,'c')
+    timeline.scheduleEvent(2,3,_cb,'d')
+    
+    assert timeline.getEvents()==[[1,1,'b'],[2,3,'d'],[2,2,'c'],[2,1,'a']]
+    assert popAll(timeline)==[[1,1,'b'],[2,3,'d'],[2,2,'c'],[2,1,'a']]
+
+def test_replace(timeline):
+    timeline.scheduleEvent(1,1,_cb,'a')
+    timeline.scheduleEvent(2,1,_cb,'b')
+    timeline.scheduleEvent(2,2,_cb,'a')
+    
+    # an event with the same (moteId,desc) replaces the pending one
+    timeline.scheduleEvent(3,1,_cb,'a')
+    assert timeline.getEvents()==[[2,2,'a'],[2,1,'b'],[3,1,'a']]
+    
+    # rescheduled at the time of other events, it runs before them
+    timeline.scheduleEvent(2,1,_cb,'a')
+    assert timeline.getEvents()==[[2,1,'a'],[2,2,'a'],[2,1,'b']]
+    assert popAll(timeline)==[[2,1,'a'],[2,2,'a'],[2,1,'b']]
+
+def test_cancelAndReschedule(timeline):
+    timeline.scheduleEvent(1,1,_cb,'a')
+    timeline.scheduleEvent(2,1,_cb,'b')
+    
+    assert timeline.cancelEvent(1,'a')==1
+    assert timeline.cancelEvent(1,'a')==0
+    assert timeline.cancelEvent(5,'b')==0
+    assert timeline.getEvents()==[[2,1,'b']]
+    
+    # an event can be scheduled again after it was canceled
+    timeline.scheduleEvent(3,1,_cb,'a')
+    assert timeline.getEvents()==[[2,1,'b'],[3,1,'a']]
+    assert popAll(timeline)==[[2,1,'b'],[3,1,'a']]
+    assert timeline.cancelEvent(1,'a')==0
+
+def test_compaction(timeline):
+    for i in range(10):
+        timeline.scheduleEvent(i,1,_cb,str(i))
+    
+    # canceling most of the events compacts the heap
+    for i in range(0,10,2)+[1,3]:
+        timeline.cancelEvent(1,str(i))
+    assert len(timeline.timeline)<10
+    assert timeline.numCanceled==len([e for e in timeline.timeline if e[2].cancelled])
+    assert timeline.getEvents()==[[5,1,'5'],[7,1,'7'],[9,1,'9']]
+    
+    # the order survives compaction, new events included
+    timeline.scheduleEvent(7,2,_cb,'x')
+    assert popAll(timeline)==[[5,1,'5'],[7,2,'x'],[7,1,'7'],[9,1,'9']]
+    assert timeline.numCanceled==0
+
+def test_sameAsList(timeline):
+    reference = listTimeLine()
+    rand      = random.Random(0)
+    now       = 0
+    for _ in range(5000):
+        moteId = rand.randint(1,5)
+        desc   = 'event{0}'.format(rand.randint(1,5))
+        action = rand.random()
+        if action<0.6:
+            atTime = now+rand.randint(0,10)
+            timeline.scheduleEvent(atTime,moteId,_cb,desc)
+            reference.scheduleEvent(atTime,moteId,_cb,desc)
+        elif action<0.8:
+            assert timeline.cancelEvent(moteId,desc)==reference.cancelEvent(moteId,desc)
+        elif reference.timeline:
+            event = timeline._popEvent()
+            assert [event.atTime,event.moteId,event.desc]==reference.popEvent()
+            now   = event.atTime
+        assert timeline.getEvents()==reference.getEvents()
+    assert popAll(timeline)==reference.getEvents()
+
+def test_stats(timeline):
+    stats = timeline.getStats()
+    assert isinstance(stats,TimeLine.TimeLineStats)
+    assert stats.getNumEvents()==0
+    stats.incrementEvents()
+    assert timeline.getStats().getNumEvents()==1
+    
+    # the log output of the timeline
+    timeline.scheduleEvent(1,2,_cb,'a')
+    assert timeline._printTimeline()=='\n1 2: a'
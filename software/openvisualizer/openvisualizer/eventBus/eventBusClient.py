@@ -9,13 +9,209 @@ log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
 import threading
+import weakref
+import bisect
+import itertools
 import Queue
 
 from pydispatch import dispatcher
 
+WILDCARD = '*'
+
+def _isWildcardSignal(signal):
+    '''
+    Returns True when a signal cannot be looked up by exact key, i.e. it is
+    the wildcard itself or a tuple signal with a wildcard component.
+    '''
+    if signal==WILDCARD:
+        return True
+    if type(signal)==tuple:
+        for s in signal:
+            if s==WILDCARD:
+                return True
+    return False
+
+def _signalsEquivalent(s1,s2):
+    if type(s1)==type(s2)==str:
+        if (s1==s2) or (s1==WILDCARD) or (s2==WILDCARD):
+            return True
+        else:
+            return False
+    elif type(s1)==type(s2)==tuple:
+        assert len(s1)==len(s2)==3
+        for i in range(3):
+            if not ((s1[i]==s2[i]) or (s1[i]==WILDCARD) or (s2[i]==WILDCARD)):
+                return False
+        return True
+    return False
+
+class eventBusRouter(object):
+    '''
+    Central routing index shared by all the :class:`eventBusClient`
+    instances.
+    
+    Only the router is connected to the dispatcher. Registrations are
+    indexed by their exact signal (string, or ``(dst_addr,proto,port)``
+    tuple); registrations with a wildcard signal, or a tuple signal with a
+    wildcard component, are kept in a separate, small bucket. A dispatched
+    signal therefore only touches the callbacks which can match it.
+    
+    The buckets are never modified in place: (un)registering replaces them
+    with a new list, so notifications can walk them without taking a lock.
+    '''
+    
+    def __init__(self):
+        
+        # local variables
+        self.dataLock        = threading.RLock()
+        self.exact           = {}   # signal -> sorted list of entries
+        self.wildcard        = []   # sorted list of entries
+        self.clientSeq       = itertools.count()
+        self.regSeq          = itertools.count()
+        
+        # connect to dispatcher
+        dispatcher.connect(
+            receiver = self._eventBusNotification,
+            weak     = False,
+        )
+    
+    #======================== public ==========================================
+    
+    def newClientId(self):
+        return self.clientSeq.next()
+    
+    def add(self,client,registration):
+        '''
+        Index a registration of a client.
+        
+        The client is only weakly referenced, so a client which is garbage
+        collected stops receiving notifications, as it did when each client
+        connected to the dispatcher on its own. The entries therefore do not
+        hold the registration, which references the callback; the client
+        looks it up by its sequence number.
+        
+        :returns: The sequence number of the registration.
+        '''
+        clientId = client._clientId
+        regSeq   = self.regSeq.next()
+        signal   = registration['signal']
+        entry    = (
+            clientId,
+            regSeq,
+            weakref.ref(client,self._makeCleanup(clientId)),
+            registration['sender'],
+            signal,
+        )
+        
+        with self.dataLock:
+            if _isWildcardSignal(signal):
+                bucket = self.wildcard[:]
+                bisect.insort(bucket,entry)
+                self.wildcard = bucket
+            else:
+                bucket = self.exact.get(signal,[])[:]
+                bisect.insort(bucket,entry)
+                self.exact[signal] = bucket
+    
+        return regSeq
+    
+    def remove(self,signal,regSeq):
+        
+        with self.dataLock:
+            if _isWildcardSignal(signal):
+                self.wildcard = [e for e in self.wildcard if e[1]!=regSeq]
+            else:
+                bucket = [e for e in self.exact.get(signal,[]) if e[1]!=regSeq]
+                if bucket:
+                    self.exact[signal] = bucket
+                else:
+                    self.exact.pop(signal,None)
+    
+    def getCandidates(self,signal):
+        '''
+        Returns the entries which can match a signal, in registration order.
+        '''
+        
+        if _isWildcardSignal(signal):
+            # rare: the dispatched signal itself is a wildcard
+            with self.dataLock:
+                candidates = self.wildcard[:]
+                for bucket in self.exact.values():
+                    candidates += bucket
+            candidates.sort()
+            return candidates
+        
+        try:
+            exact = self.exact.get(signal)
+        except TypeError:
+            # unhashable signal
+            return []
+        wildcard  = self.wildcard
+        
+        if not wildcard:
+            return exact or []
+        if not exact:
+            return wildcard
+        return sorted(exact+wildcard)
+    
+    #======================== private =========================================
+    
+    def _eventBusNotification(self,signal,sender,data):
+        
+        responses    = []
+        candidates   = self.getCandidates(signal)
+        if not candidates:
+            return responses
+        
+        # each client only answers with its first matching registration
+        lastClientId = None
+        for (clientId,regSeq,clientRef,regSender,regSignal) in candidates:
+            if clientId==lastClientId:
+                continue
+            if not (regSender==sender or regSender==WILDCARD):
+                continue
+            if not _signalsEquivalent(regSignal,signal):
+                continue
+            client   = clientRef()
+            if client is None:
+                continue
+            reg      = client._registrationsBySeq.get(regSeq)
+            if reg is None:
+                # unregistered meanwhile
+                continue
+            lastClientId = clientId
+            responses += [client._callCallback(reg,sender,signal,data)]
+        
+        return responses
+    
+    def _makeCleanup(self,clientId):
+        def cleanup(ref):
+            with self.dataLock:
+                self.wildcard = [e for e in self.wildcard if e[0]!=clientId]
+                for (signal,bucket) in self.exact.items():
+                    bucket = [e for e in bucket if e[0]!=clientId]
+                    if bucket:
+                        self.exact[signal] = bucket
+                    else:
+                        del self.exact[signal]
+        return cleanup
+
+_router = None
+_routerLock = threading.Lock()
+
+def getRouter():
+    '''
+    Returns the process-wide :class:`eventBusRouter`, creating it on first use.
+    '''
+    global _router
+    with _routerLock:
+        if _router is None:
+            _router = eventBusRouter()
+    return _router
+
 class eventBusClient(object):
     
-    WILDCARD  = '*'
+    WILDCARD  = WILDCARD
     
     PROTO_ICMPv6 = 'icmpv6'
     PROTO_UDP = 'udp'
@@ -39,6 +235,9 @@ class eventBusClient(object):
         # store params
         self.dataLock        = threading.RLock()
         self.registrations   = []
+        self._registrationsBySeq = {}
+        self._router         = getRouter()
+        self._clientId       = self._router.newClientId()
         
         # give this thread a name
         self.name            = name
@@ -54,19 +253,26 @@ class eventBusClient(object):
                 callback     = r['callback'],
             )
         
-        # connect to dispatcher
-        dispatcher.connect(
-            receiver = self._eventBusNotification,
-        )
-    
     #======================== public ==========================================
     
     def dispatch(self,signal,data):
-        return dispatcher.send(
-            sender = self.name,
-            signal = signal,
-            data   = data,
-        )
+        '''
+        Send a signal on the event bus.
+        
+        :returns: A list of ``(receiver,response)`` tuples, one per
+            receiver which was notified.
+        '''
+        responses = []
+        for (receiver,response) in dispatcher.send(
+                sender = self.name,
+                signal = signal,
+                data   = data,
+            ):
+            if receiver==self._router._eventBusNotification:
+                responses += response
+            else:
+                responses += [(receiver,response)]
+        return responses
     
     def register(self,sender,signal,callback):
         
@@ -95,64 +301,49 @@ class eventBusClient(object):
         }
         with self.dataLock:
             self.registrations += [newRegistration]
+            regSeq = self._router.add(self,newRegistration)
+            self._registrationsBySeq[regSeq] = newRegistration
     
     def unregister(self,sender,signal,callback):
         
         with self.dataLock:
-            for reg in self.registrations:
+            for reg in self.registrations[:]:
                 if  (
                         reg['sender']==sender                             and
                         self._signalsEquivalent(reg['signal'], signal)    and
                         reg['callback']==callback
                     ):
                     self.registrations.remove(reg)
+                    for (regSeq,r) in self._registrationsBySeq.items():
+                        if r is reg:
+                            del self._registrationsBySeq[regSeq]
+                            self._router.remove(reg['signal'],regSeq)
     
     #======================== private =========================================
     
-    def _eventBusNotification(self,signal,sender,data):
-        
-        callback = None
-        
-        # find the callback
-        with self.dataLock:
-            for r in self.registrations:
-                if (
-                        self._signalsEquivalent(r['signal'],signal) and
-                        (r['sender']==sender or r['sender']==self.WILDCARD)
-                    ):
-                    callback = r['callback']
-                    break
+    def _callCallback(self,reg,sender,signal,data):
         
-        if not callback:
-            return None
+        callback = reg['callback']
+        reg['numRx'] += 1
         
         # call the callback
         try:
-            return callback(
-                sender = sender,
-                signal = signal,
-                data   = data,
+            return (
+                callback,
+                callback(
+                    sender = sender,
+                    signal = signal,
+                    data   = data,
+                ),
             )
         except TypeError as err:
             output = "ERROR could not call {0}, err={1}".format(callback,err)
             log.critical(output)
             print output
+            return (callback,None)
     
     def _signalsEquivalent(self,s1,s2):
-        if type(s1)==type(s2)==str:
-            if (s1==s2) or (s1==self.WILDCARD) or (s2==self.WILDCARD):
-                return True
-            else:
-                return False
-        elif type(s1)==type(s2)==tuple:
-            assert len(s1)==len(s2)==3
-            for i in range(3):
-                if (s1[i]==s2[i]) or (s1[i]==self.WILDCARD) or (s2[i]==self.WILDCARD):
-                    return True
-                else:
-                    return False
-        return False
-    
+        return _signalsEquivalent(s1,s2)
     
     def _dispatchProtocol(self,signal,data):
         ''' used to sent to the eventBus a signal and look whether someone responds or not'''
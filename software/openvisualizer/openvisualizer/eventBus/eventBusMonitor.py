@@ -170,9 +170,9 @@ class eventBusMonitor(object):
         wrapped around outgoing 6LoWPAN layer packet.
         '''
         
-        phop   = previousHop[:]
+        phop   = list(previousHop)
         phop.reverse()
-        nhop   = nextHop[:]
+        nhop   = list(nextHop)
         nhop.reverse()
         
         # ZEP
@@ -216,7 +216,7 @@ class eventBusMonitor(object):
         zep   += [len(body)+2]      # length
         
         # mac frame
-        mac    = body
+        mac    = list(body)
         mac   += u.calculateFCS(mac)
         
         return zep+mac
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # eventBus/
+
+import logging
+import logging.handlers
+import gc
+
+import pytest
+
+import eventBusClient
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_eventBusClient.log'
+
+import logging
+log = logging.getLogger('test_eventBusClient')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_eventBusClient',
+                   'eventBusClient',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+DAGROOT = tuple([0xbb,0xbb]+[0x00]*13+[0x01])
+MOTE_A  = tuple([0xbb,0xbb]+[0x00]*13+[0xaa])
+
+#============================ helpers =========================================
+
+class recorder(eventBusClient.eventBusClient):
+
+    def __init__(self,name,signals):
+        self.received = []
+        eventBusClient.eventBusClient.__init__(
+            self,
+            name          = name,
+            registrations = [
+                {
+                    'sender'   : self.WILDCARD,
+                    'signal'   : s,
+                    'callback' : self._record,
+                } for s in signals
+            ]
+        )
+
+    def close(self):
+        for reg in self.registrations[:]:
+            self.unregister(
+                sender   = reg['sender'],
+                signal   = reg['signal'],
+                callback = reg['callback'],
+            )
+
+    def _record(self,sender,signal,data):
+        self.received += [(signal,data)]
+        return self.name
+
+#============================ tests ===========================================
+
+def test_exactSignal():
+    a = recorder('test_exactSignal_a',['test_exactSignal_x'])
+    b = recorder('test_exactSignal_b',['test_exactSignal_y'])
+
+    responses = a.dispatch('test_exactSignal_x',1)
+
+    assert a.received==[('test_exactSignal_x',1)]
+    assert b.received==[]
+    assert [r for (_,r) in responses if r]==['test_exactSignal_a']
+
+def test_wildcardSignal():
+    a = recorder('test_wildcardSignal_a',[eventBusClient.eventBusClient.WILDCARD])
+
+    a.dispatch('test_wildcardSignal_x',1)
+    a.dispatch('test_wildcardSignal_y',2)
+
+    a.close()
+
+    assert ('test_wildcardSignal_x',1) in a.received
+    assert ('test_wildcardSignal_y',2) in a.received
+
+def test_tupleSignal():
+    W = eventBusClient.eventBusClient.WILDCARD
+    rpl  = recorder('test_tupleSignal_rpl', [(DAGROOT,'icmpv6',155)])
+    any6 = recorder('test_tupleSignal_any', [(W,'udp',W)])
+
+    # all components must match, not only the destination address
+    rpl.dispatch((DAGROOT,'udp',(0x16,0x33)),'d1')
+    rpl.dispatch((DAGROOT,'icmpv6',155),'d2')
+    rpl.dispatch((MOTE_A,'udp',(0x16,0x33)),'d3')
+    assert not rpl._dispatchProtocol((MOTE_A,'icmpv6',155),'d4')
+
+    any6.close()
+
+    assert [d for (_,d) in rpl.received]==['d2']
+    assert [d for (_,d) in any6.received]==['d1','d3']
+
+def test_firstRegistrationPerClient():
+    W = eventBusClient.eventBusClient.WILDCARD
+    a = recorder('test_firstRegistration_a',[W,'test_firstRegistration_x'])
+
+    responses = a.dispatch('test_firstRegistration_x',1)
+    a.close()
+
+    assert a.received==[('test_firstRegistration_x',1)]
+    assert [r for (_,r) in responses if r]==['test_firstRegistration_a']
+
+def test_unregister():
+    a = recorder('test_unregister_a',['test_unregister_x'])
+
+    a.unregister(
+        sender   = a.WILDCARD,
+        signal   = 'test_unregister_x',
+        callback = a._record,
+    )
+    a.dispatch('test_unregister_x',1)
+
+    assert a.received==[]
+    with pytest.raises(SystemError):
+        a._dispatchAndGetResult('test_unregister_x',1)
+
+def test_garbageCollectedClient():
+    a = recorder('test_garbageCollected_a',['test_garbageCollected_x'])
+    router = a._router
+
+    del a
+    gc.collect()
+
+    assert router.getCandidates('test_garbageCollected_x')==[]
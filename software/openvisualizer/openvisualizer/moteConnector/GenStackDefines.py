@@ -6,9 +6,9 @@
 '''
 Standalone script to generate the StackDefines.py file.
 
-This script extracts all the information it needs from the openwsn.h
-header file (part of the openwsn-fw repository), and generate the
-StackDefines.py file (part of the openwsn-sw repository).
+This script extracts all the information it needs from the openwsn.h and
+openserial.h header files (part of the openwsn-fw repository), and generate
+the StackDefines.py file (part of the openwsn-sw repository).
 
 To run it, just double-click on this file.
 
@@ -27,6 +27,7 @@ import time
 #============================ defines =========================================
 
 INPUT_FILE    = os.path.join('..','..','..','..','..','openwsn-fw','inc','opendefs.h')
+SERIAL_FILE   = os.path.join('..','..','..','..','..','openwsn-fw','drivers','common','openserial.h')
 OUTPUT_FILE   = 'StackDefines.py'
 
 #============================ helpers =========================================
@@ -78,12 +79,37 @@ def genErrorDescriptions():
     
     return output
 
+def genStatusElems():
+    
+    # find status elements code in openserial.h
+    codesFound = []
+    for line in open(SERIAL_FILE,'r'):
+        m = re.search('^\s*#define\s+STATUS_(\S*)\s+(\S*)',line)
+        if m:
+            name = m.group(1)
+            if name=='MAX':
+                continue
+            try:
+                code = int(m.group(2),0)
+            except ValueError:
+                print "WARNING: {0} is not a number".format(m.group(2))
+            else:
+                codesFound.append((code,name))
+    
+    # turn into text
+    output  = ["statusElems = {"]
+    output += ["{0:>4}: \"{1}\",".format(a,b) for (a,b) in codesFound]
+    output += ["}"]
+    output  = '\n'.join(output)
+    
+    return output
+
 #============================ main ============================================
 
 def main():
     
-    if os.path.exists(INPUT_FILE):
-        # we can access the openwsn.h file
+    if os.path.exists(INPUT_FILE) and os.path.exists(SERIAL_FILE):
+        # we can access the openwsn.h and openserial.h files
         
         # gather the information
         output  = []
@@ -96,6 +122,8 @@ def main():
         output += [""]
         output += [genErrorDescriptions()]
         output += [""]
+        output += [genStatusElems()]
+        output += [""]
         output  = '\n'.join(output)
         
         # write to file
@@ -106,12 +134,13 @@ def main():
         print "{0} created successfully.".format(OUTPUT_FILE)
         
     else:
-        # we can NOT access the openwsn.h file
+        # we can NOT access the openwsn.h or openserial.h file
         
         # print error message
         output  = []
-        output += ["ERROR: could not open the following file"]
+        output += ["ERROR: could not open the following files"]
         output += ["   {0}".format(INPUT_FILE)]
+        output += ["   {0}".format(SERIAL_FILE)]
         output += [""]
         output += ["Do you have the openwsn-fw and openwsn-sw repositories"]
         output += ["checked out side-by-side?"]
@@ -9,6 +9,7 @@ log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
 from ParserException import ParserException
+import openvisualizer.openvisualizer_utils as u
 
 class ParsingKey(object):
     
@@ -53,6 +54,10 @@ class Parser(object):
         if log.isEnabledFor(logging.DEBUG):
             log.debug("received input={0}".format(input))
         
+        # accept lists of integers from callers which have not moved to
+        # BytePacket yet
+        input = u.BytePacket(input)
+        
         # ensure input not short longer than header
         self._checkLength(input)
         
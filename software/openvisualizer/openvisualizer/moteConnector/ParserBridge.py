@@ -59,16 +59,18 @@ class ParserBridge(Parser.Parser):
             incoming = 2
         else:
 	    incoming = 7
-	tag = ''
+	tag = ()
 	input = input[2:]
 	if incoming & 1:
-            tag += str((input[0] << 8) + input[1])   #tag
+            tag += ((input[0] << 8) + input[1],)     #tag
 	    input = input[2:]
 	if incoming & 4:
-            tag += str(input[0] & 7) + str(input[1]) # size
+            tag += (((input[0] & 7) << 8) + input[1],) # size
 	    input = input[2:]
 	if incoming & 2:
-	    tag += str(input[0:])                    # source or destination
+	    tag += (tuple(input[0:]),)               # source or destination
+        if len(tag) == 1:
+            tag = tag[0]
         return (eventType,(incoming,tag))
 
  #======================== private =========================================
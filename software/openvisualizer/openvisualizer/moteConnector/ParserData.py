@@ -14,12 +14,17 @@ from pydispatch import dispatcher
 
 from ParserException import ParserException
 import Parser
+import SerialFrames
+import openvisualizer.openvisualizer_utils as u
 
 class ParserData(Parser.Parser):
     
     HEADER_LENGTH  = 2
     MSPERSLOT      = 15 #ms per slot.
     
+    ASN_OFFSET     = SerialFrames.DATA_HEADER.offsets['asn_4']
+    ASN_LENGTH     = SerialFrames.DATA_HEADER.offsets['dest']-ASN_OFFSET
+    
     IPHC_SAM       = 4
     IPHC_DAM       = 0
     
@@ -45,23 +50,24 @@ class ParserData(Parser.Parser):
         if log.isEnabledFor(logging.DEBUG):
             log.debug("received data {0}".format(input))
         
+        # accept lists of integers as well
+        input = u.BytePacket(input)
+        
         # ensure input not short longer than header
         self._checkLength(input)
    
-        headerBytes = input[:2]
-        #asn comes in the next 5bytes.  
-        
-        asnbytes=input[2:7]
-        (self._asn) = struct.unpack('<BHH',''.join([chr(c) for c in asnbytes]))
-        
-        #source and destination of the message
-        dest = input[7:15]
+        # the mote id, asn, and the destination and source of the message
+        # (the next and previous hops) come before the packet
+        try:
+            (moteId,asn_4,asn_2_3,asn_0_1,dest,source) = SerialFrames.DATA_HEADER.unpack_from(input)
+        except struct.error:
+            raise ParserException(ParserException.DESERIALIZE,"could not extract asn, dest and source from {0}".format(input))
         
-        #source is elided!!! so it is not there.. check that.
-        source = input[15:23]
+        self._asn = (asn_4,asn_2_3,asn_0_1)
+        source    = u.BytePacket(source)
         
         if log.isEnabledFor(logging.DEBUG):
-            a="".join(hex(c) for c in dest)
+            a="".join(hex(ord(c)) for c in dest)
             log.debug("destination address of the packet is {0} ".format(a))
         
         if log.isEnabledFor(logging.DEBUG):
@@ -71,7 +77,8 @@ class ParserData(Parser.Parser):
         # remove asn src and dest and mote id at the beginning.
         # this is a hack for latency measurements... TODO, move latency to an app listening on the corresponding port.
         # inject end_asn into the packet as well
-        input = input[23:]
+        frame = input
+        input = input[SerialFrames.DATA_HEADER.size:]
         
         if log.isEnabledFor(logging.DEBUG):
             log.debug("packet without source,dest and asn {0}".format(input))
@@ -85,6 +92,7 @@ class ParserData(Parser.Parser):
            if (input[36]==238 and input[37]==73):
             # udp port 61001 for udplatency app.
                aux      = input[len(input)-5:]               # last 5 bytes of the packet are the ASN in the UDP latency packet
+               asnbytes = frame[self.ASN_OFFSET:self.ASN_OFFSET+self.ASN_LENGTH]
                diff     = self._asndiference(aux,asnbytes)   # calculate difference 
                timeinus = diff*self.MSPERSLOT                # compute time in ms
                SN       = input[len(input)-23:len(input)-21] # SN sent by mote
@@ -123,8 +131,8 @@ class ParserData(Parser.Parser):
  
     def _asndiference(self,init,end):
       
-       asninit = struct.unpack('<HHB',''.join([chr(c) for c in init]))
-       asnend  = struct.unpack('<HHB',''.join([chr(c) for c in end]))
+       asninit = u.BytePacket(init).unpack_from('<HHB')
+       asnend  = u.BytePacket(end).unpack_from('<HHB')
        if (asnend[2] != asninit[2]): #'byte4'
           return 0xFFFFFFFF
        else:
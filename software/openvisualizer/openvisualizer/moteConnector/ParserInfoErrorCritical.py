@@ -12,6 +12,8 @@ import struct
 
 from ParserException import ParserException
 import Parser
+import SerialFrames
+import openvisualizer.openvisualizer_utils as u
 
 import StackDefines
 
@@ -46,13 +48,18 @@ class ParserInfoErrorCritical(Parser.Parser):
         if log.isEnabledFor(logging.DEBUG):
             log.debug("received data {0}".format(input))
         
-        # parse packet
+        # accept lists of integers as well
+        input = u.BytePacket(input)
+        
+        # parse packet, in place
         try:
+           if len(input)!=SerialFrames.INFO_ERROR_CRITICAL.size:
+               raise struct.error('unpack requires a string argument of length {0}'.format(SerialFrames.INFO_ERROR_CRITICAL.size))
            (moteId,
             callingComponent,
             error_code,
             arg1,
-            arg2) = struct.unpack('>HBBHH',''.join([chr(c) for c in input]))
+            arg2) = SerialFrames.INFO_ERROR_CRITICAL.unpack_from(input)
         except struct.error:
             raise ParserException(ParserException.DESERIALIZE,"could not extract data from {0}".format(input))
         
@@ -0,0 +1,281 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+'''
+Layout of the frames exchanged with the mote over the serial port.
+
+Each layout is declared once below, as a list of (field name, struct format)
+pairs, and compiled at import into a :class:`Codec`, which holds the
+precomputed struct.Struct decoding the frame in place and encoding it into a
+preallocated buffer. The status elements are numbered as in the firmware,
+from ``StackDefines.statusElems``, generated by GenStackDefines.py.
+
+The mote to PC layouts start after the frame type byte, which OpenParser
+removes before handing the frame to a parser; the PC to mote layouts start
+with it.
+'''
+
+import collections
+import struct
+
+import openvisualizer.openvisualizer_utils as u
+
+import StackDefines
+
+#============================ defines =========================================
+
+BYTE_ORDER             = '<'
+
+#===== mote to PC
+
+STATUS_HEADER_FIELDS   = [
+    ('moteId',                 'H'),
+    ('statusElem',             'B'),
+]
+
+# statusElem name in the firmware, named tuple name, fields
+STATUS_ELEM_FIELDS     = [
+    (
+        'ISSYNC',
+        'IsSync',
+        [
+            ('isSync',                 'B'),
+        ],
+    ),
+    (
+        'ID',
+        'IdManager',
+        [
+            ('isDAGroot',              'B'),
+        ]+[
+            ('myPANID_{0}'.format(i),  'B') for i in range(2)
+        ]+[
+            ('my16bID_{0}'.format(i),  'B') for i in range(2)
+        ]+[
+            ('my64bID_{0}'.format(i),  'B') for i in range(8)
+        ]+[
+            ('myPrefix_{0}'.format(i), 'B') for i in range(8)
+        ],
+    ),
+    (
+        'DAGRANK',
+        'MyDagRank',
+        [
+            ('myDAGrank',              'H'),
+        ],
+    ),
+    (
+        'OUTBUFFERINDEXES',
+        'OutputBuffer',
+        [
+            ('index_write',            'H'),
+            ('index_read',             'H'),
+        ],
+    ),
+    (
+        'ASN',
+        'Asn',
+        [
+            ('asn_4',                  'B'),
+            ('asn_2_3',                'H'),
+            ('asn_0_1',                'H'),
+        ],
+    ),
+    (
+        'MACSTATS',
+        'MacStats',
+        [
+            ('numSyncPkt',             'B'),
+            ('numSyncAck',             'B'),
+            ('minCorrection',          'h'),
+            ('maxCorrection',          'h'),
+            ('numDeSync',              'B'),
+            ('numTicsOn',              'I'),
+            ('numTicsTotal',           'I'),
+        ],
+    ),
+    (
+        'SCHEDULE',
+        'ScheduleRow',
+        [
+            ('row',                    'B'),
+            ('slotOffset',             'H'),
+            ('type',                   'B'),
+            ('shared',                 'B'),
+            ('channelOffset',          'B'),
+            ('neighbor_type',          'B'),
+            ('neighbor_bodyH',         'Q'),
+            ('neighbor_bodyL',         'Q'),
+            ('numRx',                  'B'),
+            ('numTx',                  'B'),
+            ('numTxACK',               'B'),
+            ('lastUsedAsn_4',          'B'),
+            ('lastUsedAsn_2_3',        'H'),
+            ('lastUsedAsn_0_1',        'H'),
+        ],
+    ),
+    (
+        'BACKOFF',
+        'Backoff',
+        [
+            ('backoffExponent',        'B'),
+            ('backoff',                'B'),
+        ],
+    ),
+    (
+        'QUEUE',
+        'QueueRow',
+        [
+            (f.format(i),              'B') for i in range(10) for f in ['creator_{0}','owner_{0}']
+        ],
+    ),
+    (
+        'NEIGHBORS',
+        'NeighborsRow',
+        [
+            ('row',                    'B'),
+            ('used',                   'B'),
+            ('parentPreference',       'B'),
+            ('stableNeighbor',         'B'),
+            ('switchStabilityCounter', 'B'),
+            ('addr_type',              'B'),
+            ('addr_bodyH',             'Q'),
+            ('addr_bodyL',             'Q'),
+            ('DAGrank',                'H'),
+            ('rssi',                   'b'),
+            ('numRx',                  'B'),
+            ('numTx',                  'B'),
+            ('numTxACK',               'B'),
+            ('numWraps',               'B'),
+            ('asn_4',                  'B'),
+            ('asn_2_3',                'H'),
+            ('asn_0_1',                'H'),
+            ('joinPrio',               'B'),
+        ],
+    ),
+    (
+        'KAPERIOD',
+        'kaPeriod',
+        [
+            ('kaPeriod',               'H'),
+        ],
+    ),
+]
+
+# header the DAG root prepends to the packets it forwards to the PC
+DATA_HEADER_FIELDS     = [
+    ('moteId',                 'H'),
+    ('asn_4',                  'B'),
+    ('asn_2_3',                'H'),
+    ('asn_0_1',                'H'),
+    ('dest',                   '8s'),                 # next hop
+    ('source',                 '8s'),                 # previous hop
+]
+
+# the info, error and critical notifications are in network byte order
+INFO_ERROR_CRITICAL_FIELDS = [
+    ('moteId',                 'H'),
+    ('callingComponent',       'B'),
+    ('error_code',             'B'),
+    ('arg1',                   'H'),
+    ('arg2',                   'H'),
+]
+
+#===== PC to mote
+
+SETDAGROOT_FIELDS      = [
+    ('type',                   'B'),
+    ('action',                 'B'),
+    ('prefix',                 '8s'),
+]
+
+COMMAND_GD_FIELDS      = [
+    ('type',                   'B'),
+    ('version',                'B'),
+    ('imageId',                'B'),
+    ('commandId',              'B'),
+    ('length',                 'B'),
+]
+
+COMMAND_GD_PARAMETER_FIELDS = [
+    ('parameter',              'H'),
+]
+
+#============================ classes =========================================
+
+class Codec(object):
+    '''
+    A frame layout, compiled into a struct.Struct.
+    '''
+    
+    def __init__(self,name,fields,byteOrder=BYTE_ORDER):
+        '''
+        :param name:      [in] The name of the layout, which names its named
+            tuple ``Tuple_<name>``.
+        :param fields:    [in] The (field name, struct format) pairs, in the
+            order of the frame.
+        :param byteOrder: [in] The struct byte order character.
+        '''
+        self.name       = name
+        self.fields     = [f for (f,_) in fields]
+        self.structure  = byteOrder+''.join([fmt for (_,fmt) in fields])
+        self.struct     = struct.Struct(self.structure)
+        self.size       = self.struct.size
+        self.namedTuple = collections.namedtuple('Tuple_'+name,self.fields)
+        self.offsets    = {}
+        for i in range(len(fields)):
+            self.offsets[fields[i][0]] = struct.calcsize(byteOrder+''.join([fmt for (_,fmt) in fields[:i]]))
+    
+    #======================== public ==========================================
+    
+    def unpack_from(self,buf,offset=0):
+        '''
+        Decodes the fields in place, without copying the bytes.
+        
+        :param buf:    [in] A BytePacket, string, bytearray or memoryview.
+        :param offset: [in] Offset of the frame in buf.
+        
+        :raises: struct.error when buf is too short.
+        
+        :returns: A tuple of the fields.
+        '''
+        if isinstance(buf,u.BytePacket):
+            return buf.unpack_from(self.struct,offset)
+        return self.struct.unpack_from(buf,offset)
+    
+    def pack_into(self,buf,offset,*values):
+        '''
+        Encodes the fields into a preallocated buffer.
+        
+        :param buf:    [in] A bytearray, at least offset+size bytes long.
+        :param offset: [in] Offset of the frame in buf.
+        :param values: [in] The values of the fields, in order.
+        
+        :raises: struct.error when the values do not fit the fields.
+        '''
+        self.struct.pack_into(buf,offset,*values)
+    
+    def pack(self,*values):
+        '''
+        :returns: The fields encoded into a string.
+        '''
+        return self.struct.pack(*values)
+
+#============================ codecs ==========================================
+
+STATUS_HEADER          = Codec('StatusHeader',STATUS_HEADER_FIELDS)
+DATA_HEADER            = Codec('DataHeader',DATA_HEADER_FIELDS)
+INFO_ERROR_CRITICAL    = Codec('InfoErrorCritical',INFO_ERROR_CRITICAL_FIELDS,byteOrder='>')
+SETDAGROOT             = Codec('SetDagRoot',SETDAGROOT_FIELDS)
+COMMAND_GD             = Codec('CommandGd',COMMAND_GD_FIELDS)
+COMMAND_GD_PARAMETER   = Codec('CommandGdParameter',COMMAND_GD_PARAMETER_FIELDS)
+
+def _compileStatusElems():
+    vals   = dict([(v,k) for (k,v) in StackDefines.statusElems.items()])
+    codecs = [(vals[elemName],Codec(name,fields)) for (elemName,name,fields) in STATUS_ELEM_FIELDS]
+    return collections.OrderedDict(sorted(codecs))
+
+# statusElem -> Codec, in the order of the statusElems
+STATUS_ELEMS           = _compileStatusElems()
@@ -13,6 +13,9 @@ import socket
 import random
 import traceback
 import sys
+import time
+import struct
+import collections
 import openvisualizer.openvisualizer_utils as u
 
 from openvisualizer.eventBus      import eventBusClient
@@ -23,6 +26,10 @@ class SerialTester(eventBusClient.eventBusClient):
     DFLT_TESTPKT_LENGTH = 10  ##< number of bytes in a test packet
     DFLT_NUM_TESTPKT    = 20  ##< number of test packets to send
     DFLT_TIMEOUT        = 5   ##< timeout in second for getting a reply
+    DFLT_WINDOW         = 0   ##< echo requests in flight, 0 for stop-and-wait
+    
+    WINDOWED_HEADER     = struct.Struct('>II') ##< sequence number, send time (us)
+    LATENCY_BUCKETS_MS  = [1,2,5,10,20,50,100,200,500,1000,2000,5000]
     
     def __init__(self,moteProbeSerialPort):
         
@@ -37,11 +44,18 @@ class SerialTester(eventBusClient.eventBusClient):
         self.testPktLen           = self.DFLT_TESTPKT_LENGTH
         self.numTestPkt           = self.DFLT_NUM_TESTPKT
         self.timeout              = self.DFLT_TIMEOUT
+        self.window               = self.DFLT_WINDOW
         self.traceCb              = None
         self.busyTesting          = False
         self.lastSent             = []
         self.lastReceived         = []
         self.waitForReply         = threading.Event()
+        self.inFlight             = collections.OrderedDict() # seq -> (sendTime,packet)
+        self.highestSeq           = -1
+        self.nextSeq              = 0
+        self.lastEchoTime         = None
+        self.latencies            = []
+        self.watchdog             = None
         self._resetStats()
         
         # give this thread a name
@@ -60,6 +74,9 @@ class SerialTester(eventBusClient.eventBusClient):
             ]
         )
         
+        # the parent class replaces dataLock
+        self.windowChanged        = threading.Condition(self.dataLock)
+    
     def quit(self):
         self.goOn = False
     
@@ -73,6 +90,9 @@ class SerialTester(eventBusClient.eventBusClient):
             with self.dataLock:
                 if not self.busyTesting:
                     return
+                if self.window:
+                    self._receiveWindowedEcho(data[1+2+5:])
+                    return
             with self.dataLock:
                self.lastReceived = data[1+2+5:] # type (1B), moteId (2B), ASN (5B)
                # wake up other thread
@@ -95,6 +115,15 @@ class SerialTester(eventBusClient.eventBusClient):
         with self.dataLock:
             self.timeout     = newTimeout
     
+    def setWindow(self,newWindow):
+        '''
+        :param newWindow: [in] The number of echo requests kept in flight,
+            or 0 to wait for each echo before sending the next request.
+        '''
+        assert type(newWindow)==int and newWindow>=0
+        with self.dataLock:
+            self.window      = newWindow
+    
     def setTrace(self,newTraceCb):
         assert (callable(newTraceCb)) or (newTraceCb==None)
         with self.dataLock:
@@ -103,10 +132,15 @@ class SerialTester(eventBusClient.eventBusClient):
     #===== run test
     
     def test(self,blocking=True):
+        with self.dataLock:
+            if self.window:
+                target = self._runWindowedTest
+            else:
+                target = self._runtest
         if blocking:
-            self._runtest()
+            target()
         else:
-            threading.Thread(target=self._runtest).start()
+            threading.Thread(target=target).start()
     
     #===== get test results
     
@@ -143,6 +177,9 @@ class SerialTester(eventBusClient.eventBusClient):
             with self.dataLock:
                 self.lastSent = packetToSend[:]
             
+            # the echo can come back before dispatch returns
+            self.waitForReply.clear()
+            
             # send
             self.dispatch(
                 signal        = 'fromMoteConnector@'+self.moteProbeSerialPort,
@@ -158,7 +195,6 @@ class SerialTester(eventBusClient.eventBusClient):
             self._log('sent:     {0}'.format(self.formatList(self.lastSent)))
             
             # wait for answer
-            self.waitForReply.clear()
             if self.waitForReply.wait(timeout):
                 
                 # log
@@ -181,6 +217,191 @@ class SerialTester(eventBusClient.eventBusClient):
         with self.dataLock:
             self.busyTesting = False
     
+    def _runWindowedTest(self):
+        '''
+        Keeps up to ``window`` echo requests in flight.
+        
+        Each request starts with its sequence number and send time, so the
+        echoes can be matched to their request and timed as they come back,
+        in any order. Requests not echoed within the timeout are lost.
+        '''
+        
+        # I'm testing
+        with self.dataLock:
+            self.busyTesting = True
+        
+        # gather test parameters
+        with self.dataLock:
+            testPktLen = max(self.testPktLen,self.WINDOWED_HEADER.size)
+            numTestPkt = self.numTestPkt
+            timeout    = self.timeout
+            window     = self.window
+        
+        # reset stats
+        self._resetStats()
+        with self.dataLock:
+            self.inFlight.clear()
+            self.highestSeq   = -1
+            self.nextSeq      = 0
+            self.lastEchoTime = None
+            self.latencies    = []
+        
+        self._log('sending {0} packets of {1} bytes, {2} in flight'.format(numTestPkt,testPktLen,window))
+        
+        # wakes me up when the oldest request times out
+        with self.dataLock:
+            self.watchdog = threading.Thread(target=self._watchTimeouts,args=(timeout,))
+            self.watchdog.name   = '{0}_watchdog'.format(self.name)
+            self.watchdog.daemon = True
+            self.watchdog.start()
+        
+        # send packets while the window is open
+        start = time.time()
+        for seq in range(numTestPkt):
+            
+            with self.dataLock:
+                while not self._waitForWindow(window,timeout):
+                    pass
+                
+                # prepare packet to send
+                packetToSend = self.WINDOWED_HEADER.pack(seq,self._timestampUs()) + ''.join(
+                    [chr(random.randint(0x00,0xff)) for _ in range(testPktLen-self.WINDOWED_HEADER.size)]
+                )
+                
+                # in flight before it is sent, the echo can come back at once
+                self.inFlight[seq]        = (time.time(),packetToSend)
+                self.nextSeq              = seq+1
+                self.stats['numSent']    += 1
+            
+            # send
+            self.dispatch(
+                signal        = 'fromMoteConnector@'+self.moteProbeSerialPort,
+                data          = chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_TRIGGERSERIALECHO)+packetToSend,
+            )
+        
+        # wait for the last echoes
+        with self.dataLock:
+            while not self._waitForWindow(1,timeout):
+                pass
+            end = self.lastEchoTime or time.time()
+            self._computeWindowedStats(end-start)
+            stats = self.stats.copy()
+        
+        self._log('{0} ok, {1} corrupted, {2} lost, {3} reordered, {4:.1f} frames/s, p50/p95/p99 {5:.1f}/{6:.1f}/{7:.1f} ms'.format(
+            stats['numOk'],
+            stats['numCorrupted'],
+            stats['numTimeout'],
+            stats['numReordered'],
+            stats['framesPerSec'],
+            stats['latencyP50'],
+            stats['latencyP95'],
+            stats['latencyP99'],
+        ))
+        
+        # I'm not testing
+        with self.dataLock:
+            self.busyTesting = False
+    
+    def _waitForWindow(self,window,timeout):
+        '''
+        Waits until less than ``window`` requests are in flight, or the
+        oldest one times out. Called with dataLock held.
+        
+        The wait has no timeout, as a timed wait polls, adding up to 50ms
+        to each wait; the watchdog thread wakes the sender up instead.
+        
+        :returns: True if less than ``window`` requests are in flight.
+        '''
+        now = time.time()
+        while self.inFlight:
+            (seq,(sendTime,packet)) = next(self.inFlight.iteritems())
+            if sendTime+timeout>now:
+                break
+            del self.inFlight[seq]
+            self.stats['numTimeout']             += 1
+            self._log('!! timeout of {0}.'.format(seq))
+        if len(self.inFlight)<window:
+            return True
+        self.windowChanged.wait()
+        return len(self.inFlight)<window
+    
+    def _watchTimeouts(self,timeout):
+        while True:
+            with self.dataLock:
+                if not (self.busyTesting and self.watchdog is threading.current_thread()):
+                    # test over
+                    return
+                self.windowChanged.notify()
+                if self.inFlight:
+                    (sendTime,packet) = next(self.inFlight.itervalues())
+                    wakeup = sendTime+timeout
+                else:
+                    wakeup = time.time()+timeout
+            time.sleep(max(wakeup-time.time(),0.001))
+    
+    def _receiveWindowedEcho(self,echo):
+        '''
+        Called with dataLock held.
+        '''
+        now  = self._timestampUs()
+        echo = u.BytePacket(echo).tobytes()
+        if len(echo)<self.WINDOWED_HEADER.size:
+            self.stats['numCorrupted']           += 1
+            self._log('!! corrupted, too short.')
+            return
+        (seq,sendTimestamp) = self.WINDOWED_HEADER.unpack_from(echo)
+        if seq not in self.inFlight:
+            if seq<self.nextSeq:
+                # already echoed or timed out
+                self.stats['numLate']            += 1
+            else:
+                self.stats['numCorrupted']       += 1
+                self._log('!! corrupted sequence number {0}.'.format(seq))
+            return
+        (sendTime,packet) = self.inFlight.pop(seq)
+        self.windowChanged.notify()
+        if echo!=packet:
+            self.stats['numCorrupted']           += 1
+            self._log('!! corrupted {0}.'.format(seq))
+            return
+        self.stats['numOk']                      += 1
+        self.stats['numBytesOk']                 += len(echo)
+        if seq<self.highestSeq:
+            self.stats['numReordered']           += 1
+        else:
+            self.highestSeq = seq
+        self.latencies.append(((now-sendTimestamp)&0xffffffff)/1000.0)
+        self.lastEchoTime = time.time()
+    
+    def _computeWindowedStats(self,duration):
+        '''
+        Called with dataLock held.
+        '''
+        latencies = sorted(self.latencies)
+        histogram = [0]*(len(self.LATENCY_BUCKETS_MS)+1)
+        bucket    = 0
+        for latency in latencies:
+            while bucket<len(self.LATENCY_BUCKETS_MS) and latency>self.LATENCY_BUCKETS_MS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+        
+        self.stats['duration']                   = duration
+        if duration>0:
+            self.stats['framesPerSec']           = self.stats['numOk']/duration
+            self.stats['bytesPerSec']            = self.stats['numBytesOk']/duration
+        self.stats['latencyP50']                 = self._percentile(latencies,50)
+        self.stats['latencyP95']                 = self._percentile(latencies,95)
+        self.stats['latencyP99']                 = self._percentile(latencies,99)
+        self.stats['latencyHistogram']           = histogram
+    
+    def _percentile(self,sortedValues,percent):
+        if not sortedValues:
+            return 0.0
+        return sortedValues[int(round(percent/100.0*(len(sortedValues)-1)))]
+    
+    def _timestampUs(self):
+        return int(time.time()*1000000)&0xffffffff
+    
     def _log(self,msg):
         if log.isEnabledFor(logging.DEBUG):
             log.debug(msg)
@@ -195,6 +416,17 @@ class SerialTester(eventBusClient.eventBusClient):
                 'numOk'               : 0,
                 'numCorrupted'        : 0,
                 'numTimeout'          : 0,
+                # windowed test only
+                'numLate'             : 0,
+                'numReordered'        : 0,
+                'numBytesOk'          : 0,
+                'duration'            : 0.0,
+                'framesPerSec'        : 0.0,
+                'bytesPerSec'         : 0.0,
+                'latencyP50'          : 0.0, # ms
+                'latencyP95'          : 0.0,
+                'latencyP99'          : 0.0,
+                'latencyHistogram'    : [0]*(len(self.LATENCY_BUCKETS_MS)+1),
             }
     
     def formatList(self,l):
@@ -115,3 +115,17 @@ errorDescriptions = {
   66: "incoming fragment overlaps with previously received one",
   67: "fragment timer expired",
 }
+
+statusElems = {
+   0: "ISSYNC",
+   1: "ID",
+   2: "DAGRANK",
+   3: "OUTBUFFERINDEXES",
+   4: "ASN",
+   5: "MACSTATS",
+   6: "SCHEDULE",
+   7: "BACKOFF",
+   8: "QUEUE",
+   9: "NEIGHBORS",
+  10: "KAPERIOD",
+}
@@ -21,6 +21,7 @@ from openvisualizer.moteState     import moteState
 
 import OpenParser
 import ParserException
+import SerialFrames
 
 class moteConnector(eventBusClient.eventBusClient):
     
@@ -37,6 +38,8 @@ class moteConnector(eventBusClient.eventBusClient):
         self.stateLock                 = threading.Lock()
         self.networkPrefix             = None
         self._subcribedDataForDagRoot  = False
+        self.numParsed                 = 0
+        self.parseErrors               = {} # (frame type,error code) -> count
               
         # give this thread a name
         self.name = 'moteConnector@{0}'.format(self.serialport)
@@ -77,10 +80,14 @@ class moteConnector(eventBusClient.eventBusClient):
             (eventSubType,parsedNotif)  = self.parser.parseInput(input)
             assert isinstance(eventSubType,str)
         except ParserException.ParserException as err:
+            # count
+            key = (chr(input[0]) if len(input) else '',err.errorCode)
+            self.parseErrors[key] = self.parseErrors.get(key,0)+1
             # log
             log.error(str(err))
             pass
         else:
+            self.numParsed += 1
             # dispatch
             self.dispatch('fromMote.'+eventSubType,parsedNotif)
         
@@ -135,10 +142,14 @@ class moteConnector(eventBusClient.eventBusClient):
                 
                 # create data to send
                 with self.stateLock:
-                    dataToSend = [
+                    dataToSend = bytearray(SerialFrames.SETDAGROOT.size)
+                    SerialFrames.SETDAGROOT.pack_into(
+                        dataToSend,
+                        0,
                         OpenParser.OpenParser.SERFRAME_PC2MOTE_SETDAGROOT,
                         OpenParser.OpenParser.SERFRAME_ACTION_TOGGLE,
-                    ]+self.networkPrefix
+                        u.toByteString(self.networkPrefix),
+                    )
                 
                 # toggle the DAGroot state
                 self._sendToMoteProbe(
@@ -196,15 +207,21 @@ class moteConnector(eventBusClient.eventBusClient):
 
         if data[1][:2] == '6p':
             try:
-                dataToSend = [OpenParser.OpenParser.SERFRAME_PC2MOTE_COMMAND_GD,
+                cells = []
+                if data[1] == '6pAdd' or data[1] == '6pDelete':
+                    if len(data[2][1:-1].split(','))>0:
+                        cells = [int(i) for i in data[2][1:-1].split(',')] # celllist
+                dataToSend = bytearray(SerialFrames.COMMAND_GD.size+len(cells))
+                SerialFrames.COMMAND_GD.pack_into(
+                    dataToSend,
+                    0,
+                    OpenParser.OpenParser.SERFRAME_PC2MOTE_COMMAND_GD,
                     2, # version
                     imageId,
                     commandId,
-                    len(data[2][1:-1].split(','))
-                ]
-                if data[1] == '6pAdd' or data[1] == '6pDelete':
-                    if len(data[2][1:-1].split(','))>0:
-                        dataToSend += [int(i) for i in data[2][1:-1].split(',')] # celllist
+                    len(data[2][1:-1].split(',')),
+                )
+                dataToSend[SerialFrames.COMMAND_GD.size:] = bytearray(cells)
             except:
                 print "============================================="
                 print "Wrong 6p parameter format {0}. Split the slot by".format(data[2])
@@ -212,16 +229,22 @@ class moteConnector(eventBusClient.eventBusClient):
                 return [outcome,dataToSend]
         else:
             parameter = int(data[2])
-            if parameter <= 0xffff:
-                parameter  = [(parameter & 0xff),((parameter >> 8) & 0xff)]
-                dataToSend = [OpenParser.OpenParser.SERFRAME_PC2MOTE_COMMAND_GD,
+            if 0 <= parameter <= 0xffff:
+                dataToSend = bytearray(SerialFrames.COMMAND_GD.size+SerialFrames.COMMAND_GD_PARAMETER.size)
+                SerialFrames.COMMAND_GD.pack_into(
+                    dataToSend,
+                    0,
+                    OpenParser.OpenParser.SERFRAME_PC2MOTE_COMMAND_GD,
                     2, # version
                     imageId,
                     commandId,
                     commandLen, # length 
-                    parameter[0],
-                    parameter[1]
-                ]
+                )
+                SerialFrames.COMMAND_GD_PARAMETER.pack_into(
+                    dataToSend,
+                    SerialFrames.COMMAND_GD.size,
+                    parameter,
+                )
             else:
                 # more than two bytes parameter, error
                 print "============================================="
@@ -240,7 +263,11 @@ class moteConnector(eventBusClient.eventBusClient):
         (nextHop,lowpan) = data
         
         self._sendToMoteProbe(
-            dataToSend = [OpenParser.OpenParser.SERFRAME_PC2MOTE_DATA]+nextHop+lowpan,
+            dataToSend = ''.join([
+                chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_DATA),
+                u.toByteString(nextHop),
+                u.toByteString(lowpan),
+            ]),
         )
     
     #======================== public ==========================================
@@ -248,14 +275,37 @@ class moteConnector(eventBusClient.eventBusClient):
     def quit(self):
         raise NotImplementedError()
     
+    def getStats(self):
+        '''
+        Returns the counters of the parsing of the frames from the mote.
+        
+        :returns: A dictionary with the number of frames parsed, of frames
+            which could not be, and the latter by frame type, the first
+            byte of the frame, and by error description, e.g.
+            ``{'S': {'deserialization error': 2}}``.
+        '''
+        parseErrors = {}
+        for ((frameType,errorCode),count) in self.parseErrors.items():
+            description = ParserException.ParserException.descriptions.get(errorCode,str(errorCode))
+            parseErrors.setdefault(frameType,{})[description] = count
+        return {
+            'numParsed':        self.numParsed,
+            'numParseErrors':   sum(self.parseErrors.values()),
+            'parseErrors':      parseErrors,
+        }
+    
     #======================== private =========================================
     
     def _sendToMoteProbe(self,dataToSend):
+        '''
+        :param dataToSend: [in] The frame, as a string, a BytePacket or a list
+            of integers.
+        '''
         try:
              dispatcher.send(
                       sender        = self.name,
                       signal        = 'fromMoteConnector@'+self.serialport,
-                      data          = ''.join([chr(c) for c in dataToSend])
+                      data          = u.toByteString(dataToSend)
                       )
             
         except socket.error:
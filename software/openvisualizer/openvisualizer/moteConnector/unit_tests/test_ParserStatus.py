@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteConnector/
+
+import logging
+import logging.handlers
+import struct
+
+import pytest
+
+import ParserStatus
+from ParserException import ParserException
+import openvisualizer.openvisualizer_utils as u
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_ParserStatus.log'
+
+import logging
+log = logging.getLogger('test_ParserStatus')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_ParserStatus',
+                   'ParserStatus',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+MOTEID = 0x1234
+
+#============================ helpers =========================================
+
+def statusFrame(statusElem,structure,fields):
+    return struct.pack('<HB',MOTEID,statusElem)+struct.pack(structure,*fields)
+
+#============================ tests ===========================================
+
+def test_parseAllStatusElems():
+    parser = ParserStatus.ParserStatus()
+    
+    for key in parser.fieldsParsingKeys:
+        fields = tuple(range(len(key.fields)))
+        frame  = statusFrame(key.val,key.structure,fields)
+        
+        for input in [u.BytePacket(frame),[ord(c) for c in frame]]:
+            (eventType,notif) = parser.parseInput(input)
+            assert eventType=='status'
+            assert type(notif)==parser.named_tuple[key.name]
+            assert notif._fields==tuple(key.fields)
+            assert tuple(notif)==fields
+
+def test_namedTuplesShared():
+    parser1 = ParserStatus.ParserStatus()
+    parser2 = ParserStatus.ParserStatus()
+    
+    frame   = statusFrame(4,'<BHH',(1,2,3))
+    (_,notif) = parser1.parseInput(frame)
+    
+    assert type(notif) is parser2.named_tuple['Asn']
+
+def test_wrongLength():
+    parser = ParserStatus.ParserStatus()
+    
+    frame  = statusFrame(4,'<BHH',(1,2,3))
+    for input in [frame[:-1],frame+'\x00']:
+        with pytest.raises(ParserException) as excinfo:
+            parser.parseInput(input)
+        assert excinfo.value.errorCode==ParserException.DESERIALIZE
+
+def test_unknownStatusElem():
+    parser = ParserStatus.ParserStatus()
+    
+    with pytest.raises(ParserException) as excinfo:
+        parser.parseInput(statusFrame(0xfe,'<B',(0,)))
+    assert excinfo.value.errorCode==ParserException.NO_KEY
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteConnector/
+
+import logging
+import logging.handlers
+import struct
+
+import pytest
+
+import SerialFrames
+import StackDefines
+import ParserData
+import ParserInfoErrorCritical as ParserIEC
+from ParserException import ParserException
+import openvisualizer.openvisualizer_utils as u
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_SerialFrames.log'
+
+import logging
+log = logging.getLogger('test_SerialFrames')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_SerialFrames',
+                   'ParserData',
+                   'ParserInfoErrorCritical',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+DEST   = '\x14\x15\x92\x00\x00\x00\x00\x01'
+SOURCE = '\x14\x15\x92\x00\x00\x00\x00\x02'
+
+#============================ tests ===========================================
+
+def test_codec():
+    codec  = SerialFrames.Codec('Test',[('a','B'),('b','H'),('c','4s'),('d','h')])
+    assert codec.structure=='<BH4sh'
+    assert codec.size==9
+    assert codec.offsets=={'a':0,'b':1,'c':3,'d':7}
+    assert codec.namedTuple._fields==('a','b','c','d')
+    
+    # into a preallocated buffer, and back in place
+    buf    = bytearray(2+codec.size)
+    codec.pack_into(buf,2,1,0x1234,'abcd',-2)
+    assert str(buf)=='\x00\x00'+codec.pack(1,0x1234,'abcd',-2)
+    for input in [buf,str(buf),u.BytePacket(str(buf))]:
+        assert codec.unpack_from(input,2)==(1,0x1234,'abcd',-2)
+    with pytest.raises(struct.error):
+        codec.unpack_from(u.BytePacket(str(buf)),3)
+
+def test_statusElems():
+    # one codec per status element of the firmware
+    assert sorted(SerialFrames.STATUS_ELEMS)==sorted(StackDefines.statusElems)
+    assert SerialFrames.STATUS_ELEMS.keys()==sorted(SerialFrames.STATUS_ELEMS)
+    assert SerialFrames.STATUS_ELEMS[4].structure=='<BHH'
+    assert SerialFrames.STATUS_ELEMS[8].fields[:3]==['creator_0','owner_0','creator_1']
+
+def test_parseData():
+    parser = ParserData.ParserData()
+    packet = '\x78\x33\x3a'+'x'*20
+    frame  = SerialFrames.DATA_HEADER.pack(1,2,3,4,DEST,SOURCE)+packet
+    
+    (eventType,(source,input)) = parser.parseInput(frame)
+    assert eventType=='data'
+    assert source==[ord(c) for c in SOURCE]
+    assert input.tobytes()==packet
+    assert parser._asn==(2,3,4)
+    
+    with pytest.raises(ParserException) as excinfo:
+        parser.parseInput(frame[:SerialFrames.DATA_HEADER.size-1])
+    assert excinfo.value.errorCode==ParserException.DESERIALIZE
+
+def test_parseInfoErrorCritical():
+    parser = ParserIEC.ParserInfoErrorCritical(ParserIEC.ParserInfoErrorCritical.SEVERITY_ERROR)
+    frame  = struct.pack('>HBBHH',0x1234,1,2,3,4)
+    
+    assert SerialFrames.INFO_ERROR_CRITICAL.pack(0x1234,1,2,3,4)==frame
+    assert parser.parseInput(frame)==('error',[ord(c) for c in frame])
+    with pytest.raises(ParserException):
+        parser.parseInput(frame+'\x00')
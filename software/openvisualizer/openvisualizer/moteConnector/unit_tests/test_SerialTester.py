@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteConnector/
+
+import logging
+import logging.handlers
+import threading
+import select
+
+import pytest
+from   pydispatch import dispatcher
+
+import SerialTester
+import OpenParser
+from   openvisualizer.moteProbe import moteProbe
+from   openvisualizer.moteProbe import OpenHdlc
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_SerialTester.log'
+
+import logging
+log = logging.getLogger('test_SerialTester')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_SerialTester',
+                   'SerialTester',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+ECHO     = chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_TRIGGERSERIALECHO)
+DATA     = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_DATA)
+REQUEST  = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_REQUEST)
+HEADER   = '\x00\x01'+'\x00'*5 # moteId (2B), ASN (5B)
+
+#============================ helpers =========================================
+
+class ptyEchoMote(threading.Thread):
+    '''
+    Stands in for a mote on the master side of a pseudo-terminal: requests
+    data when idle, and echoes the serial echo requests it receives.
+    '''
+    
+    def __init__(self):
+        (self.master,self.slave) = os.openpty()
+        self.portname            = os.ttyname(self.slave)
+        self.hdlc                = OpenHdlc.OpenHdlc()
+        self.deframer            = OpenHdlc.OpenHdlcDeframer()
+        self.goOn                = True
+        threading.Thread.__init__(self)
+        self.daemon              = True
+        self.start()
+    
+    def run(self):
+        request = self.hdlc.hdlcify(REQUEST)
+        while self.goOn:
+            if not select.select([self.master],[],[],0.001)[0]:
+                os.write(self.master,request)
+                continue
+            output = []
+            for frame in self.deframer.feed(os.read(self.master,4096)):
+                if frame[:1]==ECHO:
+                    output += [self.hdlc.hdlcify(DATA+HEADER+frame[1:])]
+            output += [request]
+            os.write(self.master,''.join(output))
+    
+    def close(self):
+        self.goOn = False
+
+class lossyEchoMote(object):
+    '''
+    Echoes the requests on the event bus, swapping each pair of echoes and
+    dropping one request in ``dropEvery``.
+    '''
+    
+    def __init__(self,portname,dropEvery):
+        self.portname  = portname
+        self.dropEvery = dropEvery
+        self.numRx     = 0
+        self.held      = None
+        dispatcher.connect(
+            self._receive,
+            signal = 'fromMoteConnector@'+portname,
+            weak   = False,
+        )
+    
+    def close(self):
+        dispatcher.disconnect(
+            self._receive,
+            signal = 'fromMoteConnector@'+self.portname,
+            weak   = False,
+        )
+    
+    def _receive(self,sender,signal,data):
+        self.numRx += 1
+        if self.numRx%self.dropEvery==0:
+            return
+        echo = [ord(b) for b in DATA+HEADER+data[1:]]
+        if self.held is None:
+            self.held = echo
+            return
+        for e in [echo,self.held]:
+            dispatcher.send(
+                sender = 'lossyEchoMote',
+                signal = 'fromMoteProbe@'+self.portname,
+                data   = e,
+            )
+        self.held = None
+
+#============================ tests ===========================================
+
+def test_stopAndWait():
+    mote   = ptyEchoMote()
+    probe  = moteProbe.moteProbe(serialport=(mote.portname,115200))
+    tester = SerialTester.SerialTester(mote.portname)
+    try:
+        tester.setNumTestPkt(20)
+        tester.setTimeout(1)
+        tester.test(blocking=True)
+        stats = tester.getStats()
+    finally:
+        tester.quit()
+        probe.close()
+        mote.close()
+    
+    assert stats['numSent']==20
+    assert stats['numOk']==20
+    assert stats['duration']==0.0
+
+def test_windowedOverPty():
+    mote   = ptyEchoMote()
+    probe  = moteProbe.moteProbe(serialport=(mote.portname,115200))
+    tester = SerialTester.SerialTester(mote.portname)
+    try:
+        tester.setNumTestPkt(500)
+        tester.setTestPktLength(40)
+        tester.setTimeout(2)
+        tester.setWindow(8)
+        tester.test(blocking=True)
+        stats = tester.getStats()
+    finally:
+        tester.quit()
+        probe.close()
+        mote.close()
+    
+    assert stats['numSent']==500
+    assert stats['numOk']==500
+    assert stats['numCorrupted']==stats['numTimeout']==stats['numReordered']==0
+    assert stats['framesPerSec']>0
+    assert stats['bytesPerSec']==pytest.approx(40*stats['framesPerSec'])
+    assert 0<stats['latencyP50']<=stats['latencyP95']<=stats['latencyP99']
+    assert sum(stats['latencyHistogram'])==500
+
+def test_windowedLossAndReordering():
+    portname = 'test_windowedLossAndReordering'
+    mote     = lossyEchoMote(portname,dropEvery=10)
+    tester   = SerialTester.SerialTester(portname)
+    try:
+        tester.setNumTestPkt(100)
+        tester.setTimeout(1)
+        tester.setWindow(4)
+        tester.test(blocking=True)
+        stats = tester.getStats()
+    finally:
+        tester.quit()
+        mote.close()
+    
+    # the request after each dropped one is held, and can time out
+    assert stats['numSent']==100
+    assert stats['numTimeout']>=10
+    assert stats['numOk']+stats['numTimeout']==100
+    assert 0<stats['numReordered']<=stats['numOk']/2
+    assert stats['numCorrupted']==0
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteConnector/
+
+import logging
+import logging.handlers
+import struct
+
+import pytest
+
+import moteConnector
+import OpenParser
+from ParserException import ParserException
+import openvisualizer.openvisualizer_utils as u
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_moteConnector.log'
+
+import logging
+log = logging.getLogger('test_moteConnector')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_moteConnector',
+                   'moteConnector',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+STATUS = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_STATUS)
+ERROR  = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_ERROR)
+
+#============================ tests ===========================================
+
+def test_parseErrors():
+    mc = moteConnector.moteConnector('test_parseErrors')
+    
+    # IsSync, then IsSync of the wrong length, an unknown status and an
+    # error notification too short
+    for frame in [
+            STATUS+struct.pack('<HBB',1,0,1),
+            STATUS+struct.pack('<HBH',1,0,1),
+            STATUS+struct.pack('<HBB',1,0xff,1),
+            ERROR+'\x00',
+            'X',
+        ]:
+        mc._sendToParser(u.BytePacket(frame))
+    
+    stats = mc.getStats()
+    assert stats['numParsed']==1
+    assert stats['numParseErrors']==4
+    assert stats['parseErrors']=={
+        'S': {
+            ParserException.descriptions[ParserException.DESERIALIZE]: 1,
+            ParserException.descriptions[ParserException.NO_KEY]:      1,
+        },
+        'E': {
+            ParserException.descriptions[ParserException.DESERIALIZE]: 1,
+        },
+        'X': {
+            ParserException.descriptions[ParserException.NO_KEY]:      1,
+        },
+    }
+
+def test_GDcommandToBytes():
+    mc = moteConnector.moteConnector('test_GDcommandToBytes')
+    GD = chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_COMMAND_GD)
+
+    # image, command id, length, parameter
+    (success,dataToSend) = mc._GDcommandToBytes(['gd_root','kaPeriod','4660'])
+    assert success
+    assert u.toByteString(dataToSend)==GD+'\x02\x01\x02\x02\x34\x12'
+
+    # image, command id, number of cells, cells
+    (success,dataToSend) = mc._GDcommandToBytes(['gd_sniffer','6pAdd','[6,7]'])
+    assert success
+    assert u.toByteString(dataToSend)==GD+'\x02\x02\x09\x02\x06\x07'
+
+    for data in [
+            ['gd_root','kaPeriod','65536'],
+            ['gd_root','kaPeriod','-1'],
+            ['gd_root','6pAdd','[6,x]'],
+        ]:
+        (success,_) = mc._GDcommandToBytes(data)
+        assert not success
@@ -10,10 +10,19 @@ log = logging.getLogger('OpenHdlc')
 log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
+import bisect
+
 import openvisualizer.openvisualizer_utils as u
 
 class HdlcException(Exception):
-    pass
+    
+    TOO_SHORT        = 'tooShort'
+    WRONG_STUFFING   = 'wrongStuffing'
+    WRONG_CRC        = 'wrongCrc'
+    
+    def __init__(self,message,errorCode=None):
+        Exception.__init__(self,message)
+        self.errorCode  = errorCode
 
 class OpenHdlc(object):
     
@@ -24,41 +33,6 @@ class OpenHdlc(object):
     HDLC_CRCINIT           = 0xffff
     HDLC_CRCGOOD           = 0xf0b8
     
-    FCS16TAB  = (
-        0x0000, 0x1189, 0x2312, 0x329b, 0x4624, 0x57ad, 0x6536, 0x74bf,
-        0x8c48, 0x9dc1, 0xaf5a, 0xbed3, 0xca6c, 0xdbe5, 0xe97e, 0xf8f7, 
-        0x1081, 0x0108, 0x3393, 0x221a, 0x56a5, 0x472c, 0x75b7, 0x643e,
-        0x9cc9, 0x8d40, 0xbfdb, 0xae52, 0xdaed, 0xcb64, 0xf9ff, 0xe876, 
-        0x2102, 0x308b, 0x0210, 0x1399, 0x6726, 0x76af, 0x4434, 0x55bd,
-        0xad4a, 0xbcc3, 0x8e58, 0x9fd1, 0xeb6e, 0xfae7, 0xc87c, 0xd9f5, 
-        0x3183, 0x200a, 0x1291, 0x0318, 0x77a7, 0x662e, 0x54b5, 0x453c,
-        0xbdcb, 0xac42, 0x9ed9, 0x8f50, 0xfbef, 0xea66, 0xd8fd, 0xc974, 
-        0x4204, 0x538d, 0x6116, 0x709f, 0x0420, 0x15a9, 0x2732, 0x36bb,
-        0xce4c, 0xdfc5, 0xed5e, 0xfcd7, 0x8868, 0x99e1, 0xab7a, 0xbaf3, 
-        0x5285, 0x430c, 0x7197, 0x601e, 0x14a1, 0x0528, 0x37b3, 0x263a,
-        0xdecd, 0xcf44, 0xfddf, 0xec56, 0x98e9, 0x8960, 0xbbfb, 0xaa72, 
-        0x6306, 0x728f, 0x4014, 0x519d, 0x2522, 0x34ab, 0x0630, 0x17b9,
-        0xef4e, 0xfec7, 0xcc5c, 0xddd5, 0xa96a, 0xb8e3, 0x8a78, 0x9bf1, 
-        0x7387, 0x620e, 0x5095, 0x411c, 0x35a3, 0x242a, 0x16b1, 0x0738,
-        0xffcf, 0xee46, 0xdcdd, 0xcd54, 0xb9eb, 0xa862, 0x9af9, 0x8b70, 
-        0x8408, 0x9581, 0xa71a, 0xb693, 0xc22c, 0xd3a5, 0xe13e, 0xf0b7,
-        0x0840, 0x19c9, 0x2b52, 0x3adb, 0x4e64, 0x5fed, 0x6d76, 0x7cff, 
-        0x9489, 0x8500, 0xb79b, 0xa612, 0xd2ad, 0xc324, 0xf1bf, 0xe036,
-        0x18c1, 0x0948, 0x3bd3, 0x2a5a, 0x5ee5, 0x4f6c, 0x7df7, 0x6c7e, 
-        0xa50a, 0xb483, 0x8618, 0x9791, 0xe32e, 0xf2a7, 0xc03c, 0xd1b5,
-        0x2942, 0x38cb, 0x0a50, 0x1bd9, 0x6f66, 0x7eef, 0x4c74, 0x5dfd, 
-        0xb58b, 0xa402, 0x9699, 0x8710, 0xf3af, 0xe226, 0xd0bd, 0xc134,
-        0x39c3, 0x284a, 0x1ad1, 0x0b58, 0x7fe7, 0x6e6e, 0x5cf5, 0x4d7c, 
-        0xc60c, 0xd785, 0xe51e, 0xf497, 0x8028, 0x91a1, 0xa33a, 0xb2b3, 
-        0x4a44, 0x5bcd, 0x6956, 0x78df, 0x0c60, 0x1de9, 0x2f72, 0x3efb, 
-        0xd68d, 0xc704, 0xf59f, 0xe416, 0x90a9, 0x8120, 0xb3bb, 0xa232,
-        0x5ac5, 0x4b4c, 0x79d7, 0x685e, 0x1ce1, 0x0d68, 0x3ff3, 0x2e7a, 
-        0xe70e, 0xf687, 0xc41c, 0xd595, 0xa12a, 0xb0a3, 0x8238, 0x93b1,
-        0x6b46, 0x7acf, 0x4854, 0x59dd, 0x2d62, 0x3ceb, 0x0e70, 0x1ff9, 
-        0xf78f, 0xe606, 0xd49d, 0xc514, 0xb1ab, 0xa022, 0x92b9, 0x8330,
-        0x7bc7, 0x6a4e, 0x58d5, 0x495c, 0x3de3, 0x2c6a, 0x1ef1, 0x0f78,
-    )
-    
     #============================ public ======================================
     
     def hdlcify(self,inBuf):
@@ -72,9 +46,7 @@ class OpenHdlc(object):
         outBuf     = inBuf[:]
         
         # calculate CRC
-        crc        = self.HDLC_CRCINIT
-        for b in outBuf:
-            crc    = self._crcIteration(crc,b)
+        crc        = u.reflectedCrc16(outBuf,self.HDLC_CRCINIT)
         crc        = 0xffff-crc
         
         # append CRC
@@ -108,31 +80,183 @@ class OpenHdlc(object):
         if log.isEnabledFor(logging.DEBUG):
             log.debug("after flags:     {0}".format(u.formatStringBuf(outBuf)))
         
-        # unstuff
-        outBuf     = outBuf.replace(self.HDLC_ESCAPE+self.HDLC_FLAG_ESCAPED,   self.HDLC_FLAG)
-        outBuf     = outBuf.replace(self.HDLC_ESCAPE+self.HDLC_ESCAPE_ESCAPED, self.HDLC_ESCAPE)
+        # unstuff, check and remove CRC
+        outBuf     = self.unstuffAndCheck(outBuf)
         if log.isEnabledFor(logging.DEBUG):
-            log.debug("after unstuff:   {0}".format(u.formatStringBuf(outBuf)))
+            log.debug("after CRC:       {0}".format(u.formatStringBuf(outBuf)))
+        
+        return outBuf
+    
+    def unstuffAndCheck(self,body):
+        '''
+        Unstuff the body of an hdlc frame (between flags), verify and remove
+        its CRC.
+        
+        :param body: [in] The stuffed bytes between the opening and closing
+            flags, as a string.
+        
+        :raises: HdlcException if the frame is too short, badly stuffed or
+            has a wrong CRC.
         
-        if len(outBuf)<2:
-            raise HdlcException('packet too short')
+        :returns: The frame, without CRC, as a string.
+        '''
+        
+        # unstuff: each escape byte flips bit 5 of the byte which follows it
+        if self.HDLC_ESCAPE in body:
+            pieces = body.split(self.HDLC_ESCAPE)
+            for i in xrange(1,len(pieces)):
+                piece = pieces[i]
+                if not piece:
+                    raise HdlcException('wrong stuffing',HdlcException.WRONG_STUFFING)
+                pieces[i] = chr(ord(piece[0])^0x20)+piece[1:]
+            body   = ''.join(pieces)
+        
+        if len(body)<2:
+            raise HdlcException('packet too short',HdlcException.TOO_SHORT)
         
         # check CRC
-        crc        = self.HDLC_CRCINIT
-        for b in outBuf:
-            crc    = self._crcIteration(crc,b)
+        crc        = u.reflectedCrc16(body,self.HDLC_CRCINIT)
         if crc!=self.HDLC_CRCGOOD:
-           raise HdlcException('wrong CRC')
+           raise HdlcException('wrong CRC',HdlcException.WRONG_CRC)
         
         # remove CRC
-        outBuf     = outBuf[:-2] # remove CRC
-        if log.isEnabledFor(logging.DEBUG):
-            log.debug("after CRC:       {0}".format(u.formatStringBuf(outBuf)))
-        
-        return outBuf
+        return body[:-2]
 
+class OpenHdlcDeframer(object):
+    '''
+    Streaming hdlc deframer.
+    
+    Consumes chunks of bytes as they are read from a serial port or socket,
+    whatever their size, and returns the complete, valid frames they
+    contain. Bytes received before the first flag are discarded; a frame
+    spanning several chunks is kept until its closing flag is received.
+    '''
+    
+    # longest partial frame kept while waiting for the closing flag
+    MAX_FRAME_LEN          = 4096
+    
+    # error counted when dropping a partial frame longer than MAX_FRAME_LEN
+    OVERFLOW               = 'overflow'
+    
+    # upper bounds of the frame size histogram, in bytes; the last bucket
+    # counts the longer frames
+    FRAME_SIZE_BUCKETS     = [8,16,32,64,96,128,256]
+    
+    def __init__(self,name='OpenHdlcDeframer'):
+        
+        # store params
+        self.name          = name
+        
+        # local variables
+        self.hdlc          = OpenHdlc()
+        self.inFrame       = False   # True after an opening flag
+        self.partial       = ''      # bytes received since the last flag
+        self.numBytes      = 0
+        self.numFrames     = 0
+        self.numFrameBytes = 0
+        self.numErrors     = 0
+        self.errors        = dict.fromkeys([
+            HdlcException.TOO_SHORT,
+            HdlcException.WRONG_STUFFING,
+            HdlcException.WRONG_CRC,
+            self.OVERFLOW,
+        ],0)
+        self.frameSizes    = [0]*(len(self.FRAME_SIZE_BUCKETS)+1)
+    
+    #============================ public ======================================
+    
+    def feed(self,chunk):
+        '''
+        Consume a chunk of received bytes.
+        
+        :param chunk: [in] The received bytes, as a string.
+        
+        :returns: A list of the valid frames completed by this chunk, CRC
+            removed, each a string.
+        '''
+        
+        FLAG       = OpenHdlc.HDLC_FLAG
+        
+        self.numBytes += len(chunk)
+        
+        if not self.inFrame:
+            # discard everything up to the first flag
+            idx    = chunk.find(FLAG)
+            if idx<0:
+                return []
+            chunk  = chunk[idx+1:]
+            self.inFrame = True
+        
+        if FLAG not in chunk:
+            # frame continues in a later chunk
+            self.partial += chunk
+            self._checkPartialLen()
+            return []
+        
+        # the last piece is the beginning of a frame not yet closed
+        pieces       = (self.partial+chunk).split(FLAG)
+        self.partial = pieces.pop()
+        self._checkPartialLen()
+        
+        frames     = []
+        for body in pieces:
+            if not body:
+                # back-to-back flags
+                continue
+            try:
+                frame = self.hdlc.unstuffAndCheck(body)
+            except HdlcException as err:
+                self.numErrors += 1
+                self.errors[err.errorCode] += 1
+                log.warning('{0}: invalid serial frame: {2} {1}'.format(
+                        self.name,
+                        err,
+                        u.formatStringBuf(body),
+                    )
+                )
+            else:
+                size                = len(frame)
+                self.numFrames     += 1
+                self.numFrameBytes += size
+                self.frameSizes[bisect.bisect_left(self.FRAME_SIZE_BUCKETS,size)] += 1
+                frames    += [frame]
+        
+        return frames
+    
+    def getStats(self):
+        '''
+        Returns the counters of the deframer.
+        
+        :returns: A dictionary with the number of bytes fed; of valid frames
+            and of their bytes, CRC removed; of invalid frames, in total and
+            by error ('tooShort', 'wrongStuffing', 'wrongCrc', and 'overflow'
+            for the bytes dropped without a closing flag); and the histogram
+            of the sizes of the valid frames, as the list of upper bounds of
+            its buckets and the list of counts, with one more bucket for the
+            longer frames.
+        '''
+        return {
+            'numBytes':          self.numBytes,
+            'numFrames':         self.numFrames,
+            'numFrameBytes':     self.numFrameBytes,
+            'numErrors':         self.numErrors,
+            'errors':            dict(self.errors),
+            'frameSizeBuckets':  list(self.FRAME_SIZE_BUCKETS),
+            'frameSizes':        list(self.frameSizes),
+        }
+    
     #============================ private =====================================
     
-    def _crcIteration(self,crc,b):
-        return (crc>>8)^self.FCS16TAB[((crc^(ord(b))) & 0xff)]
+    def _checkPartialLen(self):
+        if len(self.partial)>self.MAX_FRAME_LEN:
+            # no closing flag: drop and resynchronize on the next flag
+            self.numErrors += 1
+            self.errors[self.OVERFLOW] += 1
+            log.warning('{0}: dropping {1} bytes without closing flag'.format(
+                    self.name,
+                    len(self.partial),
+                )
+            )
+            self.partial   = ''
+            self.inFrame   = False
     
\ No newline at end of file
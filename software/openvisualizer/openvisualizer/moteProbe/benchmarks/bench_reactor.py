@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+'''
+Benchmark of the reading of the serial ports, with a thread per moteProbe
+and with a single ioReactor.
+
+Each mote is a pseudo-terminal pair: the moteProbe opens the slave side as
+its serial port, the benchmark writes HDLC frames to the master side, a few
+at a time on each port in turn, the way motes report periodically. The CPU
+time of the process, writer included, is divided by the number of frames
+received by all the moteProbes.
+
+Usage: python bench_reactor.py [numMotes] [framesPerMote] [framesPerSecond]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteProbe/
+
+import time
+import threading
+
+from   pydispatch import dispatcher
+
+import moteProbe
+import ioReactor
+import OpenHdlc
+from   openvisualizer.moteConnector import OpenParser
+
+#============================ defines =========================================
+
+NUM_MOTES         = 80
+FRAMES_PER_MOTE   = 200
+FRAMES_PER_SECOND = 4000   # all motes together
+FRAME             = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_DATA)+'\x00'*60
+
+#============================ helpers =========================================
+
+class counter(object):
+    
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.received = 0
+    
+    def receive(self,sender,signal,data):
+        with self.lock:
+            self.received += 1
+
+def cpuTime():
+    times = os.times()
+    return times[0]+times[1]
+
+def run(numMotes,framesPerMote,framesPerSecond,useReactor):
+    
+    ptys      = [os.openpty() for _ in range(numMotes)]
+    reactor   = ioReactor.ioReactor() if useReactor else None
+    count     = counter()
+    probes    = []
+    for (master,slave) in ptys:
+        probe = moteProbe.moteProbe(
+            serialport = (os.ttyname(slave),115200),
+            reactor    = reactor,
+        )
+        dispatcher.connect(
+            count.receive,
+            signal = 'fromMoteProbe@'+probe.getPortName(),
+            weak   = False,
+        )
+        probes += [probe]
+    time.sleep(0.5) # let the threads open their port
+    
+    frame     = OpenHdlc.OpenHdlc().hdlcify(FRAME)
+    total     = numMotes*framesPerMote
+    period    = float(numMotes)/framesPerSecond
+    numThreads= threading.activeCount()
+    
+    startCpu  = cpuTime()
+    start     = time.time()
+    for i in range(framesPerMote):
+        for (master,slave) in ptys:
+            os.write(master,frame)
+        # pace the motes
+        delay = start+(i+1)*period-time.time()
+        if delay>0:
+            time.sleep(delay)
+    while count.received<total and time.time()<start+framesPerMote*period+10:
+        time.sleep(0.01)
+    duration  = time.time()-start
+    cpu       = cpuTime()-startCpu
+    
+    for probe in probes:
+        probe.close()
+    if reactor:
+        reactor.close()
+    
+    return (count.received,total,cpu,duration,numThreads)
+
+def bench(numMotes,framesPerMote,framesPerSecond):
+    
+    output    = []
+    output   += ['{0} motes, {1} frames per mote, {2} frames/s'.format(numMotes,framesPerMote,framesPerSecond)]
+    for (name,useReactor) in [('reactor',True),('threads',False)]:
+        (received,total,cpu,duration,numThreads) = run(numMotes,framesPerMote,framesPerSecond,useReactor)
+        output   += ['- {0}: {1} threads, {2}/{3} frames in {4:.2f}s, {5:.0f}us CPU/frame ({6:.0f}% CPU)'.format(
+            name,
+            numThreads,
+            received,
+            total,
+            duration,
+            1e6*cpu/max(received,1),
+            100*cpu/duration,
+        )]
+    print '\n'.join(output)
+    sys.stdout.flush()
+    
+    # the moteProbe threads stay blocked reading their port
+    os._exit(0)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numMotes        = int(sys.argv[1]) if len(sys.argv)>1 else NUM_MOTES
+    framesPerMote   = int(sys.argv[2]) if len(sys.argv)>2 else FRAMES_PER_MOTE
+    framesPerSecond = int(sys.argv[3]) if len(sys.argv)>3 else FRAMES_PER_SECOND
+    bench(numMotes,framesPerMote,framesPerSecond)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+'''
+End-to-end benchmark of moteConnector, moteState, openLbr and RPL on
+captured serial traffic.
+
+Each capture file, recorded with the --capture option of OpenVisualizer or
+the capturefile parameter of moteProbe, is replayed by a moteProbe as fast
+as possible into a moteConnector and moteState, with openLbr, the fragment
+reassembly and RPL listening on the event bus. Without files, a capture of
+status frames of all kinds is synthesized.
+
+Usage: python bench_replay.py [captureFile ...]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteProbe/
+
+import time
+import struct
+import tempfile
+import threading
+
+from   pydispatch import dispatcher
+
+import moteProbe
+import OpenHdlc
+import serialCapture
+from   openvisualizer.moteConnector import moteConnector
+from   openvisualizer.moteConnector import ParserStatus
+from   openvisualizer.moteConnector import OpenParser
+from   openvisualizer.moteState     import moteState
+from   openvisualizer.openLbr       import openLbr
+from   openvisualizer.openLbr       import fragment
+from   openvisualizer.RPL           import RPL
+
+#============================ defines =========================================
+
+NUM_FRAMES        = 50000
+MOTEID            = 0x0001
+CHUNK_LENGTH      = 256
+
+#============================ helpers =========================================
+
+class counter(object):
+    
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.received = 0
+    
+    def receive(self,sender,signal,data):
+        with self.lock:
+            self.received += 1
+
+def cpuTime():
+    times = os.times()
+    return times[0]+times[1]
+
+def synthesize(filename,numFrames):
+    '''
+    Captures a stream of status frames of all kinds, as read in chunks from
+    a serial port.
+    '''
+    hdlc    = OpenHdlc.OpenHdlc()
+    frames  = []
+    for key in ParserStatus.ParserStatus().fieldsParsingKeys:
+        frames.append(hdlc.hdlcify(
+            chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_STATUS)+
+            struct.pack('<HB',MOTEID,key.val)+
+            struct.pack(key.structure,*range(len(key.fields)))
+        ))
+    stream  = ''.join([frames[i%len(frames)] for i in range(numFrames)])
+    writer  = serialCapture.CaptureWriter(filename,'synthesized',compress=True)
+    for i in range(0,len(stream),CHUNK_LENGTH):
+        writer.write(stream[i:i+CHUNK_LENGTH],now=writer.startTime+i/11520.0)
+    writer.close()
+
+def bench(filenames):
+    
+    # the stack behind the moteProbes
+    stack     = [openLbr.OpenLbr(),fragment.Fragment(),RPL.RPL()]
+    count     = counter()
+    probes    = []
+    states    = []
+    for filename in filenames:
+        probe = moteProbe.moteProbe(replayfile=filename,replaySpeed=0)
+        dispatcher.connect(
+            count.receive,
+            signal = 'fromMoteProbe@'+probe.getPortName(),
+            weak   = False,
+        )
+        states += [moteState.moteState(moteConnector.moteConnector(probe.getPortName()))]
+        probes += [probe]
+    
+    startCpu  = cpuTime()
+    start     = time.time()
+    for probe in probes:
+        probe.start()
+    for probe in probes:
+        probe.join()
+    duration  = time.time()-start
+    cpu       = cpuTime()-startCpu
+    
+    output    = []
+    output   += ['{0} capture files, {1} frames'.format(len(filenames),count.received)]
+    output   += ['- {0:.2f}s, {1:.0f} frames/s, {2:.1f}us CPU/frame'.format(
+        duration,
+        count.received/duration,
+        1e6*cpu/max(count.received,1),
+    )]
+    print '\n'.join(output)
+    sys.stdout.flush()
+    
+    # the moteConnectors and RPL keep threads running
+    os._exit(0)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    filenames = sys.argv[1:]
+    if not filenames:
+        filenames = [os.path.join(tempfile.mkdtemp(),'synthesized.ovcap.gz')]
+        synthesize(filenames[0],NUM_FRAMES)
+    bench(filenames)
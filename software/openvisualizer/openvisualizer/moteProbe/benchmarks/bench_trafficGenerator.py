@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+'''
+Load test of moteProbe, moteConnector, moteState, openLbr and RPL with the
+synthetic traffic of virtual motes.
+
+The motes, a moteProbe each, send status frames, notifications, and through
+the DAG root UDP packets and DAOs, at the given rates, for the given time.
+The benchmark reports the frames generated, dropped by the motes as their
+port was not read in time, and received, and the CPU time per frame. The
+DAOs printed by RPL are discarded.
+
+Usage: python bench_trafficGenerator.py [numMotes] [duration] [rates]
+with rates e.g. "status=1,notif=0.1,data=0.5,dao=0.05", per mote.
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteProbe/
+
+import time
+
+from   pydispatch import dispatcher
+
+import moteProbe
+import trafficGenerator
+from   openvisualizer.moteConnector import moteConnector
+from   openvisualizer.moteState     import moteState
+from   openvisualizer.openLbr       import openLbr
+from   openvisualizer.openLbr       import fragment
+from   openvisualizer.RPL           import RPL
+
+#============================ defines =========================================
+
+NUM_MOTES         = 100
+DURATION          = 10     # s
+
+#============================ helpers =========================================
+
+def cpuTime():
+    times = os.times()
+    return times[0]+times[1]
+
+def bench(numMotes,duration,rates):
+    
+    # the stack behind the moteProbes
+    stack     = [openLbr.OpenLbr(),fragment.Fragment(),RPL.RPL()]
+    dispatcher.send(sender='bench',signal='networkPrefix',data=trafficGenerator.PREFIX)
+    generator = trafficGenerator.TrafficGenerator(numMotes,rates=rates)
+    probes    = [moteProbe.moteProbe(emulatedMote=m) for m in generator.getMotes()]
+    states    = [moteState.moteState(moteConnector.moteConnector(p.getPortName())) for p in probes]
+    
+    stdout    = sys.stdout
+    sys.stdout= open(os.devnull,'w')
+    startCpu  = cpuTime()
+    generator.start()
+    time.sleep(duration)
+    for probe in probes:
+        probe.close()
+    generator.close()
+    cpu       = cpuTime()-startCpu
+    sys.stdout= stdout
+    
+    stats     = generator.getStats()
+    output    = []
+    output   += ['{0} motes, {1}'.format(numMotes,', '.join(['{0}={1}/s'.format(k,rates[k]) for k in trafficGenerator.KIND_ALL]))]
+    output   += ['- generated {0} frames in {1:.1f}s, {2:.0f} frames/s'.format(
+        stats['numGenerated'],
+        stats['duration'],
+        stats['offeredRate'],
+    )]
+    output   += ['- received  {0} frames, {1:.0f} frames/s, {2:.0f}B/s, {3:.1f}us CPU/frame ({4:.0f}% CPU)'.format(
+        stats['numReceived'],
+        stats['ingestRate'],
+        stats['bytesPerSec'],
+        1e6*cpu/max(stats['numReceived'],1),
+        100*cpu/stats['duration'],
+    )]
+    output   += ['- dropped   {0} frames ({1:.1f}%), lost {2}'.format(
+        stats['numDropped'],
+        100.0*stats['numDropped']/max(stats['numGenerated'],1),
+        stats['numLost'],
+    )]
+    print '\n'.join(output)
+    sys.stdout.flush()
+    
+    # the moteConnectors and RPL keep threads running
+    os._exit(0)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numMotes  = int(sys.argv[1]) if len(sys.argv)>1 else NUM_MOTES
+    duration  = float(sys.argv[2]) if len(sys.argv)>2 else DURATION
+    rates     = trafficGenerator.parseRates(sys.argv[3] if len(sys.argv)>3 else '')
+    bench(numMotes,duration,rates)
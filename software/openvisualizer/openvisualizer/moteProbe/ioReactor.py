@@ -0,0 +1,178 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+import logging
+log = logging.getLogger('ioReactor')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+import os
+if os.name=='posix':
+   import fcntl
+import sys
+import select
+import threading
+import errno
+
+import openvisualizer.openvisualizer_utils as u
+
+def setNonBlocking(fd):
+    '''
+    Makes reads from a file descriptor return what is available, instead of
+    waiting for input.
+    '''
+    if hasattr(fd,'setblocking'):
+        fd.setblocking(False)
+        return
+    if hasattr(fd,'fileno'):
+        fd = fd.fileno()
+    flags = fcntl.fcntl(fd,fcntl.F_GETFL)
+    fcntl.fcntl(fd,fcntl.F_SETFL,flags|os.O_NONBLOCK)
+
+def wouldBlock(err):
+    '''
+    :returns: True if an error only means there was nothing to read.
+    '''
+    return err.args and err.args[0] in [errno.EAGAIN,errno.EWOULDBLOCK]
+
+class ioReactor(threading.Thread):
+    '''
+    Single thread which waits for input on many file descriptors.
+    
+    Serial ports, TCP sockets and the TUN interface register a callback for
+    their file descriptor; the thread waits on all of them at once, with
+    epoll where available, and calls the callback of each descriptor which
+    has input. The callbacks run in this thread, they must not block.
+    
+    Registrations can be changed from any thread: the thread is woken up
+    through a pipe and picks them up. A descriptor whose callback raises is
+    unregistered, and its owner told through an error callback, e.g. to
+    reopen it.
+    '''
+    
+    READ_SIZE = 4096 # bytes read at once by the callbacks
+    
+    def __init__(self):
+        
+        # log
+        log.info("create instance")
+        
+        # local variables
+        self.dataLock             = threading.Lock()
+        self.callbacks            = {} # fd -> (callback,onError)
+        self.goOn                 = True
+        (self.wakeupRx,self.wakeupTx) = os.pipe()
+        if hasattr(select,'epoll'):
+            self.epoll            = select.epoll()
+            self.epoll.register(self.wakeupRx,select.EPOLLIN)
+        else:
+            self.epoll            = None
+        
+        # initialize the parent class
+        threading.Thread.__init__(self)
+        
+        # give this thread a name
+        self.name                 = 'ioReactor'
+        self.daemon               = True
+        
+        # start myself
+        self.start()
+    
+    #======================== thread ==========================================
+    
+    def run(self):
+        try:
+            # log
+            log.info("start running")
+            
+            while self.goOn:
+                for fd in self._wait():
+                    if fd==self.wakeupRx:
+                        os.read(self.wakeupRx,self.READ_SIZE)
+                        continue
+                    with self.dataLock:
+                        callbacks = self.callbacks.get(fd)
+                    if callbacks is None:
+                        # unregistered meanwhile
+                        continue
+                    (callback,onError) = callbacks
+                    try:
+                        callback()
+                    except Exception as err:
+                        # a failing port must not stop the others
+                        log.error("{0}: dropping fd {1} after {2}".format(self.name,fd,err))
+                        self.unregister(fd)
+                        if onError:
+                            try:
+                                onError(err)
+                            except Exception as err:
+                                log.error("{0}: error callback of fd {1} failed: {2}".format(self.name,fd,err))
+        except Exception as err:
+            errMsg=u.formatCrashMessage(self.name,err)
+            print errMsg
+            log.critical(errMsg)
+            sys.exit(-1)
+    
+    #======================== public ==========================================
+    
+    def register(self,fd,callback,onError=None):
+        '''
+        Call a function each time a file descriptor has input.
+        
+        :param fd:       [in] The file descriptor, or an object with a
+            ``fileno()`` method.
+        :param callback: [in] The function to call, without parameters. It
+            reads the input without blocking.
+        :param onError:  [in] The function to call, with the exception, when
+            the callback raised and the descriptor was unregistered.
+        '''
+        fd = self._fileno(fd)
+        with self.dataLock:
+            self.callbacks[fd] = (callback,onError)
+            if self.epoll:
+                self.epoll.register(fd,select.EPOLLIN)
+        self._wakeup()
+    
+    def unregister(self,fd):
+        fd = self._fileno(fd)
+        with self.dataLock:
+            if self.callbacks.pop(fd,None) is None:
+                return
+            if self.epoll:
+                try:
+                    self.epoll.unregister(fd)
+                except (IOError,OSError,ValueError):
+                    # already closed
+                    pass
+        self._wakeup()
+    
+    def close(self):
+        self.goOn = False
+        self._wakeup()
+    
+    #======================== private =========================================
+    
+    def _wait(self):
+        '''
+        :returns: The file descriptors which have input.
+        '''
+        while True:
+            try:
+                if self.epoll:
+                    return [fd for (fd,event) in self.epoll.poll()]
+                with self.dataLock:
+                    fds = [self.wakeupRx]+self.callbacks.keys()
+                return select.select(fds,[],[])[0]
+            except (IOError,OSError,select.error) as err:
+                if err.args[0]!=errno.EINTR:
+                    raise
+    
+    def _wakeup(self):
+        os.write(self.wakeupTx,'w')
+    
+    def _fileno(self,fd):
+        if hasattr(fd,'fileno'):
+            return fd.fileno()
+        return fd
@@ -15,6 +15,8 @@ elif os.name=='posix':  # Linux
    import glob
    import platform      # To recognize MAC OS X
 import threading
+import collections
+import bisect
 
 import serial
 import socket
@@ -23,6 +25,8 @@ import sys
 
 from   pydispatch import dispatcher
 import OpenHdlc
+import ioReactor
+import serialCapture
 import openvisualizer.openvisualizer_utils as u
 from   openvisualizer.moteConnector import OpenParser
 
@@ -76,27 +80,79 @@ class moteProbe(threading.Thread):
     MODE_SERIAL    = 'serial'
     MODE_EMULATED  = 'emulated'
     MODE_IOTLAB    = 'IoT-LAB'
+    MODE_REPLAY    = 'replay'
     MODE_ALL       = [
         MODE_SERIAL,
         MODE_EMULATED,
         MODE_IOTLAB,
+        MODE_REPLAY,
     ]
     
-    def __init__(self,serialport=None,emulatedMote=None,iotlabmote=None):
+    PRIORITY_COMMAND = 0
+    PRIORITY_DATA    = 1
+    PRIORITY_ALL     = [
+        PRIORITY_COMMAND,
+        PRIORITY_DATA,
+    ]
+    
+    # frames which go ahead of the data in the output queue
+    COMMAND_FRAMES   = [
+        chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_SETDAGROOT),
+        chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_COMMAND_GD),
+    ]
+    
+    # upper bounds of the histogram of the time frames wait in the output
+    # queue, in seconds; the last bucket counts the longer waits
+    WAIT_BUCKETS     = [0.001,0.002,0.005,0.01,0.02,0.05,0.1,0.2,0.5,1,2,5]
+    
+    RECONNECT_DELAY  = 1 # seconds before reopening a port which failed
+    
+    def __init__(self,serialport=None,emulatedMote=None,iotlabmote=None,framesPerRequest=1,reactor=None,
+            replayfile=None,replaySpeed=1.0,capturefile=None):
+        '''
+        :param framesPerRequest: [in] Maximum number of queued frames written
+            at once when the mote requests data. Only set it above 1 for
+            motes which buffer that many frames from the serial port.
+        :param reactor:          [in] The :class:`ioReactor.ioReactor` which
+            reads the serial port or IoT-LAB socket, instead of a thread of
+            this moteProbe. Emulated motes always use their own thread. As
+            with a thread, a port which fails, or cannot be opened at
+            creation, is reopened every :data:`RECONNECT_DELAY` seconds until
+            it succeeds.
+        :param replayfile:       [in] A file written by ``capturefile``, whose
+            bytes are handed to the deframer as if read from the port. The
+            replay starts when :meth:`start` is called, once the components
+            listening to the port are created.
+        :param replaySpeed:      [in] The pace of the replay, relative to the
+            capture: 1 for the original pace, 10 for ten times faster, 0 for
+            as fast as possible.
+        :param capturefile:      [in] A file to record the bytes read from the
+            port in, see :mod:`serialCapture`. Compressed if the name ends
+            with ``.gz``.
+        '''
         
         # verify params
         if   serialport:
             assert not emulatedMote
             assert not iotlabmote
+            assert not replayfile
             self.mode             = self.MODE_SERIAL
         elif emulatedMote:
             assert not serialport
             assert not iotlabmote
+            assert not replayfile
             self.mode             = self.MODE_EMULATED
         elif iotlabmote:
             assert not serialport
             assert not emulatedMote
+            assert not replayfile
             self.mode             = self.MODE_IOTLAB
+        elif replayfile:
+            assert not serialport
+            assert not emulatedMote
+            assert not iotlabmote
+            assert replaySpeed>=0
+            self.mode             = self.MODE_REPLAY
         else:
             raise SystemError()
         
@@ -111,6 +167,10 @@ class moteProbe(threading.Thread):
         elif self.mode==self.MODE_IOTLAB:
             self.iotlabmote       = iotlabmote
             self.portname         = 'IoT-LAB{0}'.format(iotlabmote)
+        elif self.mode==self.MODE_REPLAY:
+            self.replayReader     = serialCapture.CaptureReader(replayfile)
+            self.replaySpeed      = replaySpeed
+            self.portname         = 'replay-{0}'.format(self.replayReader.portname)
         else:
             raise SystemError()
         
@@ -122,14 +182,33 @@ class moteProbe(threading.Thread):
         
         # local variables
         self.hdlc                 = OpenHdlc.OpenHdlc()
-        self.lastRxByte           = self.hdlc.HDLC_FLAG
-        self.busyReceiving        = False
-        self.inputBuf             = ''
-        self.outputBuf            = []
+        self.framesPerRequest     = framesPerRequest
+        self.outputBuf            = [collections.deque() for p in self.PRIORITY_ALL] # (queued time,hdlcData) per priority
         self.outputBufLock        = threading.RLock()
+        self.outputStats          = {
+            'numQueued':     0,
+            'numWritten':    0,
+            'numWrites':     0,
+            'numBytes':      0,
+            'maxDepth':      0,
+            'waitTotal':     0.0,
+            'waitMax':       0.0,
+        }
+        self.waitHistogram        = [0]*(len(self.WAIT_BUCKETS)+1)
+        self.numRequests          = 0
         self.dataLock             = threading.Lock()
+        if capturefile:
+            self.capture          = serialCapture.CaptureWriter(
+                capturefile,
+                self.portname,
+                compress          = capturefile.endswith('.gz'),
+            )
+        else:
+            self.capture          = None
         # flag to permit exit from read loop
         self.goOn                 = True
+        self.reconnectTimer       = None
+        self.numReconnects        = 0
         
         # initialize the parent class
         threading.Thread.__init__(self)
@@ -137,7 +216,10 @@ class moteProbe(threading.Thread):
         # give this thread a name
         self.name                 = 'moteProbe@'+self.portname
         
-        if self.mode in [self.MODE_EMULATED,self.MODE_IOTLAB]:
+        # deframes whatever chunks are read from the port
+        self.deframer             = OpenHdlc.OpenHdlcDeframer(self.name)
+        
+        if self.mode in [self.MODE_EMULATED,self.MODE_IOTLAB,self.MODE_REPLAY]:
             # Non-daemonized moteProbe does not consistently die on close(),
             # so ensure moteProbe does not persist.
             self.daemon           = True
@@ -148,8 +230,27 @@ class moteProbe(threading.Thread):
             signal = 'fromMoteConnector@'+self.portname,
         )
     
-        # start myself
-        self.start()
+        if reactor and self.mode in [self.MODE_SERIAL,self.MODE_IOTLAB]:
+            # the reactor reads the port
+            self.reactor          = reactor
+            self.serial           = None
+            self.fd               = None
+            try:
+                self._openPort()
+                self._registerPort()
+            except Exception as err:
+                # e.g. a busy serial port, the other ports start anyway
+                print err
+                log.warning("{0}: could not open port ({1})".format(self.name,err))
+                self._closePort()
+                self._scheduleReopen()
+        elif self.mode==self.MODE_REPLAY:
+            # started by the caller
+            self.reactor          = None
+        else:
+            self.reactor          = None
+            # start myself
+            self.start()
     
     #======================== thread ==========================================
     
@@ -157,30 +258,22 @@ class moteProbe(threading.Thread):
         try:
             # log
             log.info("start running")
+            
+            if self.mode==self.MODE_REPLAY:
+                self._replay()
+                return
         
             while self.goOn:     # open serial port
                 
-                # log 
-                log.info("open port {0}".format(self.portname))
-                
-                if   self.mode==self.MODE_SERIAL:
-                    self.serial = serial.Serial(self.serialport,self.baudrate)
-                    self.serial.setDTR(0)
-                    self.serial.setRTS(0)
-                elif self.mode==self.MODE_EMULATED:
-                    self.serial = self.emulatedMote.bspUart
-                elif self.mode==self.MODE_IOTLAB:
-                    self.serial = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-                    self.serial.connect((self.iotlabmote,20000))
-                else:
-                    raise SystemError()
+                self._openPort()
                 
                 while self.goOn: # read bytes from serial port
                     try:
                         if   self.mode==self.MODE_SERIAL:
-                            rxBytes = self.serial.read(1)
+                            # block for one byte, then drain what is waiting
+                            rxBytes = self.serial.read(self.serial.inWaiting() or 1)
                         elif self.mode==self.MODE_EMULATED:
-                            rxBytes = self.serial.read()
+                            rxBytes = ''.join(self.serial.read())
                         elif self.mode==self.MODE_IOTLAB:
                             rxBytes = self.serial.recv(1024)
                         else:
@@ -191,57 +284,7 @@ class moteProbe(threading.Thread):
                         time.sleep(1)
                         break
                     else:
-                        for rxByte in rxBytes:
-                            if      (
-                                        (not self.busyReceiving)             and 
-                                        self.lastRxByte==self.hdlc.HDLC_FLAG and
-                                        rxByte!=self.hdlc.HDLC_FLAG
-                                    ):
-                                # start of frame
-                                if log.isEnabledFor(logging.DEBUG):
-                                    log.debug("{0}: start of hdlc frame {1} {2}".format(self.name, u.formatStringBuf(self.hdlc.HDLC_FLAG), u.formatStringBuf(rxByte)))
-                                self.busyReceiving       = True
-                                self.inputBuf            = self.hdlc.HDLC_FLAG
-                                self.inputBuf           += rxByte
-                            elif    (
-                                        self.busyReceiving                   and
-                                        rxByte!=self.hdlc.HDLC_FLAG
-                                    ):
-                                # middle of frame
-                                
-                                self.inputBuf           += rxByte
-                            elif    (
-                                        self.busyReceiving                   and
-                                        rxByte==self.hdlc.HDLC_FLAG
-                                    ):
-                                # end of frame
-                                if log.isEnabledFor(logging.DEBUG):
-                                    log.debug("{0}: end of hdlc frame {1} ".format(self.name, u.formatStringBuf(rxByte)))
-                                self.busyReceiving       = False
-                                self.inputBuf           += rxByte
-                                
-                                try:
-                                    tempBuf = self.inputBuf
-                                    self.inputBuf        = self.hdlc.dehdlcify(self.inputBuf)
-                                    if log.isEnabledFor(logging.DEBUG):
-                                        log.debug("{0}: {2} dehdlcized input: {1}".format(self.name, u.formatStringBuf(self.inputBuf), u.formatStringBuf(tempBuf)))
-                                except OpenHdlc.HdlcException as err:
-                                    log.warning('{0}: invalid serial frame: {2} {1}'.format(self.name, err, u.formatStringBuf(tempBuf)))
-                                else:
-                                    if self.inputBuf==chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_REQUEST):
-                                        with self.outputBufLock:
-                                            if self.outputBuf:
-                                                outputToWrite = self.outputBuf.pop(0)
-                                                self.serial.write(outputToWrite)
-                                    else:
-                                        # dispatch
-                                        dispatcher.send(
-                                            sender        = self.name,
-                                            signal        = 'fromMoteProbe@'+self.portname,
-                                            data          = [ord(c) for c in self.inputBuf],
-                                        )
-                            
-                            self.lastRxByte = rxByte
+                        self._feed(rxBytes)
                         
                     if self.mode==self.MODE_EMULATED:
                         self.serial.doneReading()
@@ -262,19 +305,234 @@ class moteProbe(threading.Thread):
             return self.baudrate
     
     def close(self):
-        self.goOn = False
+        with self.dataLock:
+            self.goOn = False
+            if self.reconnectTimer:
+                self.reconnectTimer.cancel()
+        if self.reactor:
+            if self.fd is not None:
+                self.reactor.unregister(self.fd)
+            self._closePort()
+        if self.capture:
+            self.capture.close()
+    
+    def getOutputStats(self):
+        '''
+        Returns the counters of the output queue.
+        
+        :returns: A dictionary with the number of frames queued and written,
+            the number of writes to the port and bytes written, the current
+            and maximum number of frames waiting, the total and maximum time,
+            in seconds, frames waited in the queue before being written, and
+            the histogram of that time, as the list of upper bounds of its
+            buckets and the list of counts, with one more bucket for the
+            longer waits.
+        '''
+        with self.outputBufLock:
+            returnVal = dict(self.outputStats)
+            returnVal['depth'] = sum([len(q) for q in self.outputBuf])
+            returnVal['waitBuckets']   = list(self.WAIT_BUCKETS)
+            returnVal['waitHistogram'] = list(self.waitHistogram)
+        return returnVal
+    
+    def getInputStats(self):
+        '''
+        Returns the counters of the input, see
+        :meth:`OpenHdlc.OpenHdlcDeframer.getStats`, with the number of
+        requests for data among the frames.
+        '''
+        returnVal = self.deframer.getStats()
+        returnVal['numRequests']   = self.numRequests
+        returnVal['numReconnects'] = self.numReconnects
+        return returnVal
+    
+    def getStats(self):
+        '''
+        Returns a snapshot of the counters of the port.
+        
+        :returns: A dictionary with the name of the port, and the counters
+            of the input and output.
+        '''
+        return {
+            'portname':      self.getPortName(),
+            'input':         self.getInputStats(),
+            'output':        self.getOutputStats(),
+        }
     
     #======================== private =========================================
     
+    def _openPort(self):
+        
+        # log
+        log.info("open port {0}".format(self.portname))
+        
+        if   self.mode==self.MODE_SERIAL:
+            self.serial = serial.Serial(self.serialport,self.baudrate)
+            try:
+                self.serial.setDTR(0)
+                self.serial.setRTS(0)
+            except IOError as err:
+                # e.g. a pseudo-terminal, without modem control lines
+                log.warning("{0}: could not clear DTR/RTS ({1})".format(self.name,err))
+        elif self.mode==self.MODE_EMULATED:
+            self.serial = self.emulatedMote.bspUart
+        elif self.mode==self.MODE_IOTLAB:
+            self.serial = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+            self.serial.connect((self.iotlabmote,20000))
+        else:
+            raise SystemError()
+    
+    def _registerPort(self):
+        ioReactor.setNonBlocking(self.serial)
+        self.fd = self.serial.fileno()
+        self.reactor.register(self.fd,self._readReady,self._portFailed)
+    
+    def _portFailed(self,err):
+        '''
+        Called by the reactor when reading the port failed, e.g. the mote was
+        unplugged or the IoT-LAB socket closed; the port is reopened later.
+        '''
+        print err
+        log.warning(err)
+        self._closePort()
+        self._scheduleReopen()
+    
+    def _closePort(self):
+        if self.serial is None:
+            return
+        try:
+            self.serial.close()
+        except Exception as err:
+            log.warning("{0}: could not close port ({1})".format(self.name,err))
+    
+    def _scheduleReopen(self):
+        with self.dataLock:
+            if not self.goOn:
+                return
+            self.reconnectTimer        = threading.Timer(self.RECONNECT_DELAY,self._reopenPort)
+            self.reconnectTimer.daemon = True
+            self.reconnectTimer.start()
+    
+    def _reopenPort(self):
+        if not self.goOn:
+            return
+        try:
+            self._openPort()
+            self._registerPort()
+        except Exception as err:
+            log.warning("{0}: could not reopen port ({1})".format(self.name,err))
+            self._closePort()
+            self._scheduleReopen()
+            return
+        self.numReconnects += 1
+        if not self.goOn:
+            # closed meanwhile
+            self.reactor.unregister(self.fd)
+            self.serial.close()
+    
+    def _readReady(self):
+        '''
+        Called by the reactor when the port has input, which is read without
+        blocking.
+        '''
+        try:
+            if self.mode==self.MODE_SERIAL:
+                rxBytes = os.read(self.serial.fileno(),ioReactor.ioReactor.READ_SIZE)
+            else:
+                rxBytes = self.serial.recv(ioReactor.ioReactor.READ_SIZE)
+        except (IOError,OSError,socket.error) as err:
+            if ioReactor.wouldBlock(err):
+                return
+            raise
+        if not rxBytes:
+            # the reactor stops reading the port
+            raise IOError('{0} closed'.format(self.portname))
+        self._feed(rxBytes)
+    
+    def _replay(self):
+        '''
+        Hands the chunks of the replayed file to the deframer, at the pace
+        they were captured divided by replaySpeed. The thread ends with the
+        file.
+        '''
+        start = time.time()
+        for (offset,chunk) in self.replayReader:
+            if not self.goOn:
+                break
+            if self.replaySpeed:
+                wait = start+offset/self.replaySpeed-time.time()
+                if wait>0:
+                    time.sleep(wait)
+            self._feed(chunk)
+        self.replayReader.close()
+        
+        # log
+        log.info("{0}: end of replay".format(self.name))
+    
+    def _feed(self,rxBytes):
+        if self.capture:
+            self.capture.write(rxBytes)
+        for frame in self.deframer.feed(rxBytes):
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("{0}: dehdlcized input: {1}".format(self.name, u.formatStringBuf(frame)))
+            self._handleFrame(frame)
+    
+    def _handleFrame(self,frame):
+        if frame==chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_REQUEST):
+            self.numRequests += 1
+            self._writeQueued()
+        else:
+            # dispatch
+            dispatcher.send(
+                sender        = self.name,
+                signal        = 'fromMoteProbe@'+self.portname,
+                data          = u.BytePacket(frame),
+            )
+    
     def _bufferDataToSend(self,data):
         
-        # abort for IoT-LAB
-        if self.mode==self.MODE_IOTLAB:
+        # abort for IoT-LAB, and for replayed ports, which have no mote
+        if self.mode in [self.MODE_IOTLAB,self.MODE_REPLAY]:
             return
         
         # frame with HDLC
         hdlcData = self.hdlc.hdlcify(data)
         
+        # commands go ahead of data
+        if data[:1] in self.COMMAND_FRAMES:
+            priority = self.PRIORITY_COMMAND
+        else:
+            priority = self.PRIORITY_DATA
+        
         # add to outputBuf
         with self.outputBufLock:
-            self.outputBuf += [hdlcData]
+            self.outputBuf[priority].append((time.time(),hdlcData))
+            self.outputStats['numQueued'] += 1
+            depth = sum([len(q) for q in self.outputBuf])
+            if depth>self.outputStats['maxDepth']:
+                self.outputStats['maxDepth'] = depth
+
+    def _writeQueued(self):
+        '''
+        Writes the next queued frames, highest priority first, in a single
+        write to the port.
+        '''
+        with self.outputBufLock:
+            now    = time.time()
+            frames = []
+            for queue in self.outputBuf:
+                while queue and len(frames)<self.framesPerRequest:
+                    (queued,hdlcData) = queue.popleft()
+                    frames += [hdlcData]
+                    wait    = now-queued
+                    self.outputStats['waitTotal'] += wait
+                    if wait>self.outputStats['waitMax']:
+                        self.outputStats['waitMax'] = wait
+                    self.waitHistogram[bisect.bisect_left(self.WAIT_BUCKETS,wait)] += 1
+            if not frames:
+                return
+            data   = ''.join(frames)
+            self.serial.write(data)
+            self.outputStats['numWritten'] += len(frames)
+            self.outputStats['numWrites']  += 1
+            self.outputStats['numBytes']   += len(data)
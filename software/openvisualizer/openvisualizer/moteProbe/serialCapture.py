@@ -0,0 +1,150 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+'''
+Capture of the raw bytes received on a serial port, to replay them later.
+
+A capture file starts with a header, followed by one record per chunk of
+bytes read from the port::
+
+    header: 'OVCAPTUR' | version (1B) | start time (8B double, seconds since
+            the epoch) | port name length (2B) | port name
+    record: time since start (8B, in us) | chunk length (2B) | chunk
+
+All fields are big-endian. A file written compressed is a gzip stream of the
+same content; the reader recognizes it by its magic bytes.
+'''
+import logging
+log = logging.getLogger('serialCapture')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+import gzip
+import struct
+import threading
+import time
+
+MAGIC          = 'OVCAPTUR'
+VERSION        = 1
+GZIP_MAGIC     = '\x1f\x8b'
+
+HEADER         = struct.Struct('>8sBdH') # magic, version, start time, name length
+RECORD         = struct.Struct('>QH')    # time since start (us), chunk length
+MAX_CHUNK      = 0xffff
+
+class CaptureException(Exception):
+    pass
+
+class CaptureWriter(object):
+    '''
+    Appends the chunks read from a port to a capture file.
+    '''
+    
+    def __init__(self,filename,portname,compress=False):
+        '''
+        :param filename: [in] The path of the capture file, overwritten.
+        :param portname: [in] The name of the captured port, stored in the
+            header.
+        :param compress: [in] Write the file through gzip.
+        '''
+        
+        # log
+        log.info("capturing {0} to {1}".format(portname,filename))
+        
+        # store params
+        self.filename        = filename
+        self.portname        = portname
+        
+        # local variables
+        self.dataLock        = threading.Lock()
+        self.startTime       = time.time()
+        self.numChunks       = 0
+        self.numBytes        = 0
+        if compress:
+            self.file        = gzip.open(filename,'wb')
+        else:
+            self.file        = open(filename,'wb')
+        self.file.write(HEADER.pack(MAGIC,VERSION,self.startTime,len(portname))+portname)
+    
+    #======================== public ==========================================
+    
+    def write(self,chunk,now=None):
+        '''
+        :param chunk: [in] The bytes read from the port, as a string.
+        :param now:   [in] The time the chunk was read, by default now.
+        '''
+        if now is None:
+            now = time.time()
+        offset = max(int((now-self.startTime)*1000000),0)
+        with self.dataLock:
+            if self.file is None:
+                return
+            for i in range(0,len(chunk),MAX_CHUNK):
+                piece = chunk[i:i+MAX_CHUNK]
+                self.file.write(RECORD.pack(offset,len(piece))+piece)
+                self.numChunks += 1
+            self.numBytes      += len(chunk)
+    
+    def close(self):
+        with self.dataLock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+        log.info("captured {0} bytes in {1} chunks to {2}".format(self.numBytes,self.numChunks,self.filename))
+
+class CaptureReader(object):
+    '''
+    Reads back a capture file, compressed or not.
+    '''
+    
+    def __init__(self,filename):
+        
+        # store params
+        self.filename        = filename
+        
+        # detect compression
+        with open(filename,'rb') as f:
+            compressed       = f.read(len(GZIP_MAGIC))==GZIP_MAGIC
+        if compressed:
+            self.file        = gzip.open(filename,'rb')
+        else:
+            self.file        = open(filename,'rb')
+        
+        # read header
+        header               = self.file.read(HEADER.size)
+        if len(header)<HEADER.size:
+            raise CaptureException('{0}: truncated header'.format(filename))
+        (magic,version,self.startTime,nameLen) = HEADER.unpack(header)
+        if magic!=MAGIC:
+            raise CaptureException('{0}: not a capture file'.format(filename))
+        if version!=VERSION:
+            raise CaptureException('{0}: unsupported version {1}'.format(filename,version))
+        self.portname        = self.file.read(nameLen)
+    
+    #======================== public ==========================================
+    
+    def __iter__(self):
+        '''
+        Yields ``(offset,chunk)`` tuples, offset being the time, in seconds,
+        the chunk was read after the start of the capture. A truncated last
+        record, e.g. when the capture was not closed, ends the iteration.
+        '''
+        read   = self.file.read
+        unpack = RECORD.unpack
+        size   = RECORD.size
+        while True:
+            record = read(size)
+            if len(record)<size:
+                break
+            (offset,length) = unpack(record)
+            chunk  = read(length)
+            if len(chunk)<length:
+                log.warning('{0}: truncated last record'.format(self.filename))
+                break
+            yield (offset/1000000.0,chunk)
+    
+    def close(self):
+        self.file.close()
@@ -0,0 +1,505 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+'''
+Synthetic traffic of virtual motes, to load the serial ingestion pipeline.
+
+A :class:`TrafficGenerator` creates virtual motes which a moteProbe reads the
+way it reads emulated motes, i.e. ``moteProbe.moteProbe(emulatedMote=mote)``.
+Each mote writes HDLC frames to its port, at the configured rates:
+
+- status frames of all kinds in turn, as parsed by ParserStatus;
+- info, error and critical notifications;
+- on the port of the DAG root, the first mote, the data frames of the other
+  motes: UDP packets to the host, and DAOs. The motes form a binary tree
+  under the DAG root; motes one hop away send IPHC-compressed packets,
+  deeper motes packets with the 6LoRH RPI and IP-in-IP headers.
+
+A mote holds at most ``uartBuffer`` bytes for the computer: the frames it
+generates beyond, when its port is not read fast enough, are dropped.
+'''
+import logging
+log = logging.getLogger('trafficGenerator')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+import heapq
+import random
+import threading
+import time
+
+from   pydispatch import dispatcher
+
+import OpenHdlc
+import openvisualizer.openvisualizer_utils as u
+from   openvisualizer.moteConnector import OpenParser
+from   openvisualizer.moteConnector import ParserStatus
+from   openvisualizer.moteConnector import SerialFrames
+from   openvisualizer.moteConnector import StackDefines
+
+#============================ defines =========================================
+
+KIND_STATUS        = 'status'
+KIND_NOTIF         = 'notif'
+KIND_DATA          = 'data'
+KIND_DAO           = 'dao'
+KIND_ALL           = [
+    KIND_STATUS,
+    KIND_NOTIF,
+    KIND_DATA,
+    KIND_DAO,
+]
+
+# frames per second of each mote
+DFLT_RATES         = {
+    KIND_STATUS:   1.0,
+    KIND_NOTIF:    0.1,
+    KIND_DATA:     0.5,
+    KIND_DAO:      0.05,
+}
+
+UART_BUFFER        = 4096   # bytes a mote holds for the computer
+NUM_VARIANTS       = 16     # different frames of each kind, in turn
+MAX_WAIT           = 0.1    # s, between checks of close() when idle
+
+PREFIX             = [0xbb,0xbb,0x00,0x00,0x00,0x00,0x00,0x00]
+HOST_IID           = [0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x01]
+EUI64_PREFIX       = [0x14,0x15,0x92,0xcc,0x00,0x00]
+PANID              = [0xca,0xfe]
+MINHOPRANKINCREASE = 256
+
+UDP_SRC_PORT       = 0xf0b1
+UDP_DST_PORT       = 0xf0b2
+DATA_LENGTH        = 40     # bytes of UDP payload
+
+SERFRAME_DATA      = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_DATA)
+SERFRAME_STATUS    = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_STATUS)
+NOTIF_SEVERITIES   = [
+    chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_INFO),
+    chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_INFO),
+    chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_ERROR),
+    chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_INFO),
+    chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_ERROR),
+    chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_CRITICAL),
+]
+
+#=== 6LoWPAN (RFC6282, RFC8138)
+
+IANA_UDP           = 17
+IANA_ICMPv6        = 58
+PAGE_ONE_DISPATCH  = 0xf1
+RPI_6LoRH          = [0x80,0x05]  # critical, flags 0, RPI type
+IPINIP_6LoRH       = [0xa9,0x06]  # elective, length 9, IP-in-IP type
+IPHC_NH_COMPRESSED = [0x7e]       # TF elided, next header compressed, hop limit 64
+IPHC_NH_INLINE     = [0x7a]       # TF elided, next header inline, hop limit 64
+IPHC_SAM_64B       = 0x10
+IPHC_SAM_ELIDED    = 0x30
+IPHC_DAM_64B       = 0x01
+IPHC_DAM_ELIDED    = 0x03
+NHC_UDP            = [0xf0]       # ports and checksum inline
+HOP_LIMIT          = 64
+
+#=== RPL DAO (RFC6550)
+
+ICMPv6_RPL_TYPE    = 155
+ICMPv6_RPL_DAO     = 0x02
+DAO_D_FLAG         = 0x40
+TARGET_OPTION      = 0x05
+TRANSIT_OPTION     = 0x06
+PATH_LIFETIME      = 0xaa
+
+def parseRates(text):
+    '''
+    Parses per-mote rates given as text, e.g. ``status=2,data=0.5``.
+    
+    :param text: [in] Comma-separated ``kind=rate`` items, kind being one of
+        :data:`KIND_ALL` and rate the frames per second of each mote.
+    :returns: A dictionary of rates, the default ones for the kinds not
+        given.
+    :raises ValueError: if an item is not a known kind and a rate.
+    '''
+    rates = dict(DFLT_RATES)
+    for item in [i for i in text.split(',') if i.strip()]:
+        try:
+            (kind,rate) = item.split('=')
+            rate        = float(rate)
+        except ValueError:
+            raise ValueError('invalid rate "{0}"'.format(item))
+        kind = kind.strip()
+        if kind not in KIND_ALL or rate<0:
+            raise ValueError('invalid rate "{0}"'.format(item))
+        rates[kind] = rate
+    return rates
+
+#============================ classes =========================================
+
+class VirtualUart(object):
+    '''
+    The serial port of a virtual mote, read by a moteProbe.
+    
+    Each source of frames has a rate; a read blocks until the next frame is
+    due, and returns all the frames due since the previous read.
+    '''
+    
+    def __init__(self,uartBuffer):
+        
+        # store params
+        self.uartBuffer      = uartBuffer
+        
+        # local variables
+        self.sources         = [] # [period,frames,index,offset] per source
+        self.schedule        = [] # heap of (due time,source index)
+        self.goOn            = True
+        self.dataLock        = threading.Lock()
+        self.stats           = {
+            'numGenerated':  0,
+            'numDropped':    0,
+            'numBytes':      0,
+            'numReads':      0,
+            'numWritten':    0,
+        }
+    
+    #======================== public ==========================================
+    
+    def addSource(self,rate,frames,offset):
+        '''
+        :param rate:   [in] The frames per second; no frames when 0.
+        :param frames: [in] The HDLC frames sent in turn.
+        :param offset: [in] When the first frame is due, as a fraction of
+            the period.
+        '''
+        if rate>0:
+            self.sources.append([1.0/rate,frames,0,offset])
+    
+    def start(self,startTime):
+        schedule = [(startTime+s[0]*s[3],i) for (i,s) in enumerate(self.sources)]
+        heapq.heapify(schedule)
+        self.schedule = schedule
+    
+    def close(self):
+        self.goOn = False
+    
+    def read(self):
+        
+        # wait for the next frame
+        while self.goOn:
+            if self.schedule:
+                wait = self.schedule[0][0]-time.time()
+            else:
+                wait = MAX_WAIT
+            if wait<=0:
+                break
+            time.sleep(min(wait,MAX_WAIT))
+        if not self.goOn:
+            return []
+        
+        # the frames due, up to what the mote holds
+        now       = time.time()
+        schedule  = self.schedule
+        frames    = []
+        size      = 0
+        generated = 0
+        dropped   = 0
+        while schedule and schedule[0][0]<=now:
+            (due,i)   = schedule[0]
+            source    = self.sources[i]
+            frame     = source[1][source[2]%len(source[1])]
+            source[2]+= 1
+            generated+= 1
+            if size+len(frame)<=self.uartBuffer:
+                frames.append(frame)
+                size += len(frame)
+            else:
+                dropped += 1
+            heapq.heapreplace(schedule,(due+source[0],i))
+        
+        with self.dataLock:
+            self.stats['numGenerated'] += generated
+            self.stats['numDropped']   += dropped
+            self.stats['numBytes']     += size
+            self.stats['numReads']     += 1
+        
+        return [''.join(frames)]
+    
+    def write(self,data):
+        with self.dataLock:
+            self.stats['numWritten']   += len(data)
+    
+    def doneReading(self):
+        pass
+    
+    def getStats(self):
+        with self.dataLock:
+            return dict(self.stats)
+
+class VirtualMote(object):
+    '''
+    A mote, as seen by a moteProbe in emulated mode.
+    '''
+    
+    def __init__(self,moteId,uartBuffer):
+        self.moteId          = moteId
+        self.eui64           = EUI64_PREFIX+[moteId>>8,moteId&0xff]
+        self.parent          = moteId//2 # 0 for the DAG root
+        self.depth           = 0
+        while moteId>1:
+            moteId         //= 2
+            self.depth      += 1
+        self.rank            = MINHOPRANKINCREASE*(self.depth+1)
+        self.bspUart         = VirtualUart(uartBuffer)
+    
+    def getId(self):
+        return self.moteId
+
+class TrafficGenerator(object):
+    '''
+    Generates the serial traffic of a network of virtual motes.
+    '''
+    
+    def __init__(self,numMotes,rates=None,uartBuffer=UART_BUFFER,prefix=PREFIX):
+        '''
+        :param numMotes:   [in] The number of virtual motes, the first one
+            being the DAG root.
+        :param rates:      [in] The frames per second of each kind, for all
+            motes, or a list with the rates of each mote. The kinds not given
+            take the rates of :data:`DFLT_RATES`.
+        :param uartBuffer: [in] The bytes a mote holds for the computer.
+        :param prefix:     [in] The network prefix, as a list of 8 bytes.
+        '''
+        assert numMotes>=1
+        if rates is None:
+            rates = {}
+        if isinstance(rates,dict):
+            rates = [rates]*numMotes
+        assert len(rates)==numMotes
+        
+        # store params
+        self.numMotes        = numMotes
+        self.rates           = []
+        for r in rates:
+            assert set(r)<=set(KIND_ALL)
+            self.rates      += [dict(DFLT_RATES,**r)]
+        self.prefix          = prefix
+        
+        # local variables
+        self.hdlc            = OpenHdlc.OpenHdlc()
+        self.motes           = [VirtualMote(i+1,uartBuffer) for i in range(numMotes)]
+        self.dataLock        = threading.Lock()
+        self.numReceived     = 0
+        self.startTime       = None
+        self.stopTime        = None
+        
+        # IdManager first, to announce the DAG root
+        self.statusKeys      = sorted(
+            ParserStatus.ParserStatus().fieldsParsingKeys,
+            key = lambda k: k.name!='IdManager',
+        )
+        
+        # sources of frames, spread over their period
+        root                 = self.motes[0]
+        for mote in self.motes:
+            rand             = random.Random(mote.moteId)
+            moteRates        = self.rates[mote.moteId-1]
+            mote.bspUart.addSource(moteRates[KIND_STATUS],self._statusFrames(mote),0)
+            mote.bspUart.addSource(moteRates[KIND_NOTIF],self._notifFrames(mote),rand.random())
+            if mote is not root:
+                root.bspUart.addSource(moteRates[KIND_DATA],self._dataFrames(mote),rand.random())
+                root.bspUart.addSource(moteRates[KIND_DAO],self._daoFrames(mote),rand.random())
+        
+        # log
+        log.info("created {0} virtual motes".format(numMotes))
+    
+    #======================== public ==========================================
+    
+    def getMotes(self):
+        '''
+        :returns: The virtual motes, to hand to moteProbes as emulated motes.
+        '''
+        return self.motes
+    
+    def start(self):
+        '''
+        Starts generating frames; call it once the moteProbes of the motes,
+        and the components listening to them, are created.
+        '''
+        for mote in self.motes:
+            dispatcher.connect(
+                self._received,
+                signal = 'fromMoteProbe@emulated{0}'.format(mote.getId()),
+                weak   = False,
+            )
+        with self.dataLock:
+            self.startTime = time.time()
+        for mote in self.motes:
+            mote.bspUart.start(self.startTime)
+    
+    def close(self):
+        '''
+        Stops generating frames; call it once the moteProbes are closed.
+        '''
+        with self.dataLock:
+            if self.startTime is not None and self.stopTime is None:
+                self.stopTime = time.time()
+        for mote in self.motes:
+            mote.bspUart.close()
+            dispatcher.disconnect(
+                self._received,
+                signal = 'fromMoteProbe@emulated{0}'.format(mote.getId()),
+                weak   = False,
+            )
+        
+        # log
+        log.info("closed: {0}".format(self.getStats()))
+    
+    def getStats(self):
+        '''
+        Returns the counters of the generated traffic.
+        
+        :returns: A dictionary with the number of motes; the time, in
+            seconds, since the start; the number of frames generated, dropped
+            by the motes as their port was not read fast enough, received by
+            the moteProbes, and neither, i.e. lost or being deframed; the
+            bytes the moteProbes read; and the frames per second generated
+            and received, and bytes per second read.
+        '''
+        stats = dict.fromkeys(['numGenerated','numDropped','numBytes','numReads','numWritten'],0)
+        for mote in self.motes:
+            for (k,v) in mote.bspUart.getStats().items():
+                stats[k] += v
+        with self.dataLock:
+            stats['numReceived'] = self.numReceived
+            if self.startTime is None:
+                duration         = 0.0
+            else:
+                duration         = (self.stopTime or time.time())-self.startTime
+        stats['numMotes']        = self.numMotes
+        stats['duration']        = duration
+        stats['numLost']         = stats['numGenerated']-stats['numDropped']-stats['numReceived']
+        if duration:
+            stats['offeredRate'] = stats['numGenerated']/duration
+            stats['ingestRate']  = stats['numReceived']/duration
+            stats['bytesPerSec'] = stats['numBytes']/duration
+        else:
+            stats['offeredRate'] = 0.0
+            stats['ingestRate']  = 0.0
+            stats['bytesPerSec'] = 0.0
+        return stats
+    
+    #======================== private =========================================
+    
+    def _received(self,sender,signal,data):
+        with self.dataLock:
+            self.numReceived += 1
+    
+    #=== frames
+    
+    def _statusFrames(self,mote):
+        fields = {
+            'isSync':           1,
+            'isDAGroot':        1 if mote.parent==0 else 0,
+            'myPANID_0':        PANID[0],
+            'myPANID_1':        PANID[1],
+            'my16bID_0':        mote.eui64[6],
+            'my16bID_1':        mote.eui64[7],
+            'myDAGrank':        mote.rank,
+            'kaPeriod':         2000,
+            'used':             1,
+            'parentPreference': 1,
+            'addr_type':        3, # 64-bit
+            'addr_bodyL':       mote.parent,
+            'rssi':             -50,
+        }
+        for i in range(8):
+            fields['my64bID_{0}'.format(i)]  = mote.eui64[i]
+            fields['myPrefix_{0}'.format(i)] = self.prefix[i]
+        frames = []
+        for key in self.statusKeys:
+            frames += [self.hdlc.hdlcify(
+                SERFRAME_STATUS+
+                SerialFrames.STATUS_HEADER.pack(mote.moteId,key.val)+
+                key.struct.pack(*[fields.get(f,0) for f in key.fields])
+            )]
+        return frames
+    
+    def _notifFrames(self,mote):
+        components = sorted(StackDefines.components)
+        errors     = sorted(StackDefines.errorDescriptions)
+        frames     = []
+        for i in range(NUM_VARIANTS):
+            frames += [self.hdlc.hdlcify(
+                NOTIF_SEVERITIES[i%len(NOTIF_SEVERITIES)]+
+                SerialFrames.INFO_ERROR_CRITICAL.pack(
+                    mote.moteId,
+                    components[(mote.moteId+i)%len(components)],
+                    errors[(mote.moteId+i)%len(errors)],
+                    i,
+                    0,
+                )
+            )]
+        return frames
+    
+    def _dataFrames(self,mote):
+        src    = self.prefix+mote.eui64
+        dst    = self.prefix+HOST_IID
+        frames = []
+        for seq in range(NUM_VARIANTS):
+            data   = [seq>>8,seq&0xff]+[(seq+i)&0xff for i in range(DATA_LENGTH-2)]
+            length = [0,0,0,8+len(data)]
+            udp    = [UDP_SRC_PORT>>8,UDP_SRC_PORT&0xff,UDP_DST_PORT>>8,UDP_DST_PORT&0xff]
+            udp   += u.calculatePseudoHeaderCRC(src,dst,length,[0,0,0,IANA_UDP],udp+length[2:]+[0,0]+data)
+            frames+= [self._dataFrame(mote,seq,IPHC_NH_COMPRESSED,IPHC_DAM_64B,HOST_IID,NHC_UDP+udp+data)]
+        return frames
+    
+    def _daoFrames(self,mote):
+        src    = self.prefix+mote.eui64
+        dagRoot= self.prefix+self.motes[0].eui64
+        parent = self.motes[mote.parent-1].eui64
+        frames = []
+        for seq in range(NUM_VARIANTS):
+            dao    = [0x00,DAO_D_FLAG,0x00,seq]+dagRoot
+            dao   += [TARGET_OPTION,18,0x00,128]+self.prefix+mote.eui64
+            dao   += [TRANSIT_OPTION,20,0x00,0x00,seq,PATH_LIFETIME]+self.prefix+parent
+            icmp   = [ICMPv6_RPL_TYPE,ICMPv6_RPL_DAO]
+            icmp  += u.calculatePseudoHeaderCRC(src,dagRoot,[0,0,0,4+len(dao)],[0,0,0,IANA_ICMPv6],icmp+[0,0]+dao)
+            frames+= [self._dataFrame(mote,seq,IPHC_NH_INLINE+[IANA_ICMPv6],IPHC_DAM_ELIDED,[],icmp+dao)]
+        return frames
+    
+    def _dataFrame(self,mote,seq,iphcNh,dam,dst,payload):
+        '''
+        Returns the data frame with which the DAG root hands the computer a
+        packet of the mote, compressed the way it reaches the DAG root.
+        
+        :param iphcNh:  [in] The IPHC byte with the next header encoding,
+            followed by the next header when inline.
+        :param dam:     [in] The IPHC destination address mode.
+        :param dst:     [in] The destination address bytes carried inline.
+        :param payload: [in] The bytes after the IPHC header.
+        '''
+        root       = self.motes[0]
+        if mote.depth==1:
+            # from the mote itself, its address elided
+            previousHop = mote
+            lowpan      = iphcNh[:1]+[IPHC_SAM_ELIDED|dam]+iphcNh[1:]+dst
+        else:
+            # from a mote one hop away, with the address of the mote
+            previousHop = mote
+            while previousHop.depth>1:
+                previousHop = self.motes[previousHop.parent-1]
+            lowpan      = [PAGE_ONE_DISPATCH]
+            lowpan     += RPI_6LoRH+[0x00,mote.rank>>8,mote.rank&0xff]
+            lowpan     += IPINIP_6LoRH+[HOP_LIMIT]+mote.eui64
+            lowpan     += iphcNh[:1]+[IPHC_SAM_64B|dam]+iphcNh[1:]+mote.eui64+dst
+        return self.hdlc.hdlcify(
+            SERFRAME_DATA+
+            SerialFrames.DATA_HEADER.pack(
+                root.moteId,
+                0,
+                0,
+                seq,
+                u.toByteString(root.eui64),
+                u.toByteString(previousHop.eui64),
+            )+
+            u.toByteString(lowpan+payload)
+        )
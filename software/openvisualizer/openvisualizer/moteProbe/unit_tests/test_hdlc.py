@@ -94,7 +94,7 @@ def test_dehdlcifyToZero():
     crc        = crcini
     for c in frame:
         tmp    = crc^(ord(c))
-        crc    = (crc>> 8)^hdlc.FCS16TAB[(tmp & 0xff)]
+        crc    = (crc>> 8)^u.FCS16TAB_REFLECTED[(tmp & 0xff)]
         log.debug("after {0}, crc={1}".format(hex(ord(c)),hex(crc)))
 
 def test_randdomBackAndForth(randomFrame):
@@ -117,3 +117,64 @@ def test_randdomBackAndForth(randomFrame):
     log.debug("dehdlcified:    {0}".format(u.formatStringBuf(frameDehdlcified)))
     
     assert frameDehdlcified==randomFrame
+
+def test_deframerChunks():
+    
+    log.debug("\n---------- test_deframerChunks")
+    
+    hdlc     = OpenHdlc.OpenHdlc()
+    deframer = OpenHdlc.OpenHdlcDeframer()
+    
+    frames   = [''.join([chr(b) for b in json.loads(f)]) for f in RANDOMFRAME[::37]]
+    stream   = '\x11\x22' + ''.join([hdlc.hdlcify(f) for f in frames])
+    
+    # feed the stream in chunks of random size
+    received = []
+    idx      = 0
+    while idx<len(stream):
+        chunkLen  = random.randint(1,64)
+        received += deframer.feed(stream[idx:idx+chunkLen])
+        idx      += chunkLen
+    
+    assert received==frames
+    assert deframer.numErrors==0
+
+def test_deframerWrongCrc():
+    
+    log.debug("\n---------- test_deframerWrongCrc")
+    
+    hdlc     = OpenHdlc.OpenHdlc()
+    deframer = OpenHdlc.OpenHdlcDeframer()
+    
+    good     = hdlc.hdlcify('\x44\x7e\x7d\x55')
+    bad      = good[:2]+chr(ord(good[2])^0x01)+good[3:]
+    
+    assert deframer.feed(bad+good)==['\x44\x7e\x7d\x55']
+    assert deframer.numErrors==1
+
+def test_deframerStats():
+    
+    log.debug("\n---------- test_deframerStats")
+    
+    hdlc     = OpenHdlc.OpenHdlc()
+    deframer = OpenHdlc.OpenHdlcDeframer()
+    
+    good     = hdlc.hdlcify('\x44'*20)
+    badCrc   = good[:2]+chr(ord(good[2])^0x01)+good[3:]
+    stream   = good+badCrc+'\x7e\x01\x7e'+'\x7e\x44\x7d\x7e'+hdlc.hdlcify('\x44'*200)
+    deframer.feed(stream)
+    deframer.feed('\x00'*(deframer.MAX_FRAME_LEN+1))
+    
+    stats    = deframer.getStats()
+    assert stats['numBytes']==len(stream)+deframer.MAX_FRAME_LEN+1
+    assert stats['numFrames']==2
+    assert stats['numFrameBytes']==220
+    assert stats['numErrors']==4
+    assert stats['errors']=={
+        OpenHdlc.HdlcException.TOO_SHORT:       1,
+        OpenHdlc.HdlcException.WRONG_STUFFING:  1,
+        OpenHdlc.HdlcException.WRONG_CRC:       1,
+        deframer.OVERFLOW:                      1,
+    }
+    # 20 bytes in the (16,32] bucket, 200 in the (128,256] one
+    assert stats['frameSizes']==[0,0,1,0,0,0,1,0]
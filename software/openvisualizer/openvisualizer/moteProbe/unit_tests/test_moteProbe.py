@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))               # root/
+sys.path.insert(0, os.path.join(here, '..'))                           # moteProbe/
+
+import socket
+import threading
+import time
+
+import pytest
+from   pydispatch import dispatcher
+
+import moteProbe
+import ioReactor
+import serialCapture
+import OpenHdlc
+from   openvisualizer.moteConnector import OpenParser
+
+import logging
+import logging.handlers
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_moteProbe.log'
+
+import logging
+log = logging.getLogger('test_moteProbe')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  maxBytes=2*1024*1024,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in   [
+                        'test_moteProbe',
+                        'moteProbe',
+                    ]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+REQUEST  = chr(OpenParser.OpenParser.SERFRAME_MOTE2PC_REQUEST)
+DATA     = chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_DATA)
+DAGROOT  = chr(OpenParser.OpenParser.SERFRAME_PC2MOTE_SETDAGROOT)
+
+#============================ helpers =========================================
+
+class fakeUart(object):
+    '''
+    Records the writes; reading blocks until closed.
+    '''
+    def __init__(self):
+        self.writes = []
+        self.closed = threading.Event()
+    def write(self,data):
+        self.writes += [data]
+    def read(self):
+        self.closed.wait()
+        return []
+    def doneReading(self):
+        pass
+
+class fakeMote(object):
+    def __init__(self,id):
+        self.id      = id
+        self.bspUart = fakeUart()
+    def getId(self):
+        return self.id
+
+@pytest.fixture
+def newProbe(request):
+    def create(id,**kwargs):
+        probe = moteProbe.moteProbe(emulatedMote=fakeMote(id),**kwargs)
+        def close():
+            probe.close()
+            probe.emulatedMote.bspUart.closed.set()
+            probe.join()
+        request.addfinalizer(close)
+        # wait for the thread to open the port
+        while not hasattr(probe,'serial'):
+            time.sleep(0.001)
+        return probe
+    return create
+
+def deframe(writes):
+    return OpenHdlc.OpenHdlcDeframer().feed(''.join(writes))
+
+@pytest.fixture
+def reactor(request):
+    reactor = ioReactor.ioReactor()
+    request.addfinalizer(reactor.close)
+    return reactor
+
+def waitFor(condition,timeout=2):
+    end = time.time()+timeout
+    while not condition() and time.time()<end:
+        time.sleep(0.001)
+    return condition()
+
+#============================ tests ===========================================
+
+def test_onePerRequest(newProbe):
+    probe = newProbe(1)
+    for i in range(3):
+        probe._bufferDataToSend(DATA+chr(i))
+    
+    probe._handleFrame(REQUEST)
+    probe._handleFrame(REQUEST)
+    
+    assert deframe(probe.emulatedMote.bspUart.writes)==[DATA+'\x00',DATA+'\x01']
+    stats = probe.getOutputStats()
+    assert stats['numQueued']==3
+    assert stats['numWritten']==2
+    assert stats['depth']==1
+    assert stats['maxDepth']==3
+
+def test_commandsFirst(newProbe):
+    probe = newProbe(2)
+    probe._bufferDataToSend(DATA+'\x00')
+    probe._bufferDataToSend(DATA+'\x01')
+    probe._bufferDataToSend(DAGROOT+'T')
+    
+    for _ in range(4):
+        probe._handleFrame(REQUEST)
+    
+    assert deframe(probe.emulatedMote.bspUart.writes)==[DAGROOT+'T',DATA+'\x00',DATA+'\x01']
+
+def test_framesPerRequest(newProbe):
+    probe = newProbe(3,framesPerRequest=4)
+    for i in range(6):
+        probe._bufferDataToSend(DATA+chr(i))
+    
+    probe._handleFrame(REQUEST)
+    probe._handleFrame(REQUEST)
+    
+    assert len(probe.emulatedMote.bspUart.writes)==2
+    assert deframe(probe.emulatedMote.bspUart.writes)==[DATA+chr(i) for i in range(6)]
+    stats = probe.getOutputStats()
+    assert stats['numWrites']==2
+    assert stats['numWritten']==6
+    assert stats['waitMax']>=0
+
+def test_portStats(newProbe):
+    probe = newProbe(4)
+    hdlc  = OpenHdlc.OpenHdlc()
+    probe._bufferDataToSend(DATA+'\x00')
+    probe._bufferDataToSend(DATA+'\x01')
+
+    stream = hdlc.hdlcify('D1')+hdlc.hdlcify(REQUEST)+'\x7e\x00\x7e'
+    probe._feed(stream)
+
+    stats  = probe.getStats()
+    assert stats['portname']=='emulated4'
+    assert stats['input']['numBytes']==len(stream)
+    assert stats['input']['numFrames']==2
+    assert stats['input']['numRequests']==1
+    assert stats['input']['errors'][OpenHdlc.HdlcException.TOO_SHORT]==1
+    assert stats['output']['numWritten']==1
+    assert stats['output']['numBytes']==len(hdlc.hdlcify(DATA+'\x00'))
+    assert stats['output']['depth']==1
+    assert sum(stats['output']['waitHistogram'])==1
+    assert len(stats['output']['waitHistogram'])==len(stats['output']['waitBuckets'])+1
+
+def test_reactorReadsPorts(reactor):
+    hdlc     = OpenHdlc.OpenHdlc()
+    ptys     = [os.openpty() for _ in range(2)]
+    received = []
+    probes   = []
+    for (master,slave) in ptys:
+        probe   = moteProbe.moteProbe(serialport=(os.ttyname(slave),115200),reactor=reactor)
+        def receive(sender,signal,data,port=probe.getPortName()):
+            received.append((port,data.tobytes()))
+        dispatcher.connect(receive,signal='fromMoteProbe@'+probe.getPortName(),weak=False)
+        probes += [probe]
+
+    # no thread per moteProbe
+    assert not [p for p in probes if p.isAlive()]
+
+    os.write(ptys[0][0],hdlc.hdlcify('D1')+hdlc.hdlcify('D2'))
+    os.write(ptys[1][0],hdlc.hdlcify('D3'))
+    assert waitFor(lambda: len(received)==3)
+    assert sorted(received)==sorted([
+        (probes[0].getPortName(),'D1'),
+        (probes[0].getPortName(),'D2'),
+        (probes[1].getPortName(),'D3'),
+    ])
+
+    # the frames queued for the mote are written on request
+    probes[1]._bufferDataToSend(DATA+'\x01')
+    os.write(ptys[1][0],hdlc.hdlcify(REQUEST))
+    written  = OpenHdlc.OpenHdlcDeframer()
+    frames   = []
+    while not frames:
+        frames += written.feed(os.read(ptys[1][0],100))
+    assert frames==[DATA+'\x01']
+
+    for probe in probes:
+        probe.close()
+    for (master,slave) in ptys:
+        os.close(master)
+        os.close(slave)
+
+def test_reactorDropsFailingFd(reactor):
+    (badRx,badTx)   = os.pipe()
+    (goodRx,goodTx) = os.pipe()
+    received        = []
+    errors          = []
+    def fail():
+        os.read(badRx,100)
+        raise IOError('port gone')
+    reactor.register(badRx,fail,errors.append)
+    reactor.register(goodRx,lambda: received.append(os.read(goodRx,100)))
+
+    os.write(badTx,'x')
+    assert waitFor(lambda: badRx not in reactor.callbacks)
+    assert [str(e) for e in errors]==['port gone']
+    os.write(goodTx,'y')
+    assert waitFor(lambda: received==['y'])
+
+    reactor.unregister(goodRx)
+    for fd in [badRx,badTx,goodRx,goodTx]:
+        os.close(fd)
+
+def test_reactorReconnects(reactor,monkeypatch):
+    hdlc     = OpenHdlc.OpenHdlc()
+    server   = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    try:
+        server.bind(('127.0.0.1',20000)) # the IoT-LAB port
+    except socket.error:
+        server.close()
+        pytest.skip('port 20000 in use')
+    server.listen(1)
+    server.settimeout(2)
+    monkeypatch.setattr(moteProbe.moteProbe,'RECONNECT_DELAY',0.05)
+
+    probe    = moteProbe.moteProbe(iotlabmote='127.0.0.1',reactor=reactor)
+    received = []
+    dispatcher.connect(
+        lambda sender,signal,data: received.append(data.tobytes()),
+        signal = 'fromMoteProbe@'+probe.getPortName(),
+        weak   = False,
+    )
+    (conn,_) = server.accept()
+    conn.sendall(hdlc.hdlcify('D1'))
+    assert waitFor(lambda: received==['D1'])
+
+    # the socket closes, the moteProbe connects again
+    conn.close()
+    (conn,_) = server.accept()
+    conn.sendall(hdlc.hdlcify('D2'))
+    assert waitFor(lambda: received==['D1','D2'])
+    assert probe.getInputStats()['numReconnects']==1
+
+    probe.close()
+    conn.close()
+    server.close()
+
+def test_reactorOpenFails(reactor,monkeypatch):
+    hdlc     = OpenHdlc.OpenHdlc()
+    server   = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    try:
+        server.bind(('127.0.0.1',20000)) # the IoT-LAB port
+    except socket.error:
+        server.close()
+        pytest.skip('port 20000 in use')
+    monkeypatch.setattr(moteProbe.moteProbe,'RECONNECT_DELAY',0.05)
+
+    # nobody listens yet, the moteProbe is created anyway
+    probe    = moteProbe.moteProbe(iotlabmote='127.0.0.1',reactor=reactor)
+    assert probe.getInputStats()['numReconnects']==0
+
+    # and can be closed before its port ever opened
+    unopened = moteProbe.moteProbe(iotlabmote='127.0.0.1',reactor=reactor)
+    unopened.close()
+    received = []
+    dispatcher.connect(
+        lambda sender,signal,data: received.append(data.tobytes()),
+        signal = 'fromMoteProbe@'+probe.getPortName(),
+        weak   = False,
+    )
+
+    # it connects once the port is up
+    server.listen(1)
+    server.settimeout(2)
+    (conn,_) = server.accept()
+    conn.sendall(hdlc.hdlcify('D1'))
+    assert waitFor(lambda: received==['D1'])
+
+    probe.close()
+    conn.close()
+    server.close()
+
+def test_captureAndReplay(reactor,tmpdir):
+    hdlc       = OpenHdlc.OpenHdlc()
+    frames     = ['D'+chr(i)*(i+1) for i in range(20)]
+    filename   = str(tmpdir.join('capture.ovcap.gz'))
+
+    # capture what the mote sends, in chunks cutting through frames
+    (master,slave) = os.openpty()
+    portname   = os.ttyname(slave)
+    probe      = moteProbe.moteProbe(
+        serialport  = (portname,115200),
+        reactor     = reactor,
+        capturefile = filename,
+    )
+    stream     = ''.join([hdlc.hdlcify(f) for f in frames])
+    for i in range(0,len(stream),7):
+        os.write(master,stream[i:i+7])
+    assert waitFor(lambda: probe.capture.numBytes==len(stream))
+    probe.close()
+    os.close(master)
+    os.close(slave)
+
+    # the replay goes through the same deframing
+    replayed   = []
+    probe      = moteProbe.moteProbe(replayfile=filename,replaySpeed=0)
+    assert probe.getPortName()=='replay-'+portname
+    dispatcher.connect(
+        lambda sender,signal,data: replayed.append(data.tobytes()),
+        signal = 'fromMoteProbe@'+probe.getPortName(),
+        weak   = False,
+    )
+    probe.start()
+    probe.join()
+    assert replayed==frames
+
+def test_replayPace(tmpdir):
+    filename   = str(tmpdir.join('capture.ovcap'))
+    writer     = serialCapture.CaptureWriter(filename,'paced')
+    hdlc       = OpenHdlc.OpenHdlc()
+    writer.write(hdlc.hdlcify('D1'),now=writer.startTime)
+    writer.write(hdlc.hdlcify('D2'),now=writer.startTime+0.4)
+    writer.close()
+
+    durations  = []
+    for speed in [1,4]:
+        probe  = moteProbe.moteProbe(replayfile=filename,replaySpeed=speed)
+        start  = time.time()
+        probe.start()
+        probe.join()
+        durations.append(time.time()-start)
+    assert 0.4<=durations[0]<0.6
+    assert 0.1<=durations[1]<0.3
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))               # root/
+sys.path.insert(0, os.path.join(here, '..'))                           # moteProbe/
+
+import logging
+import logging.handlers
+
+import pytest
+
+import serialCapture
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_serialCapture.log'
+
+import logging
+log = logging.getLogger('test_serialCapture')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  maxBytes=2*1024*1024,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in   [
+                        'test_serialCapture',
+                        'serialCapture',
+                    ]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+CHUNKS   = ['\x7eD\x01\x02', '\x03\x7e', '\x00'*300]
+
+#============================ helpers =========================================
+
+def capture(filename,chunks,compress=False):
+    writer = serialCapture.CaptureWriter(filename,'/dev/ttyUSB0',compress=compress)
+    for (i,chunk) in enumerate(chunks):
+        writer.write(chunk,now=writer.startTime+i*0.25)
+    writer.close()
+    return writer
+
+#============================ tests ===========================================
+
+@pytest.mark.parametrize('compress',[False,True])
+def test_roundTrip(tmpdir,compress):
+    filename = str(tmpdir.join('capture'))
+    writer   = capture(filename,CHUNKS,compress)
+    
+    reader   = serialCapture.CaptureReader(filename)
+    records  = list(reader)
+    reader.close()
+    
+    assert reader.portname==writer.portname
+    assert reader.startTime==writer.startTime
+    assert records==[(i*0.25,c) for (i,c) in enumerate(CHUNKS)]
+
+def test_compressedIsSmaller(tmpdir):
+    plain      = str(tmpdir.join('plain'))
+    compressed = str(tmpdir.join('compressed'))
+    capture(plain,CHUNKS*100)
+    capture(compressed,CHUNKS*100,compress=True)
+    assert os.path.getsize(compressed)<os.path.getsize(plain)/4
+
+def test_largeChunkSplit(tmpdir):
+    filename = str(tmpdir.join('capture'))
+    chunk    = ''.join([chr(i%256) for i in range(serialCapture.MAX_CHUNK+10)])
+    capture(filename,[chunk])
+    
+    records  = list(serialCapture.CaptureReader(filename))
+    assert [len(c) for (_,c) in records]==[serialCapture.MAX_CHUNK,10]
+    assert ''.join([c for (_,c) in records])==chunk
+
+def test_truncatedLastRecord(tmpdir):
+    filename = str(tmpdir.join('capture'))
+    capture(filename,CHUNKS)
+    with open(filename,'rb+') as f:
+        f.truncate(os.path.getsize(filename)-100)
+    
+    records  = list(serialCapture.CaptureReader(filename))
+    assert records==[(i*0.25,c) for (i,c) in enumerate(CHUNKS[:2])]
+
+def test_notACapture(tmpdir):
+    filename = str(tmpdir.join('capture'))
+    with open(filename,'wb') as f:
+        f.write('\x7eD\x01\x02\x7e'*10)
+    with pytest.raises(serialCapture.CaptureException):
+        serialCapture.CaptureReader(filename)
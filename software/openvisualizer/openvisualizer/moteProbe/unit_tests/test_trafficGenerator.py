@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))               # root/
+sys.path.insert(0, os.path.join(here, '..'))                           # moteProbe/
+
+import logging
+import logging.handlers
+import time
+
+import pytest
+from   pydispatch import dispatcher
+
+import moteProbe
+import trafficGenerator
+import OpenHdlc
+import openvisualizer.openvisualizer_utils as u
+from   openvisualizer.moteConnector import OpenParser
+from   openvisualizer.moteConnector import moteConnector
+from   openvisualizer.moteState     import moteState
+from   openvisualizer.openLbr       import openLbr
+from   openvisualizer.openLbr       import fragment
+from   openvisualizer.RPL           import RPL
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_trafficGenerator.log'
+
+import logging
+log = logging.getLogger('test_trafficGenerator')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  maxBytes=2*1024*1024,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in   [
+                        'test_trafficGenerator',
+                        'trafficGenerator',
+                    ]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+NUM_MOTES = 6     # motes 4 to 6 are two hops away from the DAG root
+RATES     = {
+    trafficGenerator.KIND_STATUS: 20,
+    trafficGenerator.KIND_NOTIF:  5,
+    trafficGenerator.KIND_DATA:   10,
+    trafficGenerator.KIND_DAO:    5,
+}
+
+#============================ helpers =========================================
+
+def waitFor(condition,timeout=5):
+    end = time.time()+timeout
+    while not condition() and time.time()<end:
+        time.sleep(0.01)
+    return condition()
+
+class collector(object):
+    def __init__(self,signal):
+        self.received = []
+        dispatcher.connect(self.receive,signal=signal,weak=False)
+    def receive(self,sender,signal,data):
+        self.received.append(data)
+
+#============================ tests ===========================================
+
+def test_framesParse():
+    generator = trafficGenerator.TrafficGenerator(NUM_MOTES)
+    parser    = OpenParser.OpenParser()
+    kinds     = set()
+    for mote in generator.getMotes():
+        for source in mote.bspUart.sources:
+            frames = OpenHdlc.OpenHdlcDeframer().feed(''.join(source[1]))
+            assert len(frames)==len(source[1])
+            for frame in frames:
+                (eventSubType,_) = parser.parseInput(u.BytePacket(frame))
+                kinds.add(eventSubType)
+    assert kinds==set(['status','error','data'])
+
+def test_pipeline():
+    lbr       = openLbr.OpenLbr()
+    frag      = fragment.Fragment()
+    rpl       = RPL.RPL()
+    parents   = collector('updateParents')
+    packets   = collector('v6ToInternet')
+    dispatcher.send(sender='test',signal='networkPrefix',data=trafficGenerator.PREFIX)
+    
+    generator = trafficGenerator.TrafficGenerator(NUM_MOTES,rates=RATES)
+    probes    = [moteProbe.moteProbe(emulatedMote=m) for m in generator.getMotes()]
+    states    = [moteState.moteState(moteConnector.moteConnector(p.getPortName())) for p in probes]
+    generator.start()
+    
+    # a DAO from each mote, with its parent
+    motes     = generator.getMotes()
+    expected  = set([(tuple(m.eui64),tuple(motes[m.parent-1].eui64)) for m in motes[1:]])
+    assert waitFor(lambda: expected<=set([(s,tuple(p[0])) for (s,p) in parents.received]))
+    # UDP packets to the host, with a valid checksum
+    assert waitFor(lambda: len(packets.received)>=NUM_MOTES-1)
+    for p in packets.received:
+        p = list(p)
+        assert p[6]==trafficGenerator.IANA_UDP
+        assert p[24:40]==trafficGenerator.PREFIX+trafficGenerator.HOST_IID
+        assert u.calculatePseudoHeaderCRC(p[8:24],p[24:40],[0,0]+p[4:6],[0,0,0,p[6]],p[40:])==[0,0]
+    
+    for probe in probes:
+        probe.close()
+    generator.close()
+    
+    stats     = generator.getStats()
+    assert stats['numGenerated']>0
+    assert stats['numDropped']==0
+    assert 0<=stats['numLost']<=NUM_MOTES
+    assert stats['ingestRate']>0
+    assert states[0].getStateElem(moteState.moteState.ST_IDMANAGER).data[0]['isDAGroot']==1
+
+def test_drops():
+    uart      = trafficGenerator.VirtualUart(100)
+    uart.addSource(1000,['\x7e'+'x'*8+'\x7e'],0)
+    uart.start(time.time())
+    time.sleep(0.1)
+    
+    # the mote holds 10 frames of the ~100 generated meanwhile
+    assert len(uart.read()[0])==100
+    stats     = uart.getStats()
+    assert stats['numGenerated']>=50
+    assert stats['numDropped']==stats['numGenerated']-10
+
+def test_parseRates():
+    rates     = trafficGenerator.parseRates('status=2, data=0.5')
+    assert rates[trafficGenerator.KIND_STATUS]==2
+    assert rates[trafficGenerator.KIND_DATA]==0.5
+    assert rates[trafficGenerator.KIND_DAO]==trafficGenerator.DFLT_RATES[trafficGenerator.KIND_DAO]
+    for text in ['status','foo=1','data=-1','dao=x']:
+        with pytest.raises(ValueError):
+            trafficGenerator.parseRates(text)
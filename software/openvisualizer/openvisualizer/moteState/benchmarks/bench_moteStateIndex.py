@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+'''
+Benchmark of the lookup of a moteState by 16-bit address.
+
+Looks motes up the way the web UI does for each request. Compares
+moteStateIndex.getBy16bAddr to the scan of all the moteStates
+OpenVisualizerApp.getMoteState used to do.
+
+Usage: python bench_moteStateIndex.py [numMotes] [numLookups]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteState/
+
+import time
+import random
+import struct
+
+import moteState
+from openvisualizer.moteConnector import ParserStatus
+
+#============================ defines =========================================
+
+NUM_MOTES   = 200
+NUM_LOOKUPS = 10000
+
+#============================ helpers =========================================
+
+class connector(object):
+    '''
+    The part of a moteConnector a moteState uses.
+    '''
+    def __init__(self,serialport):
+        self.serialport = serialport
+
+def linearLookup(moteStates,moteid):
+    # OpenVisualizerApp.getMoteState before moteStates were indexed
+    for ms in moteStates:
+        idManager = ms.getStateElem(ms.ST_IDMANAGER)
+        if idManager and idManager.get16bAddr():
+            addr = ''.join(['%02x'%b for b in idManager.get16bAddr()])
+            if addr == moteid:
+                return ms
+    else:
+        return None
+
+def bench(numMotes,numLookups):
+    
+    parser     = ParserStatus.ParserStatus()
+    moteStates = []
+    for i in range(numMotes):
+        ms     = moteState.moteState(connector('emulated{0}'.format(i)))
+        addr   = [(i+1)>>8,(i+1)&0xff]
+        frame  = struct.pack('<HB',i+1,1)+struct.pack('<'+'B'*21,*([0,0xca,0xfe]+addr+[0x14,0x15,0x92,0,0,0]+addr+[0xbb,0xbb]+[0]*6))
+        ms._receivedStatus_notif(
+            sender = 'moteConnector@emulated{0}'.format(i),
+            signal = 'fromMote.status',
+            data   = parser.parseInput(frame)[1],
+        )
+        moteStates += [ms]
+    index      = moteState.moteStateIndex(moteStates)
+    
+    rand       = random.Random(0)
+    moteids    = ['{0:04x}'.format(rand.randint(1,numMotes)) for _ in range(numLookups)]
+    
+    start      = time.time()
+    for moteid in moteids:
+        assert index.getBy16bAddr(moteid)
+    tIndex     = time.time()-start
+    
+    start      = time.time()
+    for moteid in moteids:
+        assert linearLookup(moteStates,moteid)
+    tLinear    = time.time()-start
+    
+    output     = []
+    output    += ['{0} motes, {1} lookups'.format(numMotes,numLookups)]
+    output    += ['- moteStateIndex.getBy16bAddr: {0:.3f}s ({1:.2f}us/lookup)'.format(tIndex,1e6*tIndex/numLookups)]
+    output    += ['- linear scan:                 {0:.3f}s ({1:.2f}us/lookup)'.format(tLinear,1e6*tLinear/numLookups)]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numMotes   = int(sys.argv[1]) if len(sys.argv)>1 else NUM_MOTES
+    numLookups = int(sys.argv[2]) if len(sys.argv)>2 else NUM_LOOKUPS
+    bench(numMotes,numLookups)
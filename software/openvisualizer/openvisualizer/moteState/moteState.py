@@ -17,6 +17,7 @@ import copy
 import time
 import threading
 import json
+import random
 
 from openvisualizer.moteConnector import ParserStatus
 from openvisualizer.eventBus      import eventBusClient
@@ -37,11 +38,16 @@ class OpenEncoder(json.JSONEncoder):
 class StateElem(object):
     '''
     Abstract superclass for internal mote state classes.
+    
+    The version of a state element is incremented on each update. The JSON
+    produced by :meth:`toJson` is cached until the next update.
     '''
     
     def __init__(self):
         self.meta                      = [{}]
         self.data                      = []
+        self.version                   = 0
+        self._jsonCache                = {} # (aspect,isPrettyPrint) -> (version,json)
         
         self.meta[0]['numUpdates']     = 0
         self.meta[0]['lastUpdated']    = None
@@ -51,6 +57,7 @@ class StateElem(object):
     def update(self):
         self.meta[0]['lastUpdated']    = time.time()
         self.meta[0]['numUpdates']    += 1
+        self.version                  += 1
     
     def toJson(self, aspect='all', isPrettyPrint=False):
         '''
@@ -69,6 +76,15 @@ class StateElem(object):
                 for the meta and data aspects. Otherwise, the JSON
                 is a list of the selected aspect's content.
         '''
+        
+        # read the version before encoding: if an update happens meanwhile,
+        # the cached JSON is re-encoded on the next call
+        version = self.version
+        key     = (aspect,bool(isPrettyPrint))
+        cached  = self._jsonCache.get(key)
+        if cached and cached[0]==version:
+            return cached[1]
+        
         content = None
         if aspect   == 'all':
             content = self._toDict()
@@ -79,9 +95,13 @@ class StateElem(object):
         else:
             raise ValueError('No aspect named {0}'.format(aspect))
             
-        return json.dumps(content,
-                          sort_keys = bool(isPrettyPrint),
-                          indent    = 4 if isPrettyPrint else None)
+        returnVal = json.dumps(content,
+                               sort_keys = bool(isPrettyPrint),
+                               indent    = 4 if isPrettyPrint else None)
+        
+        self._jsonCache[key] = (version,returnVal)
+        
+        return returnVal
     
     def __str__(self):
         return self.toJson(isPrettyPrint=True)
@@ -272,6 +292,7 @@ class StateIdManager(StateElem):
         self.eventBusClient  = eventBusClient
         self.moteConnector   = moteConnector
         self.isDAGroot       = None
+        self.addrs           = None
     
     def get16bAddr(self):
         try:
@@ -279,6 +300,12 @@ class StateIdManager(StateElem):
         except IndexError:
             return None
     
+    def get64bAddr(self):
+        try:
+            return self.data[0]['my64bID'].addr[:]
+        except IndexError:
+            return None
+    
     def update(self,notif):
     
         # update state
@@ -348,6 +375,23 @@ class StateIdManager(StateElem):
         # record isDAGroot
         self.isDAGroot = self.data[0]['isDAGroot']
 
+        # announce the addresses of the mote when they change
+        addrs = (self.data[0]['my16bID'].addr,self.data[0]['my64bID'].addr)
+        if  self.addrs!=addrs:
+            
+            # dispatch
+            self.eventBusClient.dispatch(
+                signal        = 'infoIdManager',
+                data          = {
+                                    '16bAddr':      self.data[0]['my16bID'].addr,
+                                    'eui64':        self.data[0]['my64bID'].addr,
+                                    'serialPort':   self.moteConnector.serialport,
+                                },
+            )
+        
+        # record addresses
+        self.addrs = addrs
+
 class StateMyDagRank(StateElem):
     
     def update(self,notif):
@@ -379,6 +423,90 @@ class StateTable(StateElem):
             self.data.append(self.meta[0]['rowClass']())
         self.data[notif.row].update(notif)
 
+class moteStateIndex(eventBusClient.eventBusClient):
+    '''
+    Finds the moteState of a mote by serial port, 16-bit address or EUI64.
+    
+    The serial port of a moteState is indexed when it is added. Its
+    addresses are indexed then, if already known, and re-indexed each time
+    its IdManager announces new addresses with the 'infoIdManager' signal.
+    '''
+    
+    def __init__(self,moteStates=[]):
+        
+        # log
+        log.info("create instance")
+        
+        # local variables
+        self.indexLock       = threading.Lock()
+        self.bySerialPort    = {}
+        self.by16bAddr       = {} # '0001' -> moteState
+        self.byEui64         = {} # (0x14,0x15,...) -> moteState
+        self.addrsOf         = {} # serialPort -> (16bAddr,eui64) keys
+        
+        # initialize parent class
+        eventBusClient.eventBusClient.__init__(
+            self,
+            name             = 'moteStateIndex',
+            registrations    = [
+                {
+                    'sender'      : self.WILDCARD,
+                    'signal'      : 'infoIdManager',
+                    'callback'    : self._infoIdManager_notif,
+                },
+            ]
+        )
+        
+        for ms in moteStates:
+            self.add(ms)
+    
+    #======================== public ==========================================
+    
+    def add(self,ms):
+        serialPort     = ms.moteConnector.serialport
+        idManager      = ms.getStateElem(ms.ST_IDMANAGER)
+        with self.indexLock:
+            self.bySerialPort[serialPort] = ms
+            self._indexAddrs(serialPort,idManager.get16bAddr(),idManager.get64bAddr())
+    
+    def getBySerialPort(self,serialPort):
+        return self.bySerialPort.get(serialPort)
+    
+    def getBy16bAddr(self,moteid):
+        '''
+        :param moteid: [in] 16-bit address, as a hex string, e.g. '0001'.
+        '''
+        return self.by16bAddr.get(moteid)
+    
+    def getByEui64(self,eui64):
+        return self.byEui64.get(tuple(eui64))
+    
+    #======================== private =========================================
+    
+    def _infoIdManager_notif(self,sender,signal,data):
+        with self.indexLock:
+            if data['serialPort'] in self.bySerialPort:
+                self._indexAddrs(data['serialPort'],data['16bAddr'],data['eui64'])
+    
+    def _indexAddrs(self,serialPort,addr16b,eui64):
+        
+        ms   = self.bySerialPort[serialPort]
+        
+        # remove the previous addresses, unless another mote took them over
+        for (index,key) in zip([self.by16bAddr,self.byEui64],self.addrsOf.pop(serialPort,[])):
+            if key is not None and index.get(key) is ms:
+                del index[key]
+        
+        keys = (
+            ''.join(['%02x'%b for b in addr16b]) if addr16b else None,
+            tuple(eui64)                         if eui64   else None,
+        )
+        if keys[0] is not None:
+            self.by16bAddr[keys[0]] = ms
+        if keys[1] is not None:
+            self.byEui64[keys[1]]   = ms
+        self.addrsOf[serialPort] = keys
+
 class moteState(eventBusClient.eventBusClient):
     
     ST_OUPUTBUFFER      = 'OutputBuffer'
@@ -465,6 +593,8 @@ class moteState(eventBusClient.eventBusClient):
         self.parserStatus                   = ParserStatus.ParserStatus()
         self.stateLock                      = threading.Lock()
         self.state                          = {}
+        self.snapshotId                     = random.getrandbits(32)
+        self.snapshot                       = None # (versions,etag,body)
         
         self.state[self.ST_OUPUTBUFFER]     = StateOutputBuffer()
         self.state[self.ST_ASN]             = StateAsn()
@@ -573,6 +703,34 @@ class moteState(eventBusClient.eventBusClient):
         
         return returnVal
     
+    def getSnapshot(self):
+        '''
+        Returns the data of all the state elements of this mote, encoded.
+        
+        The encoded data is cached until one of the state elements is
+        updated, so that polling a mote whose state did not change costs
+        nothing. The state lock is not taken.
+        
+        :returns: A tuple (etag,body). body is a JSON object which maps
+            the name of each state element to the JSON of its data. etag
+            changes whenever body changes.
+        '''
+        versions  = tuple([self.state[name].version for name in self.ST_ALL])
+        snapshot  = self.snapshot
+        if snapshot and snapshot[0]==versions:
+            return snapshot[1:]
+        
+        body      = json.dumps(
+            dict([(name,self.state[name].toJson('data')) for name in self.ST_ALL])
+        )
+        
+        # versions only increase, so does their sum
+        etag      = '"{0:08x}-{1:x}"'.format(self.snapshotId,sum(versions))
+        
+        self.snapshot = (versions,etag,body)
+        
+        return (etag,body)
+    
     def triggerAction(self,action):
         
         # dispatch
@@ -597,11 +755,16 @@ class moteState(eventBusClient.eventBusClient):
         
         # call handler
         found = False
-        for k,v in self.notifHandlers.items():
-            if self._isnamedtupleinstance(data,k):
-                found = True
-                v(data)
-                break
+        handler = self.notifHandlers.get(type(data))
+        if handler is None:
+            # a named tuple class not created by ParserStatus
+            for k,v in self.notifHandlers.items():
+                if self._isnamedtupleinstance(data,k):
+                    handler = v
+                    break
+        if handler is not None:
+            found = True
+            handler(data)
         
         # unlock the state data
         self.stateLock.release()
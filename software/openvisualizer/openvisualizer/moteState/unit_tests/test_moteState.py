@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # moteState/
+
+import logging
+import logging.handlers
+import json
+import struct
+
+import pytest
+
+import moteState
+from openvisualizer.moteConnector import ParserStatus
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_moteState.log'
+
+import logging
+log = logging.getLogger('test_moteState')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_moteState',
+                   'moteState',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ helpers =========================================
+
+class connector(object):
+    '''
+    The part of a moteConnector a moteState uses.
+    '''
+    def __init__(self,serialport):
+        self.serialport = serialport
+
+def receiveStatus(ms,statusElem,structure,fields):
+    frame        = struct.pack('<HB',0x0001,statusElem)+struct.pack(structure,*fields)
+    (_,notif)    = ParserStatus.ParserStatus().parseInput(frame)
+    ms._receivedStatus_notif(
+        sender   = 'moteConnector@'+ms.moteConnector.serialport,
+        signal   = 'fromMote.status',
+        data     = notif,
+    )
+
+#============================ tests ===========================================
+
+def test_toJsonCached():
+    ms   = moteState.moteState(connector('test_toJsonCached'))
+    elem = ms.getStateElem(ms.ST_ASN)
+    
+    receiveStatus(ms,4,'<BHH',(0x01,0x0002,0x0003))
+    json1 = elem.toJson('data')
+    assert elem.toJson('data') is json1
+    assert json.loads(json1)==[{'asn':'0x0100020003'}]
+    
+    receiveStatus(ms,4,'<BHH',(0x01,0x0002,0x0004))
+    assert json.loads(elem.toJson('data'))==[{'asn':'0x0100020004'}]
+
+def test_snapshot():
+    ms   = moteState.moteState(connector('test_snapshot'))
+    
+    (etag1,body1) = ms.getSnapshot()
+    assert sorted(json.loads(body1).keys())==sorted(ms.ST_ALL)
+    assert ms.getSnapshot()==(etag1,body1)
+    
+    # a status notification changes the ETag and the body
+    receiveStatus(ms,7,'<BB',(3,5))
+    (etag2,body2) = ms.getSnapshot()
+    assert etag2!=etag1
+    backoff = json.loads(json.loads(body2)[ms.ST_BACKOFF])
+    assert backoff==[{'backoffExponent':3,'backoff':5}]
+    
+    # so does an update of a row of a table
+    receiveStatus(ms,8,'<'+'B'*20,[0]*20)
+    (etag3,_) = ms.getSnapshot()
+    assert etag3 not in [etag1,etag2]
+    
+    # the ETags of motes differ
+    other = moteState.moteState(connector('test_snapshot_other'))
+    assert other.getSnapshot()[0]!=ms.getSnapshot()[0]
+
+def receiveIdManager(ms,addr16b,eui64):
+    receiveStatus(ms,1,'<'+'B'*21,[0,0xca,0xfe]+addr16b+eui64+[0xbb,0xbb]+[0x00]*6)
+
+def test_moteStateIndex():
+    msA   = moteState.moteState(connector('test_moteStateIndex_a'))
+    msB   = moteState.moteState(connector('test_moteStateIndex_b'))
+    
+    # addresses known before the mote is indexed
+    receiveIdManager(msA,[0x00,0x0a],[0x14,0x15,0x92,0x00,0x00,0x00,0x00,0x0a])
+    index = moteState.moteStateIndex([msA,msB])
+    
+    assert index.getBySerialPort('test_moteStateIndex_a') is msA
+    assert index.getBySerialPort('test_moteStateIndex_b') is msB
+    assert index.getBy16bAddr('000a') is msA
+    assert index.getByEui64([0x14,0x15,0x92,0x00,0x00,0x00,0x00,0x0a]) is msA
+    assert index.getBy16bAddr('000b') is None
+    
+    # addresses announced after the mote is indexed
+    receiveIdManager(msB,[0x00,0x0b],[0x14,0x15,0x92,0x00,0x00,0x00,0x00,0x0b])
+    assert index.getBy16bAddr('000b') is msB
+    
+    # a change of address replaces the previous one
+    receiveIdManager(msA,[0x00,0x0c],[0x14,0x15,0x92,0x00,0x00,0x00,0x00,0x0c])
+    assert index.getBy16bAddr('000a') is None
+    assert index.getByEui64([0x14,0x15,0x92,0x00,0x00,0x00,0x00,0x0a]) is None
+    assert index.getBy16bAddr('000c') is msA
+    assert index.getBy16bAddr('000b') is msB
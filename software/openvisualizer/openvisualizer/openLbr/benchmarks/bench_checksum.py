@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+'''
+Micro-benchmark of the checksum engine in openvisualizer_utils, against
+the per-byte implementations it replaces.
+
+Usage: python bench_checksum.py [numIterations]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+
+import time
+import random
+
+import openvisualizer.openvisualizer_utils as u
+
+#============================ defines =========================================
+
+NUM_ITERATIONS = 10000
+PAYLOAD_LENS   = [20,127,1280]
+
+#============================ legacy implementations ==========================
+
+def legacy_byteinverse(b):
+    rb = 0
+    for pos in range(8):
+        if b&(1<<pos)!=0:
+            bitval = 1
+        else:
+            bitval = 0
+        rb |= bitval<<(7-pos)
+    return rb
+
+def legacy_calculateFCS(rpayload):
+    payload = []
+    for b in rpayload:
+        payload += [legacy_byteinverse(b)]
+    crc     = 0x0000
+    for b in payload:
+        crc = ((crc<<8)&0xffff) ^ u.FCS16TAB[((crc>>8)^b) & 0xff]
+    return [
+        legacy_byteinverse(crc>>8),
+        legacy_byteinverse(crc&0xff)
+    ]
+
+def legacy_oneComplementSum(field,checksum):
+    sum            = 0xFFFF & (checksum[0] << 8 | checksum[1])
+    i              = len(field)
+    while (i > 1):
+        sum       += 0xFFFF & (field[-i] << 8 | (field[-i+1]))
+        i         -= 2
+    if i:
+        sum       += (0xFF & field[-1]) << 8
+    while (sum >> 16):
+        sum        = (sum & 0xFFFF) + (sum >> 16)
+    checksum[0]    = (sum >> 8) & 0xFF
+    checksum[1]    = sum & 0xFF
+    return checksum
+
+def legacy_calculateCRC(payload):
+    checksum       = legacy_oneComplementSum(payload,[0x00]*2)
+    return [checksum[0]^0xFF,checksum[1]^0xFF]
+
+def legacy_hdlcCrc(buf):
+    crc = 0xffff
+    for b in buf:
+        crc = (crc>>8)^u.FCS16TAB_REFLECTED[((crc^(ord(b))) & 0xff)]
+    return crc
+
+#============================ helpers =========================================
+
+def timeit(func,arg,numIterations):
+    start = time.time()
+    for _ in xrange(numIterations):
+        func(arg)
+    return 1e6*(time.time()-start)/numIterations
+
+def bench(numIterations):
+    output   = []
+    for payloadLen in PAYLOAD_LENS:
+        payload = [random.randint(0x00,0xff) for _ in range(payloadLen)]
+        payloadStr = ''.join([chr(b) for b in payload])
+        
+        # make sure the implementations agree
+        assert legacy_calculateFCS(payload)==u.calculateFCS(payload)
+        assert legacy_calculateCRC(payload)==u.calculateCRC(payload)
+        assert legacy_hdlcCrc(payloadStr)==u.reflectedCrc16(payloadStr,0xffff)
+        
+        output += ['{0} bytes (us per call)'.format(payloadLen)]
+        for (name,legacy,new,arg) in [
+                ('calculateFCS (list)',    legacy_calculateFCS, u.calculateFCS,                            payload),
+                ('calculateCRC (list)',    legacy_calculateCRC, u.calculateCRC,                            payload),
+                ('hdlc crc (string)',      legacy_hdlcCrc,      lambda b: u.reflectedCrc16(b,0xffff),      payloadStr),
+                ('hdlc crc, no binascii',  legacy_hdlcCrc,      lambda b: u.reflectedCrc16(b,0xffff,False),payloadStr),
+            ]:
+            tLegacy = timeit(legacy,arg,numIterations)
+            tNew    = timeit(new,arg,numIterations)
+            output += ['- {0:<24} legacy {1:9.2f}  new {2:9.2f}  x{3:.1f}'.format(name,tLegacy,tNew,tLegacy/tNew)]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numIterations = int(sys.argv[1]) if len(sys.argv)>1 else NUM_ITERATIONS
+    bench(numIterations)
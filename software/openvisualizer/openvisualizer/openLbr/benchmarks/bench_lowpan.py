@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+'''
+Benchmark of the 6LoWPAN compression of downstream packets.
+
+Sends CoAP-sized UDP packets from the host to the motes of a random
+DODAG, and reports the average 6LoWPAN size, fragments and bytes on air per
+packet, with and without context-based address compression and UDP NHC.
+
+Usage: python bench_lowpan.py [numPackets] [numMotes]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # openLbr/
+
+import random
+import struct
+
+import openLbr
+import fragment
+import openvisualizer.openvisualizer_utils as u
+
+#============================ defines =========================================
+
+NUM_PACKETS = 10000
+NUM_MOTES   = 100
+
+PREFIX      = [0xbb,0xbb,0x00,0x00,0x00,0x00,0x00,0x00]
+DAGROOT     = [0x14,0x15,0x92,0xcc,0x00,0x00,0x00,0x01]
+HOST        = PREFIX+[0x00]*7+[0x01]
+COAP_PORT   = 5683
+
+#============================ helpers =========================================
+
+def buildDodag(rand,numMotes):
+    '''
+    Returns the route to each mote, without the DAGroot, as
+    SourceRoute.getSourceRoute computes it.
+    '''
+    motes  = [DAGROOT[:7]+[i+2] for i in range(numMotes)]
+    routes = {}
+    for (i,mote) in enumerate(motes):
+        parent = rand.randint(-1,i-1)
+        if parent==-1:
+            routes[i] = [mote]
+        else:
+            routes[i] = [mote]+routes[parent]
+    return [routes[i] for i in range(numMotes)]
+
+def udpPacket(rand,dst):
+    data = ''.join(chr(rand.randint(0,255)) for _ in range(rand.randint(10,120)))
+    udp  = struct.pack('>HHHH',rand.randint(0xc000,0xffff),COAP_PORT,8+len(data),0)+data
+    ip   = struct.pack('>BBBBHBB',0x60,0x00,0x00,0x00,len(udp),openLbr.OpenLbr.IANA_UDP,64)
+    return u.BytePacket(ip+u.toByteString(HOST)+u.toByteString(dst)+udp)
+
+def onAir(size):
+    '''
+    Returns the number of fragments, and bytes on air, to send a 6LoWPAN
+    packet of a given size, the way fragment.Fragment splits it.
+    '''
+    F            = fragment.Fragment
+    max_fragment = F.FRAGMENT_DATA_UTIL - F.L2_HSIZE
+    if size<=max_fragment:
+        return (1,F.L2_HSIZE+size)
+    
+    frag1        = (max_fragment-F.FRAGMENT_SKIP_BYTES) & 0xF8
+    fragn        = (max_fragment-F.FRAGMENT_SKIP_BYTES-1) & 0xF8
+    numFragments = 1+(size-frag1+fragn-1)//fragn
+    overhead     = F.L2_HSIZE+F.FRAGMENT_SKIP_BYTES+(numFragments-1)*(F.L2_HSIZE+F.FRAGMENT_SKIP_BYTES+1)
+    return (numFragments,size+overhead)
+
+def bench(numPackets,numMotes):
+    
+    rand      = random.Random(0)
+    lbr       = openLbr.OpenLbr()
+    lbr._setPrefix_notif(None,'networkPrefix',PREFIX)
+    lbr.dagRootEui64 = DAGROOT
+    routes    = buildDodag(rand,numMotes)
+    
+    results   = {}
+    for compress in [False,True]:
+        
+        # without contexts, all addresses are carried inline
+        if compress:
+            lbr.contexts = {0: PREFIX}
+        else:
+            lbr.contexts = {}
+        
+        rand      = random.Random(1)
+        numBytes  = 0
+        numFrags  = 0
+        numOnAir  = 0
+        for _ in xrange(numPackets):
+            route             = rand.choice(routes)
+            ipv6              = lbr.disassemble_ipv6(udpPacket(rand,PREFIX+route[0]))
+            lowpan            = lbr.ipv6_to_lowpan(ipv6)
+            if not compress:
+                lowpan['nh']      = [ipv6['next_header']]
+                lowpan['payload'] = ipv6['payload']
+            lowpan['route']   = route
+            lowpan['nextHop'] = route[-1]
+            size              = len(lbr.reassemble_lowpan(lowpan))+len(lowpan['payload'])
+            (frags,air)       = onAir(size)
+            numBytes         += size
+            numFrags         += frags
+            numOnAir         += air
+        results[compress] = (numBytes,numFrags,numOnAir)
+    
+    output    = []
+    output   += ['{0} packets to {1} motes'.format(numPackets,numMotes)]
+    for (compress,name) in [(False,'inline addresses, no NHC'),(True,'contexts and UDP NHC    ')]:
+        (numBytes,numFrags,numOnAir) = results[compress]
+        output += ['- {0}: {1:.1f}B 6LoWPAN, {2:.2f} fragments, {3:.1f}B on air per packet'.format(
+            name,
+            float(numBytes)/numPackets,
+            float(numFrags)/numPackets,
+            float(numOnAir)/numPackets,
+        )]
+    print '\n'.join(output)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numPackets = int(sys.argv[1]) if len(sys.argv)>1 else NUM_PACKETS
+    numMotes   = int(sys.argv[2]) if len(sys.argv)>2 else NUM_MOTES
+    bench(numPackets,numMotes)
@@ -11,10 +11,183 @@ log.addHandler(logging.NullHandler())
 from openvisualizer.eventBus import eventBusClient
 import random
 import threading
+import time
+import collections
 import openvisualizer.openvisualizer_utils as u
 
 #============================ parameters ======================================
 
+class ReassemblyManager(object):
+    '''
+    Reassembly buffers of the incoming fragmented 6LoWPAN packets.
+    
+    A packet being reassembled is identified by the ``(tag,size,source)``
+    tuple of section 5.3 of RFC 4944. It is held in a :class:`bytearray` of
+    its full size, in which each fragment is written at its offset; the
+    number of bytes received so far is kept along, so completion is checked
+    without walking the fragments. As required by section 5.3 of RFC 4944, a
+    fragment overlapping one received at a different offset drops the
+    packet.
+    
+    A packet which is not complete :data:`REASSEMBLY_TIMEOUT` seconds after
+    its first fragment arrived is dropped. So are the oldest packets when
+    the buffers would use more than ``maxBytes`` bytes.
+    '''
+    
+    REASSEMBLY_TIMEOUT = 60           # seconds, section 5.3 of RFC 4944
+    MAX_BYTES          = 32*1280      # 32 IPv6 packets of MTU size
+    
+    def __init__(self,timeout=REASSEMBLY_TIMEOUT,maxBytes=MAX_BYTES):
+        '''
+        :param timeout:  [in] Seconds after which an incomplete packet is
+            dropped.
+        :param maxBytes: [in] Maximum number of bytes held by all the
+            reassembly buffers.
+        '''
+        
+        # store params
+        self.timeout         = timeout
+        self.maxBytes        = maxBytes
+        
+        # local variables
+        self.dataLock        = threading.Lock()
+        self.buffers         = collections.OrderedDict() # key -> entry, oldest first
+        self.bytesInUse      = 0
+        self.stats           = {
+            'started':       0,
+            'completed':     0,
+            'expired':       0,
+            'evicted':       0,
+            'aborted':       0,
+            'duplicates':    0,
+            'overlaps':      0,
+            'malformed':     0,
+        }
+    
+    #======================== public ==========================================
+    
+    def addFragment(self,key,offset,payload,now=None):
+        '''
+        Store a fragment of a packet.
+        
+        :param key:     [in] The ``(tag,size,source)`` tuple of the packet.
+        :param offset:  [in] The offset of the fragment in the packet, in
+            bytes.
+        :param payload: [in] The payload of the fragment.
+        :param now:     [in] The current time, defaults to :func:`time.time`.
+        
+        :returns: The reassembled packet, as a
+            :class:`openvisualizer_utils.BytePacket`, once all its bytes were
+            received, None otherwise.
+        '''
+        if now is None:
+            now = time.time()
+        size    = key[1]
+        payload = u.BytePacket(payload)
+        length  = len(payload)
+        
+        with self.dataLock:
+            self._expire(now)
+            
+            if length==0 or offset+length>size or size>self.maxBytes:
+                # does not fit in its packet, or in the buffers
+                self.stats['malformed'] += 1
+                return None
+            
+            entry = self.buffers.get(key)
+            if entry is None:
+                # make room for the new packet, dropping the oldest ones
+                while self.buffers and self.bytesInUse+size>self.maxBytes:
+                    self._remove(next(iter(self.buffers)))
+                    self.stats['evicted'] += 1
+                entry = {
+                    'buffer':    bytearray(size),
+                    'fragments': {},          # offset -> length
+                    'received':  0,
+                    'deadline':  now+self.timeout,
+                }
+                self.buffers[key]   = entry
+                self.bytesInUse    += size
+                self.stats['started'] += 1
+            
+            if entry['fragments'].get(offset)==length:
+                self.stats['duplicates'] += 1
+                return None
+            
+            for (o,l) in entry['fragments'].items():
+                if o<offset+length and offset<o+l:
+                    # overlaps a fragment received at another offset
+                    self._remove(key)
+                    self.stats['overlaps'] += 1
+                    return None
+            
+            entry['buffer'][offset:offset+length] = payload.view
+            entry['fragments'][offset] = length
+            entry['received'] += length
+            
+            if entry['received']<size:
+                return None
+            
+            self._remove(key)
+            self.stats['completed'] += 1
+            return u.BytePacket(str(entry['buffer']))
+    
+    def abort(self,key):
+        '''
+        Drop a packet being reassembled.
+        
+        :param key: [in] The ``(tag,size,source)`` tuple of the packet.
+        
+        :returns: True if the packet was being reassembled.
+        '''
+        with self.dataLock:
+            if key not in self.buffers:
+                return False
+            self._remove(key)
+            self.stats['aborted'] += 1
+            return True
+    
+    def expire(self,now=None):
+        '''
+        Drop the packets which were not reassembled in time.
+        
+        This is also done each time a fragment is added.
+        '''
+        if now is None:
+            now = time.time()
+        with self.dataLock:
+            self._expire(now)
+    
+    def getStats(self):
+        '''
+        Returns the counters of the reassembly.
+        
+        :returns: A dictionary with the number of packets started, completed,
+            expired, evicted and aborted, of duplicate, overlapping and
+            malformed fragments, and the number of pending packets and bytes
+            held.
+        '''
+        with self.dataLock:
+            returnVal = dict(self.stats)
+            returnVal['pending']    = len(self.buffers)
+            returnVal['bytesInUse'] = self.bytesInUse
+        return returnVal
+    
+    #======================== private =========================================
+    
+    def _expire(self,now):
+        # packets are ordered by their first fragment, hence by deadline
+        while self.buffers:
+            key = next(iter(self.buffers))
+            if self.buffers[key]['deadline']>now:
+                break
+            self._remove(key)
+            self.stats['expired'] += 1
+    
+    def _remove(self,key):
+        entry            = self.buffers.pop(key)
+        self.bytesInUse -= len(entry['buffer'])
+
 class Fragment(eventBusClient.eventBusClient):
     '''
     Class which is responsible for 6LoWPAN fragmentation.
@@ -36,15 +209,36 @@ class Fragment(eventBusClient.eventBusClient):
 
     LENGTH_IPV6_MTU = 1280
     
-    def __init__(self):
+    SEND_TIMEOUT    = 60  # seconds before giving up on an outgoing message
+    SEND_WINDOW     = 4   # fragments handed to the DAG root before it acknowledges the first one
+    SEND_RETRIES    = 2   # retransmissions of a message the DAG root aborted
+    SEND_LATENCIES  = 100 # latencies of the last messages sent, kept for the stats
+    
+    def __init__(self,window=SEND_WINDOW,retries=SEND_RETRIES):
+        '''
+        :param window:  [in] Number of fragments of a message handed to the
+            DAG root before it acknowledges the first one. 1 sends a fragment
+            per serial round trip.
+        :param retries: [in] Number of times a message the DAG root aborted
+            is sent again.
+        '''
         
         # log
         log.info("create instance")
         
         # store params
+        self.window               = window
+        self.retries              = retries
         self.stateLock            = threading.Lock()
-        self.sndfragments         = {} # outgoing messages
-        self.rcvfragments         = {} # incoming messages
+        self.sndfragments         = collections.OrderedDict() # outgoing messages, by tag
+        self.reassembly           = ReassemblyManager()       # incoming messages
+        self.sndStats             = {
+            'sndCompleted':  0,
+            'sndRetries':    0,
+            'sndAborted':    0,
+            'sndExpired':    0,
+        }
+        self.sndLatencies         = collections.deque(maxlen=self.SEND_LATENCIES)
 
 	self.tag = random.randint(0,0xFFFF)
          
@@ -85,6 +279,23 @@ class Fragment(eventBusClient.eventBusClient):
             
     #======================== public ==========================================
     
+    def getStats(self):
+        '''
+        Returns the counters of the fragmentation.
+        
+        :returns: A dictionary with the counters of the
+            :class:`ReassemblyManager`; the number of outgoing messages
+            pending, completed, retransmitted, aborted and expired; and the
+            latencies, in seconds, from fragmenting the last messages to the
+            DAG root acknowledging their last fragment.
+        '''
+        returnVal = self.reassembly.getStats()
+        with self.stateLock:
+            returnVal.update(self.sndStats)
+            returnVal['sndPending']   = len(self.sndfragments)
+            returnVal['sndLatencies'] = list(self.sndLatencies)
+        return returnVal
+    
     #======================== private =========================================
     
     #===== Fragmentation
@@ -106,7 +317,7 @@ class Fragment(eventBusClient.eventBusClient):
                 # dispatch
                 self.dispatch(
                     signal       = 'bytesToMesh',
-                    data         = (nextHop,iphc+payload),
+                    data         = (nextHop,u.BytePacket(u.toByteString(iphc)+u.toByteString(payload))),
                 )
                 return
 
@@ -119,37 +330,42 @@ class Fragment(eventBusClient.eventBusClient):
 	    if actual_frag_size < len(iphc):
                 raise ValueError('unsupported IPHC size')
 
+            now  = time.time()
+            self._expireSent(now)
+            
             tag  = self._getNewTag()
-            stag = str(tag) #+str(size)+str(nextHop)
+            stag = tag
             # Using just tag as it is fixed by me and it is unique
-            # frag contains a triplet (data,offset,sent) for every fragment
-            self.sndfragments[stag] = {'frag':[], 'size': size, 'tag': tag, 'nextHop': nextHop}
+            # frag contains a pair (data,offset) for every fragment; the
+            # fragments before 'next' were handed to the DAG root, the
+            # first 'acked' ones were forwarded by it
+            msg  = {'frag':[], 'size': size, 'tag': tag, 'nextHop': nextHop, 'next': 0, 'acked': 0, 'retries': 0, 'start': now, 'deadline': now+self.SEND_TIMEOUT}
 
-	    input = iphc+payload
+	    input = u.BytePacket(u.toByteString(iphc)+u.toByteString(payload))
 	    if len(input) > self.LENGTH_IPV6_MTU:
 	        raise ValueError('unsupported packet size')
 
-	    self.sndfragments[stag]['frag'].append({'data': input[0:actual_frag_size], 'offset': 0, 'sent': False})
+            msg['frag'].append({'data': input[0:actual_frag_size], 'offset': 0})
             actual_sent   = actual_frag_size
             max_fragment -= 1
             actual_frag_size = max_fragment & 0xF8
             while actual_sent < size:
 	        if actual_frag_size > size - actual_sent:
                     actual_frag_size = size - actual_sent
-		self.sndfragments[stag]['frag'].append({'data': input[actual_sent:actual_sent+actual_frag_size], 'offset': actual_sent, 'sent': False})
+                msg['frag'].append({'data': input[actual_sent:actual_sent+actual_frag_size], 'offset': actual_sent})
                 actual_sent += actual_frag_size
 
 	    if log.isEnabledFor(logging.DEBUG):
                 output += " - offsets ="
-                for i in self.sndfragments[stag]['frag']:
+                for i in msg['frag']:
                     output += " " + str(i['offset'])
                 log.debug(output)
 
-            print "Sending message of " + str(len(iphc)) + "/" + str(len(input)) + " in " + str(len(self.sndfragments[stag]['frag'])) + " fragments"
-            self.dispatch(
-                signal = 'fragsent',
-                data   = stag,
-            )
+            print "Sending message of " + str(len(iphc)) + "/" + str(len(input)) + " in " + str(len(msg['frag'])) + " fragments"
+            with self.stateLock:
+                self.sndfragments.pop(stag,None)
+                self.sndfragments[stag] = msg
+            self._sendFragments(stag)
             #return
             
         except (ValueError) as err:
@@ -174,125 +390,160 @@ class Fragment(eventBusClient.eventBusClient):
             return
   
         # Packet is fragmented
-        # Create a tag mapping from tag+size+source.
-	stag  = str((pkt[2] << 8) + pkt[3])
-	stag += str(pkt[0] & 7) + str(pkt[1])
-	stag += str(data[0])
-
-	size   = ((pkt[0] & 7) << 8) + pkt[1] 
-	tag    = (pkt[2] << 8) + pkt[3]
-        offset = 0 if fragmented == self.FRAGMENT_FRAG1 else pkt[4]
-
-        # First time this tag arrives
-	if not stag in self.rcvfragments:
-#            self.rcvfragments[stag] = {'input':[], 'length':[], 'size': size}
-            self.rcvfragments[stag] = {'input':{}, 'length':[], 'size': size}
-
-        # Start of payload in frame
-        spkt = self.FRAGMENT_SKIP_BYTES
-	if fragmented == self.FRAGMENT_FRAGN:
-            spkt += 1 
-        # Start (position) and length in msg
-#	smsg = offset << 3   
-	length = len(pkt) - spkt
+        source = tuple(data[0])
+        size   = ((pkt[0] & 7) << 8) + pkt[1]
+        tag    = (pkt[2] << 8) + pkt[3]
 
-        # Store information
-#	self.rcvfragments[stag]['input'][smsg:smsg+length] = pkt[spkt:]
-	self.rcvfragments[stag]['input'][offset] = pkt[spkt:]
-	self.rcvfragments[stag]['length'].append(length)
+        # Start of payload in frame, and offset in msg
+        if fragmented == self.FRAGMENT_FRAG1:
+            spkt   = self.FRAGMENT_SKIP_BYTES
+            offset = 0
+        else:
+            spkt   = self.FRAGMENT_SKIP_BYTES+1
+            offset = pkt[4] << 3
 
-	# Check for completion
-	total = 0
-	for i in self.rcvfragments[stag]['length']:
-            total += i
-        if total == self.rcvfragments[stag]['size']:
-#            msg = self.rcvfragments[stag]['input']
-            msg = []
-	    for i in sorted(self.rcvfragments[stag]['input']):
-	        msg += self.rcvfragments[stag]['input'][i]
-	    del self.rcvfragments[stag]
-	    self.dispatch(
+        msg = self.reassembly.addFragment((tag,size,source),offset,pkt[spkt:])
+        if msg is not None:
+            self.dispatch(
                 signal = 'meshToV6',
                 data   = (data[0],msg),
             )
-        #return
 
     def _fragsent_notif(self,sender,signal,data):
         '''
+        The DAG root forwarded a fragment of a message: completes the
+        message, or hands the DAG root the next fragments of the window.
         '''
-	stag = data
-	size = self.sndfragments[stag]['size']
-        tag  = self.sndfragments[stag]['tag']
-	for fragment in self.sndfragments[stag]['frag']:
-            if not fragment['sent']:
-                offset  = fragment['offset']
-		payload = []
-
-		#size
-		payload.append((size & 0x0700) >> 8)
-		payload.append(size & 0x00FF)
-		#tag
-		payload.append((tag & 0xFF00) >> 8)
-		payload.append(tag & 0x00FF)
-		#offset & dispatch
-		if offset == 0:
-                    payload[0] |= self.FRAGMENT_FRAG1 << self.FRAGMENT_DISPATCH
-                else:
-                    payload[0] |= self.FRAGMENT_FRAGN << self.FRAGMENT_DISPATCH
-                    payload.append(offset >> 3)
-                #data
-                payload += fragment['data']
-
-	        if log.isEnabledFor(logging.DEBUG):
-		    log.debug("Sending fragment of " + str(len(payload)) +"B")
-
-		#send it
-		self.dispatch(
-                    signal = 'bytesToMesh',
-		    data   = (self.sndfragments[stag]['nextHop'],payload),
-                )
-
-		fragment['sent'] = True
-		return
-        
-	#Message sent
-	del self.sndfragments[stag]
-	#return
+        stag = data
+        with self.stateLock:
+            msg = self.sndfragments.get(stag)
+            if msg is None:
+                # aborted or expired meanwhile
+                return
+            msg['acked'] = min(msg['acked']+1,msg['next'])
+            if msg['acked'] == len(msg['frag']):
+                #Message sent
+                del self.sndfragments[stag]
+                latency = time.time()-msg['start']
+                self.sndStats['sndCompleted'] += 1
+                self.sndLatencies.append(latency)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Sent message {0} in {1:.3f}s".format(stag,latency))
+                return
+        self._sendFragments(stag)
     
     def _fragsent_notif_mote(self,sender,signal,data):
-	stag = data[1]
-	if stag in self.sndfragments:
+        stag = data[1]
+        if stag in self.sndfragments:
             self.dispatch(
                 signal = 'fragsent',
                 data   = stag,
             )
-	else:
- 	    if log.isEnabledFor(logging.DEBUG):
-	        log.debug("received sending tag {0} from mote".stag)
-  	#return
+        else:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("received sending tag {0} from mote".format(stag))
 
     def _fragabort_notif(self,sender,signal,data):
         '''
+        Drops the message a mote could not forward.
+        
+        The message is identified as parsed by the bridge parser: the
+        ``(tag,size,source)`` tuple of an incoming message, the tag of an
+        outgoing one, or the next hop of the outgoing messages.
         '''
 
-	incoming = data[0]
-	stag     = data[1]
+        incoming = data[0]
+        stag     = data[1]
 
-	if incoming == 7:
-	    if stag in self.rcvfragments:
-                del self.rcvfragments[stag]
-	elif incoming == 1:
-	    if stag in self.sndfragments:
+        if incoming == 7:
+            self.reassembly.abort(stag)
+        elif incoming == 1:
+            with self.stateLock:
+                msg = self.sndfragments.get(stag)
+                if msg is None:
+                    return
                 del self.sndfragments[stag]
-	else: #if incoming == 2
-	    for msg in self.sndfragments:
-	        if str(msg['nextHop']) == tag:
-		    del msg
-        
-        #return 
+                if msg['retries'] >= self.retries:
+                    self.sndStats['sndAborted'] += 1
+                    return
+                # the DAG root dropped the message, send it again under a new
+                # tag: the acknowledgements the DAG root still sends for the
+                # fragments of this attempt then do not count for the next one
+                stag             = self._getNewTag()
+                msg['tag']       = stag
+                msg['retries']  += 1
+                msg['next']      = 0
+                msg['acked']     = 0
+                msg['deadline']  = time.time()+self.SEND_TIMEOUT
+                self.sndfragments[stag] = msg
+                self.sndStats['sndRetries'] += 1
+            self._sendFragments(stag)
+        else: #if incoming == 2
+            with self.stateLock:
+                for (tag,msg) in self.sndfragments.items():
+                    if tuple(msg['nextHop']) == stag:
+                        del self.sndfragments[tag]
     
     #======================== helpers =========================================
     
+    def _sendFragments(self,stag):
+        '''
+        Hands the DAG root the fragments of a message, until 'window' of them
+        are waiting for its acknowledgement.
+        
+        moteProbe queues the frames until the DAG root requests them, so the
+        DAG root does not wait a serial round trip between fragments.
+        '''
+        toSend = []
+        with self.stateLock:
+            msg = self.sndfragments.get(stag)
+            if msg is None:
+                return
+            while msg['next'] < len(msg['frag']) and msg['next']-msg['acked'] < self.window:
+                toSend += [msg['frag'][msg['next']]]
+                msg['next'] += 1
+            size    = msg['size']
+            tag     = msg['tag']
+            nextHop = msg['nextHop']
+        
+        for fragment in toSend:
+            offset  = fragment['offset']
+            payload = []
+            
+            #size
+            payload.append((size & 0x0700) >> 8)
+            payload.append(size & 0x00FF)
+            #tag
+            payload.append((tag & 0xFF00) >> 8)
+            payload.append(tag & 0x00FF)
+            #offset & dispatch
+            if offset == 0:
+                payload[0] |= self.FRAGMENT_FRAG1 << self.FRAGMENT_DISPATCH
+            else:
+                payload[0] |= self.FRAGMENT_FRAGN << self.FRAGMENT_DISPATCH
+                payload.append(offset >> 3)
+            #data
+            payload  = u.BytePacket(u.toByteString(payload)+u.toByteString(fragment['data']))
+            
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Sending fragment of " + str(len(payload)) +"B")
+            
+            #send it
+            self.dispatch(
+                signal = 'bytesToMesh',
+                data   = (nextHop,payload),
+            )
+    
+    def _expireSent(self,now):
+        # messages are ordered by creation, hence by deadline
+        with self.stateLock:
+            while self.sndfragments:
+                stag = next(iter(self.sndfragments))
+                if self.sndfragments[stag]['deadline']>now:
+                    break
+                del self.sndfragments[stag]
+                self.sndStats['sndExpired'] += 1
+    
     def _getNewTag(self):
         returnVal = self.tag
 
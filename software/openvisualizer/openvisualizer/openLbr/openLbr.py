@@ -10,6 +10,7 @@ log.addHandler(logging.NullHandler())
 
 from openvisualizer.eventBus import eventBusClient
 import threading
+import struct
 import openvisualizer.openvisualizer_utils as u
 
 #============================ parameters ======================================
@@ -118,6 +119,20 @@ class OpenLbr(eventBusClient.eventBusClient):
     
     NHC_UDP_MASK             = 0xF8
     NHC_UDP_ID               = 0xF0
+    NHC_UDP_C_ELIDED         = 0x04
+    NHC_UDP_PORTS_MASK       = 0x03
+    NHC_UDP_PORTS_INLINE     = 0
+    NHC_UDP_PORTS_16S_8D     = 1
+    NHC_UDP_PORTS_8S_16D     = 2
+    NHC_UDP_PORTS_4S_4D      = 3
+    UDP_PORTS_8B             = 0xF000 # ports 0xF0xx
+    UDP_PORTS_4B             = 0xF0B0 # ports 0xF0Bx
+    UDP_HEADER_LEN           = 8
+    
+    #=== IPHC address compression (RFC6282)
+    
+    # interface identifier of an address derived from a 16-bit short address
+    IID_16B_PREFIX           = [0x00,0x00,0x00,0xff,0xfe,0x00]
     
     def __init__(self):
         
@@ -128,6 +143,7 @@ class OpenLbr(eventBusClient.eventBusClient):
         self.stateLock            = threading.Lock()
         self.networkPrefix        = None
         self.dagRootEui64         = None
+        self.contexts             = {} # context identifier -> 64-bit prefix
          
         # initialize parent class
         eventBusClient.eventBusClient.__init__(
@@ -298,32 +314,18 @@ class OpenLbr(eventBusClient.eventBusClient):
                 
                 if (ipv6dic['payload'][0] & self.NHC_UDP_MASK==self.NHC_UDP_ID):
                     
-                    oldUdp=ipv6dic['payload'][:5]
-                    #re-arrange fields and inflate
-                    newUdp = []
-                    newUdp += oldUdp[1:3] # Source Port
-                    newUdp += oldUdp[3:5] # Destination Port
-                    length = 8+len(pkt[5:])
-                    newUdp += [(length & 0xFF00) >> 8] # Length
-                    newUdp += [(length & 0x00FF) >> 0]
-                    idxCS = len(newUdp) # remember index of checksum
-                    newUdp += [0x00,0x00] # Checksum (placeholder)
-                    #append payload to compute crc again
-                    newUdp += ipv6dic['payload'][5:] # data octets
-                    
-                    checksum = u.calculateCRC(newUdp)
-                    #fill crc with the right value.
-                    newUdp[idxCS] = checksum[0]
-                    newUdp[idxCS+1] = checksum[1]
+                    #inflate
+                    (newUdp,data) = self.decompress_udp(ipv6dic['payload'],ipv6dic['src_addr'],ipv6dic['dst_addr'])
                     #keep fields for later processing if needed
                     ipv6dic['udp_src_port']=newUdp[:2]
                     ipv6dic['udp_dest_port']=newUdp[2:4]
                     ipv6dic['udp_length']=newUdp[4:6]
                     ipv6dic['udp_checksum']=newUdp[6:8]
-                    ipv6dic['app_payload']=newUdp[8:]
+                    ipv6dic['app_payload']=data
                     
                     #substitute udp header by the uncompressed header.               
-                    ipv6dic['payload'] =newUdp[:8] + ipv6dic['payload'][5:]
+                    ipv6dic['payload'] =newUdp + data
+                    ipv6dic['payload_length'] = len(ipv6dic['payload'])
                 else:
                     #No UDP header compressed    
                     ipv6dic['udp_src_port']=ipv6dic['payload'][:2]
@@ -411,8 +413,14 @@ class OpenLbr(eventBusClient.eventBusClient):
             raise NotImplementedError('flow_label={0} unsupported'.format(ipv6['flow_label']))
         lowpan['tf']         = []
         
-        # nh
+        # nh, elided when the UDP header is compressed
         lowpan['nh']         = [ipv6['next_header']]
+        lowpan['payload']    = ipv6['payload']
+        if ipv6['next_header']==self.IANA_UDP:
+            udp              = self.compress_udp(ipv6['payload'])
+            if udp is not None:
+                lowpan['nh']      = []
+                lowpan['payload'] = udp
         
         # hlim
         lowpan['hlim']       = [ipv6['hop_limit']]
@@ -426,12 +434,102 @@ class OpenLbr(eventBusClient.eventBusClient):
         # dst_addr
         lowpan['dst_addr']   = ipv6['dst_addr']
         
-        # payload
-        lowpan['payload']    = ipv6['payload']
-        
         # join
         return lowpan
     
+    def compress_udp(self,udp):
+        '''
+        Compress a UDP header with the UDP NHC of RFC6282.
+        
+        The length is elided, the ports are compressed when in the
+        0xF0xx/0xF0Bx ranges; the checksum is always carried inline.
+        
+        :param udp: [in] The UDP header and payload.
+        
+        :returns: The compressed UDP header and payload, or None when the
+            UDP header cannot be compressed.
+        '''
+        
+        if len(udp)<self.UDP_HEADER_LEN or u.buf2int(udp[4:6])!=len(udp):
+            # the length cannot be derived from the IPv6 payload length
+            return None
+        
+        srcPort              = u.buf2int(udp[0:2])
+        dstPort              = u.buf2int(udp[2:4])
+        
+        if   srcPort & 0xFFF0==self.UDP_PORTS_4B and dstPort & 0xFFF0==self.UDP_PORTS_4B:
+            header           = [self.NHC_UDP_ID|self.NHC_UDP_PORTS_4S_4D]
+            header          += [((srcPort & 0x0F) << 4) | (dstPort & 0x0F)]
+        elif dstPort & 0xFF00==self.UDP_PORTS_8B:
+            header           = [self.NHC_UDP_ID|self.NHC_UDP_PORTS_16S_8D]
+            header          += [srcPort >> 8, srcPort & 0xFF, dstPort & 0xFF]
+        elif srcPort & 0xFF00==self.UDP_PORTS_8B:
+            header           = [self.NHC_UDP_ID|self.NHC_UDP_PORTS_8S_16D]
+            header          += [srcPort & 0xFF, dstPort >> 8, dstPort & 0xFF]
+        else:
+            header           = [self.NHC_UDP_ID|self.NHC_UDP_PORTS_INLINE]
+            header          += [srcPort >> 8, srcPort & 0xFF, dstPort >> 8, dstPort & 0xFF]
+        
+        # checksum
+        header              += list(udp[6:8])
+        
+        return u.BytePacket(u.toByteString(header)+u.toByteString(udp[self.UDP_HEADER_LEN:]))
+    
+    def decompress_udp(self,nhc,src_addr,dst_addr):
+        '''
+        Inflate a UDP header compressed with the UDP NHC of RFC6282.
+        
+        :param nhc:      [in] The compressed UDP header and payload.
+        :param src_addr: [in] The IPv6 source address, to compute an elided
+            checksum.
+        :param dst_addr: [in] The IPv6 destination address, to compute an
+            elided checksum.
+        
+        :raises: ValueError when the compressed header is truncated.
+        
+        :returns: A tuple ``(header,data)`` with the 8-byte UDP header, as a
+            list, and the UDP payload.
+        '''
+        
+        ports                = nhc[0] & self.NHC_UDP_PORTS_MASK
+        if   ports==self.NHC_UDP_PORTS_INLINE:
+            header           = list(nhc[1:5])
+            ptr              = 5
+        elif ports==self.NHC_UDP_PORTS_16S_8D:
+            header           = list(nhc[1:3]) + [self.UDP_PORTS_8B >> 8, nhc[3]]
+            ptr              = 4
+        elif ports==self.NHC_UDP_PORTS_8S_16D:
+            header           = [self.UDP_PORTS_8B >> 8, nhc[1]] + list(nhc[2:4])
+            ptr              = 4
+        else:
+            header           = [self.UDP_PORTS_4B >> 8, (self.UDP_PORTS_4B & 0xF0) | (nhc[1] >> 4)]
+            header          += [self.UDP_PORTS_4B >> 8, (self.UDP_PORTS_4B & 0xF0) | (nhc[1] & 0x0F)]
+            ptr              = 2
+        
+        if not nhc[0] & self.NHC_UDP_C_ELIDED:
+            checksum         = list(nhc[ptr:ptr+2])
+            ptr             += 2
+        else:
+            checksum         = None
+        
+        if len(nhc)<ptr:
+            raise ValueError('truncated UDP NHC header ({0} bytes)'.format(len(nhc)))
+        
+        data                 = nhc[ptr:]
+        length               = self.UDP_HEADER_LEN+len(data)
+        header              += [length >> 8, length & 0xFF]
+        if checksum is None:
+            checksum         = u.calculatePseudoHeaderCRC(
+                src_addr,
+                dst_addr,
+                [0x00,0x00,length >> 8,length & 0xFF],
+                [0x00,0x00,0x00,self.IANA_UDP],
+                header+[0x00,0x00]+list(data),
+            )
+        header              += checksum
+        
+        return (header,data)
+    
     def reassemble_lowpan(self,lowpan):
         '''
         Turn dictionary of 6LoWPAN header fields into byte array.
@@ -563,50 +661,44 @@ class OpenLbr(eventBusClient.eventBusClient):
             tf               = self.IPHC_TF_ELIDED
         else:
             raise NotImplementedError()
-        # next header is in NHC format
-        nh               = self.IPHC_NH_INLINE
-        if   lowpan['hlim']==1:
+        # next header is inline, or compressed in NHC format
+        if lowpan['nh']:
+            nh               = self.IPHC_NH_INLINE
+        else:
+            nh               = self.IPHC_NH_COMPRESSED
+        hlimInline           = []
+        if   lowpan['hlim']==[1]:
             hlim             = self.IPHC_HLIM_1
-            lowpan['hlim'] = []
-        elif lowpan['hlim']==64:
+        elif lowpan['hlim']==[64]:
             hlim             = self.IPHC_HLIM_64
-            lowpan['hlim'] = []
-        elif lowpan['hlim']==255:
+        elif lowpan['hlim']==[255]:
             hlim             = self.IPHC_HLIM_255
-            lowpan['hlim'] = []
         else:
             hlim             = self.IPHC_HLIM_INLINE
+            hlimInline       = lowpan['hlim']
         returnVal           += [(self.IPHC_DISPATCH<<5) + (tf<<3) + (nh<<2) + (hlim<<0)]
         
         # Byte2: CID(1b) SAC(1b) SAM(2b) M(1b) DAC(2b) DAM(2b)
-        if len(lowpan['cid'])==0:
-            cid              = self.IPHC_CID_NO
-        else:
-            cid              = self.IPHC_CID_YES
-        sac                  = self.IPHC_SAC_STATELESS
-        if   len(lowpan['src_addr'])==128/8:
-            sam              = self.IPHC_SAM_128B
-        elif len(lowpan['src_addr'])==64/8:
-            sam              = IPHC_SAM_64B
-        elif len(lowpan['src_addr'])==16/8:
-            sam              = self.IPHC_SAM_16B
-        elif len(lowpan['src_addr'])==0:
-            sam              = self.IPHC_SAM_ELIDED
+        # the destination is derived from the MAC destination (the next hop),
+        # the source from the MAC source of the last hop, which is the
+        # DAGroot only when the next hop is the destination (RFC 6282)
+        if len(lowpan['route'])==1:
+            srcMacAddr       = self.dagRootEui64
         else:
-            raise SystemError()
-        dac                  = self.IPHC_DAC_STATELESS
+            srcMacAddr       = None
+        (sac,sam,sci,srcInline) = self._compressAddress(lowpan['src_addr'],srcMacAddr)
+        (dac,dam,dci,dstInline) = self._compressAddress(lowpan['dst_addr'],lowpan.get('nextHop'))
         m                    = self.IPHC_M_NO
-        if   len(lowpan['dst_addr'])==128/8:
-            dam              = self.IPHC_DAM_128B
-        elif len(lowpan['dst_addr'])==64/8:
-            dam              = self.IPHC_DAM_64B
-        elif len(lowpan['dst_addr'])==16/8:
-            dam              = self.IPHC_DAM_16B
-        elif len(lowpan['dst_addr'])==0:
-            dam              = self.IPHC_DAM_ELIDED
+        if sci or dci:
+            cid              = self.IPHC_CID_YES
+            cidInline        = [(sci << 4) | dci]
         else:
-            raise SystemError()
+            cid              = self.IPHC_CID_NO
+            cidInline        = []
         returnVal           += [(cid << 7) + (sac << 6) + (sam << 4) + (m << 3) + (dac << 2) + (dam << 0)]
+        
+        # cid
+        returnVal           += cidInline
 
         # tf
         returnVal           += lowpan['tf']
@@ -615,16 +707,13 @@ class OpenLbr(eventBusClient.eventBusClient):
         returnVal           += lowpan['nh']
         
         # hlim
-        returnVal           += lowpan['hlim']
-        
-        # cid
-        returnVal           += lowpan['cid']
+        returnVal           += hlimInline
 
         # src_addr
-        returnVal           += lowpan['src_addr']
+        returnVal           += srcInline
         
         # dst_addr
-        returnVal           += lowpan['dst_addr']
+        returnVal           += dstInline
 
         # payload
         #returnVal          += lowpan['payload']
@@ -685,6 +774,15 @@ class OpenLbr(eventBusClient.eventBusClient):
                 log.error("ERROR not a 6LowPAN packet")
                 return   
         
+            # cid
+            if (pkt_lowpan[1] >> 7) == self.IPHC_CID_YES:
+                sci = pkt_lowpan[ptr] >> 4
+                dci = pkt_lowpan[ptr] & 0x0F
+                ptr = ptr+1
+            else:
+                sci = 0
+                dci = 0
+            
             # tf
             tf = ((pkt_lowpan[0]) >> 3) & 0x03
             if (tf == self.IPHC_TF_3B):
@@ -721,19 +819,21 @@ class OpenLbr(eventBusClient.eventBusClient):
                 log.error("wrong hlim=="+str(hlim))
             # sam
             sam = ((pkt_lowpan[1]) >> 4) & 0x03
+            sac = ((pkt_lowpan[1]) >> 6) & 0x01
+            if sac == self.IPHC_SAC_STATEFUL:
+                prefix = self._getContext(sci)
+            else:
+                prefix = self.networkPrefix
             if (sam == self.IPHC_SAM_ELIDED):
                 #pkt from the previous hop
-                pkt_ipv6['src_addr'] = self.networkPrefix + mac_prev_hop
+                pkt_ipv6['src_addr'] = prefix + mac_prev_hop
                 
             elif (sam == self.IPHC_SAM_16B):
-                a1 = pkt_lowpan[ptr]
-                a2 = pkt_lowpan[ptr+1]
+                pkt_ipv6['src_addr'] = prefix+self.IID_16B_PREFIX+pkt_lowpan[ptr:ptr+2]
                 ptr = ptr+2
-                s = ''.join(['\x00','\x00','\x00','\x00','\x00','\x00',a1,a2])
-                pkt_ipv6['src_addr'] = self.networkPrefix+s
         
             elif (sam == self.IPHC_SAM_64B):
-                pkt_ipv6['src_addr'] = self.networkPrefix+pkt_lowpan[ptr:ptr+8]
+                pkt_ipv6['src_addr'] = prefix+pkt_lowpan[ptr:ptr+8]
                 ptr = ptr + 8
             elif (sam == self.IPHC_SAM_128B):
                 pkt_ipv6['src_addr'] = pkt_lowpan[ptr:ptr+16]
@@ -743,18 +843,20 @@ class OpenLbr(eventBusClient.eventBusClient):
                 
             # dam
             dam = ((pkt_lowpan[1]) & 0x03)
+            dac = ((pkt_lowpan[1]) >> 2) & 0x01
+            if dac == self.IPHC_DAC_STATEFUL:
+                prefix = self._getContext(dci)
+            else:
+                prefix = self.networkPrefix
             if (dam == self.IPHC_DAM_ELIDED):
                 if log.isEnabledFor(logging.DEBUG):
                     log.debug("IPHC_DAM_ELIDED this packet is for the dagroot!")
-                pkt_ipv6['dst_addr'] = self.networkPrefix+self.dagRootEui64
+                pkt_ipv6['dst_addr'] = prefix+self.dagRootEui64
             elif (dam == self.IPHC_DAM_16B):
-                a1 = pkt_lowpan[ptr]
-                a2 = pkt_lowpan[ptr+1]
+                pkt_ipv6['dst_addr'] = prefix+self.IID_16B_PREFIX+pkt_lowpan[ptr:ptr+2]
                 ptr = ptr+2
-                s = ''.join(['\x00','\x00','\x00','\x00','\x00','\x00',a1,a2])
-                pkt_ipv6['dst_addr'] = self.networPrefix+s
             elif (dam == self.IPHC_DAM_64B):
-                pkt_ipv6['dst_addr'] = self.networkPrefix+pkt_lowpan[ptr:ptr+8]
+                pkt_ipv6['dst_addr'] = prefix+pkt_lowpan[ptr:ptr+8]
                 ptr = ptr + 8
             elif (dam == self.IPHC_DAM_128B):
                 pkt_ipv6['dst_addr'] = pkt_lowpan[ptr:ptr+16]
@@ -771,6 +873,9 @@ class OpenLbr(eventBusClient.eventBusClient):
                         pkt_ipv6['next_header'] = self.IPV6_HEADER
                     else:
                         log.error("wrong NH_EID=="+str(eid))
+                elif (pkt_lowpan[ptr] & self.NHC_UDP_MASK) == self.NHC_UDP_ID:
+                    # the UDP header stays compressed in the payload
+                    pkt_ipv6['next_header'] = self.IANA_UDP
             
             #hop by hop header 
             #composed of NHC, NextHeader,Len + Rpl Option
@@ -811,26 +916,73 @@ class OpenLbr(eventBusClient.eventBusClient):
         return pkt_ipv6
     
     def reassemble_ipv6_packet(self, pkt):
-        pktw = []
-        pktw.append(((6 << 4) + (pkt['traffic_class'] >> 4)))
-        pktw.append(( ((pkt['traffic_class'] & 0x0F) << 4) + (pkt['flow_label'] >> 16) ))
-        pktw.append(( (pkt['flow_label'] >> 8) & 0x00FF ))
-        pktw.append(( pkt['flow_label'] & 0x0000FF ))
-        pktw.append(( pkt['payload_length'] >> 8 ))
-        pktw.append(( pkt['payload_length'] & 0x00FF ))
-        pktw.append(( pkt['next_header'] ))
-        pktw.append(( pkt['hop_limit'] ))
-        for i in range(0,16):
-            pktw.append( (pkt['src_addr'][i]) )
-        for i in range(0,16):
-            pktw.append( (pkt['dst_addr'][i]) ) 
+        '''
+        Turn dictionary of IPv6 fields into a packet.
+        
+        :returns: A BytePacket.
+        '''
+        pktw = struct.pack(
+            '>BBBBHBB',
+            (6 << 4) + (pkt['traffic_class'] >> 4),
+            ((pkt['traffic_class'] & 0x0F) << 4) + (pkt['flow_label'] >> 16),
+            (pkt['flow_label'] >> 8) & 0x00FF,
+            pkt['flow_label'] & 0x0000FF,
+            pkt['payload_length'],
+            pkt['next_header'],
+            pkt['hop_limit'],
+        )
         
-        return pktw + pkt['payload']
+        return u.BytePacket(''.join([
+            pktw,
+            u.toByteString(pkt['src_addr'][:16]),
+            u.toByteString(pkt['dst_addr'][:16]),
+            u.toByteString(pkt['payload']),
+        ]))
         
     
     
     #======================== helpers =========================================
     
+    #===== address compression
+    
+    def _compressAddress(self,addr,macAddr):
+        '''
+        Pick the IPHC compression of an address.
+        
+        An address is compressed when its prefix is in the context table.
+        Its interface identifier is then elided when it is the link-layer
+        address, carried on 16 bits when derived from a short address, and on
+        64 bits otherwise.
+        
+        :param addr:    [in] The 128-bit IPv6 address.
+        :param macAddr: [in] The 64-bit link-layer address the address can
+            be derived from, or None.
+        
+        :returns: A tuple ``(ac,am,ci,inline)``, with the address
+            compression, address mode, context identifier and inline bytes.
+        '''
+        
+        addr                 = list(addr)
+        for (ci,prefix) in sorted(self.contexts.items()):
+            if addr[:8]==prefix:
+                break
+        else:
+            return (self.IPHC_SAC_STATELESS,self.IPHC_SAM_128B,0,addr)
+        
+        iid                  = addr[8:]
+        if macAddr is not None and iid==list(macAddr):
+            return (self.IPHC_SAC_STATEFUL,self.IPHC_SAM_ELIDED,ci,[])
+        elif iid[:6]==self.IID_16B_PREFIX:
+            return (self.IPHC_SAC_STATEFUL,self.IPHC_SAM_16B,ci,iid[6:])
+        else:
+            return (self.IPHC_SAC_STATEFUL,self.IPHC_SAM_64B,ci,iid)
+    
+    def _getContext(self,ci):
+        prefix = self.contexts.get(ci)
+        if prefix is None:
+            raise ValueError('unknown IPHC context {0}'.format(ci))
+        return prefix
+    
     #===== source route
     
     def _getSourceRoute(self,destination):
@@ -846,6 +998,7 @@ class OpenLbr(eventBusClient.eventBusClient):
         '''
         with self.stateLock:
             self.networkPrefix    = data  
+            self.contexts[0]      = list(data)
             log.info('Set network prefix  {0}'.format(u.formatIPv6Addr(data)))
             
             
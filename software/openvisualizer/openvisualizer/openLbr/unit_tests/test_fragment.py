@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # openLbr/
+
+import logging
+import logging.handlers
+
+import pytest
+
+import fragment
+import openvisualizer.openvisualizer_utils as u
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_fragment.log'
+
+import logging
+log = logging.getLogger('test_fragment')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_fragment',
+                   'fragment',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+MOTE_A      = [0x14,0x15,0x92,0xcc,0x00,0x00,0x00,0x02]
+MOTE_B      = [0x14,0x15,0x92,0xcc,0x00,0x00,0x00,0x03]
+PACKET      = [i & 0xFF for i in range(300)]
+
+#============================ helpers =========================================
+
+class recordingFragment(fragment.Fragment):
+    
+    def __init__(self,**kwargs):
+        self.dispatched = []
+        fragment.Fragment.__init__(self,**kwargs)
+    
+    def dispatch(self,signal,data):
+        self.dispatched += [(signal,data)]
+        return []
+
+@pytest.fixture
+def frag():
+    return recordingFragment()
+
+def fragmentPacket(frag,nextHop,packet):
+    '''
+    Returns the fragments the Fragment instance sends for a packet.
+    '''
+    frag._fragment_notif(None,'fragment',(nextHop,packet[:10],packet[10:]))
+    stag = frag.sndfragments.keys()[-1]
+    # the mote acknowledges each fragment
+    while stag in frag.sndfragments:
+        frag._fragsent_notif(None,'fragsent',stag)
+    return sentFragments(frag)
+
+def sentFragments(frag):
+    return [d[1] for (s,d) in frag.dispatched if s=='bytesToMesh']
+
+#============================ tests ===========================================
+
+def test_reassembleOutOfOrder(frag):
+    fragments = fragmentPacket(frag,MOTE_A,PACKET)
+    assert len(fragments)==4
+    assert frag.getStats()['sndPending']==0
+    
+    frag.dispatched = []
+    for f in reversed(fragments):
+        frag._assemble_notif(None,'fromMote.data',(u.BytePacket(MOTE_A),f))
+    
+    assert frag.dispatched==[('meshToV6',(MOTE_A,PACKET))]
+    stats = frag.getStats()
+    assert stats['completed']==1
+    assert stats['pending']==0
+    assert stats['bytesInUse']==0
+
+def test_sourcesAreSeparate(frag):
+    fragments = fragmentPacket(frag,MOTE_A,PACKET)
+    
+    frag.dispatched = []
+    for f in fragments[:-1]:
+        frag._assemble_notif(None,'fromMote.data',(MOTE_A,f))
+    for f in fragments:
+        frag._assemble_notif(None,'fromMote.data',(MOTE_B,f))
+    
+    assert frag.dispatched==[('meshToV6',(MOTE_B,PACKET))]
+    assert frag.getStats()['pending']==1
+
+def test_duplicateFragment():
+    reassembly = fragment.ReassemblyManager()
+    key        = (1,16,tuple(MOTE_A))
+    
+    assert reassembly.addFragment(key,0,[1]*8,now=0) is None
+    assert reassembly.addFragment(key,0,[1]*8,now=0) is None
+    assert reassembly.addFragment(key,8,[2]*8,now=0)==[1]*8+[2]*8
+    assert reassembly.addFragment(key,8,[2]*9,now=0) is None
+    
+    stats = reassembly.getStats()
+    assert stats['duplicates']==1
+    assert stats['malformed']==1
+    assert stats['completed']==1
+
+def test_overlappingFragment():
+    reassembly = fragment.ReassemblyManager()
+    key        = (1,32,tuple(MOTE_A))
+    
+    # the second fragment overlaps the first: the packet is dropped
+    assert reassembly.addFragment(key,0,'A'*16,now=0) is None
+    assert reassembly.addFragment(key,8,'B'*16,now=0) is None
+    stats = reassembly.getStats()
+    assert stats['overlaps']==1
+    assert stats['pending']==0
+    assert stats['bytesInUse']==0
+    
+    # its last fragment starts a new packet, which does not complete
+    assert reassembly.addFragment(key,16,'C'*16,now=0) is None
+    assert reassembly.getStats()['completed']==0
+    assert reassembly.addFragment(key,0,'A'*16,now=0)=='A'*16+'C'*16
+    
+    # a fragment at the same offset but of another length overlaps as well
+    assert reassembly.addFragment(key,0,'A'*8,now=0) is None
+    assert reassembly.addFragment(key,0,'A'*16,now=0) is None
+    assert reassembly.getStats()['overlaps']==2
+
+def test_timeout():
+    reassembly = fragment.ReassemblyManager(timeout=60)
+    
+    reassembly.addFragment((1,16,tuple(MOTE_A)),0,[1]*8,now=0)
+    reassembly.addFragment((2,16,tuple(MOTE_A)),0,[1]*8,now=30)
+    reassembly.expire(now=60)
+    assert reassembly.getStats()['pending']==1
+    
+    # the late fragment starts a new packet
+    assert reassembly.addFragment((1,16,tuple(MOTE_A)),8,[2]*8,now=61) is None
+    stats = reassembly.getStats()
+    assert stats['expired']==1
+    assert stats['pending']==2
+
+def test_memoryBudget():
+    reassembly = fragment.ReassemblyManager(maxBytes=1000)
+    
+    for tag in range(5):
+        reassembly.addFragment((tag,300,tuple(MOTE_A)),0,[1]*8,now=0)
+    
+    stats = reassembly.getStats()
+    assert stats['pending']==3
+    assert stats['evicted']==2
+    assert stats['bytesInUse']==900
+    assert (0,300,tuple(MOTE_A)) not in reassembly.buffers
+
+def test_abort(frag):
+    fragments = fragmentPacket(frag,MOTE_A,PACKET)
+    tag       = fragments[0].unpack_from('>H',2)[0]
+    frag._assemble_notif(None,'fromMote.data',(MOTE_A,fragments[0]))
+    
+    # as parsed by ParserBridge
+    frag._fragabort_notif(None,'fromMote.fragabort',(7,(tag,len(PACKET),tuple(MOTE_A))))
+    
+    stats = frag.getStats()
+    assert stats['aborted']==1
+    assert stats['pending']==0
+
+def test_sendTimeout(frag, monkeypatch):
+    frag._fragment_notif(None,'fragment',(MOTE_A,PACKET[:10],PACKET[10:]))
+    assert frag.getStats()['sndPending']==1
+    
+    now = fragment.time.time()
+    monkeypatch.setattr(fragment.time,'time',lambda: now+frag.SEND_TIMEOUT+1)
+    frag._fragment_notif(None,'fragment',(MOTE_B,PACKET[:10],PACKET[10:]))
+    
+    stats = frag.getStats()
+    assert stats['sndPending']==1
+    assert stats['sndExpired']==1
+
+def test_sendWindow():
+    frag = recordingFragment(window=2)
+    frag._fragment_notif(None,'fragment',(MOTE_A,PACKET[:10],PACKET[10:]))
+    stag = frag.sndfragments.keys()[-1]
+    
+    # two fragments are handed to the DAG root at once
+    assert len(sentFragments(frag))==2
+    frag._fragsent_notif(None,'fragsent',stag)
+    assert len(sentFragments(frag))==3
+    frag._fragsent_notif(None,'fragsent',stag)
+    frag._fragsent_notif(None,'fragsent',stag)
+    assert len(sentFragments(frag))==4
+    assert frag.getStats()['sndPending']==1
+    frag._fragsent_notif(None,'fragsent',stag)
+    
+    stats = frag.getStats()
+    assert stats['sndPending']==0
+    assert stats['sndCompleted']==1
+    assert len(stats['sndLatencies'])==1
+
+def test_sameFragmentsAnyWindow():
+    one  = recordingFragment(window=1)
+    many = recordingFragment(window=8)
+    many.tag = one.tag
+    
+    assert fragmentPacket(one,MOTE_A,PACKET)==fragmentPacket(many,MOTE_A,PACKET)
+
+def test_retransmitOnAbort():
+    frag = recordingFragment(window=4,retries=1)
+    frag._fragment_notif(None,'fragment',(MOTE_A,PACKET[:10],PACKET[10:]))
+    stag = frag.sndfragments.keys()[-1]
+    first = sentFragments(frag)
+    assert len(first)==4
+    
+    # the whole message is sent again, under a new tag
+    frag._fragabort_notif(None,'fromMote.fragabort',(1,stag))
+    retry = frag.sndfragments.keys()[-1]
+    assert retry!=stag
+    again = sentFragments(frag)[len(first):]
+    assert [f.unpack_from('>H',2)[0] for f in again]==[retry]*4
+    assert [f[:2]+f[4:] for f in again]==[f[:2]+f[4:] for f in first]
+    
+    # until the retries are exhausted
+    frag._fragabort_notif(None,'fromMote.fragabort',(1,retry))
+    stats = frag.getStats()
+    assert stats['sndRetries']==1
+    assert stats['sndAborted']==1
+    assert stats['sndPending']==0
+
+def test_lateAckAfterRetry():
+    frag = recordingFragment(window=4,retries=1)
+    frag._fragment_notif(None,'fragment',(MOTE_A,PACKET[:10],PACKET[10:]))
+    stag = frag.sndfragments.keys()[-1]
+    
+    # the DAG root forwards a fragment, then aborts the message
+    frag._fragsent_notif(None,'fragsent',stag)
+    frag._fragabort_notif(None,'fromMote.fragabort',(1,stag))
+    retry = frag.sndfragments.keys()[-1]
+    
+    # the late acknowledgements of the first attempt are ignored
+    for _ in range(3):
+        frag._fragsent_notif(None,'fragsent',stag)
+    assert frag.sndfragments[retry]['acked']==0
+    frag._fragabort_notif(None,'fromMote.fragabort',(1,stag))
+    stats = frag.getStats()
+    assert stats['sndPending']==1
+    assert stats['sndCompleted']==0
+    assert stats['sndAborted']==0
+    
+    # those of the retry complete the message
+    for _ in range(4):
+        frag._fragsent_notif(None,'fragsent',retry)
+    stats = frag.getStats()
+    assert stats['sndPending']==0
+    assert stats['sndCompleted']==1
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # openLbr/
+
+import logging
+import logging.handlers
+import struct
+
+import pytest
+
+import openLbr
+import openvisualizer.openvisualizer_utils as u
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_openLbr.log'
+
+import logging
+log = logging.getLogger('test_openLbr')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_openLbr',
+                   'openLbr',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+#============================ defines =========================================
+
+PREFIX      = [0xbb,0xbb,0x00,0x00,0x00,0x00,0x00,0x00]
+DAGROOT     = [0x14,0x15,0x92,0xcc,0x00,0x00,0x00,0x01]
+MOTE_A      = [0x14,0x15,0x92,0xcc,0x00,0x00,0x00,0x02]
+MOTE_B      = [0x14,0x15,0x92,0xcc,0x00,0x00,0x00,0x03]
+HOST        = PREFIX+[0x00]*7+[0x01]
+INTERNET    = [0x20,0x01,0x0d,0xb8]+[0x00]*11+[0x01]
+
+#============================ helpers =========================================
+
+@pytest.fixture
+def lbr():
+    lbr = openLbr.OpenLbr()
+    lbr._setPrefix_notif(None,'networkPrefix',PREFIX)
+    lbr.dagRootEui64 = DAGROOT
+    return lbr
+
+def udpPacket(src,dst,srcPort,dstPort,data='hello',hlim=64):
+    udp = struct.pack('>HHHH',srcPort,dstPort,8+len(data),0x1234)+data
+    ip  = struct.pack('>BBBBHBB',0x60,0x00,0x00,0x00,len(udp),openLbr.OpenLbr.IANA_UDP,hlim)
+    return u.BytePacket(ip+u.toByteString(src)+u.toByteString(dst)+udp)
+
+def toLowpan(lbr,ipv6_bytes,route):
+    lowpan = lbr.ipv6_to_lowpan(lbr.disassemble_ipv6(ipv6_bytes))
+    lowpan['route']   = route
+    lowpan['nextHop'] = route[-1]
+    return (lbr.reassemble_lowpan(lowpan),lowpan['payload'])
+
+#============================ tests ===========================================
+
+def test_iphcNextHop(lbr):
+    (iphc,payload) = toLowpan(lbr,udpPacket(HOST,PREFIX+MOTE_A,0xf0b1,0x1633),[MOTE_A])
+    
+    # destination elided (the next hop), source on 64 bits, hop limit 64
+    assert iphc==[0xf1,0x7e,0x57]+HOST[8:]
+    # UDP: 8-bit source port, length elided
+    assert payload==[0xf2,0xb1,0x16,0x33,0x12,0x34]+[ord(c) for c in 'hello']
+
+def test_iphcFromDagRoot(lbr):
+    (iphc,_) = toLowpan(lbr,udpPacket(PREFIX+DAGROOT,PREFIX+MOTE_A,0x1633,0x1633),[MOTE_A])
+    
+    # source elided (the DAGroot, MAC source of the single hop), destination
+    # elided (the next hop)
+    assert iphc==[0xf1,0x7e,0x77]
+
+def test_iphcSourceRoute(lbr):
+    (iphc,_) = toLowpan(lbr,udpPacket(PREFIX+DAGROOT,PREFIX+MOTE_B,0x1633,0x1633,hlim=32),[MOTE_B,MOTE_A])
+    
+    # 6LoRH RH3 through MOTE_A
+    assert iphc[:4]==[0xf1,0x80,0x00,0x02]
+    # source on 64 bits, MOTE_B receives the frame from MOTE_A, not the
+    # DAGroot; destination on 64 bits, hop limit inline
+    assert iphc[4:]==[0x7c,0x55,32]+DAGROOT+MOTE_B
+
+def test_iphcShortAddress(lbr):
+    dst      = PREFIX+lbr.IID_16B_PREFIX+[0xab,0xcd]
+    (iphc,_) = toLowpan(lbr,udpPacket(HOST,dst,0x1633,0x1633),[dst[8:],MOTE_A])
+    
+    # 6LoRH RH3 through MOTE_A
+    assert iphc[:11]==[0xf1,0x80,0x03]+MOTE_A
+    # source on 64 bits, destination on 16 bits
+    assert iphc[11:]==[0x7e,0x56]+HOST[8:]+[0xab,0xcd]
+
+def test_iphcContext(lbr):
+    src              = [0xcc,0xcc]+[0x00]*13+[0x05]
+    lbr.contexts[3]  = src[:8]
+    (iphc,_)         = toLowpan(lbr,udpPacket(src,PREFIX+MOTE_B,0x1633,0x1633),[MOTE_B,MOTE_A])
+    
+    # 6LoRH RH3 through MOTE_A, RPI and IP-in-IP from the DAGroot
+    assert iphc[:17]==[0xf1,0x80,0x03]+MOTE_A+[0x93,0x05,0x00,0xa1,0x06,64]
+    # context 3 for the source, 0 for the destination
+    assert iphc[17:]==[0x7e,0xd5,0x30]+src[8:]+MOTE_B
+
+def test_iphcInternetSource(lbr):
+    (iphc,_) = toLowpan(lbr,udpPacket(INTERNET,PREFIX+MOTE_A,0x1633,0x1633),[MOTE_A])
+    
+    # RPI and IP-in-IP from the DAGroot, source inline, destination elided
+    assert iphc==[0xf1,0x93,0x05,0x00,0xa1,0x06,64,0x7e,0x07]+INTERNET
+
+@pytest.mark.parametrize('ports',[
+    (0x1633,0x1633,5),
+    (0x1633,0xf005,4),
+    (0xf005,0x1633,4),
+    (0xf0b1,0xf0b2,2),
+])
+def test_udpNhc(lbr,ports):
+    (srcPort,dstPort,compressedLen) = ports
+    ipv6     = lbr.disassemble_ipv6(udpPacket(HOST,PREFIX+MOTE_A,srcPort,dstPort))
+    
+    nhc      = lbr.compress_udp(ipv6['payload'])
+    assert len(nhc)==compressedLen+2+len('hello')
+    
+    (header,data) = lbr.decompress_udp(nhc,HOST,PREFIX+MOTE_A)
+    assert header+data==ipv6['payload']
+
+def test_udpNhcChecksumElided(lbr):
+    data     = [ord(c) for c in 'hello']
+    nhc      = [0xf0|lbr.NHC_UDP_C_ELIDED,0x16,0x33,0xf0,0x05]+data
+    
+    (header,_) = lbr.decompress_udp(nhc,PREFIX+MOTE_A,HOST)
+    
+    checksum = u.calculatePseudoHeaderCRC(
+        PREFIX+MOTE_A,HOST,[0,0,0,13],[0,0,0,17],header[:6]+[0,0]+data,
+    )
+    assert header==[0x16,0x33,0xf0,0x05,0x00,0x0d]+checksum
+
+def test_upstreamIphc(lbr):
+    # from MOTE_A to the DAGroot: addresses elided, UDP compressed
+    lowpan   = [0x7e,0x77,0xf0,0x16,0x33,0x16,0x33,0x12,0x34]+[ord(c) for c in 'hello']
+    
+    ipv6     = lbr.lowpan_to_ipv6([MOTE_A,lowpan])
+    
+    assert ipv6['src_addr']==PREFIX+MOTE_A
+    assert ipv6['dst_addr']==PREFIX+DAGROOT
+    assert ipv6['hop_limit']==64
+    assert ipv6['next_header']==lbr.IANA_UDP
+    assert ipv6['payload'][0]==0xf0
@@ -10,6 +10,8 @@ sys.path.insert(0, os.path.join(here, '..', '..','eventBus','PyDispatcher-2.0.3'
 import logging
 import logging.handlers
 import json
+import random
+import struct
 
 import pytest
 
@@ -114,6 +116,30 @@ EXPECTEDFORMATIPv6 = [
 def expectedformatipv6(request):
     return request.param
 
+#===== expectedfcs
+
+EXPECTEDFCS = [
+    #           payload                                  fcs
+    json.dumps(([ord(c) for c in '123456789'],           [0x89,0x21])),
+    json.dumps(([],                                      [0x00,0x00])),
+]
+
+@pytest.fixture(params=EXPECTEDFCS)
+def expectedfcs(request):
+    return request.param
+
+#===== expectedcrc
+
+EXPECTEDCRC = [
+    #           payload                                  checksum
+    json.dumps(([0x00,0x01,0xf2,0x03,0xf4,0xf5,0xf6,0xf7], [0x22,0x0d])),   # RFC1071
+    json.dumps(([0x00,0x01,0xf2],                        [0x0d,0xfe])),
+]
+
+@pytest.fixture(params=EXPECTEDCRC)
+def expectedcrc(request):
+    return request.param
+
 #============================ helpers =========================================
 
 #============================ tests ===========================================
@@ -142,4 +168,66 @@ def test_formatIPv6Addr(expectedformatipv6):
     
     print ipv6_string
     
-    assert u.formatIPv6Addr(ipv6_list)==ipv6_string
\ No newline at end of file
+    assert u.formatIPv6Addr(ipv6_list)==ipv6_string
+
+def test_calculateFCS(expectedfcs):
+    (payload,fcs) = json.loads(expectedfcs)
+    
+    assert u.calculateFCS(payload)==fcs
+    assert u.calculateFCS(''.join([chr(b) for b in payload]))==fcs
+    assert u.calculateFCS(bytearray(payload))==fcs
+
+def test_calculateCRC(expectedcrc):
+    (payload,checksum) = json.loads(expectedcrc)
+    
+    assert u.calculateCRC(payload)==checksum
+    assert u.calculateCRC(memoryview(bytearray(payload)))==checksum
+
+def test_reflectedCrc16Accelerated():
+    for _ in range(100):
+        buf = bytearray([random.randint(0x00,0xff) for _ in range(random.randint(0,127))])
+        for crc in [0x0000,0xffff]:
+            assert u.reflectedCrc16(buf,crc,accelerated=True)==u.reflectedCrc16(buf,crc,accelerated=False)
+
+def test_calculatePseudoHeaderCRC():
+    src     = [0xbb,0xbb]+[0x00]*13+[0x01]
+    dst     = [0xbb,0xbb]+[0x00]*13+[0x02]
+    length  = [0x00,0x00,0x00,0x0b]
+    nh      = [0x00,0x00,0x00,17]
+    payload = [0x12,0x34,0x56,0x78,0x00,0x0b,0x00,0x00,0xaa,0xbb,0xcc]
+    
+    assert u.calculatePseudoHeaderCRC(src,dst,length,nh,payload)==u.calculateCRC(src+dst+length+nh+payload)
+
+def test_bytePacketSlicing():
+    pkt   = u.BytePacket(''.join([chr(b) for b in range(10)]))
+
+    # slices share the string of the packet
+    body  = pkt[2:8]
+    assert body.buf is pkt.buf
+    assert body.tobytes()=='\x02\x03\x04\x05\x06\x07'
+    assert body[1:-1].tolist()==[3,4,5,6]
+    assert body[-1]==7
+    assert body[::2]==[2,4,6]
+    with pytest.raises(IndexError):
+        body[6]
+
+    # fields are unpacked in place, within the bounds of the slice
+    assert body.unpack_from('>HB',1)==(0x0304,0x05)
+    with pytest.raises(struct.error):
+        body.unpack_from('>I',3)
+
+def test_bytePacketIntList():
+    ints  = [0xbb,0xbb,0x00,0x01,0x02]
+    pkt   = u.BytePacket(ints)
+
+    assert pkt==ints
+    assert ints==pkt
+    assert list(pkt)==ints
+    assert tuple(pkt[2:])==(0x00,0x01,0x02)
+    assert str(pkt)==str(ints)
+    assert [0x44]+pkt==[0x44]+ints
+    assert pkt+[0x03]==ints+[0x03]
+    assert isinstance(pkt+'\x03',u.BytePacket)
+    assert u.buf2int(pkt[:2])==0xbbbb
+    assert u.calculateFCS(pkt[1:])==u.calculateFCS(ints[1:])
+    assert u.calculateCRC(pkt[1:])==u.calculateCRC(ints[1:])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+'''
+Benchmark of the TUN interface of OpenTunLinux.
+
+A SOCK_SEQPACKET socket pair stands in for /dev/net/tun: like a TUN
+interface, it keeps the boundaries of the packets. The benchmark writes
+IPv6 packets, with their packet information header, to one end and counts
+the 'v6ToMesh' notifications, read by a thread or by the ioReactor; then it
+sends 'v6ToInternet' packets and counts the packets written to the socket.
+
+Usage: python bench_tun.py [numPackets] [payloadLength]
+'''
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # openTun/
+
+import time
+import socket
+import struct
+import threading
+
+from   pydispatch import dispatcher
+
+import openTunLinux
+from   openvisualizer.moteProbe import ioReactor
+import openvisualizer.openvisualizer_utils as u
+
+#============================ defines =========================================
+
+NUM_PACKETS    = 100000
+PAYLOAD_LENGTH = 64
+SRC            = '\xbb\xbb'+'\x00'*13+'\x01'
+DST            = '\xbb\xbb'+'\x00'*6+'\x14\x15\x92\x00\x00\x00\x00\x02'
+
+#============================ helpers =========================================
+
+class standInTun(openTunLinux.OpenTunLinux):
+    '''
+    OpenTunLinux over one end of a socket pair.
+    '''
+    
+    def __init__(self,reactor=None):
+        (self.tunEnd,self.hostEnd) = socket.socketpair(socket.AF_UNIX,socket.SOCK_SEQPACKET)
+        openTunLinux.OpenTunLinux.__init__(self,reactor=reactor)
+    
+    def _createTunIf(self):
+        ioReactor.setNonBlocking(self.tunEnd)
+        return self.tunEnd.fileno()
+
+class counter(object):
+    
+    def __init__(self):
+        self.received = 0
+    
+    def receive(self,sender,signal,data):
+        self.received += 1
+
+def ipv6Packet(payloadLength):
+    return struct.pack('>IHBB',0x60000000,payloadLength,17,64)+SRC+DST+'\x00'*payloadLength
+
+def benchRead(numPackets,payloadLength,useReactor):
+    
+    reactor   = ioReactor.ioReactor() if useReactor else None
+    tun       = standInTun(reactor=reactor)
+    count     = counter()
+    dispatcher.connect(count.receive,signal='v6ToMesh',weak=False)
+    
+    frame     = openTunLinux.VIRTUALTUNID_STR+ipv6Packet(payloadLength)
+    
+    start     = time.time()
+    for _ in range(numPackets):
+        tun.hostEnd.send(frame)
+    while count.received<numPackets and time.time()<start+60:
+        time.sleep(0.001)
+    duration  = time.time()-start
+    
+    dispatcher.disconnect(count.receive,signal='v6ToMesh',weak=False)
+    tun.tunReadThread.close()
+    tun.hostEnd.close()
+    if reactor:
+        reactor.close()
+    return (count.received,duration)
+
+def benchWrite(numPackets,payloadLength):
+    
+    tun       = standInTun()
+    tun.hostEnd.settimeout(1)
+    received  = [0]
+    def drain():
+        try:
+            while received[0]<numPackets:
+                tun.hostEnd.recv(2048)
+                received[0] += 1
+        except socket.timeout:
+            # packets were dropped
+            pass
+    drainer   = threading.Thread(target=drain)
+    drainer.start()
+    
+    packet    = u.BytePacket(ipv6Packet(payloadLength))
+    
+    start     = time.time()
+    for _ in range(numPackets):
+        tun._v6ToInternet_notif('bench','v6ToInternet',packet)
+    drainer.join()
+    duration  = time.time()-start
+    
+    tun.hostEnd.close()
+    return (received[0],duration)
+
+def bench(numPackets,payloadLength):
+    
+    output    = []
+    output   += ['{0} packets of {1}B'.format(numPackets,40+payloadLength)]
+    for (name,useReactor) in [('thread',False),('reactor',True)]:
+        (received,duration) = benchRead(numPackets,payloadLength,useReactor)
+        output   += ['- read ({0}): {1} packets in {2:.2f}s, {3:.0f} packets/s'.format(name,received,duration,received/duration)]
+    (sent,duration) = benchWrite(numPackets,payloadLength)
+    output   += ['- write: {0} packets in {1:.2f}s, {2:.0f} packets/s'.format(sent,duration,sent/duration)]
+    print '\n'.join(output)
+    sys.stdout.flush()
+    
+    # the thread reading the socket pair may stay blocked
+    os._exit(0)
+
+#============================ main ============================================
+
+if __name__=='__main__':
+    numPackets     = int(sys.argv[1]) if len(sys.argv)>1 else NUM_PACKETS
+    payloadLength  = int(sys.argv[2]) if len(sys.argv)>2 else PAYLOAD_LENGTH
+    bench(numPackets,payloadLength)
@@ -19,9 +19,12 @@ from   openvisualizer.eventBus import eventBusClient
 IPV6PREFIX = [0xbb,0xbb,0x00,0x00,0x00,0x00,0x00,0x00]
 IPV6HOST   = [0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x01]
     
-def create():
+def create(reactor=None):
     '''
     Module-based Factory method to create instance based on operating system
+    
+    :param reactor: [in] An :class:`ioReactor.ioReactor` which reads the TUN
+        interface, instead of a thread, where supported.
     '''
     # Must import here rather than at top of module to avoid a circular 
     # reference to OpenTun class.
@@ -33,7 +36,7 @@ def create():
         
     elif sys.platform.startswith('linux'):
         from openTunLinux import OpenTunLinux
-        return OpenTunLinux()
+        return OpenTunLinux(reactor=reactor)
         
     elif sys.platform.startswith('darwin'):
         from openTunMACOS import OpenTunMACOS
@@ -49,12 +52,13 @@ class OpenTun(eventBusClient.eventBusClient):
     This class is abstract, with concrete subclases based on operating system.
     '''
     
-    def __init__(self):
+    def __init__(self,reactor=None):
         
         # log
         log.info("create instance")
         
         # store params
+        self.reactor              = reactor
         
         # register to receive outgoing network packets
         eventBusClient.eventBusClient.__init__(
@@ -13,12 +13,14 @@ import time
 import os
 import sys
 import struct
+import select
 import traceback
 
 import openvisualizer.openvisualizer_utils as u
 import openTun
 from   fcntl     import ioctl
 from   openvisualizer.eventBus  import eventBusClient
+from   openvisualizer.moteProbe import ioReactor
 
 #============================ defines =========================================
 
@@ -29,6 +31,10 @@ TUN_IPv4_NETMASK   = [255,255,0,0] ##< The IPv4 netmask of the TUN interface.
 
 ## insert 4 octedts ID tun for compatibility (it'll be discard) 
 VIRTUALTUNID = [0x00,0x00,0x86,0xdd]
+VIRTUALTUNID_STR = ''.join([chr(b) for b in VIRTUALTUNID])
+TUN_HEADER_LENGTH = len(VIRTUALTUNID)
+
+IPv6_PAYLOAD_LENGTH = struct.Struct('>H') # at offset 4 of the IPv6 header
 
 IFF_TUN            = 0x0001
 TUNSETIFF          = 0x400454ca
@@ -41,16 +47,25 @@ class TunReadThread(threading.Thread):
     
     When data is received from the interface, it calls a callback configured
     during instantiation.
+    
+    When given an :class:`ioReactor.ioReactor`, the thread is not started:
+    the reactor reads the interface.
+    
+    The interface is non-blocking: each time it has input, all the packets
+    waiting are read. Each packet is handed to the callback as a
+    :class:`openvisualizer_utils.BytePacket` over the string read, without
+    copying it.
     '''
     
     ETHERNET_MTU        = 1500
     IPv6_HEADER_LENGTH  = 40
     
-    def __init__(self,tunIf,callback):
+    def __init__(self,tunIf,callback,reactor=None):
     
         # store params
         self.tunIf                = tunIf
         self.callback             = callback
+        self.reactor              = reactor
         
         # local variables
         self.goOn                 = True
@@ -61,8 +76,11 @@ class TunReadThread(threading.Thread):
         # give this thread a name
         self.name                 = 'TunReadThread'
         
-        # start myself
-        self.start()
+        if self.reactor:
+            self.reactor.register(self.tunIf,self._readReady)
+        else:
+            # start myself
+            self.start()
     
     def run(self):
         try:
@@ -71,29 +89,9 @@ class TunReadThread(threading.Thread):
             while self.goOn:
                 
                 # wait for data
-                p =  os.read(self.tunIf,self.ETHERNET_MTU)
+                select.select([self.tunIf],[],[])
            
-                # convert input from a string to a byte list
-                p = [ord(b) for b in p]
-                
-                # debug info
-                if log.isEnabledFor(logging.DEBUG):
-                    log.debug('packet captured on tun interface: {0}'.format(u.formatBuf(p)))
-    
-                # remove tun ID octets
-                p = p[4:]
-                
-                # make sure it's an IPv6 packet (i.e., starts with 0x6x)
-                if (p[0]&0xf0) != 0x60:
-                    log.info('this is not an IPv6 packet')
-                    continue
-                
-                # because of the nature of tun for Windows, p contains ETHERNET_MTU
-                # bytes. Cut at length of IPv6 packet.
-                p = p[:self.IPv6_HEADER_LENGTH+256*p[4]+p[5]]
-                
-                # call the callback
-                self.callback(p)
+                self._readReady()
         except Exception as err:
             errMsg=u.formatCrashMessage(self.name,err)
             print errMsg
@@ -104,9 +102,45 @@ class TunReadThread(threading.Thread):
     
     def close(self):
         self.goOn = False
+        if self.reactor:
+            self.reactor.unregister(self.tunIf)
     
     #======================== private =========================================
     
+    def _readReady(self):
+        '''
+        Reads all the packets waiting on the interface.
+        '''
+        while True:
+            try:
+                p = os.read(self.tunIf,self.ETHERNET_MTU)
+            except OSError as err:
+                if ioReactor.wouldBlock(err):
+                    return
+                raise
+            if not p:
+                raise IOError('TUN interface closed')
+            self._handlePacket(p)
+    
+    def _handlePacket(self,p):
+        
+        # debug info
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('packet captured on tun interface: {0}'.format(u.formatStringBuf(p)))
+        
+        # make sure it's an IPv6 packet (i.e., starts with 0x6x), after the
+        # tun ID octets
+        if len(p) < TUN_HEADER_LENGTH+self.IPv6_HEADER_LENGTH or (ord(p[TUN_HEADER_LENGTH])&0xf0) != 0x60:
+            log.info('this is not an IPv6 packet')
+            return
+        
+        # because of the nature of tun for Windows, p contains ETHERNET_MTU
+        # bytes. Cut at length of IPv6 packet.
+        end = TUN_HEADER_LENGTH+self.IPv6_HEADER_LENGTH+IPv6_PAYLOAD_LENGTH.unpack_from(p,TUN_HEADER_LENGTH+4)[0]
+        
+        # call the callback, removing the tun ID octets
+        self.callback(u.BytePacket(p,TUN_HEADER_LENGTH,min(end,len(p))))
+    
 #============================ main class ======================================
 
 class OpenTunLinux(openTun.OpenTun):
@@ -114,12 +148,17 @@ class OpenTunLinux(openTun.OpenTun):
     Class which interfaces between a TUN virtual interface and an EventBus.
     '''
     
-    def __init__(self):
+    WRITE_TIMEOUT = 0.1 # seconds to wait for room on the interface
+    
+    def __init__(self,reactor=None):
         # log
         log.info("create instance")
         
+        # packets dropped because the interface stayed full
+        self.numDroppedWrites = 0
+        
         # initialize parent class
-        openTun.OpenTun.__init__(self)
+        openTun.OpenTun.__init__(self,reactor)
     
     #======================== public ==========================================
     
@@ -137,15 +176,12 @@ class OpenTunLinux(openTun.OpenTun):
         if not self.tunIf:
             return
         
-        # add tun header
-        data  = VIRTUALTUNID + data
-        
-        # convert data to string
-        data  = ''.join([chr(b) for b in data])
+        # add tun header, a single copy of the packet
+        data  = VIRTUALTUNID_STR + u.toByteString(data)
         
         try:
             # write over tuntap interface
-            os.write(self.tunIf, data)
+            self._write(data)
             if log.isEnabledFor(logging.DEBUG):
                 log.debug("data dispatched to tun correctly {0}, {1}".format(signal,sender))
         except Exception as err:
@@ -164,7 +200,7 @@ class OpenTunLinux(openTun.OpenTun):
         try:
             #=====
             log.info("opening tun interface")
-            returnVal=os.open("/dev/net/tun", os.O_RDWR)
+            returnVal=os.open("/dev/net/tun", os.O_RDWR|os.O_NONBLOCK)
             ifs=ioctl(returnVal,TUNSETIFF,struct.pack("16sH","tun%d",IFF_TUN)) 
             ifname=ifs[:16].strip("\x00")
             
@@ -211,8 +247,26 @@ class OpenTunLinux(openTun.OpenTun):
         '''
         return TunReadThread(
             self.tunIf,
-            self._v6ToMesh_notif
+            self._v6ToMesh_notif,
+            reactor = self.reactor,
         )
    
     #======================== helpers =========================================
     
+    def _write(self,buf):
+        try:
+            os.write(self.tunIf,buf)
+        except OSError as err:
+            if not ioReactor.wouldBlock(err):
+                raise
+            # the queue of the interface is full, give it some time
+            select.select([],[self.tunIf],[],self.WRITE_TIMEOUT)
+            try:
+                os.write(self.tunIf,buf)
+            except OSError as err:
+                if not ioReactor.wouldBlock(err):
+                    raise
+                # still full, drop the packet
+                self.numDroppedWrites += 1
+                log.warning('tun interface full, packet dropped ({0} so far)'.format(self.numDroppedWrites))
+
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import os
+import sys
+here = sys.path[0]
+sys.path.insert(0, os.path.join(here, '..', '..', '..'))                       # root/
+sys.path.insert(0, os.path.join(here, '..'))                                   # openTun/
+
+import logging
+import logging.handlers
+import socket
+import struct
+import time
+
+import pytest
+
+#============================ logging =========================================
+
+LOGFILE_NAME = 'test_openTunLinux.log'
+
+import logging
+log = logging.getLogger('test_openTunLinux')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+logHandler = logging.handlers.RotatingFileHandler(LOGFILE_NAME,
+                                                  backupCount=5,
+                                                  mode='w')
+logHandler.setFormatter(logging.Formatter("%(asctime)s [%(name)s:%(levelname)s] %(message)s"))
+for loggerName in ['test_openTunLinux',
+                   'openTunLinux',]:
+    temp = logging.getLogger(loggerName)
+    temp.setLevel(logging.DEBUG)
+    temp.addHandler(logHandler)
+
+openTunLinux = pytest.importorskip('openTunLinux')   # needs fcntl
+from openvisualizer.moteProbe import ioReactor
+
+#============================ defines =========================================
+
+SRC = '\xbb\xbb'+'\x00'*13+'\x01'
+DST = '\xbb\xbb'+'\x00'*6+'\x14\x15\x92\x00\x00\x00\x00\x02'
+
+#============================ helpers =========================================
+
+class standInTun(openTunLinux.OpenTunLinux):
+    '''
+    OpenTunLinux over one end of a socket pair, which keeps the boundaries
+    of the packets like a TUN interface.
+    '''
+    
+    def __init__(self,reactor=None):
+        self.received = []
+        (self.tunEnd,self.hostEnd) = socket.socketpair(socket.AF_UNIX,socket.SOCK_SEQPACKET)
+        openTunLinux.OpenTunLinux.__init__(self,reactor=reactor)
+    
+    def _createTunIf(self):
+        ioReactor.setNonBlocking(self.tunEnd)
+        return self.tunEnd.fileno()
+    
+    def _v6ToMesh_notif(self,data):
+        self.received += [data]
+
+@pytest.fixture
+def tun(request):
+    reactor = ioReactor.ioReactor()
+    tun     = standInTun(reactor=reactor)
+    def close():
+        tun.tunReadThread.close()
+        reactor.close()
+        tun.hostEnd.close()
+        tun.tunEnd.close()
+    request.addfinalizer(close)
+    return tun
+
+def ipv6Packet(payload):
+    return struct.pack('>IHBB',0x60000000,len(payload),17,64)+SRC+DST+payload
+
+def waitFor(condition,timeout=2):
+    end = time.time()+timeout
+    while not condition() and time.time()<end:
+        time.sleep(0.001)
+    return condition()
+
+#============================ tests ===========================================
+
+def test_readPackets(tun):
+    packets = [ipv6Packet('p{0}'.format(i)) for i in range(5)]
+    
+    for p in packets:
+        tun.hostEnd.send(openTunLinux.VIRTUALTUNID_STR+p)
+    # not IPv6, dropped
+    tun.hostEnd.send(openTunLinux.VIRTUALTUNID_STR+'\x45'+'\x00'*40)
+    # padded, cut at the length of the IPv6 packet
+    tun.hostEnd.send(openTunLinux.VIRTUALTUNID_STR+packets[0]+'\x00'*20)
+    
+    assert waitFor(lambda: len(tun.received)==6)
+    assert [r.tobytes() for r in tun.received]==packets+packets[:1]
+
+def test_writePacket(tun):
+    packet = ipv6Packet('hello')
+    
+    tun._v6ToInternet_notif('test','v6ToInternet',[ord(c) for c in packet])
+    
+    assert tun.hostEnd.recv(2048)==openTunLinux.VIRTUALTUNID_STR+packet
+
+def test_writeFull(tun):
+    tun.WRITE_TIMEOUT = 0.01
+    packet = ipv6Packet('hello')
+    
+    # fill the interface, nobody reads the other end
+    tun.tunEnd.setblocking(False)
+    numQueued = 0
+    while True:
+        try:
+            tun.tunEnd.send(openTunLinux.VIRTUALTUNID_STR+packet)
+        except socket.error:
+            break
+        numQueued += 1
+    
+    # the packet is dropped and counted, without raising
+    tun._write(openTunLinux.VIRTUALTUNID_STR+packet)
+    tun._write(openTunLinux.VIRTUALTUNID_STR+packet)
+    assert tun.numDroppedWrites==2
+    
+    # writes go through again once there is room
+    for _ in range(numQueued):
+        tun.hostEnd.recv(2048)
+    tun._v6ToInternet_notif('test','v6ToInternet',[ord(c) for c in packet])
+    assert tun.hostEnd.recv(2048)==openTunLinux.VIRTUALTUNID_STR+packet
+    assert tun.numDroppedWrites==2
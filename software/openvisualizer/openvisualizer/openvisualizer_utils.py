@@ -5,6 +5,8 @@
 # https://openwsn.atlassian.net/wiki/display/OW/License
 import traceback
 import threading
+import binascii
+import struct
 
 def buf2int(buf):
     '''
@@ -74,21 +76,275 @@ def hex2buf(s):
     
     return returnVal
 
+#===== packets
+
+class BytePacket(object):
+    '''
+    A packet, or part of a packet, held as a string of bytes.
+    
+    Slicing returns a new BytePacket over the same string, so a packet can be
+    cut into headers and payload, and handed from layer to layer, without
+    copying it. Fields are read in place with :meth:`unpack_from`.
+    
+    For the consumers which still expect a list of integers, a BytePacket
+    also behaves as one: indexing and iterating yield integers, it compares
+    equal to the list of integers it holds, it prints as that list, and
+    concatenating it with a list returns a list.
+    '''
+    
+    __slots__ = ['buf','start','end']
+    
+    def __init__(self,buf,start=0,end=None):
+        '''
+        :param buf:   [in] A string, BytePacket, list of integers, bytearray or
+            memoryview. Strings and BytePackets are not copied.
+        :param start: [in] Offset of the first byte of the packet in buf.
+        :param end:   [in] Offset after the last byte of the packet in buf.
+        '''
+        if isinstance(buf,BytePacket):
+            start += buf.start
+            end    = buf.end if end is None else buf.start+end
+            buf    = buf.buf
+        elif not isinstance(buf,str):
+            buf    = toByteString(buf)
+        self.buf   = buf
+        self.start = start
+        self.end   = len(buf) if end is None else end
+    
+    #======================== public ==========================================
+    
+    def tobytes(self):
+        '''
+        :returns: The packet as a string. No copy is made when the packet
+            spans the whole underlying string.
+        '''
+        if self.start==0 and self.end==len(self.buf):
+            return self.buf
+        return self.buf[self.start:self.end]
+    
+    def tolist(self):
+        '''
+        :returns: The packet as a list of integers.
+        '''
+        return list(bytearray(self.view))
+    
+    @property
+    def view(self):
+        '''
+        A memoryview over the bytes of the packet.
+        '''
+        return memoryview(self.buf)[self.start:self.end]
+    
+    def unpack_from(self,fmt,offset=0):
+        '''
+        Unpacks fields in place, without copying the bytes.
+        
+        :param fmt:    [in] A struct format string, or a struct.Struct.
+        :param offset: [in] Offset of the fields in the packet.
+        
+        :raises: struct.error when the packet is too short.
+        
+        :returns: A tuple of the unpacked fields.
+        '''
+        if not isinstance(fmt,struct.Struct):
+            fmt = struct.Struct(fmt)
+        if offset<0 or offset+fmt.size>self.end-self.start:
+            raise struct.error(
+                'unpack_from requires {0} bytes at offset {1}, packet is {2} bytes'.format(
+                    fmt.size,
+                    offset,
+                    self.end-self.start,
+                )
+            )
+        return fmt.unpack_from(self.buf,self.start+offset)
+    
+    #======================== int-list compatibility ==========================
+    
+    def __len__(self):
+        return self.end-self.start
+    
+    def __getitem__(self,key):
+        length = self.end-self.start
+        if isinstance(key,slice):
+            (start,stop,step) = key.indices(length)
+            if step!=1:
+                return self.tolist()[key]
+            return BytePacket(self.buf,self.start+start,self.start+max(start,stop))
+        if key<0:
+            key += length
+        if key<0 or key>=length:
+            raise IndexError('BytePacket index out of range')
+        return ord(self.buf[self.start+key])
+    
+    def __iter__(self):
+        return iter(bytearray(self.view))
+    
+    def __add__(self,other):
+        if isinstance(other,(BytePacket,str)):
+            return BytePacket(self.tobytes()+toByteString(other))
+        if isinstance(other,list):
+            return self.tolist()+other
+        return NotImplemented
+    
+    def __radd__(self,other):
+        if isinstance(other,str):
+            return BytePacket(other+self.tobytes())
+        if isinstance(other,list):
+            return other+self.tolist()
+        return NotImplemented
+    
+    def __eq__(self,other):
+        if isinstance(other,(BytePacket,str)):
+            return self.tobytes()==toByteString(other)
+        if isinstance(other,list):
+            return self.tolist()==other
+        return NotImplemented
+    
+    def __ne__(self,other):
+        returnVal = self.__eq__(other)
+        if returnVal is NotImplemented:
+            return returnVal
+        return not returnVal
+    
+    def __hash__(self):
+        return hash(self.tobytes())
+    
+    def __repr__(self):
+        return repr(self.tolist())
+    
+    __str__ = __repr__
+
 #===== CRC
 
-def calculateCRC(payload):  
+# The checksum engine below works on whole buffers. Buffers can be lists of
+# integers (as used throughout OpenVisualizer), strings, BytePackets,
+# bytearrays or memoryviews.
+#
+# The reflected CRCs (802.15.4 FCS and HDLC) are computed with the C
+# implementation of CRC-CCITT in binascii.crc_hqx, after bit-reversing the
+# input through a translation table. The table-driven Python implementation
+# is used when binascii.crc_hqx is not available.
+
+# bit-reversed value of each byte
+BYTEINVERSE_TAB  = tuple([sum([((b>>pos)&1)<<(7-pos) for pos in range(8)]) for b in range(256)])
+_BYTEINVERSE_STR = ''.join([chr(b) for b in BYTEINVERSE_TAB])
+
+# CRC-CCITT (polynomial 0x1021), non-reflected
+FCS16TAB  = (
+    0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50a5, 0x60c6, 0x70e7,
+    0x8108, 0x9129, 0xa14a, 0xb16b, 0xc18c, 0xd1ad, 0xe1ce, 0xf1ef,
+    0x1231, 0x0210, 0x3273, 0x2252, 0x52b5, 0x4294, 0x72f7, 0x62d6,
+    0x9339, 0x8318, 0xb37b, 0xa35a, 0xd3bd, 0xc39c, 0xf3ff, 0xe3de,
+    0x2462, 0x3443, 0x0420, 0x1401, 0x64e6, 0x74c7, 0x44a4, 0x5485,
+    0xa56a, 0xb54b, 0x8528, 0x9509, 0xe5ee, 0xf5cf, 0xc5ac, 0xd58d,
+    0x3653, 0x2672, 0x1611, 0x0630, 0x76d7, 0x66f6, 0x5695, 0x46b4,
+    0xb75b, 0xa77a, 0x9719, 0x8738, 0xf7df, 0xe7fe, 0xd79d, 0xc7bc,
+    0x48c4, 0x58e5, 0x6886, 0x78a7, 0x0840, 0x1861, 0x2802, 0x3823,
+    0xc9cc, 0xd9ed, 0xe98e, 0xf9af, 0x8948, 0x9969, 0xa90a, 0xb92b,
+    0x5af5, 0x4ad4, 0x7ab7, 0x6a96, 0x1a71, 0x0a50, 0x3a33, 0x2a12,
+    0xdbfd, 0xcbdc, 0xfbbf, 0xeb9e, 0x9b79, 0x8b58, 0xbb3b, 0xab1a,
+    0x6ca6, 0x7c87, 0x4ce4, 0x5cc5, 0x2c22, 0x3c03, 0x0c60, 0x1c41,
+    0xedae, 0xfd8f, 0xcdec, 0xddcd, 0xad2a, 0xbd0b, 0x8d68, 0x9d49,
+    0x7e97, 0x6eb6, 0x5ed5, 0x4ef4, 0x3e13, 0x2e32, 0x1e51, 0x0e70,
+    0xff9f, 0xefbe, 0xdfdd, 0xcffc, 0xbf1b, 0xaf3a, 0x9f59, 0x8f78,
+    0x9188, 0x81a9, 0xb1ca, 0xa1eb, 0xd10c, 0xc12d, 0xf14e, 0xe16f,
+    0x1080, 0x00a1, 0x30c2, 0x20e3, 0x5004, 0x4025, 0x7046, 0x6067,
+    0x83b9, 0x9398, 0xa3fb, 0xb3da, 0xc33d, 0xd31c, 0xe37f, 0xf35e,
+    0x02b1, 0x1290, 0x22f3, 0x32d2, 0x4235, 0x5214, 0x6277, 0x7256,
+    0xb5ea, 0xa5cb, 0x95a8, 0x8589, 0xf56e, 0xe54f, 0xd52c, 0xc50d,
+    0x34e2, 0x24c3, 0x14a0, 0x0481, 0x7466, 0x6447, 0x5424, 0x4405,
+    0xa7db, 0xb7fa, 0x8799, 0x97b8, 0xe75f, 0xf77e, 0xc71d, 0xd73c,
+    0x26d3, 0x36f2, 0x0691, 0x16b0, 0x6657, 0x7676, 0x4615, 0x5634,
+    0xd94c, 0xc96d, 0xf90e, 0xe92f, 0x99c8, 0x89e9, 0xb98a, 0xa9ab,
+    0x5844, 0x4865, 0x7806, 0x6827, 0x18c0, 0x08e1, 0x3882, 0x28a3,
+    0xcb7d, 0xdb5c, 0xeb3f, 0xfb1e, 0x8bf9, 0x9bd8, 0xabbb, 0xbb9a,
+    0x4a75, 0x5a54, 0x6a37, 0x7a16, 0x0af1, 0x1ad0, 0x2ab3, 0x3a92,
+    0xfd2e, 0xed0f, 0xdd6c, 0xcd4d, 0xbdaa, 0xad8b, 0x9de8, 0x8dc9,
+    0x7c26, 0x6c07, 0x5c64, 0x4c45, 0x3ca2, 0x2c83, 0x1ce0, 0x0cc1,
+    0xef1f, 0xff3e, 0xcf5d, 0xdf7c, 0xaf9b, 0xbfba, 0x8fd9, 0x9ff8,
+    0x6e17, 0x7e36, 0x4e55, 0x5e74, 0x2e93, 0x3eb2, 0x0ed1, 0x1ef0
+)
+
+# CRC-CCITT (polynomial 0x1021), reflected
+FCS16TAB_REFLECTED = tuple([
+    (BYTEINVERSE_TAB[FCS16TAB[BYTEINVERSE_TAB[i]]&0xff]<<8) | BYTEINVERSE_TAB[FCS16TAB[BYTEINVERSE_TAB[i]]>>8]
+    for i in range(256)
+])
+
+CRC_ACCELERATED  = hasattr(binascii,'crc_hqx')
+
+def toByteString(buf):
+    '''
+    Converts a buffer into a string of bytes. Strings are not copied.
     
-    checksum       = [0x00]*2
+    :param buf: [in] A list of integers, string, BytePacket, bytearray or
+        memoryview.
+    '''
+    if isinstance(buf,str):
+        return buf
+    if isinstance(buf,BytePacket):
+        return buf.tobytes()
+    if isinstance(buf,memoryview):
+        return buf.tobytes()
+    if isinstance(buf,bytearray):
+        return str(buf)
+    return str(bytearray(buf))
+
+def reflectedCrc16(buf,crc,accelerated=None):
+    '''
+    Computes a reflected CRC-CCITT, as used by HDLC and IEEE802.15.4, over a
+    whole buffer.
     
-    checksum       = _oneComplementSum(payload,checksum)
+    :param buf:         [in] The buffer.
+    :param crc:         [in] The initial value of the CRC register.
+    :param accelerated: [in] Force (True) or disable (False) the use of
+        binascii.crc_hqx; by default, it is used when available.
     
-    checksum[0]   ^= 0xFF;
-    checksum[1]   ^= 0xFF;
+    :returns: The value of the CRC register, as an integer.
+    '''
+    buf = toByteString(buf)
+    if accelerated is None:
+        accelerated = CRC_ACCELERATED
+    if accelerated:
+        crc = binascii.crc_hqx(
+            buf.translate(_BYTEINVERSE_STR),
+            (BYTEINVERSE_TAB[crc & 0xff]<<8) | BYTEINVERSE_TAB[crc>>8],
+        )
+        return (BYTEINVERSE_TAB[crc & 0xff]<<8) | BYTEINVERSE_TAB[crc>>8]
+    else:
+        tab = FCS16TAB_REFLECTED
+        for b in bytearray(buf):
+            crc = (crc>>8) ^ tab[(crc^b) & 0xff]
+        return crc
+
+def onesComplementSum(buf,initial=0):
+    '''
+    Computes the 16-bit one's complement sum of a whole buffer, see
+    http://tools.ietf.org/html/rfc1071. A buffer of odd length is padded
+    with a zero byte.
     
-    checksum[0]   = int(checksum[0]);
-    checksum[1]   = int(checksum[1]);
+    :param buf:     [in] The buffer.
+    :param initial: [in] The sum to start from, e.g. that of a previous
+        buffer.
     
-    return checksum
+    :returns: The sum, as an integer.
+    '''
+    if isinstance(buf,BytePacket):
+        buf        = bytearray(buf.view)
+    elif isinstance(buf,(str,memoryview)):
+        buf        = bytearray(buf)
+    # the sum of the high bytes and that of the low bytes are computed
+    # separately, without building 16-bit words
+    total          = initial+(sum(buf[0::2])<<8)+sum(buf[1::2])
+    while (total >> 16):
+        total      = (total & 0xFFFF) + (total >> 16)
+    return total
+
+def calculateCRC(payload):  
+    
+    checksum       = 0xFFFF ^ onesComplementSum(payload)
+    
+    return [checksum >> 8, checksum & 0xFF]
 
 def calculatePseudoHeaderCRC(src,dst,length,nh,payload):
     '''
@@ -99,34 +355,18 @@ def calculatePseudoHeaderCRC(src,dst,length,nh,payload):
     * http://en.wikipedia.org/wiki/User_Datagram_Protocol#IPv6_PSEUDO-HEADER
     '''
     
-    checksum       = [0x00]*2
-    
     #compute pseudo header crc
-    checksum       = _oneComplementSum(src,checksum)
-    checksum       = _oneComplementSum(dst,checksum)
-    checksum       = _oneComplementSum(length,checksum)
-    checksum       = _oneComplementSum(nh,checksum)
-    checksum       = _oneComplementSum(payload,checksum)
-    
-    checksum[0]   ^= 0xFF;
-    checksum[1]   ^= 0xFF;
+    checksum       = 0
+    for field in (src,dst,length,nh,payload):
+        checksum   = onesComplementSum(field,checksum)
     
-    checksum[0]   = int(checksum[0]);
-    checksum[1]   = int(checksum[1]);
+    checksum      ^= 0xFFFF
     
-    return checksum
+    return [checksum >> 8, checksum & 0xFF]
 
 def _oneComplementSum(field,checksum):
         
-    sum            = 0xFFFF & (checksum[0] << 8 | checksum[1])
-    i              = len(field)
-    while (i > 1):
-        sum       += 0xFFFF & (field[-i] << 8 | (field[-i+1]))
-        i         -= 2
-    if i:
-        sum       += (0xFF & field[-1]) << 8
-    while (sum >> 16):
-        sum        = (sum & 0xFFFF) + (sum >> 16)
+    sum            = onesComplementSum(field,(checksum[0] << 8) | checksum[1])
     
     checksum[0]    = (sum >> 8) & 0xFF
     checksum[1]    = sum & 0xFF
@@ -134,65 +374,18 @@ def _oneComplementSum(field,checksum):
     return checksum
 
 def byteinverse(b):
-    # TODO: speed up through lookup table
-    rb = 0
-    for pos in range(8):
-        if b&(1<<pos)!=0:
-            bitval = 1
-        else:
-            bitval = 0
-        rb |= bitval<<(7-pos)
-    return rb
+    return BYTEINVERSE_TAB[b]
 
 def calculateFCS(rpayload):
+    '''
+    Computes the IEEE802.15.4 FCS of a frame.
     
-    payload = []
-    for b in rpayload:        
-        payload += [byteinverse(b)]
-    
-    FCS16TAB  = (
-        0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50a5, 0x60c6, 0x70e7,
-        0x8108, 0x9129, 0xa14a, 0xb16b, 0xc18c, 0xd1ad, 0xe1ce, 0xf1ef,
-        0x1231, 0x0210, 0x3273, 0x2252, 0x52b5, 0x4294, 0x72f7, 0x62d6,
-        0x9339, 0x8318, 0xb37b, 0xa35a, 0xd3bd, 0xc39c, 0xf3ff, 0xe3de,
-        0x2462, 0x3443, 0x0420, 0x1401, 0x64e6, 0x74c7, 0x44a4, 0x5485,
-        0xa56a, 0xb54b, 0x8528, 0x9509, 0xe5ee, 0xf5cf, 0xc5ac, 0xd58d,
-        0x3653, 0x2672, 0x1611, 0x0630, 0x76d7, 0x66f6, 0x5695, 0x46b4,
-        0xb75b, 0xa77a, 0x9719, 0x8738, 0xf7df, 0xe7fe, 0xd79d, 0xc7bc,
-        0x48c4, 0x58e5, 0x6886, 0x78a7, 0x0840, 0x1861, 0x2802, 0x3823,
-        0xc9cc, 0xd9ed, 0xe98e, 0xf9af, 0x8948, 0x9969, 0xa90a, 0xb92b,
-        0x5af5, 0x4ad4, 0x7ab7, 0x6a96, 0x1a71, 0x0a50, 0x3a33, 0x2a12,
-        0xdbfd, 0xcbdc, 0xfbbf, 0xeb9e, 0x9b79, 0x8b58, 0xbb3b, 0xab1a,
-        0x6ca6, 0x7c87, 0x4ce4, 0x5cc5, 0x2c22, 0x3c03, 0x0c60, 0x1c41,
-        0xedae, 0xfd8f, 0xcdec, 0xddcd, 0xad2a, 0xbd0b, 0x8d68, 0x9d49,
-        0x7e97, 0x6eb6, 0x5ed5, 0x4ef4, 0x3e13, 0x2e32, 0x1e51, 0x0e70,
-        0xff9f, 0xefbe, 0xdfdd, 0xcffc, 0xbf1b, 0xaf3a, 0x9f59, 0x8f78,
-        0x9188, 0x81a9, 0xb1ca, 0xa1eb, 0xd10c, 0xc12d, 0xf14e, 0xe16f,
-        0x1080, 0x00a1, 0x30c2, 0x20e3, 0x5004, 0x4025, 0x7046, 0x6067,
-        0x83b9, 0x9398, 0xa3fb, 0xb3da, 0xc33d, 0xd31c, 0xe37f, 0xf35e,
-        0x02b1, 0x1290, 0x22f3, 0x32d2, 0x4235, 0x5214, 0x6277, 0x7256,
-        0xb5ea, 0xa5cb, 0x95a8, 0x8589, 0xf56e, 0xe54f, 0xd52c, 0xc50d,
-        0x34e2, 0x24c3, 0x14a0, 0x0481, 0x7466, 0x6447, 0x5424, 0x4405,
-        0xa7db, 0xb7fa, 0x8799, 0x97b8, 0xe75f, 0xf77e, 0xc71d, 0xd73c,
-        0x26d3, 0x36f2, 0x0691, 0x16b0, 0x6657, 0x7676, 0x4615, 0x5634,
-        0xd94c, 0xc96d, 0xf90e, 0xe92f, 0x99c8, 0x89e9, 0xb98a, 0xa9ab,
-        0x5844, 0x4865, 0x7806, 0x6827, 0x18c0, 0x08e1, 0x3882, 0x28a3,
-        0xcb7d, 0xdb5c, 0xeb3f, 0xfb1e, 0x8bf9, 0x9bd8, 0xabbb, 0xbb9a,
-        0x4a75, 0x5a54, 0x6a37, 0x7a16, 0x0af1, 0x1ad0, 0x2ab3, 0x3a92,
-        0xfd2e, 0xed0f, 0xdd6c, 0xcd4d, 0xbdaa, 0xad8b, 0x9de8, 0x8dc9,
-        0x7c26, 0x6c07, 0x5c64, 0x4c45, 0x3ca2, 0x2c83, 0x1ce0, 0x0cc1,
-        0xef1f, 0xff3e, 0xcf5d, 0xdf7c, 0xaf9b, 0xbfba, 0x8fd9, 0x9ff8,
-        0x6e17, 0x7e36, 0x4e55, 0x5e74, 0x2e93, 0x3eb2, 0x0ed1, 0x1ef0
-    )
-    crc     = 0x0000
-    for b in payload:
-        crc = ((crc<<8)&0xffff) ^ FCS16TAB[((crc>>8)^b) & 0xff]
-    
-    returnVal = [
-        byteinverse(crc>>8),
-        byteinverse(crc&0xff)
-    ]
-    return returnVal
+    :returns: The FCS, as a list of 2 bytes, least significant byte first.
+    '''
+    
+    crc     = reflectedCrc16(rpayload,0x0000)
+    
+    return [crc & 0xff, crc >> 8]
 
 def formatCriticalMessage(error):
     returnVal  = []